@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import EventTicket
+from .models import EventTicket, EventTicketStats, TicketAssetJob
 from .fast_models import FastEventTicket
+from . import ticket_stats
 
 @admin.register(EventTicket)
 class EventTicketAdmin(admin.ModelAdmin):
@@ -48,7 +49,7 @@ class EventTicketAdmin(admin.ModelAdmin):
         # Only allow viewing existing tickets, not creating new ones manually
         return False
     
-    actions = ['regenerate_qr_codes', 'mark_as_unused']
+    actions = ['regenerate_qr_codes', 'generate_assets', 'mark_as_unused']
     
     def regenerate_qr_codes(self, request, queryset):
         """Regenerate QR codes for selected tickets"""
@@ -64,9 +65,18 @@ class EventTicketAdmin(admin.ModelAdmin):
         self.message_user(request, f"Successfully regenerated QR codes for {count} tickets.")
     regenerate_qr_codes.short_description = "Regenerate QR codes for selected tickets"
     
+    def generate_assets(self, request, queryset):
+        """Queue QR codes and PDFs for the selected tickets, in parallel batches"""
+        from .tasks import generate_multiple_ticket_assets
+        job = generate_multiple_ticket_assets(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"Queued assets for {job['ticket_count']} tickets (job #{job['job_id']}).")
+    generate_assets.short_description = "Generate QR codes and PDFs in the background"
+    
     def mark_as_unused(self, request, queryset):
         """Mark selected tickets as unused (for testing)"""
+        event_ids = list(queryset.values_list('event_id', flat=True).distinct())
         count = queryset.update(is_used=False, used_at=None, verified_by=None, verified_at=None)
+        ticket_stats.rebuild(event_ids)
         self.message_user(request, f"Marked {count} tickets as unused.")
     mark_as_unused.short_description = "Mark tickets as unused (for testing)"
     
@@ -128,7 +138,9 @@ class FastEventTicketAdmin(admin.ModelAdmin):
     
     def mark_as_unused(self, request, queryset):
         """Mark selected tickets as unused (for testing)"""
+        event_ids = list(queryset.values_list('event_id', flat=True).distinct())
         count = queryset.update(is_used=False, used_at=None, verified_by=None, verified_at=None)
+        ticket_stats.rebuild(event_ids)
         self.message_user(request, f"Marked {count} fast tickets as unused.")
     mark_as_unused.short_description = "Mark fast tickets as unused (for testing)"
     
@@ -139,3 +151,28 @@ class FastEventTicketAdmin(admin.ModelAdmin):
         return "No PNG ticket generated"
     ticket_png_display.allow_tags = True
     ticket_png_display.short_description = "PNG Ticket Preview"
+
+
+@admin.register(EventTicketStats)
+class EventTicketStatsAdmin(admin.ModelAdmin):
+    list_display = ['event', 'issued', 'checked_in', 'updated_at']
+    search_fields = ['event__title', 'event__owner__email']
+    raw_id_fields = ['event']
+    readonly_fields = ['updated_at']
+    ordering = ['-updated_at']
+
+    actions = ['rebuild_stats']
+
+    def rebuild_stats(self, request, queryset):
+        """Recompute the selected events' counters from their tickets"""
+        event_ids = list(queryset.values_list('event_id', flat=True))
+        rows = ticket_stats.rebuild(event_ids)
+        self.message_user(request, f"Rebuilt ticket counters for {rows} event(s).")
+    rebuild_stats.short_description = "Rebuild from tickets"
+
+
+@admin.register(TicketAssetJob)
+class TicketAssetJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'total', 'completed', 'failed', 'created_at', 'finished_at']
+    readonly_fields = ['total', 'completed', 'failed', 'created_at', 'finished_at']
+    ordering = ['-created_at']
@@ -0,0 +1,138 @@
+"""
+Door check-in.
+
+verify_ticket used to load the ticket, check is_used in Python and then
+save() the whole row, so two scanners at two gates could both read
+is_used=False and both admit the same ticket. Every scan was also a read, a
+write and several lazy loads (event.owner, purchase.payment, the tier) just
+to build the response.
+
+check_in() takes a batch of scans — one from a single scanner, or a queue
+flushed by a scanner that was offline — and:
+
+    * reads what it needs for every scanned ticket in one query (buyer and
+      tier included);
+    * authorises the organiser once per event in the batch, not per ticket;
+    * admits each ticket with one conditional UPDATE ... WHERE is_used =
+      false. Whichever gate's UPDATE changes the row admits the ticket; every
+      other scan of it, here or anywhere else, is 'already_used';
+    * adds the batch's admissions to each event's check-in counter (see
+      ticket_stats) with one UPDATE per event.
+
+Each scan gets its own result, in the order given.
+"""
+
+import logging
+
+from django.utils import timezone
+
+from . import qr_tokens, ticket_stats
+from .fast_models import FastEventTicket
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 500
+
+ADMITTED = 'admitted'
+ALREADY_USED = 'already_used'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+FORBIDDEN = 'forbidden'
+WRONG_EVENT = 'wrong_event'
+
+
+def _parse(code):
+    """(ticket id, event id or None, error status or None) for one scanned code."""
+    try:
+        ticket_id, event_id = qr_tokens.parse(code)
+        return ticket_id, event_id, None
+    except qr_tokens.InvalidToken:
+        return None, None, INVALID
+    except ValueError:
+        return None, None, NOT_FOUND
+
+
+def admit(ticket_pk, user, now=None):
+    """Mark one ticket used, unless it already is. True if this call admitted it."""
+    now = now or timezone.now()
+    return FastEventTicket.objects.filter(pk=ticket_pk, is_used=False).update(
+        is_used=True, used_at=now, verified_by=user, verified_at=now,
+    ) == 1
+
+
+def _describe(ticket):
+    tier = ticket.purchase.selected_ticket_tier
+    return {
+        'ticket_id': str(ticket.ticket_id),
+        'event_id': ticket.event_id,
+        'buyer_name': ticket.buyer.full_name or ticket.buyer.email,
+        'ticket_tier': tier.display_name if tier else None,
+    }
+
+
+def check_in(user, codes, event_id=None):
+    """
+    Apply a batch of scanned codes for `user` (the organiser or their door
+    staff account). With `event_id`, tickets for any other event are
+    refused as 'wrong_event'. Returns one dict per code with its 'status'.
+    """
+    parsed = [_parse(code) for code in codes]
+    ticket_ids = {ticket_id for ticket_id, _, error in parsed if error is None}
+    tickets = {
+        str(ticket.ticket_id): ticket
+        for ticket in FastEventTicket.objects.filter(ticket_id__in=ticket_ids).select_related(
+            'buyer', 'event', 'purchase__selected_ticket_tier__category',
+        )
+    }
+    # One ownership decision per event in the batch.
+    allowed_events = {
+        ticket.event_id for ticket in tickets.values() if ticket.event.owner_id == user.pk
+    }
+    # Counter rows first, so the admissions below are counted once.
+    ticket_stats.ensure(allowed_events)
+
+    now = timezone.now()
+    results = []
+    already_used = []
+    for code, (ticket_id, token_event_id, error) in zip(codes, parsed):
+        result = {'code': code}
+        ticket = tickets.get(ticket_id) if error is None else None
+        if error is not None:
+            result['status'] = error
+        elif ticket is None:
+            result['status'] = NOT_FOUND
+        elif token_event_id is not None and token_event_id != ticket.event_id:
+            # A genuine signature over a different event than the ticket's.
+            result['status'] = INVALID
+        elif ticket.event_id not in allowed_events:
+            result['status'] = FORBIDDEN
+        elif event_id is not None and ticket.event_id != int(event_id):
+            result.update(_describe(ticket), status=WRONG_EVENT)
+        elif admit(ticket.pk, user, now):
+            result.update(_describe(ticket), status=ADMITTED, used_at=now)
+        else:
+            result.update(_describe(ticket), status=ALREADY_USED)
+            already_used.append((result, ticket.pk))
+        results.append(result)
+
+    if already_used:
+        # When and by whom, as it stands now (possibly another gate a moment ago).
+        used = {
+            row['pk']: row
+            for row in FastEventTicket.objects.filter(pk__in={pk for _, pk in already_used}).values(
+                'pk', 'used_at', 'verified_by__full_name',
+            )
+        }
+        for result, pk in already_used:
+            result['used_at'] = used[pk]['used_at']
+            result['verified_by'] = used[pk]['verified_by__full_name']
+
+    per_event = {}
+    for result in results:
+        if result['status'] == ADMITTED:
+            per_event[result['event_id']] = per_event.get(result['event_id'], 0) + 1
+    ticket_stats.checked_in(per_event)
+
+    admitted = sum(per_event.values())
+    logger.info("Check-in batch by user %s: %s scan(s), %s admitted", user.pk, len(codes), admitted)
+    return results
@@ -2,11 +2,12 @@
 Fast ticket models - PNG only, optimized for speed
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.files import File
 import uuid
+from . import qr_tokens, ticket_images
 from .fast_ticket_service import fast_ticket_service
 
 User = get_user_model()
@@ -48,50 +49,83 @@ class FastEventTicket(models.Model):
             return getattr(tier, 'display_name', None) or tier.name
         return 'General'
 
+    def ticket_data(self):
+        """What the ticket image shows (see ticket_renderer). Stable for a
+        given ticket, so its image can be re-drawn identically on demand."""
+        from datetime import datetime
+        return {
+            'ticket_id': str(self.ticket_id),
+            'event_id': str(self.event.id),
+            'event_title': self.event.title,
+            'event_date': self.event.event_date if self.event.event_date else 'TBD',
+            'buyer_name': getattr(self.buyer, 'full_name', '') or self.buyer.email,
+            'buyer_email': self.buyer.email,
+            'ticket_category': self._ticket_category(),
+            'quantity': self.quantity,
+            'timestamp': (self.created_at or datetime.now()).isoformat(),
+            'qr': qr_tokens.encode(self.ticket_id, self.event_id),
+        }
+
+    def store_png(self, png_buffer, fp):
+        """Write a rendered PNG (fingerprint `fp`) and point the ticket at it, without saving."""
+        if self.ticket_png:
+            # An image drawn from old details (the event was renamed, say).
+            self.ticket_png.delete(save=False)
+        self.ticket_png.save(ticket_images.filename(self, fp), File(png_buffer), save=False)
+        try:
+            self.ticket_png_path = self.ticket_png.path
+        except NotImplementedError:  # storage without local paths
+            self.ticket_png_path = None
+
     def generate_fast_ticket(self):
         """
         Generate fast PNG ticket (no PDF, no cloud upload)
         """
         try:
-            # Prepare ticket data
-            from datetime import datetime
-            ticket_data = {
-                'ticket_id': str(self.ticket_id),
-                'event_id': str(self.event.id),
-                'event_title': self.event.title,
-                'event_date': self.event.event_date if self.event.event_date else 'TBD',
-                'buyer_name': getattr(self.buyer, 'full_name', '') or self.buyer.email,
-                'buyer_email': self.buyer.email,
-                'ticket_category': self._ticket_category(),
-                'quantity': self.quantity,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            # Generate PNG ticket
-            png_buffer = fast_ticket_service.generate_ticket_png(ticket_data)
-            
-            if png_buffer:
-                # Save locally (fast)
-                result = fast_ticket_service.save_ticket_locally(png_buffer, str(self.ticket_id), self.event.id)
-                
-                if result['success']:
-                    # Save file reference
-                    filename = f"fast_ticket_{self.ticket_id}.png"
-                    self.ticket_png.save(filename, File(png_buffer), save=False)
-                    self.ticket_png_path = result['file_path']
-                    self.save(update_fields=['ticket_png', 'ticket_png_path'])
-                    
-                    return self.ticket_png
-                else:
-                    print(f"Failed to save ticket: {result.get('error')}")
-                    return None
-            else:
+            data = self.ticket_data()
+            png_buffer = fast_ticket_service.generate_ticket_png(data)
+            if not png_buffer:
                 print("Failed to generate PNG ticket")
                 return None
-                
+            self.store_png(png_buffer, ticket_images.fingerprint(data))
+            self.save(update_fields=['ticket_png', 'ticket_png_path'])
+            return self.ticket_png
+
         except Exception as e:
             print(f"Error generating fast ticket: {str(e)}")
             return None
+
+    @classmethod
+    def issue(cls, purchase, buyer, count):
+        """
+        Create `count` tickets for a purchase and render them as one batch
+        (in the render pool) rather than one save() at a time — or, with
+        TICKET_IMAGES = 'lazy', not at all (see ticket_images). Tickets whose
+        image fails are still created, without a PNG. Returns the tickets.
+        """
+        from . import ticket_stats
+        if count <= 0:
+            return []
+        with transaction.atomic():
+            # The counter row first, so a fallback built from the tickets
+            # doesn't already include these ones.
+            ticket_stats.ensure([purchase.product_id])
+            # bulk_create skips save(), so nothing renders per ticket here.
+            tickets = cls.objects.bulk_create(
+                [cls(purchase=purchase, buyer=buyer, event=purchase.product) for _ in range(count)]
+            )
+            if any(ticket.pk is None for ticket in tickets):
+                # MySQL doesn't return the new ids from a bulk insert, and
+                # rendering saves the images with bulk_update, which needs
+                # them. ticket_id is set in Python, so look them up by it.
+                ids = dict(cls.objects.filter(ticket_id__in=[t.ticket_id for t in tickets])
+                           .values_list('ticket_id', 'pk'))
+                for ticket in tickets:
+                    ticket.pk = ids[ticket.ticket_id]
+            ticket_stats.issued(purchase.product_id, len(tickets))
+        if not ticket_images.is_lazy():
+            ticket_images.materialize(tickets)
+        return tickets
     
     def generate_qr_only(self):
         """
@@ -127,10 +161,10 @@ class FastEventTicket(models.Model):
             return None
     
     def get_ticket_url(self):
-        """Get ticket PNG URL"""
+        """Get ticket PNG URL: the stored file, else the on-demand endpoint"""
         if self.ticket_png:
             return self.ticket_png.url
-        return None
+        return ticket_images.image_url(self)
     
     def get_qr_url(self):
         """Get QR code URL"""
@@ -140,15 +174,25 @@ class FastEventTicket(models.Model):
     
     def save(self, *args, **kwargs):
         """Override save to generate ticket immediately (synchronous)"""
+        from . import ticket_stats
         is_new = self.pk is None
-        super().save(*args, **kwargs)
+        if is_new:
+            with transaction.atomic():
+                ticket_stats.ensure([self.event_id])
+                super().save(*args, **kwargs)
+                ticket_stats.issued(self.event_id)
+        else:
+            super().save(*args, **kwargs)
         
-        # Generate ticket immediately for new tickets
-        if is_new and not self.ticket_png:
+        # Generate ticket immediately for new tickets (unless images are
+        # rendered on demand)
+        if is_new and not self.ticket_png and not ticket_images.is_lazy():
             print(f"🚀 Generating fast ticket for {self.ticket_id}")
             self.generate_fast_ticket()
     
     class Meta:
         ordering = ['-created_at']
+        # The seller ticket feed's keyset order (ticket_feed), per event.
+        indexes = [models.Index(fields=['event', '-created_at', '-id'])]
         verbose_name = "Fast Event Ticket"
         verbose_name_plural = "Fast Event Tickets"
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from apps.events import ticket_stats
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-event ticket counters (EventTicketStats) from the "
+        'tickets. Counters missing for an event are built on first use, so '
+        'this is only needed when tickets were changed outside ticket '
+        'creation and check-in; re-running is always safe.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the counters without writing them',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Events rebuilt per transaction (default 500)',
+        )
+        parser.add_argument(
+            '--event',
+            type=int,
+            action='append',
+            help='Only rebuild this event id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        chunk_size = max(1, options['chunk_size'])
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        events = Product.objects.filter(product_type='event').order_by('id').values_list('id', flat=True)
+        if options['event']:
+            events = events.filter(id__in=options['event'])
+
+        rows = 0
+        # Keyset over event ids, one short transaction per chunk.
+        last_id = 0
+        while True:
+            chunk = list(events.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            rows += ticket_stats.rebuild(chunk, dry_run=dry_run)
+            self.stdout.write(f"  up to event {last_id}: {rows} events")
+
+        verb = 'Would rebuild' if dry_run else 'Rebuilt'
+        self.stdout.write(self.style.SUCCESS(f"{verb} ticket counters for {rows} events."))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_merge_20250906_0737'),
+        ('products', '0014_product_is_published_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventTicketStats',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ticket_stats', serialize=False, to='products.product')),
+                ('issued', models.PositiveIntegerField(default=0)),
+                ('checked_in', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Event Ticket Stats',
+                'verbose_name_plural': 'Event Ticket Stats',
+            },
+        ),
+    ]
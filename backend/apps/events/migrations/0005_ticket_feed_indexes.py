@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_ticket_stats'),
+        ('payments', '0012_seller_daily_stats'),
+        ('products', '0014_product_is_published_review'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventticket',
+            index=models.Index(fields=['event', '-created_at', '-id'], name='events_even_event_i_22f2b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fasteventticket',
+            index=models.Index(fields=['event', '-created_at', '-id'], name='events_fast_event_i_c3ba96_idx'),
+        ),
+    ]
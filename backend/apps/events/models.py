@@ -183,7 +183,7 @@ class EventTicket(models.Model):
                     # Fallback to threading
                     from core.async_fallback import generate_ticket_assets
                     print(f"DEBUG: Starting threading async asset generation for ticket {self.ticket_id}")
-                    task = generate_ticket_assets(self.id)
+                    task = generate_ticket_assets.delay(self.id)
                     print(f"DEBUG: ✅ Threading task started for ticket {self.ticket_id}")
                 
             except Exception as e:
@@ -203,3 +203,61 @@ class EventTicket(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # The seller ticket feed's keyset order (ticket_feed), per event.
+        indexes = [models.Index(fields=['event', '-created_at', '-id'])]
+
+
+class EventTicketStats(models.Model):
+    """
+    Running ticket counters for one event, across both ticket tables (see
+    apps.events.ticket_stats): kept current by ticket creation and check-in
+    so the organiser's stats are a row read, not a scan of every ticket.
+    """
+    event = models.OneToOneField('products.Product', on_delete=models.CASCADE, primary_key=True,
+                                 related_name='ticket_stats')
+    issued = models.PositiveIntegerField(default=0)
+    checked_in = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ticket stats for event {self.event_id}: {self.checked_in}/{self.issued}"
+
+    class Meta:
+        verbose_name = "Event Ticket Stats"
+        verbose_name_plural = "Event Ticket Stats"
+
+
+class TicketAssetJob(models.Model):
+    """
+    Progress of one generate_multiple_ticket_assets run: its tickets are
+    rendered in batches by parallel tasks (apps.events.tasks), each adding
+    its counts here, and finished_at is set when the last batch is in.
+    """
+    total = models.PositiveIntegerField()
+    completed = models.PositiveIntegerField(default=0)  # QR code and PDF both made
+    failed = models.PositiveIntegerField(default=0)     # anything less
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Ticket assets job #{self.pk}: {self.completed + self.failed}/{self.total}"
+
+    @property
+    def progress(self):
+        done = self.completed + self.failed
+        return {
+            'job_id': self.pk,
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': max(0, self.total - done),
+            'percent': round(100 * done / self.total) if self.total else 100,
+            'finished': self.finished_at is not None,
+        }
+
+    @classmethod
+    def record(cls, job_id, completed, failed):
+        """Add one batch's counts."""
+        cls.objects.filter(pk=job_id).update(
+            completed=models.F('completed') + completed, failed=models.F('failed') + failed,
+        )
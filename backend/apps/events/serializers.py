@@ -56,3 +56,75 @@ class EventTicketDetailSerializer(serializers.ModelSerializer):
     def get_pdf_ticket_url(self, obj):
         """Get PDF ticket URL from Cloudinary"""
         return obj.get_pdf_ticket_url()
+
+
+class SellerTicketSerializer(serializers.Serializer):
+    """
+    One row of the seller's ticket feed (see ticket_feed), for either ticket
+    model. Expects the purchase, payment, tier, buyer, event and verifier to
+    be select_related.
+    """
+    ticket_id = serializers.UUIDField()
+    kind = serializers.SerializerMethodField()
+    purchase = serializers.IntegerField(source='purchase_id')
+    buyer = serializers.SerializerMethodField()
+    event = serializers.SerializerMethodField()
+    verified_by = serializers.SerializerMethodField()
+    quantity = serializers.IntegerField()
+    is_used = serializers.BooleanField()
+    used_at = serializers.DateTimeField()
+    verified_at = serializers.DateTimeField()
+    created_at = serializers.DateTimeField()
+    purchase_reference = serializers.SerializerMethodField()
+    payment_amount = serializers.SerializerMethodField()
+    ticket_tier = serializers.SerializerMethodField()
+    qr_code_url = serializers.SerializerMethodField()
+    pdf_ticket_url = serializers.SerializerMethodField()
+    ticket_png_url = serializers.SerializerMethodField()
+
+    def get_kind(self, obj):
+        return 'fast' if isinstance(obj, FastEventTicket) else 'legacy'
+
+    def get_buyer(self, obj):
+        return {'full_name': obj.buyer.full_name, 'email': obj.buyer.email}
+
+    def get_event(self, obj):
+        return {
+            'id': obj.event_id,
+            'title': obj.event.title,
+            'event_date': obj.event.event_date,
+            'description': obj.event.description,
+        }
+
+    def get_verified_by(self, obj):
+        return {'full_name': obj.verified_by.full_name} if obj.verified_by else None
+
+    def get_purchase_reference(self, obj):
+        payment = obj.purchase.payment if obj.purchase else None
+        return payment.reference if payment else 'N/A'
+
+    def get_payment_amount(self, obj):
+        return str(obj.purchase.total_price) if obj.purchase else '0.00'
+
+    def get_ticket_tier(self, obj):
+        # display_name/display_color handle both seller-named categories and
+        # legacy rows whose label lived on the (now optional) global category.
+        tier = obj.purchase.selected_ticket_tier if obj.purchase else None
+        if tier is None:
+            return None
+        return {
+            'id': tier.pk,
+            'name': tier.name,
+            'display_name': tier.display_name,
+            'color': tier.display_color,
+            'price': str(tier.price),
+        }
+
+    def get_qr_code_url(self, obj):
+        return obj.get_ticket_url() if isinstance(obj, FastEventTicket) else obj.get_qr_code_url()
+
+    def get_pdf_ticket_url(self, obj):
+        return None if isinstance(obj, FastEventTicket) else obj.get_pdf_ticket_url()
+
+    def get_ticket_png_url(self, obj):
+        return obj.get_ticket_url() if isinstance(obj, FastEventTicket) else None
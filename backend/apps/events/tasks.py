@@ -1,7 +1,8 @@
 """
 Background tasks for event ticket generation
 """
-from celery import shared_task
+from apps.taskqueue.canvas import chord
+from apps.taskqueue.decorators import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
@@ -9,15 +10,14 @@ import logging
 
 logger = logging.getLogger('performance')
 
-@shared_task(bind=True, name='generate_ticket_qr_code')
-def generate_ticket_qr_code(self, ticket_id):
-    """
-    Generate QR code for a ticket in the background
-    """
+# Tickets per generate_ticket_asset_batch task: enough to amortise the task
+# overhead, few enough that a job spreads across the workers.
+ASSET_BATCH_SIZE = 20
+
+def _qr_code(ticket):
+    """Make one ticket's QR code; a result dict, as generate_ticket_qr_code returns."""
+    ticket_id = ticket.id
     try:
-        from .models import EventTicket
-        
-        ticket = EventTicket.objects.get(id=ticket_id)
         logger.info(f"Starting QR code generation for ticket {ticket_id}")
         
         # Generate QR code
@@ -48,15 +48,10 @@ def generate_ticket_qr_code(self, ticket_id):
             'error': str(e)
         }
 
-@shared_task(bind=True, name='generate_ticket_pdf')
-def generate_ticket_pdf(self, ticket_id):
-    """
-    Generate PDF for a ticket in the background
-    """
+def _pdf(ticket):
+    """Make one ticket's PDF; a result dict, as generate_ticket_pdf returns."""
+    ticket_id = ticket.id
     try:
-        from .models import EventTicket
-        
-        ticket = EventTicket.objects.get(id=ticket_id)
         logger.info(f"Starting PDF generation for ticket {ticket_id}")
         
         # Generate PDF
@@ -87,101 +82,143 @@ def generate_ticket_pdf(self, ticket_id):
             'error': str(e)
         }
 
+def _assets(ticket):
+    """QR code, then PDF, for one ticket, in this task."""
+    results = {
+        'ticket_id': ticket.id,
+        'qr_code': _qr_code(ticket),
+        'pdf': _pdf(ticket),
+    }
+    ok = results['qr_code']['status'] == 'success' and results['pdf']['status'] == 'success'
+    results['status'] = 'completed' if ok else 'partial'
+    logger.info(f"Asset generation completed for ticket {ticket.id}: {results['status']}")
+    return results
+
+def _tickets(ticket_ids):
+    from .models import EventTicket
+    return EventTicket.objects.select_related('event', 'buyer').in_bulk(ticket_ids)
+
+def _missing(ticket_id):
+    return {'status': 'error', 'ticket_id': ticket_id, 'error': 'Ticket not found'}
+
+@shared_task(bind=True, name='generate_ticket_qr_code')
+def generate_ticket_qr_code(self, ticket_id):
+    """
+    Generate QR code for a ticket in the background
+    """
+    ticket = _tickets([ticket_id]).get(ticket_id)
+    return _qr_code(ticket) if ticket else _missing(ticket_id)
+
+@shared_task(bind=True, name='generate_ticket_pdf')
+def generate_ticket_pdf(self, ticket_id):
+    """
+    Generate PDF for a ticket in the background
+    """
+    ticket = _tickets([ticket_id]).get(ticket_id)
+    return _pdf(ticket) if ticket else _missing(ticket_id)
+
 @shared_task(bind=True, name='generate_ticket_assets')
 def generate_ticket_assets(self, ticket_id):
     """
-    Generate both QR code and PDF for a ticket in the background
+    Generate both QR code and PDF for a ticket in the background.
+
+    Both are made here, one after the other: this used to .delay() a task for
+    each and wait on it with .get(), holding this worker slot meanwhile and
+    deadlocking a single-worker queue.
     """
-    try:
-        from .models import EventTicket
-        
-        ticket = EventTicket.objects.get(id=ticket_id)
-        logger.info(f"Starting asset generation for ticket {ticket_id}")
-        
-        results = {
-            'ticket_id': ticket_id,
-            'qr_code': None,
-            'pdf': None,
-            'status': 'processing'
-        }
-        
-        # Generate QR code
-        try:
-            qr_result = generate_ticket_qr_code.delay(ticket_id).get(timeout=60)
-            results['qr_code'] = qr_result
-        except Exception as e:
-            logger.error(f"QR code generation failed for ticket {ticket_id}: {str(e)}")
-            results['qr_code'] = {'status': 'error', 'error': str(e)}
-        
-        # Generate PDF
-        try:
-            pdf_result = generate_ticket_pdf.delay(ticket_id).get(timeout=60)
-            results['pdf'] = pdf_result
-        except Exception as e:
-            logger.error(f"PDF generation failed for ticket {ticket_id}: {str(e)}")
-            results['pdf'] = {'status': 'error', 'error': str(e)}
-        
-        # Update status
-        if results['qr_code'] and results['qr_code'].get('status') == 'success' and \
-           results['pdf'] and results['pdf'].get('status') == 'success':
-            results['status'] = 'completed'
-        else:
-            results['status'] = 'partial'
-        
-        logger.info(f"Asset generation completed for ticket {ticket_id}: {results['status']}")
-        return results
-        
-    except Exception as e:
-        logger.error(f"Error generating assets for ticket {ticket_id}: {str(e)}")
-        return {
-            'status': 'error',
-            'ticket_id': ticket_id,
-            'error': str(e)
-        }
+    ticket = _tickets([ticket_id]).get(ticket_id)
+    return _assets(ticket) if ticket else _missing(ticket_id)
 
-@shared_task(bind=True, name='generate_multiple_ticket_assets')
-def generate_multiple_ticket_assets(self, ticket_ids):
+@shared_task(bind=True, name='generate_ticket_asset_batch')
+def generate_ticket_asset_batch(self, job_id, ticket_ids):
     """
-    Generate assets for multiple tickets in parallel
+    Generate assets for one batch of a generate_multiple_ticket_assets job,
+    adding the batch's counts to the job's progress.
+
+    Never raises: on Celery a header task that fails fails the whole chord,
+    and finish_ticket_asset_job would never close the job. A batch that
+    breaks reports its tickets as failed instead, on every backend.
     """
+    from .models import TicketAssetJob
+
     try:
-        logger.info(f"Starting asset generation for {len(ticket_ids)} tickets")
-        
-        # Create tasks for each ticket
-        tasks = []
-        for ticket_id in ticket_ids:
-            task = generate_ticket_assets.delay(ticket_id)
-            tasks.append((ticket_id, task))
-        
-        # Wait for all tasks to complete
+        tickets = _tickets(ticket_ids)
         results = []
-        for ticket_id, task in tasks:
-            try:
-                result = task.get(timeout=300)  # 5 minutes timeout
-                results.append({
-                    'ticket_id': ticket_id,
-                    'result': result
-                })
-            except Exception as e:
-                logger.error(f"Task failed for ticket {ticket_id}: {str(e)}")
-                results.append({
-                    'ticket_id': ticket_id,
-                    'result': {'status': 'error', 'error': str(e)}
-                })
-        
-        logger.info(f"Asset generation completed for {len(ticket_ids)} tickets")
-        return {
-            'status': 'completed',
-            'ticket_count': len(ticket_ids),
-            'results': results
-        }
-        
+        for ticket_id in ticket_ids:
+            ticket = tickets.get(ticket_id)
+            results.append(_assets(ticket) if ticket else _missing(ticket_id))
     except Exception as e:
-        logger.error(f"Error generating assets for multiple tickets: {str(e)}")
-        return {
-            'status': 'error',
-            'error': str(e)
-        }
+        logger.exception(f"Asset batch for job {job_id} failed")
+        results = [{'status': 'error', 'ticket_id': ticket_id, 'error': str(e)} for ticket_id in ticket_ids]
+
+    completed = sum(1 for result in results if result['status'] == 'completed')
+    try:
+        TicketAssetJob.record(job_id, completed, len(results) - completed)
+    except Exception:
+        # Only progress is lost: the job's close counts unreported tickets as failed.
+        logger.exception(f"Could not record asset batch progress for job {job_id}")
+    return results
+
+@shared_task(bind=True, name='finish_ticket_asset_job')
+def finish_ticket_asset_job(self, batch_results, job_id):
+    """
+    The chord body of generate_multiple_ticket_assets: runs once every batch
+    has finished, with their results, and closes the job.
+    """
+    from .models import TicketAssetJob
+
+    results = []
+    for batch in batch_results:
+        # A batch that failed for good leaves an error dict, not its list.
+        if isinstance(batch, list):
+            results.extend({'ticket_id': result['ticket_id'], 'result': result} for result in batch)
+
+    job = TicketAssetJob.objects.get(pk=job_id)
+    # Tickets of a batch that never reported count as failed.
+    job.failed = job.total - job.completed
+    job.finished_at = timezone.now()
+    job.save(update_fields=['failed', 'finished_at'])
+
+    logger.info(f"Asset generation completed for {job.total} tickets "
+                f"(job {job_id}: {job.completed} completed, {job.failed} failed)")
+    return {
+        'status': 'completed',
+        'job_id': job_id,
+        'ticket_count': job.total,
+        'completed': job.completed,
+        'failed': job.failed,
+        'results': results
+    }
+
+@shared_task(bind=True, name='generate_multiple_ticket_assets')
+def generate_multiple_ticket_assets(self, ticket_ids, batch_size=ASSET_BATCH_SIZE):
+    """
+    Generate assets for multiple tickets in parallel.
+
+    The tickets are split into batches, one task each, sent as a chord whose
+    body (finish_ticket_asset_job) closes the job when the last batch is
+    done. This returns at once with the job id; TicketAssetJob.progress says
+    how far along it is. Nothing waits on another task, so throughput grows
+    with the number of workers.
+    """
+    from .models import TicketAssetJob
+
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    batch_size = max(1, batch_size)
+    batches = [ticket_ids[i:i + batch_size] for i in range(0, len(ticket_ids), batch_size)]
+
+    job = TicketAssetJob.objects.create(total=len(ticket_ids))
+    chord(
+        generate_ticket_asset_batch.s(job.pk, batch) for batch in batches
+    )(finish_ticket_asset_job.s(job.pk))
+
+    logger.info(f"Queued asset generation for {len(ticket_ids)} tickets in {len(batches)} batches (job {job.pk})")
+    return {
+        'status': 'queued',
+        'job_id': job.pk,
+        'ticket_count': len(ticket_ids),
+        'batch_count': len(batches)
+    }
 
 @shared_task(bind=True, name='send_ticket_email')
 def send_ticket_email(self, ticket_id, user_email):
@@ -0,0 +1,616 @@
+"""
+Tests for event tickets: rendering and lazy images, signed QR tokens,
+check-in, the per-event counters, the seller ticket feed and background
+asset generation.
+
+Tickets come from real fulfilment (core.test_factories plus the payment
+outbox), so these cover the path a buyer's order actually takes.
+"""
+
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.payments.models import Payment, Purchase
+from core.test_factories import make_event, make_payment, make_seller, make_user
+
+
+class TicketRenderingTests(TestCase):
+    """A purchase's tickets are created and rendered as one batch, drawing the
+    event and tier's shared base image once."""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from apps.events import ticket_renderer
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media, TICKET_RENDER_PROCESSES=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        ticket_renderer.base.cache_clear()
+
+        self.event = make_event(tiers=[('VIP', 5000, 10)])
+        self.payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        self.purchase = self.payment.purchases.get()
+        Purchase.objects.filter(pk=self.purchase.pk).update(
+            quantity=3, selected_ticket_tier=self.event.ticket_tiers.get(),
+        )
+        self.purchase.refresh_from_db()
+
+    def _data(self, n):
+        return [{'ticket_id': f'ticket-{i}', 'event_id': '1', 'event_title': 'Lagos Jazz Night',
+                 'event_date': 'TBD', 'buyer_name': 'Ada', 'buyer_email': 'ada@example.com',
+                 'ticket_category': 'VIP', 'timestamp': '2026-01-01T00:00:00'} for i in range(n)]
+
+    def test_issue_renders_the_whole_purchase(self):
+        from PIL import Image
+        from apps.events import ticket_renderer
+        from apps.events.fast_models import FastEventTicket
+
+        tickets = FastEventTicket.issue(self.purchase, self.payment.user, 3)
+
+        self.assertEqual(FastEventTicket.objects.filter(purchase=self.purchase).count(), 3)
+        stored = FastEventTicket.objects.filter(purchase=self.purchase).exclude(ticket_png='')
+        self.assertEqual(stored.count(), 3)
+        with tickets[0].ticket_png.open('rb') as f:
+            self.assertEqual(Image.open(f).size[0], ticket_renderer.W)
+        self.assertEqual(ticket_renderer.base.cache_info().misses, 1)
+
+    def test_issue_renders_where_bulk_create_returns_no_ids(self):
+        from apps.events.fast_models import FastEventTicket
+        # As on MySQL: bulk_create leaves pk unset.
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            tickets = FastEventTicket.issue(self.purchase, self.payment.user, 3)
+        self.assertTrue(all(t.pk for t in tickets))
+        stored = FastEventTicket.objects.filter(purchase=self.purchase).exclude(ticket_png='')
+        self.assertEqual(sorted(stored.values_list('pk', flat=True)), sorted(t.pk for t in tickets))
+
+    def test_outbox_ticket_step_uses_the_batch(self):
+        from apps.payments import outbox
+        from apps.payments.fulfillment import load_purchases
+        from apps.events.fast_models import FastEventTicket
+
+        with patch.object(FastEventTicket, 'issue', wraps=FastEventTicket.issue) as issue:
+            outbox._event_tickets(self.payment, load_purchases(self.payment))
+            outbox._event_tickets(self.payment, load_purchases(self.payment))  # nothing missing
+        self.assertEqual([c.args[2] for c in issue.call_args_list], [3, 0])
+        self.assertEqual(FastEventTicket.objects.filter(purchase=self.purchase).count(), 3)
+
+    def test_pool_returns_the_same_images_in_order(self):
+        from apps.events import ticket_renderer
+        data = self._data(4)
+        data[3]['ticket_category'] = 'Regular'
+        inline = ticket_renderer.render_many(data, processes=0)
+        pooled = ticket_renderer.render_many(data, processes=2)
+        self.assertEqual(pooled, inline)
+        self.assertEqual(len(set(inline)), 4)
+
+    def test_broken_pool_falls_back_to_rendering_inline(self):
+        from apps.events import ticket_renderer
+        with patch.object(ticket_renderer, '_get_pool', side_effect=OSError('no processes here')):
+            pngs = ticket_renderer.render_many(self._data(4), processes=2)
+        self.assertTrue(all(png and png.startswith(b'\x89PNG') for png in pngs))
+
+    def _fake_pools(self):
+        """Swap the process pool for in-thread fakes and restore the real one afterwards."""
+        from unittest.mock import Mock
+        from apps.events import ticket_renderer
+        saved = ticket_renderer._pool, ticket_renderer._pool_size
+        ticket_renderer._pool = ticket_renderer._pool_size = None
+        self.addCleanup(lambda: setattr(ticket_renderer, '_pool', saved[0]))
+        self.addCleanup(lambda: setattr(ticket_renderer, '_pool_size', saved[1]))
+        created = []
+
+        def make_pool(**kwargs):
+            pool = Mock(map=lambda fn, chunks: [fn(chunk) for chunk in chunks])
+            created.append(pool)
+            return pool
+
+        patcher = patch.object(ticket_renderer, 'ProcessPoolExecutor', side_effect=make_pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return created
+
+    def test_concurrent_first_batches_share_one_pool(self):
+        import threading
+        from apps.events import ticket_renderer
+        created = self._fake_pools()
+        data = self._data(4)
+        start = threading.Barrier(4)
+
+        def render():
+            start.wait()
+            ticket_renderer.render_many(data, processes=2)
+
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(created), 1)
+
+    def test_a_failed_pool_is_only_dropped_while_it_is_current(self):
+        from apps.events import ticket_renderer
+        created = self._fake_pools()
+        with ticket_renderer._pool_lock:
+            old = ticket_renderer._get_pool(2)
+            current = ticket_renderer._get_pool(3)  # another caller resized it
+        old.shutdown.assert_called_once_with(wait=False)
+
+        ticket_renderer._discard_pool(old)  # the first caller's error path
+        self.assertIs(ticket_renderer._pool, current)
+        current.shutdown.assert_not_called()
+
+        ticket_renderer._discard_pool(current)
+        self.assertIsNone(ticket_renderer._pool)
+        current.shutdown.assert_called_once_with(wait=False)
+        self.assertEqual(len(created), 2)
+
+
+class TicketImageTests(TestCase):
+    """With TICKET_IMAGES = 'lazy' tickets are created without a PNG and it is
+    rendered on first view or when the ticket email goes out."""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from rest_framework.test import APIClient
+        from apps.events import ticket_images
+        from apps.events.fast_models import FastEventTicket
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media, TICKET_RENDER_PROCESSES=0, TICKET_IMAGES='lazy')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        ticket_images.cache.clear()
+
+        self.event = make_event(title='Lagos Jazz Night', tiers=[('VIP', 5000, 10)])
+        self.payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        purchase = self.payment.purchases.get()
+        self.ticket, = FastEventTicket.issue(purchase, self.payment.user, 1)
+        self.client = APIClient()
+
+    def _image(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_tickets_are_created_without_an_image(self):
+        self.ticket.refresh_from_db()
+        self.assertFalse(self.ticket.ticket_png)
+        self.assertIn(f'/api/events/ticket/{self.ticket.ticket_id}/image/?sig=', self.ticket.get_ticket_url())
+
+    def test_first_view_renders_and_stores_it_once(self):
+        from apps.events import ticket_renderer
+        url = self.ticket.get_ticket_url()
+        with patch.object(ticket_renderer, 'render', wraps=ticket_renderer.render) as render:
+            first = self._image(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first['Content-Type'], 'image/png')
+            self.assertTrue(first.content.startswith(b'\x89PNG'))
+
+            from apps.events import ticket_images
+            ticket_images.cache.clear()
+            second = self._image(url)  # from storage this time
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(self._image(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(render.call_count, 1)
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.ticket_png)
+
+    def test_editing_the_event_draws_a_new_image(self):
+        url = self.ticket.get_ticket_url()
+        before = self._image(url)
+        self.ticket.refresh_from_db()
+        old_name = self.ticket.ticket_png.name
+        type(self.event).objects.filter(pk=self.event.pk).update(title='Lagos Jazz Night II')
+
+        after = self._image(url)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.ticket.refresh_from_db()
+        self.assertNotEqual(self.ticket.ticket_png.name, old_name)
+        self.assertFalse(self.ticket.ticket_png.storage.exists(old_name))
+
+    def test_only_the_link_holder_buyer_or_organiser_may_view(self):
+        bare = f'/api/events/ticket/{self.ticket.ticket_id}/image/'
+        self.assertEqual(self._image(bare).status_code, 404)
+        self.assertEqual(self._image(bare + '?sig=forged').status_code, 404)
+        self.client.force_authenticate(make_user())
+        self.assertEqual(self._image(bare).status_code, 404)
+        self.client.force_authenticate(self.payment.user)
+        self.assertEqual(self._image(bare).status_code, 200)
+        self.client.force_authenticate(self.event.owner)
+        self.assertEqual(self._image(bare).status_code, 200)
+
+    def test_ticket_email_renders_and_attaches_them(self):
+        from apps.payments import outbox
+        from apps.payments.fulfillment import load_purchases
+        outbox._ticket_email(self.payment, load_purchases(self.payment))
+
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.ticket_png)
+        attachments = [a for m in mail.outbox for a in m.attachments]
+        self.assertEqual(len(attachments), 1)
+        self.assertTrue(attachments[0][1].startswith(b'\x89PNG'))
+
+
+class TicketQrTokenTests(TestCase):
+    """Ticket QR codes carry a compact token signed per event; the door can
+    check it offline with the event's key, and old JSON codes still work."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.events.fast_models import FastEventTicket
+        self.event = make_event(tiers=[('VIP', 5000, 10)])
+        payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        with self.settings(TICKET_IMAGES='lazy'):
+            self.ticket, = FastEventTicket.issue(payment.purchases.get(), payment.user, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.event.owner)
+
+    def test_token_is_short_and_round_trips(self):
+        from apps.events import qr_tokens
+        token = self.ticket.ticket_data()['qr']
+        self.assertLessEqual(len(token), 48)
+        self.assertRegex(token, r'^[A-Z0-9]+$')  # QR alphanumeric mode
+        self.assertEqual(qr_tokens.parse(token), (str(self.ticket.ticket_id), self.event.pk))
+
+    def test_tampered_or_foreign_tokens_are_rejected(self):
+        from apps.events import qr_tokens
+        token = qr_tokens.encode(self.ticket.ticket_id, self.event.pk)
+        # A middle character: covered by the MAC.
+        i = len(token) // 2
+        flipped = token[:i] + ('A' if token[i] != 'A' else 'B') + token[i + 1:]
+        with self.assertRaises(qr_tokens.InvalidToken):
+            qr_tokens.parse(flipped)
+        # Every other value of the last character, including those that only
+        # differ in its ignored padding bits.
+        for char in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567':
+            if char != token[-1]:
+                with self.assertRaises(qr_tokens.InvalidToken, msg=char):
+                    qr_tokens.parse(token[:-1] + char)
+        with self.settings(TICKET_QR_SECRET='another-secret'):
+            with self.assertRaises(qr_tokens.InvalidToken):
+                qr_tokens.parse(token)
+
+    def test_legacy_payloads_still_parse(self):
+        from apps.events import qr_tokens
+        legacy = json.dumps({'ticket_id': str(self.ticket.ticket_id), 'event_id': str(self.event.pk),
+                             'timestamp': '2025-01-01T00:00:00', 'type': 'fast_ticket'})
+        self.assertEqual(qr_tokens.parse(legacy), (str(self.ticket.ticket_id), self.event.pk))
+        self.assertEqual(qr_tokens.parse(str(self.ticket.ticket_id)), (str(self.ticket.ticket_id), None))
+
+    def test_verify_accepts_a_token(self):
+        from apps.events import qr_tokens
+        token = qr_tokens.encode(self.ticket.ticket_id, self.event.pk)
+        response = self.client.post(f'/api/events/verify/{token}/')
+        self.assertEqual(response.status_code, 200)
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.is_used)
+
+        forged = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        self.assertEqual(self.client.get(f'/api/events/ticket/{forged}/').status_code, 400)
+        self.assertEqual(self.client.get('/api/events/ticket/not-a-ticket/').status_code, 404)
+
+    def test_scan_key_checks_tokens_offline(self):
+        import base64
+        from apps.events import qr_tokens
+        data = self.client.get(f'/api/events/{self.event.pk}/scan-key/').json()
+        key = base64.urlsafe_b64decode(data['key'] + '=' * (-len(data['key']) % 4))
+
+        # What the scanner does, with no server: recompute the truncated MAC.
+        token = qr_tokens.encode(self.ticket.ticket_id, self.event.pk)
+        raw = base64.b32decode(token[3:] + '=' * (-len(token[3:]) % 8))
+        body, mac = raw[:20], raw[20:]
+        self.assertEqual(hmac.new(key, body, hashlib.sha256).digest()[:data['mac_bytes']], mac)
+
+        self.client.force_authenticate(make_seller())
+        self.assertEqual(self.client.get(f'/api/events/{self.event.pk}/scan-key/').status_code, 404)
+
+
+class TicketCheckInTests(TestCase):
+    """Batch check-in: each scan is one conditional UPDATE, so a ticket is
+    admitted exactly once however many gates scan it."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.events.fast_models import FastEventTicket
+        self.event = make_event(tiers=[('VIP', 5000, 10)])
+        payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        other = make_payment(product=make_event(), status=Payment.PaymentStatus.SUCCESS)
+        payment.purchases.update(selected_ticket_tier=self.event.ticket_tiers.get())
+        with self.settings(TICKET_IMAGES='lazy'):
+            self.tickets = FastEventTicket.issue(payment.purchases.get(), payment.user, 4)
+            self.foreign, = FastEventTicket.issue(other.purchases.get(), other.user, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.event.owner)
+
+    def _token(self, ticket):
+        from apps.events import qr_tokens
+        return qr_tokens.encode(ticket.ticket_id, ticket.event_id)
+
+    def test_each_scan_gets_its_own_result(self):
+        first, second = self.tickets[:2]
+        token, i = self._token(second), len(self._token(second)) // 2
+        forged = token[:i] + ('A' if token[i] != 'A' else 'B') + token[i + 1:]
+        codes = [
+            self._token(first),
+            str(second.ticket_id),
+            self._token(first),                   # the same ticket again
+            forged,
+            '00000000-0000-0000-0000-000000000000',
+            self._token(self.foreign),            # someone else's event
+        ]
+        response = self.client.post('/api/events/check-in/', {'codes': codes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [r['status'] for r in response.json()['results']]
+        self.assertEqual(statuses, ['admitted', 'admitted', 'already_used', 'invalid', 'not_found', 'forbidden'])
+        self.assertEqual(response.json()['admitted'], 2)
+        self.assertEqual(response.json()['results'][0]['ticket_tier'], 'VIP')
+        self.foreign.refresh_from_db()
+        self.assertFalse(self.foreign.is_used)
+
+    def test_one_update_per_scan(self):
+        codes = [self._token(t) for t in self.tickets]
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/api/events/check-in/', {'codes': codes}, format='json')
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        # One per scan, plus the event's check-in counter.
+        self.assertEqual(len(updates), len(codes) + 1)
+        self.assertLessEqual(len(ctx.captured_queries) - len(updates), 3)
+
+    def test_a_ticket_is_admitted_once_across_gates(self):
+        from apps.events import checkin
+        ticket = self.tickets[0]
+        self.assertTrue(checkin.admit(ticket.pk, self.event.owner))
+        # The second gate's own endpoint sees the UPDATE change nothing.
+        response = self.client.post(f'/api/events/verify/{ticket.ticket_id}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Ticket already used')
+        self.assertIsNotNone(response.json()['used_at'])
+
+    def test_event_filter_and_limits(self):
+        response = self.client.post('/api/events/check-in/', {
+            'codes': [self._token(self.tickets[0])], 'event_id': self.event.pk + 1000,
+        }, format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 'wrong_event')
+        self.assertEqual(self.client.post('/api/events/check-in/', {'codes': []}, format='json').status_code, 400)
+        too_many = {'codes': ['x'] * 501}
+        self.assertEqual(self.client.post('/api/events/check-in/', too_many, format='json').status_code, 400)
+
+
+class EventTicketStatsTests(TestCase):
+    """Per-event ticket counters: kept by ticket creation and check-in, built
+    from both ticket tables when missing, and read in one query."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.event = make_event(tiers=[('Regular', 1000, 50)], title='Launch Night')
+        self.payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        self.client = APIClient()
+        self.client.force_authenticate(self.event.owner)
+
+    def _issue(self, count):
+        from apps.events.fast_models import FastEventTicket
+        with self.settings(TICKET_IMAGES='lazy'):
+            return FastEventTicket.issue(self.payment.purchases.get(), self.payment.user, count)
+
+    def _stats(self):
+        from apps.events.models import EventTicketStats
+        return EventTicketStats.objects.get(event=self.event)
+
+    def test_issue_and_check_in_keep_the_counters(self):
+        from apps.events import checkin, qr_tokens
+        tickets = self._issue(3)
+        self._issue(2)
+        self.assertEqual((self._stats().issued, self._stats().checked_in), (5, 0))
+
+        codes = [qr_tokens.encode(t.ticket_id, t.event_id) for t in tickets[:2]]
+        checkin.check_in(self.event.owner, codes + codes[:1])
+        self.client.post(f'/api/events/verify/{tickets[2].ticket_id}/')
+        self.assertEqual((self._stats().issued, self._stats().checked_in), (5, 3))
+
+    def test_missing_counters_are_built_from_both_ticket_tables(self):
+        from apps.events.models import EventTicket, EventTicketStats
+        from apps.events import ticket_stats
+        purchase = self.payment.purchases.get()
+        EventTicket.objects.bulk_create([
+            EventTicket(purchase=purchase, buyer=self.payment.user, event=self.event, is_used=used)
+            for used in (True, False)
+        ])
+        tickets = self._issue(2)
+        self.assertEqual((self._stats().issued, self._stats().checked_in), (4, 1))
+
+        EventTicketStats.objects.all().delete()
+        type(tickets[0]).objects.filter(pk=tickets[0].pk).update(is_used=True)
+        self.assertEqual(dict(ticket_stats.aggregate([self.event.pk])[self.event.pk]), {'issued': 4, 'checked_in': 2})
+        response = self.client.get('/api/events/seller-stats/')
+        self.assertEqual(response.json()['events']['Launch Night'], {'total': 4, 'used': 2, 'valid': 2})
+        self.assertEqual(self._stats().checked_in, 2)
+
+    def test_check_in_without_a_counter_row_counts_each_admission_once(self):
+        from apps.events import checkin, qr_tokens
+        from apps.events.models import EventTicketStats
+        tickets = self._issue(4)
+        # An event from before the counters existed.
+        EventTicketStats.objects.all().delete()
+        codes = [qr_tokens.encode(t.ticket_id, t.event_id) for t in tickets[:2]]
+        checkin.check_in(self.event.owner, codes)
+        self.assertEqual((self._stats().issued, self._stats().checked_in), (4, 2))
+
+        EventTicketStats.objects.all().delete()
+        self.client.post(f'/api/events/verify/{tickets[2].ticket_id}/')
+        self.assertEqual((self._stats().issued, self._stats().checked_in), (4, 3))
+
+    def test_stats_endpoint_query_count_is_independent_of_tickets(self):
+        self._issue(2)
+        self.client.get('/api/events/seller-stats/')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/api/events/seller-stats/')
+        self._issue(20)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/api/events/seller-stats/')
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(response.json()['total_tickets'], 22)
+        self.assertEqual(response.json()['valid_tickets'], 22)
+
+
+@override_settings(TASK_BACKEND='database')
+class TicketAssetJobTests(TestCase):
+    """generate_multiple_ticket_assets sends one task per batch of tickets as
+    a chord and returns; progress is counted per batch and the job closes
+    when the last one is in. No task waits on another."""
+
+    def setUp(self):
+        from apps.events.models import EventTicket
+        event = make_event(tiers=[('Regular', 1000, 50)])
+        purchase = make_payment(product=event).purchases.get()
+        # bulk_create skips EventTicket.save(), which queues its own assets.
+        EventTicket.objects.bulk_create([
+            EventTicket(purchase=purchase, buyer=purchase.payment.user, event=event) for _ in range(5)
+        ])
+        self.ids = list(EventTicket.objects.order_by('id').values_list('id', flat=True))
+
+    def _run_next(self):
+        from apps.taskqueue import queue
+        return queue.work_once('test-worker', limit=1)
+
+    @patch('apps.events.models.EventTicket.generate_pdf_ticket')
+    @patch('apps.events.models.EventTicket.generate_qr_code', return_value=True)
+    def test_batches_report_progress_and_the_chord_closes_the_job(self, qr, pdf):
+        from apps.events.models import TicketAssetJob
+        from apps.events.tasks import generate_multiple_ticket_assets
+        from apps.taskqueue.models import QueuedTask
+
+        failing = self.ids[3]
+        pdf.side_effect = lambda: None if qr.call_count == 4 else True  # the 4th ticket's PDF fails
+        queued = generate_multiple_ticket_assets(self.ids + [self.ids[0]], batch_size=2)
+        self.assertEqual((queued['status'], queued['ticket_count'], queued['batch_count']), ('queued', 5, 3))
+        self.assertEqual(QueuedTask.objects.filter(name='taskqueue.chord_member').count(), 3)
+        self.assertEqual(qr.call_count, 0)
+
+        job = TicketAssetJob.objects.get(pk=queued['job_id'])
+        self._run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.progress['completed'], 2)
+        self.assertEqual((job.progress['pending'], job.progress['finished']), (3, False))
+
+        while self._run_next():
+            pass
+        job.refresh_from_db()
+        self.assertEqual(job.progress, {
+            'job_id': job.pk, 'total': 5, 'completed': 4, 'failed': 1, 'pending': 0,
+            'percent': 100, 'finished': True,
+        })
+        summary = QueuedTask.objects.get(name='finish_ticket_asset_job').result
+        self.assertEqual([r['ticket_id'] for r in summary['results']], self.ids)
+        self.assertEqual(summary['results'][3]['result']['status'], 'partial')
+        self.assertEqual(summary['results'][3]['ticket_id'], failing)
+
+    def test_a_broken_batch_reports_its_tickets_failed_instead_of_raising(self):
+        from apps.events.models import TicketAssetJob
+        from apps.events.tasks import generate_ticket_asset_batch
+        job = TicketAssetJob.objects.create(total=2)
+
+        with patch('apps.events.tasks._tickets', side_effect=RuntimeError('database gone')):
+            results = generate_ticket_asset_batch(job.pk, self.ids[:2])
+        self.assertEqual([(r['status'], r['ticket_id']) for r in results],
+                         [('error', self.ids[0]), ('error', self.ids[1])])
+        job.refresh_from_db()
+        self.assertEqual((job.completed, job.failed), (0, 2))
+
+        with patch('apps.events.tasks._tickets', side_effect=RuntimeError('database gone')), \
+                patch.object(TicketAssetJob, 'record', side_effect=RuntimeError('still gone')):
+            self.assertEqual(len(generate_ticket_asset_batch(job.pk, self.ids[:2])), 2)
+
+    @patch('apps.events.models.EventTicket.generate_pdf_ticket', return_value=True)
+    @patch('apps.events.models.EventTicket.generate_qr_code', return_value=True)
+    def test_single_ticket_assets_are_made_in_the_task(self, qr, pdf):
+        from apps.events.tasks import generate_ticket_assets
+        from apps.taskqueue.models import QueuedTask
+        result = generate_ticket_assets(self.ids[0])
+        self.assertEqual((result['status'], result['qr_code']['status'], result['pdf']['status']),
+                         ('completed', 'success', 'success'))
+        self.assertFalse(QueuedTask.objects.exists())
+
+
+class SellerTicketFeedTests(TestCase):
+    """The seller ticket feed: one UNION over both ticket tables, keyset
+    pages, filters, and a query count that doesn't grow with the page."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.events.fast_models import FastEventTicket
+        from apps.events.models import EventTicket
+        self.event = make_event(tiers=[('VIP', 5000, 10), ('Regular', 1000, 50)], title='Gala')
+        self.vip, self.regular = self.event.ticket_tiers.order_by('name').reverse()
+        vip_payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        vip_payment.purchases.update(selected_ticket_tier=self.vip)
+        regular_payment = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS)
+        regular_payment.purchases.update(selected_ticket_tier=self.regular)
+        with self.settings(TICKET_IMAGES='lazy'):
+            self.fast = FastEventTicket.issue(vip_payment.purchases.get(), vip_payment.user, 3)
+        self.legacy = EventTicket.objects.bulk_create([
+            EventTicket(purchase=regular_payment.purchases.get(), buyer=regular_payment.user, event=self.event)
+            for _ in range(2)
+        ])
+        # Interleave the two tables in time, with one exact tie across them.
+        base = timezone.now()
+        for i, ticket in enumerate(self.fast + self.legacy):
+            type(ticket).objects.filter(pk=ticket.pk).update(created_at=base - timedelta(minutes=i))
+        EventTicket.objects.filter(pk=self.legacy[0].pk).update(created_at=base)
+        other = make_payment(product=make_event(), status=Payment.PaymentStatus.SUCCESS)
+        with self.settings(TICKET_IMAGES='lazy'):
+            FastEventTicket.issue(other.purchases.get(), other.user, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.event.owner)
+
+    def _walk(self, **params):
+        seen, cursor = [], ''
+        while True:
+            body = self.client.get('/api/events/seller-tickets/', {**params, 'cursor': cursor}).json()
+            seen += body['results']
+            if not body['pagination']['has_next']:
+                return seen
+            cursor = body['pagination']['next_cursor']
+
+    def test_pages_cover_both_tables_once_newest_first(self):
+        rows = self._walk(page_size=1)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len({(r['kind'], r['ticket_id']) for r in rows}), 5)
+        self.assertEqual([r['created_at'] for r in rows], sorted((r['created_at'] for r in rows), reverse=True))
+        self.assertEqual({r['kind'] for r in rows}, {'fast', 'legacy'})
+        legacy = next(r for r in rows if r['kind'] == 'legacy')
+        self.assertEqual(legacy['ticket_tier']['display_name'], 'Regular')
+        self.assertEqual(legacy['event']['title'], 'Gala')
+
+    def test_filters(self):
+        self.assertEqual(len(self._walk(tier=self.vip.pk)), 3)
+        self.assertEqual(len(self._walk(event=self.event.pk + 1000)), 0)
+        type(self.fast[0]).objects.filter(pk=self.fast[0].pk).update(is_used=True)
+        used = self._walk(checked_in='true')
+        self.assertEqual([r['ticket_id'] for r in used], [str(self.fast[0].ticket_id)])
+        self.assertEqual(len(self._walk(checked_in='false')), 4)
+        bad = self.client.get('/api/events/seller-tickets/', {'checked_in': 'maybe'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_unpaged_clients_still_get_a_list(self):
+        response = self.client.get('/api/events/seller-tickets/')
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_query_count_is_constant_in_page_size(self):
+        with CaptureQueriesContext(connection) as small:
+            # Already both tables: the legacy ticket tied with the newest fast one.
+            self.client.get('/api/events/seller-tickets/', {'page_size': 2})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/events/seller-tickets/', {'page_size': 5})
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertLessEqual(len(large.captured_queries), 3)
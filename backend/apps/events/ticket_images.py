@@ -0,0 +1,178 @@
+"""
+Ticket images on demand.
+
+Every FastEventTicket used to be rendered to PNG when it was created, in the
+outbox ticket step, and written to disk twice (save_ticket_locally, then
+ticket_png.save). Most tickets are looked at once or twice, at the door.
+
+With settings.TICKET_IMAGES = 'lazy' a ticket is created without an image
+and materialised the first time something needs it:
+
+    * the ticket image endpoint (TicketImageView), which the library and
+      ticket details link to through a signed URL (image_url());
+    * the ticket email, which materialises a purchase's tickets as one batch
+      (materialize()) before attaching them.
+
+A rendered PNG is written once, to the ticket's ticket_png, under a name
+carrying its fingerprint: a hash of everything drawn on it (ticket_data())
+and the renderer version. The same inputs always give the same fingerprint,
+so it is the image's ETag — the endpoint can answer 304 without rendering —
+and a stored image whose event has since been renamed or re-dated no longer
+matches and is drawn again. Recently served PNGs are also kept in a small
+per-process LRU.
+
+'eager' (the default) keeps rendering at creation; the endpoint and signed
+URLs work in both modes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from . import ticket_renderer
+
+logger = logging.getLogger(__name__)
+
+SIGNING_SALT = 'events.ticket-image'
+
+
+def is_lazy():
+    return getattr(settings, 'TICKET_IMAGES', 'eager') == 'lazy'
+
+
+def fingerprint(ticket_data):
+    """Content hash of a ticket image: equal inputs, equal image."""
+    payload = json.dumps({**ticket_data, '_renderer': ticket_renderer.VERSION}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def filename(ticket, fp):
+    return f"fast_ticket_{ticket.ticket_id}-{fp[:12]}.png"
+
+
+def is_current(ticket, fp):
+    """Whether the ticket's stored PNG was drawn from these inputs."""
+    return bool(ticket.ticket_png) and os.path.basename(ticket.ticket_png.name).startswith(
+        filename(ticket, fp)[:-len('.png')]
+    )
+
+
+class _LRU:
+    """A small thread-safe LRU of fingerprint -> PNG bytes."""
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = getattr(settings, 'TICKET_IMAGE_CACHE_SIZE', 128)
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+cache = _LRU()
+
+
+def _read_stored(ticket):
+    try:
+        with ticket.ticket_png.open('rb') as f:
+            return f.read()
+    except Exception as e:
+        logger.warning("Stored image for ticket %s unreadable, rendering again: %s", ticket.ticket_id, e)
+        return None
+
+
+def _store(ticket, png, fp):
+    ticket.store_png(BytesIO(png), fp)
+    ticket.save(update_fields=['ticket_png', 'ticket_png_path'])
+
+
+def png_for(ticket):
+    """(PNG bytes, fingerprint) for a ticket, rendering and storing it if needed."""
+    data = ticket.ticket_data()
+    fp = fingerprint(data)
+    png = cache.get(fp)
+    if png is None and is_current(ticket, fp):
+        png = _read_stored(ticket)
+    if png is None:
+        png = ticket_renderer.render(data)
+        _store(ticket, png, fp)
+    cache.put(fp, png)
+    return png, fp
+
+
+def materialize(tickets):
+    """
+    Make sure every ticket has a current stored image, rendering the missing
+    ones as one batch (see ticket_renderer.render_many) and saving them with
+    one bulk_update. A ticket whose image fails is left without one.
+    """
+    missing = []
+    for ticket in tickets:
+        data = ticket.ticket_data()
+        fp = fingerprint(data)
+        if not is_current(ticket, fp):
+            missing.append((ticket, data, fp))
+    if not missing:
+        return
+    stored = []
+    for (ticket, _, fp), png in zip(missing, ticket_renderer.render_many([data for _, data, _ in missing])):
+        if png is None:
+            continue
+        try:
+            ticket.store_png(BytesIO(png), fp)
+        except Exception:
+            logger.exception("Could not store the image for ticket %s", ticket.ticket_id)
+            continue
+        cache.put(fp, png)
+        stored.append(ticket)
+    if stored:
+        type(stored[0]).objects.bulk_update(stored, ['ticket_png', 'ticket_png_path'])
+
+
+# --- links -----------------------------------------------------------------
+
+def _signer():
+    return signing.Signer(salt=SIGNING_SALT)
+
+
+def signature(ticket_id):
+    return _signer().signature(str(ticket_id))
+
+
+def check_signature(ticket_id, sig):
+    try:
+        _signer().unsign(f"{ticket_id}{_signer().sep}{sig}")
+        return True
+    except signing.BadSignature:
+        return False
+
+
+def image_url(ticket):
+    """
+    A link to the ticket image endpoint that works without a login (an <img>
+    tag can't send the JWT), like the media URL of a rendered ticket does.
+    """
+    return f"{reverse('events:ticket_image', args=[ticket.ticket_id])}?sig={signature(ticket.ticket_id)}"
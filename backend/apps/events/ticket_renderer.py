@@ -0,0 +1,348 @@
+"""
+Ticket PNG rendering.
+
+FastTicketService.generate_ticket_png used to draw every ticket from scratch:
+reopen and resize the logo, load the fonts, draw the header band, wrap the
+title, lay out the badge and stub, then encode with optimize=True (which
+re-compresses the image several times to shave a few bytes). All of that is
+the same for every ticket of an event and tier; only the QR code and the
+buyer's name, email and ticket id differ. And FastEventTicket.save() ran it
+once per ticket, one after another.
+
+Now:
+
+    * base() draws everything a ticket shares with the rest of its event and
+      tier — header, logo, title, badge, QR tile, perforation, date, labels,
+      footer and frame — and keeps it in an LRU keyed by what is drawn (event
+      title, date and tier name), so editing the event just yields a new
+      base. The logo and fonts are loaded once per process;
+    * render() copies the base and adds the QR code and buyer fields, then
+      encodes the PNG without optimize;
+    * render_many() renders a batch — a purchase's tickets — in a bounded
+      process pool (TICKET_RENDER_PROCESSES workers), in chunks that share a
+      base so each worker draws it once. Small batches, a pool of 0, or a
+      host that won't start processes render inline instead.
+
+The module only needs Pillow and qrcode (no Django models), so pool workers
+start quickly and tickets can be rendered outside a request.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Part of every ticket image's fingerprint (ticket_images): bump it when the
+# design changes so stored images are drawn again.
+VERSION = 2
+
+W = 440
+
+# Palette (Darra indigo brand)
+INDIGO = (56, 0, 255)
+CONTAINER = (243, 241, 255)
+BADGE_BG = (232, 222, 255)
+BORDER = (226, 224, 240)
+TEXT = (24, 24, 27)
+MUTED = (120, 118, 132)
+WHITE = (255, 255, 255)
+
+# Pre-rendered logo (the SVG is rasterised offline so the server needs no
+# SVG library). If the file is missing the header falls back to the
+# wordmark alone — a ticket never fails to generate over a logo.
+LOGO_PATH = os.path.join(os.path.dirname(__file__), 'assets', 'logo.png')
+
+BASE_CACHE_SIZE = 64
+# Below this many tickets the pool's overhead outweighs the parallelism.
+POOL_MIN_BATCH = 4
+
+
+@lru_cache(maxsize=None)
+def font(size):
+    # Pillow's scalable built-in font: renders identically on the server,
+    # no dependency on a system font like Arial (which the old code needed
+    # and which Linux does not have — that made server tickets tiny).
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # very old Pillow
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=1)
+def _logo(height):
+    """The logo scaled to `height`, or None if it can't be loaded."""
+    try:
+        logo = Image.open(LOGO_PATH).convert('RGBA')
+    except Exception as e:
+        logger.warning("Ticket logo not loaded, using wordmark only: %s", e)
+        return None
+    width = max(1, int(logo.width / logo.height * height))
+    return logo.resize((width, height))
+
+
+def _bold(draw, xy, text, fnt, fill):
+    x, y = xy
+    draw.text((x, y), text, font=fnt, fill=fill)
+    draw.text((x + 1, y), text, font=fnt, fill=fill)
+
+
+def _wrap(draw, text, fnt, maxw, max_lines=2):
+    words = str(text).split()
+    lines, cur = [], ""
+    for w in words:
+        t = (cur + " " + w).strip()
+        if draw.textlength(t, font=fnt) <= maxw:
+            cur = t
+        else:
+            if cur:
+                lines.append(cur)
+            cur = w
+    if cur:
+        lines.append(cur)
+    return lines[:max_lines] or [""]
+
+
+def _fit(draw, text, fnt, maxw):
+    text = str(text)
+    if draw.textlength(text, font=fnt) <= maxw:
+        return text
+    while text and draw.textlength(text + "…", font=fnt) > maxw:
+        text = text[:-1]
+    return text + "…"
+
+
+def _date_text(event_date):
+    if hasattr(event_date, 'strftime'):
+        return event_date.strftime('%b %d, %Y · %I:%M %p')
+    return str(event_date or 'TBD')
+
+
+def base_key(ticket_data):
+    """What a ticket's base image depends on."""
+    return (
+        str(ticket_data.get('event_title', 'Event')),
+        str(ticket_data.get('ticket_category') or 'General'),
+        _date_text(ticket_data.get('event_date', 'TBD')),
+    )
+
+
+@lru_cache(maxsize=BASE_CACHE_SIZE)
+def base(title, category, date_text):
+    """
+    (image, layout) for every ticket of one event and tier. The image must be
+    copied before drawing on it; layout holds where the per-ticket parts go.
+    """
+    measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    title_font = font(23)
+    title_lines = _wrap(measure, title, title_font, W - 56)
+    H = 690 + (len(title_lines) - 1) * 30
+
+    img = Image.new('RGB', (W, H), WHITE)
+    draw = ImageDraw.Draw(img)
+
+    # Header band (rounded top, square bottom)
+    draw.rounded_rectangle([0, 0, W, 132], 24, fill=INDIGO)
+    draw.rectangle([0, 108, W, 132], fill=INDIGO)
+
+    # Brand: the logo in a white tile + wordmark.
+    wordmark_x, wordmark_y, wordmark_size = 28, 40, 30
+    logo = _logo(42)
+    if logo is not None:
+        tile, tx, ty = 58, 26, 30
+        draw.rounded_rectangle([tx, ty, tx + tile, ty + tile], 15, fill=WHITE)
+        img.paste(logo, (tx + (tile - logo.width) // 2, ty + (tile - logo.height) // 2), logo)
+        wordmark_x, wordmark_y, wordmark_size = tx + tile + 14, 46, 28
+
+    _bold(draw, (wordmark_x, wordmark_y), "DARRA", font(wordmark_size), WHITE)
+    draw.text((W - 26, 50), "E-TICKET", font=font(13), fill=(206, 196, 255), anchor="ra")
+
+    # Event title
+    y = 152
+    for ln in title_lines:
+        _bold(draw, (28, y), ln, title_font, TEXT)
+        y += 30
+
+    # Category badge
+    badge = category.upper()
+    bf = font(12)
+    bw = measure.textlength(badge, font=bf) + 26
+    draw.rounded_rectangle([28, y + 2, 28 + bw, y + 28], 13, fill=BADGE_BG)
+    draw.text((28 + 13, y + 8), badge, font=bf, fill=INDIGO)
+    y += 44
+
+    # QR tile; the code itself is per ticket
+    ct = y + 2
+    cs = 236
+    cx = (W - cs) // 2
+    draw.rounded_rectangle([cx, ct, cx + cs, ct + cs], 18, fill=CONTAINER)
+
+    # Perforated stub line with side notches
+    yp = ct + cs + 22
+    for x in range(24, W - 24, 14):
+        draw.line([x, yp, x + 7, yp], fill=(205, 203, 216), width=2)
+    draw.ellipse([-12, yp - 12, 12, yp + 12], fill=WHITE, outline=BORDER, width=2)
+    draw.ellipse([W - 12, yp - 12, W + 12, yp + 12], fill=WHITE, outline=BORDER, width=2)
+
+    # Details grid: the date and every label; the buyer's values are per ticket
+    gy = yp + 24
+    for x, cy, label in ((28, gy, "Date"), (W // 2, gy, "Guest"),
+                         (28, gy + 52, "Email"), (28, gy + 104, "Ticket ID")):
+        draw.text((x, cy), label.upper(), font=font(11), fill=MUTED)
+    draw.text((28, gy + 16), _fit(draw, date_text, font(15), 170), font=font(15), fill=TEXT)
+
+    draw.text((W // 2, H - 30), "Present this code at entry  •  darra.com.ng",
+              font=font(11), fill=MUTED, anchor="ma")
+
+    # Outer border last so it frames everything cleanly
+    draw.rounded_rectangle([0, 0, W - 1, H - 1], 24, outline=BORDER, width=2)
+
+    return img, {'qr': (cx + 14, ct + 14), 'grid': gy}
+
+
+def qr_payload(ticket_data):
+    # The compact signed token (qr_tokens) when the caller supplies one;
+    # otherwise the original JSON payload.
+    if ticket_data.get('qr'):
+        return ticket_data['qr']
+    return json.dumps({
+        'ticket_id': ticket_data['ticket_id'],
+        'event_id': ticket_data.get('event_id', ''),
+        'timestamp': ticket_data.get('timestamp', ''),
+        'type': 'fast_ticket',
+    })
+
+
+def _qr_image(payload):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=8,
+        border=1,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    # NEAREST keeps module edges sharp for the scanner.
+    return qr.make_image(fill_color=TEXT, back_color=WHITE).convert('RGB').resize((208, 208), Image.NEAREST)
+
+
+def render(ticket_data):
+    """The ticket as PNG bytes."""
+    template, layout = base(*base_key(ticket_data))
+    img = template.copy()
+    draw = ImageDraw.Draw(img)
+    img.paste(_qr_image(qr_payload(ticket_data)), layout['qr'])
+
+    gy = layout['grid']
+    value = font(15)
+    for x, cy, text, maxw in (
+        (W // 2, gy, ticket_data.get('buyer_name', 'Guest'), 170),
+        (28, gy + 52, ticket_data.get('buyer_email', ''), W - 56),
+        (28, gy + 104, ticket_data.get('ticket_id', 'N/A'), W - 56),
+    ):
+        draw.text((x, cy + 16), _fit(draw, text, value, maxw), font=value, fill=TEXT)
+
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _render_safely(ticket_data):
+    try:
+        return render(ticket_data)
+    except Exception:
+        logger.exception("Could not render ticket %s", ticket_data.get('ticket_id'))
+        return None
+
+
+def _render_chunk(chunk):
+    return [_render_safely(ticket_data) for ticket_data in chunk]
+
+
+# --- batches ---------------------------------------------------------------
+
+_pool = None
+_pool_size = None
+# render_many runs on request threads and background executor threads at once;
+# the pool is only created, replaced, handed work or dropped under this lock.
+_pool_lock = threading.Lock()
+
+
+def _get_pool(processes):
+    """The shared pool, sized for `processes`. Call with _pool_lock held."""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != processes:
+        if _pool is not None:
+            # Not cancelled: work other threads already gave it still finishes.
+            _pool.shutdown(wait=False)
+        import multiprocessing
+        # spawn, not fork: the caller is a threaded web or worker process
+        # holding DB connections and locks a forked child must not inherit.
+        _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        _pool_size = processes
+    return _pool
+
+
+def _discard_pool(pool):
+    """Drop `pool` after it failed, unless another thread has already replaced it."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if pool is None or _pool is not pool:
+            return
+        _pool, _pool_size = None, None
+    pool.shutdown(wait=False)
+
+
+def _chunks(items, processes):
+    """
+    Split the indexes of `items` into about one chunk per process, keeping
+    tickets that share a base together so each worker draws it once.
+    """
+    groups = {}
+    for index, ticket_data in enumerate(items):
+        groups.setdefault(base_key(ticket_data), []).append(index)
+    size = max(1, -(-len(items) // processes))
+    chunks = []
+    for indexes in groups.values():
+        chunks.extend(indexes[i:i + size] for i in range(0, len(indexes), size))
+    return chunks
+
+
+def render_many(items, processes=None):
+    """
+    PNG bytes for each ticket_data in `items`, in order (None where one
+    failed). `processes` defaults to settings.TICKET_RENDER_PROCESSES.
+    """
+    items = list(items)
+    if processes is None:
+        from django.conf import settings
+        processes = getattr(settings, 'TICKET_RENDER_PROCESSES', 0)
+    if processes < 1 or len(items) < POOL_MIN_BATCH:
+        return _render_chunk(items)
+
+    chunks = _chunks(items, processes)
+    pool = None
+    try:
+        with _pool_lock:
+            # map() submits every chunk before it returns, so the pool cannot
+            # be replaced between being fetched and being given the work.
+            pool = _get_pool(processes)
+            rendered = pool.map(_render_chunk, [[items[i] for i in chunk] for chunk in chunks])
+        results = [None] * len(items)
+        for chunk, pngs in zip(chunks, rendered):
+            for index, png in zip(chunk, pngs):
+                results[index] = png
+        return results
+    except Exception as e:
+        # A broken pool (a worker was killed) or a host that can't start
+        # processes: start afresh next time and render these here.
+        logger.warning("Ticket render pool unavailable, rendering %s ticket(s) inline: %s", len(items), e)
+        _discard_pool(pool)
+        return _render_chunk(items)
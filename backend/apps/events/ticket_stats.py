@@ -0,0 +1,129 @@
+"""
+Per-event ticket counters (EventTicketStats).
+
+seller_event_stats used to load every EventTicket and FastEventTicket of the
+seller's events into Python, touch ticket.event.title on each (a query per
+ticket) and tally them in dicts. For an organiser with 20k tickets that is a
+multi-second read of their whole history, and door staff refresh it
+constantly while doors are open.
+
+Now each event has one counter row:
+
+    * issued() adds to it when tickets are created (FastEventTicket.issue()
+      and save()), and checked_in() when check-in admits them. Both are
+      UPDATE ... SET n = n + k, so concurrent gates and purchases never lose
+      a count;
+    * a missing row is first built from the tickets (aggregate(): one
+      GROUP BY event per ticket table), so events that had tickets before the
+      counters existed start from the right numbers. Callers that create
+      or admit tickets ensure the row *before* inserting or admitting them,
+      so each ticket is counted once;
+    * for_seller() answers the stats endpoint: one query for the seller's
+      events and their counters, whatever the number of tickets;
+    * rebuild() recomputes rows from the tickets. It backs
+      `manage.py rebuild_event_ticket_stats` and the admin action, for when
+      tickets were deleted or edited by hand.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .fast_models import FastEventTicket
+from .models import EventTicket, EventTicketStats
+
+logger = logging.getLogger(__name__)
+
+TICKET_MODELS = (FastEventTicket, EventTicket)
+
+
+def aggregate(event_ids):
+    """{event_id: {'issued': n, 'checked_in': n}} counted from both ticket tables."""
+    totals = defaultdict(lambda: {'issued': 0, 'checked_in': 0})
+    for model in TICKET_MODELS:
+        rows = (
+            model.objects.filter(event_id__in=event_ids)
+            .values('event_id')
+            .annotate(issued=Count('id'), checked_in=Count('id', filter=Q(is_used=True)))
+            .order_by()
+        )
+        for row in rows:
+            totals[row['event_id']]['issued'] += row['issued']
+            totals[row['event_id']]['checked_in'] += row['checked_in']
+    return totals
+
+
+def ensure(event_ids):
+    """Create any missing counter rows from the tickets as they stand."""
+    event_ids = set(event_ids)
+    missing = event_ids - set(
+        EventTicketStats.objects.filter(event_id__in=event_ids).values_list('event_id', flat=True)
+    )
+    if not missing:
+        return
+    counts = aggregate(missing)
+    EventTicketStats.objects.bulk_create(
+        [EventTicketStats(event_id=event_id, **counts[event_id]) for event_id in missing],
+        ignore_conflicts=True,
+    )
+
+
+def issued(event_id, count=1):
+    """Count `count` new tickets. Call ensure([event_id]) before inserting them."""
+    if count:
+        EventTicketStats.objects.filter(event_id=event_id).update(issued=F('issued') + count)
+
+
+def checked_in(counts):
+    """
+    Count admissions: `counts` is {event_id: tickets admitted}. Call
+    ensure() for the events before admitting: a row built afterwards already
+    counts these admissions, and adding them again would count them twice.
+    """
+    counts = {event_id: n for event_id, n in counts.items() if n}
+    for event_id, n in counts.items():
+        EventTicketStats.objects.filter(event_id=event_id).update(checked_in=F('checked_in') + n)
+
+
+def for_seller(user):
+    """
+    [{'event_id', 'title', 'issued', 'checked_in'}] for each of the user's
+    events, from the counters (built on the spot for any event without one).
+    """
+    from products.models import Product
+
+    def read():
+        return list(
+            Product.objects.filter(owner=user, product_type='event')
+            .values('pk', 'title', 'ticket_stats__issued', 'ticket_stats__checked_in')
+            .order_by('pk')
+        )
+
+    events = read()
+    missing = [e['pk'] for e in events if e['ticket_stats__issued'] is None]
+    if missing:
+        ensure(missing)
+        events = read()
+    return [
+        {
+            'event_id': e['pk'],
+            'title': e['title'],
+            'issued': e['ticket_stats__issued'] or 0,
+            'checked_in': e['ticket_stats__checked_in'] or 0,
+        }
+        for e in events
+    ]
+
+
+def rebuild(event_ids, dry_run=False):
+    """Recompute the counters of `event_ids` from their tickets. Returns rows written."""
+    with transaction.atomic():
+        counts = aggregate(event_ids)
+        rows = [EventTicketStats(event_id=event_id, **counts[event_id]) for event_id in event_ids]
+        EventTicketStats.objects.filter(event_id__in=event_ids).delete()
+        EventTicketStats.objects.bulk_create(rows)
+        if dry_run:
+            transaction.set_rollback(True)
+    return len(rows)
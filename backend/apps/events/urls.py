@@ -6,9 +6,13 @@ app_name = 'events'
 urlpatterns = [
     path('seller-tickets/', views.SellerEventTicketsView.as_view(), name='seller_tickets'),
     path('ticket/<str:ticket_id>/', views.get_ticket_details, name='ticket_details'),
+    path('ticket/<uuid:ticket_id>/image/', views.TicketImageView.as_view(), name='ticket_image'),
     path('verify/<str:ticket_id>/', views.verify_ticket, name='verify_ticket'),
+    path('check-in/', views.check_in_tickets, name='check_in'),
     path('regenerate/<str:ticket_id>/', views.regenerate_ticket, name='regenerate_ticket'),
+    path('<int:event_id>/scan-key/', views.event_scan_key, name='scan_key'),
     path('seller-stats/', views.seller_event_stats, name='seller_stats'),
+    path('<int:event_id>/attendees.<str:fmt>', views.EventAttendeesExportView.as_view(), name='attendees_export'),
 ]
 
 
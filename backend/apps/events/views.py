@@ -1,97 +1,68 @@
-from rest_framework import generics, status
+import base64
+
+from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from core.exports import ExportView
+from core.pagination import is_paged, page_size_for
 from .models import EventTicket
+from . import checkin, qr_tokens, ticket_feed, ticket_images, ticket_stats
 from .fast_models import FastEventTicket
-from .serializers import EventTicketSerializer, EventTicketDetailSerializer
+from .serializers import EventTicketDetailSerializer, SellerTicketSerializer
 
-class SellerEventTicketsView(generics.ListAPIView):
-    """Get all event tickets for seller's events"""
-    serializer_class = EventTicketSerializer
+class SellerEventTicketsView(APIView):
+    """
+    Every ticket to the seller's events, legacy and fast, newest first (see
+    ticket_feed). Filters: `event`, `tier` (ids) and `checked_in`
+    (true/false). Clients that send `cursor`, `page_size` or `page` get
+    cursor pages; others get the whole list, as before pagination existed.
+    """
     permission_classes = [IsAuthenticated]
-    
-    def get_queryset(self):
-        # Get both old and fast tickets for events owned by the seller
-        from django.db import models
-        
-        # Combine both querysets
-        old_tickets = EventTicket.objects.filter(
-            event__owner=self.request.user
-        ).select_related('buyer', 'event', 'purchase__payment')
-        
-        fast_tickets = FastEventTicket.objects.filter(
-            event__owner=self.request.user
-        ).select_related('buyer', 'event', 'purchase__payment')
-        
-        # Combine and order by created_at
-        all_tickets = list(old_tickets) + list(fast_tickets)
-        all_tickets.sort(key=lambda x: x.created_at, reverse=True)
-        
-        return all_tickets
-    
-    def list(self, request, *args, **kwargs):
-        """Override list to handle mixed ticket types"""
-        queryset = self.get_queryset()
-        
-        # Serialize each ticket individually to handle different types
-        serialized_tickets = []
-        for ticket in queryset:
-            try:
-                if hasattr(ticket, 'ticket_png'):
-                    # Fast ticket - create a custom representation
-                    ticket_data = {
-                        'ticket_id': str(ticket.ticket_id),
-                        'buyer': {
-                            'full_name': ticket.buyer.full_name,
-                            'email': ticket.buyer.email,
-                        },
-                        'event': {
-                            'title': ticket.event.title,
-                            'event_date': ticket.event.event_date,
-                            'description': ticket.event.description,
-                        },
-                        'verified_by': {
-                            'full_name': ticket.verified_by.full_name,
-                        } if ticket.verified_by else None,
-                        'quantity': ticket.quantity,
-                        'is_used': ticket.is_used,
-                        'used_at': ticket.used_at,
-                        'verified_at': ticket.verified_at,
-                        'created_at': ticket.created_at,
-                        'purchase_reference': ticket.purchase.payment.reference if ticket.purchase and ticket.purchase.payment else 'N/A',
-                        'payment_amount': str(ticket.purchase.total_price) if ticket.purchase else '0.00',
-                        # display_name/display_color handle both seller-named
-                        # categories and legacy rows whose label lived on the
-                        # (now optional) global category.
-                        'ticket_tier': {
-                            'name': ticket.purchase.selected_ticket_tier.name,
-                            'display_name': ticket.purchase.selected_ticket_tier.display_name,
-                            'color': ticket.purchase.selected_ticket_tier.display_color,
-                            'price': str(ticket.purchase.selected_ticket_tier.price),
-                        } if ticket.purchase and ticket.purchase.selected_ticket_tier else None,
-                        'qr_code_url': ticket.ticket_png.url if ticket.ticket_png else None,
-                        'pdf_ticket_url': None,
-                        'ticket_png_url': ticket.ticket_png.url if ticket.ticket_png else None,
-                    }
-                else:
-                    # Old ticket - use regular serializer
-                    serializer = self.get_serializer(ticket)
-                    ticket_data = serializer.data
-                
-                serialized_tickets.append(ticket_data)
-            except Exception as e:
-                print(f"Error serializing ticket {ticket.ticket_id}: {str(e)}")
-                continue
-        
-        return Response(serialized_tickets)
+
+    def get(self, request):
+        try:
+            filters = ticket_feed.parse_filters(request.GET)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not is_paged(request):
+            tickets = ticket_feed.iterate(request.user, filters)
+            return Response(SellerTicketSerializer(tickets, many=True).data)
+
+        tickets, meta = ticket_feed.page(
+            request.user, filters, request.GET.get('cursor'), page_size_for(request, 24, 100),
+        )
+        return Response({'results': SellerTicketSerializer(tickets, many=True).data, 'pagination': meta})
+
+
+def _scanned_ticket_id(value):
+    """
+    The ticket id in whatever the scanner read — a signed token, the legacy
+    JSON payload or the id itself. Raises qr_tokens.InvalidToken for a forged
+    or damaged token, ValueError for anything unreadable.
+    """
+    return qr_tokens.parse(value)[0]
+
+
+def _unreadable_ticket(error):
+    if isinstance(error, qr_tokens.InvalidToken):
+        return Response({'error': 'Invalid ticket code'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'error': 'Fast ticket not found'}, status=status.HTTP_404_NOT_FOUND)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_ticket_details(request, ticket_id):
     """Get detailed information about a specific ticket - FAST TICKETS ONLY"""
+    try:
+        ticket_id = _scanned_ticket_id(ticket_id)
+    except ValueError as e:
+        return _unreadable_ticket(e)
     try:
         # Only look for fast tickets
         from .fast_models import FastEventTicket
@@ -149,9 +120,9 @@ def get_ticket_details(request, ticket_id):
                     'color': ticket.purchase.selected_ticket_tier.display_color,
                 }
             } if ticket.purchase and ticket.purchase.selected_ticket_tier else None,
-            'qr_code_url': ticket.ticket_png.url if ticket.ticket_png else None,
+            'qr_code_url': ticket.get_ticket_url(),
             'pdf_ticket_url': None,
-            'ticket_png_url': ticket.ticket_png.url if ticket.ticket_png else None,
+            'ticket_png_url': ticket.get_ticket_url(),
         }
         print(f"DEBUG: Fast ticket data created successfully")
         return Response(ticket_data)
@@ -163,31 +134,35 @@ def get_ticket_details(request, ticket_id):
 @permission_classes([IsAuthenticated])
 def verify_ticket(request, ticket_id):
     """Verify an event ticket - FAST TICKETS ONLY"""
+    try:
+        ticket_id = _scanned_ticket_id(ticket_id)
+    except ValueError as e:
+        return _unreadable_ticket(e)
     try:
         # Only look for fast tickets
         from .fast_models import FastEventTicket
         
-        ticket = FastEventTicket.objects.get(ticket_id=ticket_id)
-        print(f"DEBUG: Verifying fast ticket: {ticket.ticket_id}")
+        ticket = FastEventTicket.objects.select_related(
+            'buyer', 'event', 'purchase__payment', 'purchase__selected_ticket_tier__category',
+        ).get(ticket_id=ticket_id)
         
         # Check if seller owns this event
-        if ticket.event.owner != request.user:
+        if ticket.event.owner_id != request.user.pk:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if ticket is already used
-        if ticket.is_used:
+        # Counter row first, so this admission is counted once.
+        ticket_stats.ensure([ticket.event_id])
+        # Mark ticket as used, atomically: if another scanner got there
+        # first, this UPDATE changes nothing (see checkin.admit).
+        if not checkin.admit(ticket.pk, request.user):
+            ticket.refresh_from_db(fields=['used_at', 'verified_by'])
             return Response({
                 'error': 'Ticket already used',
                 'used_at': ticket.used_at,
                 'verified_by': ticket.verified_by.full_name if ticket.verified_by else None
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Mark ticket as used
-        ticket.is_used = True
-        ticket.used_at = timezone.now()
-        ticket.verified_by = request.user
-        ticket.verified_at = timezone.now()
-        ticket.save()
+        ticket_stats.checked_in({ticket.event_id: 1})
+        ticket.refresh_from_db(fields=['is_used', 'used_at', 'verified_by', 'verified_at'])
         
         # Create fast ticket response for verification (same format as get_ticket_details)
         ticket_data = {
@@ -222,9 +197,9 @@ def verify_ticket(request, ticket_id):
                     'color': ticket.purchase.selected_ticket_tier.display_color,
                 }
             } if ticket.purchase and ticket.purchase.selected_ticket_tier else None,
-            'qr_code_url': ticket.ticket_png.url if ticket.ticket_png else None,
+            'qr_code_url': ticket.get_ticket_url(),
             'pdf_ticket_url': None,
-            'ticket_png_url': ticket.ticket_png.url if ticket.ticket_png else None,
+            'ticket_png_url': ticket.get_ticket_url(),
         }
         
         return Response({
@@ -272,39 +247,26 @@ def regenerate_ticket(request, ticket_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def seller_event_stats(request):
-    """Get statistics for seller's events"""
+    """
+    Ticket statistics for the seller's events, read from the per-event
+    counters (see ticket_stats): one query however many tickets there are.
+    """
     try:
-        # Get all tickets for seller's events (both old and fast)
-        old_tickets = EventTicket.objects.filter(event__owner=request.user)
-        fast_tickets = FastEventTicket.objects.filter(event__owner=request.user)
-        
-        # Combine both ticket types
-        all_tickets = list(old_tickets) + list(fast_tickets)
-        
-        total_tickets = len(all_tickets)
-        used_tickets = len([t for t in all_tickets if t.is_used])
-        valid_tickets = total_tickets - used_tickets
-        
-        # Get events with ticket counts
         events = {}
-        for ticket in all_tickets:
-            event_title = ticket.event.title
-            if event_title not in events:
-                events[event_title] = {
-                    'total': 0,
-                    'used': 0,
-                    'valid': 0
-                }
-            events[event_title]['total'] += 1
-            if ticket.is_used:
-                events[event_title]['used'] += 1
-            else:
-                events[event_title]['valid'] += 1
-        
+        for row in ticket_stats.for_seller(request.user):
+            event = events.setdefault(row['title'], {'total': 0, 'used': 0, 'valid': 0})
+            event['total'] += row['issued']
+            event['used'] += row['checked_in']
+            event['valid'] += row['issued'] - row['checked_in']
+        # Events without tickets were never listed.
+        events = {title: counts for title, counts in events.items() if counts['total']}
+
+        total_tickets = sum(e['total'] for e in events.values())
+        used_tickets = sum(e['used'] for e in events.values())
         return Response({
             'total_tickets': total_tickets,
             'used_tickets': used_tickets,
-            'valid_tickets': valid_tickets,
+            'valid_tickets': total_tickets - used_tickets,
             'events': events
         })
         
@@ -314,3 +276,124 @@ def seller_event_stats(request):
 
 
 
+
+
+class EventAttendeesExportView(ExportView):
+    """
+    Everyone holding a ticket to one of the seller's events — fast tickets and
+    legacy ones — streamed as CSV or NDJSON for door lists and mail merges.
+    """
+    filename = 'attendees'
+    columns = (
+        'ticket_id', 'buyer_name', 'buyer_email', 'ticket_tier', 'checked_in', 'checked_in_at',
+        'purchase_reference', 'issued_at',
+    )
+
+    def get_rows(self, request, event):
+        for model in (FastEventTicket, EventTicket):
+            tickets = (
+                model.objects.filter(event=event)
+                .select_related('buyer', 'purchase__payment', 'purchase__selected_ticket_tier__category')
+                .order_by('created_at', 'id')
+            )
+            for ticket in tickets.iterator(chunk_size=self.chunk_size):
+                tier = ticket.purchase.selected_ticket_tier
+                yield {
+                    'ticket_id': str(ticket.ticket_id),
+                    'buyer_name': ticket.buyer.full_name,
+                    'buyer_email': ticket.buyer.email,
+                    'ticket_tier': tier.display_name if tier else None,
+                    'checked_in': ticket.is_used,
+                    'checked_in_at': ticket.used_at,
+                    'purchase_reference': ticket.purchase.payment.reference,
+                    'issued_at': ticket.created_at,
+                }
+
+    def get(self, request, fmt, event_id):
+        # Resolve the event before streaming starts, so a wrong id is a 404
+        # rather than an empty file.
+        from products.models import Product
+        event = get_object_or_404(Product, pk=event_id, owner=request.user, product_type='event')
+        return super().get(request, fmt, event=event)
+
+
+class TicketImageView(APIView):
+    """
+    A fast ticket's PNG, rendered on first request when tickets are created
+    without one (see ticket_images). Open to the buyer, the event's owner and
+    anyone holding the signed link from get_ticket_url().
+    """
+    permission_classes = [AllowAny]
+
+    def perform_content_negotiation(self, request, force=False):
+        # Always a PNG, whatever an <img> tag's Accept header lists.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, ticket_id):
+        ticket = get_object_or_404(
+            FastEventTicket.objects.select_related('buyer', 'event', 'purchase__selected_ticket_tier__category'),
+            ticket_id=ticket_id,
+        )
+        user = request.user
+        allowed = ticket_images.check_signature(ticket.ticket_id, request.GET.get('sig', '')) or (
+            user.is_authenticated and user.pk in (ticket.buyer_id, ticket.event.owner_id)
+        )
+        if not allowed:
+            raise Http404
+
+        etag = f'"{ticket_images.fingerprint(ticket.ticket_data())}"'
+        if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = HttpResponse(status=304)
+        else:
+            png, _ = ticket_images.png_for(ticket)
+            response = HttpResponse(png, content_type='image/png')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def event_scan_key(request, event_id):
+    """
+    The key that signs this event's ticket QR tokens, for the organiser's
+    scanner to check tickets offline (see qr_tokens).
+    """
+    from products.models import Product
+    event = get_object_or_404(Product, pk=event_id, owner=request.user, product_type='event')
+    key = base64.urlsafe_b64encode(qr_tokens.event_key(event.pk)).decode().rstrip('=')
+    response = Response({
+        'event_id': event.pk,
+        'format': qr_tokens.PREFIX,
+        'mac_bytes': qr_tokens.MAC_BYTES,
+        'key': key,
+    })
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def check_in_tickets(request):
+    """
+    Check in a batch of scanned ticket codes (tokens, legacy JSON or ids) in
+    one request, e.g. a busy door or a scanner's offline queue. Body:
+    {"codes": [...], "event_id": optional}. Each code gets its own result.
+    """
+    codes = request.data.get('codes')
+    if not isinstance(codes, list) or not codes or not all(isinstance(c, str) for c in codes):
+        return Response({'error': 'codes must be a non-empty list of strings'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(codes) > checkin.MAX_BATCH:
+        return Response({'error': f'At most {checkin.MAX_BATCH} codes per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    event_id = request.data.get('event_id')
+    try:
+        event_id = int(event_id) if event_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return Response({'error': 'event_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = checkin.check_in(request.user, codes, event_id=event_id)
+    return Response({
+        'results': results,
+        'admitted': sum(1 for r in results if r['status'] == checkin.ADMITTED),
+    })
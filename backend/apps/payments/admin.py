@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Payment, Purchase, UserLibrary, SellerCommission, PayoutRequest, SellerEarnings
+from . import ledger, outbox, payout_sync, seller_stats, webhook_inbox
+from .models import (
+    Payment, Purchase, UserLibrary, SellerCommission, PayoutRequest, SellerEarnings,
+    EarningsLedgerEntry, PaymentOutboxTask, SellerDailyStats, TicketHold, WebhookEvent,
+)
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -124,25 +128,17 @@ class PayoutRequestAdmin(admin.ModelAdmin):
     def sync_status_from_flutterwave(self, request, queryset):
         """
         Reconcile stuck 'processing' payouts against Flutterwave's real transfer
-        status — the one-click fix for a missed confirmation webhook. Updates the
-        record, releases the balance if it failed, and emails the seller.
+        status — the one-click fix for a missed confirmation webhook. Statuses
+        are fetched concurrently and the seller emails go out in the
+        background; for a large backlog use `manage.py sync_payout_statuses`.
         """
-        from apps.payments.services import FlutterwaveService
-        svc = FlutterwaveService()
-        completed = failed = unchanged = 0
-        for payout in queryset:
-            before = payout.status
-            after = svc.sync_payout_status(payout)
-            if after == 'completed' and before != 'completed':
-                completed += 1
-            elif after == 'failed' and before != 'failed':
-                failed += 1
-            else:
-                unchanged += 1
+        totals = payout_sync.reconcile(queryset)
+        unchanged = queryset.count() - totals['completed'] - totals['failed'] - totals['errors']
         self.message_user(
             request,
-            f"Synced from Flutterwave — {completed} completed, {failed} failed, "
-            f"{unchanged} unchanged."
+            f"Synced from Flutterwave — {totals['completed']} completed, {totals['failed']} failed, "
+            f"{unchanged} unchanged, {totals['errors']} could not be fetched.",
+            level='WARNING' if totals['errors'] else 'INFO',
         )
     sync_status_from_flutterwave.short_description = "Sync status from Flutterwave (fix missed webhooks)"
 
@@ -196,9 +192,9 @@ class PayoutRequestAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
         if previous_status != obj.status:
-            if obj.status == 'failed':
-                from apps.payments.services import FlutterwaveService
-                FlutterwaveService().update_seller_earnings(obj.seller)
+            # Releases the reservation on 'failed', re-reserves if a failed
+            # payout is moved back to a live status.
+            ledger.sync_payout(obj)
             self._notify_status_change(obj, obj.status)
 
     def _bulk_transition(self, request, queryset, new_status, label):
@@ -211,10 +207,8 @@ class PayoutRequestAdmin(admin.ModelAdmin):
             if new_status == 'completed' and not payout.processed_at:
                 payout.processed_at = timezone.now()
             payout.save()
-            if new_status == 'failed':
-                # A failed payout is no longer reserved — release the balance.
-                from apps.payments.services import FlutterwaveService
-                FlutterwaveService().update_seller_earnings(payout.seller)
+            # A failed payout is no longer reserved — release the balance.
+            ledger.sync_payout(payout)
             changed += 1
             if self._notify_status_change(payout, new_status):
                 notified += 1
@@ -254,17 +248,96 @@ class SellerEarningsAdmin(admin.ModelAdmin):
     actions = ['recalculate_earnings']
     
     def recalculate_earnings(self, request, queryset):
-        """Recalculate earnings for selected sellers"""
-        from .services import PaystackService
-        paystack_service = PaystackService()
-        
-        count = 0
-        for earnings in queryset:
-            try:
-                paystack_service.update_seller_earnings(earnings.seller)
-                count += 1
-            except Exception as e:
-                self.message_user(request, f"Error updating {earnings.seller.email}: {str(e)}", level='ERROR')
+        """Rebuild the selected sellers' earnings from the ledger"""
+        seller_ids = list(queryset.values_list('seller_id', flat=True))
+        try:
+            posted, drift = ledger.reconcile_sellers(seller_ids)
+        except Exception as e:
+            self.message_user(request, f"Error recalculating earnings: {str(e)}", level='ERROR')
+            return
         
-        self.message_user(request, f"Recalculated earnings for {count} sellers.")
-    recalculate_earnings.short_description = "Recalculate earnings" 
\ No newline at end of file
+        self.message_user(
+            request,
+            f"Recalculated earnings for {len(seller_ids)} sellers; "
+            f"{posted} missing ledger entries posted, {len(drift)} totals corrected."
+        )
+    recalculate_earnings.short_description = "Recalculate earnings"
+
+@admin.register(EarningsLedgerEntry)
+class EarningsLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['seller', 'entry_type', 'amount', 'purchase', 'payout', 'created_at']
+    list_filter = ['entry_type', 'created_at']
+    search_fields = ['seller__email', 'payout__transfer_reference', 'purchase__payment__reference']
+    raw_id_fields = ['seller', 'purchase', 'payout']
+    ordering = ['-created_at']
+
+    # Append-only: corrections are new entries, never edits.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(PaymentOutboxTask)
+class PaymentOutboxTaskAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'step', 'status', 'attempts', 'available_at', 'completed_at']
+    list_filter = ['status', 'step']
+    search_fields = ['payment__reference', 'payment__user__email']
+    readonly_fields = ['payment', 'step', 'attempts', 'last_error', 'started_at', 'completed_at', 'created_at']
+    ordering = ['-created_at']
+
+    actions = ['replay_tasks']
+
+    def replay_tasks(self, request, queryset):
+        """Queue the selected steps to run again (failed ones, or a resend)"""
+        count = outbox.replay(queryset)
+        self.message_user(request, f"Queued {count} outbox steps to run again on the next drain.")
+    replay_tasks.short_description = "Run again"
+
+@admin.register(TicketHold)
+class TicketHoldAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'tier', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status']
+    search_fields = ['payment__reference', 'payment__user__email']
+    raw_id_fields = ['payment', 'tier']
+    readonly_fields = ['created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'provider', 'kind', 'status', 'outcome', 'attempts', 'deliveries', 'received_at']
+    list_filter = ['status', 'provider', 'kind']
+    search_fields = ['reference', 'event_id']
+    readonly_fields = [
+        'provider', 'kind', 'event_id', 'reference', 'dedupe_key', 'body', 'outcome', 'attempts',
+        'deliveries', 'last_error', 'received_at', 'available_at', 'started_at', 'processed_at',
+    ]
+    ordering = ['-received_at']
+
+    actions = ['replay_events']
+
+    def replay_events(self, request, queryset):
+        """Queue the selected webhooks to be re-verified and processed again"""
+        count = webhook_inbox.replay(queryset)
+        self.message_user(request, f"Queued {count} webhook event(s) to run again on the next drain.")
+    replay_events.short_description = "Process again"
+
+
+@admin.register(SellerDailyStats)
+class SellerDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['seller', 'date', 'revenue', 'orders', 'commission', 'net_payout', 'updated_at']
+    list_filter = ['date']
+    search_fields = ['seller__email', 'seller__brand_name']
+    raw_id_fields = ['seller']
+    readonly_fields = ['updated_at']
+    ordering = ['-date']
+
+    actions = ['rebuild_stats']
+
+    def rebuild_stats(self, request, queryset):
+        """Recompute the selected sellers' rollup from their commissions"""
+        seller_ids = list(queryset.values_list('seller_id', flat=True).distinct())
+        rows = seller_stats.rebuild(seller_ids)
+        self.message_user(request, f"Rebuilt {rows} daily rows for {len(seller_ids)} seller(s).")
+    rebuild_stats.short_description = "Rebuild from commissions"
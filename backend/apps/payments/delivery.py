@@ -0,0 +1,216 @@
+"""
+Product file delivery for the library download endpoint.
+
+download_product_file used to stream every file through a Django worker with
+FileResponse(product.open_file()): for R2 the bytes were proxied from
+Cloudflare through our process, and there was no Range, ETag or resume, so a
+dropped 50 MB audio or video download started again from zero while holding
+a worker for the whole transfer.
+
+Once the view has checked that the caller owns the library item, deliver()
+hands the bytes off:
+
+    * R2 (any non-filesystem storage): a 302 to a presigned GET that expires
+      after PRODUCT_DOWNLOAD_URL_EXPIRY seconds, with the download filename
+      and type baked into the signature. Cloudflare serves the bytes, with
+      Range and resume. A file not in the bucket (not migrated yet) is served
+      from the legacy on-disk location as below, or not found;
+    * local disk with PRODUCT_FILE_OFFLOAD = 'nginx' or 'sendfile': an empty
+      response carrying X-Accel-Redirect / X-Sendfile, so the web server
+      sends the file (and does Range itself) and the worker is free at once;
+    * local disk otherwise, or a file still in the legacy public location: a
+      Django response that honours Range (one range), If-Range and
+      If-None-Match against an ETag built from the file's size and mtime.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+CONTENT_TYPES = {
+    '.pdf': 'application/pdf',
+    '.mp3': 'audio/mpeg',
+    '.mp4': 'video/mp4',
+    '.zip': 'application/zip',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.png': 'image/png',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _is_remote(storage):
+    return not isinstance(storage, FileSystemStorage)
+
+
+def describe(product):
+    """(download filename, content type) for the product's file."""
+    # Derive the name from the stored field, not the resolved path, so it is
+    # identical regardless of which location the file came from.
+    filename = os.path.basename(product.file.name)
+    ext = os.path.splitext(filename)[1].lower()
+    return filename, CONTENT_TYPES.get(ext, 'application/octet-stream')
+
+
+def _attachment(filename):
+    return f'attachment; filename="{filename}"'
+
+
+# --- R2 --------------------------------------------------------------------
+
+def _remote_exists(product):
+    """Whether the product's key is in the bucket. A presigned URL for a
+    missing key would send the buyer to a storage error page."""
+    try:
+        return product.file.storage.exists(product.file.name)
+    except (OSError, ValueError, NotImplementedError, SuspiciousFileOperation):
+        return False
+
+
+def presigned_redirect(product):
+    filename, content_type = describe(product)
+    url = product.file.storage.url(
+        product.file.name,
+        parameters={
+            'ResponseContentDisposition': _attachment(filename),
+            'ResponseContentType': content_type,
+        },
+        expire=getattr(settings, 'PRODUCT_DOWNLOAD_URL_EXPIRY', 300),
+    )
+    response = HttpResponseRedirect(url)
+    # The URL is a credential for a few minutes; nobody should cache it.
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+# --- local disk ------------------------------------------------------------
+
+def _offloaded(path, filename, content_type):
+    """An X-Accel-Redirect / X-Sendfile response, or None if not configured or not possible."""
+    mode = getattr(settings, 'PRODUCT_FILE_OFFLOAD', '')
+    if mode == 'sendfile':
+        header, value = 'X-Sendfile', path
+    elif mode == 'nginx':
+        root = os.path.realpath(settings.PRIVATE_MEDIA_ROOT)
+        real = os.path.realpath(path)
+        if os.path.commonpath([root, real]) != root:
+            # Still in the legacy public location; nginx's internal
+            # location only covers the private root.
+            return None
+        prefix = getattr(settings, 'PRODUCT_FILE_ACCEL_PREFIX', '/protected-files/').rstrip('/')
+        header, value = 'X-Accel-Redirect', f"{prefix}/{os.path.relpath(real, root).replace(os.sep, '/')}"
+    else:
+        return None
+    response = HttpResponse(content_type=content_type)
+    response[header] = value
+    response['Content-Disposition'] = _attachment(filename)
+    return response
+
+
+def etag_for(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, 'unsatisfiable', or
+    None to ignore it (absent, malformed or multi-range: send the whole file).
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, sep, last = header[len('bytes='):].strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            # Suffix range: the last N bytes.
+            length = int(last)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, mtime):
+    validator = request.META.get('HTTP_IF_RANGE')
+    if not validator:
+        return True
+    if validator.startswith('"') or validator.startswith('W/'):
+        return validator == etag   # strong comparison only
+    since = parse_http_date_safe(validator)
+    return since is not None and int(mtime) <= since
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def ranged_response(request, path, filename, content_type):
+    """Serve `path` from Django, honouring Range, If-Range and If-None-Match."""
+    stat = os.stat(path)
+    size, etag = stat.st_size, etag_for(stat)
+
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if _if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        # FileResponse, so the server's wsgi.file_wrapper can sendfile() it.
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read(path, start, end - start + 1), status=206,
+                                         content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Content-Disposition'] = _attachment(filename)
+    response['Cache-Control'] = 'private'
+    return response
+
+
+def deliver(request, product):
+    """
+    The response that gets the product's file to an owner who asked for it,
+    or None if the file isn't there.
+    """
+    if _is_remote(product.file.storage) and _remote_exists(product):
+        return presigned_redirect(product)
+
+    # Local disk, or a remote file not migrated yet: resolve_file_path()
+    # falls back to the legacy on-disk location.
+    path = product.resolve_file_path()
+    if path is None:
+        return None
+    filename, content_type = describe(product)
+    return _offloaded(path, filename, content_type) or ranged_response(request, path, filename, content_type)
@@ -0,0 +1,126 @@
+"""
+Flutterwave transfer fee schedule, cached.
+
+Every payout used to ask /transfers/fee for its fee before sending the
+transfer itself — two provider round trips per payout, multiplied across a
+bulk approval, for a number that only changes when Flutterwave reprices. The
+NGN schedule is flat per amount band, so one answer covers every amount in
+its band.
+
+lookup() serves the fee for an amount's band from the cache:
+
+    * fresh (learned within FRESH_FOR): returned as is;
+    * stale: still returned, and a background refresh asks Flutterwave
+      again (one per band at a time, guarded by a cache lock);
+    * never learned, or the cache is down: the fallback table below, which
+      errs high so the platform is never short, and a background refresh.
+
+Bands are learned from whatever live answer comes by: the refresh call, and
+the `fee` Flutterwave reports on each accepted transfer (learn()), and — under
+Celery — a periodic refresh_all(). Payout initiation itself therefore makes
+one provider call: the transfer.
+"""
+
+import logging
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# (upper bound inclusive, fallback fee) per NGN band; None is "and above".
+# The fallback fees are slightly conservative.
+BANDS = (
+    (Decimal('5000'), Decimal('10')),
+    (Decimal('50000'), Decimal('25')),
+    (None, Decimal('50')),
+)
+
+FRESH_FOR = 6 * 60 * 60            # seconds before a learned fee is re-checked
+KEEP_FOR = 30 * 24 * 60 * 60       # how long a learned fee is served at all
+REFRESH_LOCK_TTL = 60
+
+
+def band_for(amount):
+    amount = Decimal(str(amount))
+    for index, (upper, _) in enumerate(BANDS):
+        if upper is None or amount <= upper:
+            return index
+    return len(BANDS) - 1
+
+
+def fallback_fee(amount):
+    return BANDS[band_for(amount)][1]
+
+
+def _key(currency, band):
+    return f"transfer_fee:{currency}:{band}"
+
+
+def learn(amount, fee, currency='NGN'):
+    """Record a fee Flutterwave quoted or charged for `amount`."""
+    key = _key(currency, band_for(amount))
+    try:
+        fee = Decimal(str(fee))
+        previous = cache.get(key)
+        if previous and Decimal(previous['fee']) != fee:
+            logger.info("Transfer fee for %s band %s changed: %s -> %s",
+                        currency, band_for(amount), previous['fee'], fee)
+        cache.set(key, {'fee': str(fee), 'learned_at': time.time()}, KEEP_FOR)
+    except Exception as e:
+        logger.warning("Could not cache transfer fee: %s", e)
+
+
+def refresh(amount, fetch, currency='NGN'):
+    """Ask Flutterwave (via `fetch(amount)`) and learn the answer. Returns the fee or None."""
+    fee = fetch(amount)
+    if fee is not None:
+        learn(amount, fee, currency)
+    return fee
+
+
+def refresh_all(fetch, currency='NGN'):
+    """Refresh every band (the periodic warm-up). Returns how many were learned."""
+    learned = 0
+    for index, (upper, _) in enumerate(BANDS):
+        amount = upper if upper is not None else BANDS[index - 1][0] * 2
+        learned += refresh(amount, fetch, currency) is not None
+    return learned
+
+
+def _refresh_in_thread(amount, fetch, currency):
+    try:
+        refresh(amount, fetch, currency)
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(amount, fetch, currency='NGN'):
+    """Refresh `amount`'s band in the background, unless that is already happening."""
+    try:
+        if not cache.add(f"{_key(currency, band_for(amount))}:refreshing", 1, REFRESH_LOCK_TTL):
+            return
+    except Exception:
+        pass
+    from core.async_fallback import AsyncFallback
+    AsyncFallback.delay(_refresh_in_thread, amount, fetch, currency)
+
+
+def lookup(amount, fetch, currency='NGN'):
+    """
+    The transfer fee for `amount`, without waiting on the provider. `fetch`
+    is the live lookup used to refresh the band in the background.
+    """
+    try:
+        entry = cache.get(_key(currency, band_for(amount)))
+    except Exception as e:
+        logger.warning("Transfer fee cache unavailable (%s); using the fallback table", e)
+        entry = None
+
+    if entry is None or time.time() - entry['learned_at'] >= FRESH_FOR:
+        schedule_refresh(amount, fetch, currency)
+    if entry is not None:
+        return Decimal(entry['fee'])
+    return fallback_fee(amount)
@@ -0,0 +1,149 @@
+"""
+Bulk fulfilment of a paid order.
+
+Once a payment has been claimed (see PaymentService.process_successful_payment)
+the buyer is owed their library rows, each seller a commission record, and
+every ticket tier its sold count. This used to be done purchase by purchase —
+one INSERT per event ticket, a get_or_create per commission, an UPDATE per
+tier and a full earnings recompute per purchase — so a 20-ticket cart turned
+the webhook into 60+ round-trips while the provider waited for its 200.
+
+Here the whole order is loaded in one query and written in a fixed number of
+statements, whatever the cart size:
+
+    1 SELECT   purchases + product + owner + tier
+    1 INSERT   library rows            (bulk_create)
+    1 INSERT   commissions             (bulk_create)
+    n UPDATE   tier counters           (one per distinct increment, usually 1)
+    1 UPDATE   ticket holds -> converted
+    + the earnings ledger: 1 SELECT + 2 INSERT, then one UPDATE per seller
+    + the daily stats rollup: 1 INSERT, 1 SELECT ... FOR UPDATE, 1 UPDATE
+
+Everything runs in one transaction with the claim, so a crash half way leaves
+nothing half-granted: the claim rolls back with it and the provider's retry
+fulfils the order cleanly.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from products.models import TicketTier
+from . import inventory, ledger, seller_stats
+from .models import UserLibrary, SellerCommission
+
+logger = logging.getLogger(__name__)
+
+# Platform commission on every sale. The seller receives the rest.
+COMMISSION_RATE = Decimal('0.04')
+
+
+def split_commission(product_price):
+    """(commission, seller_payout) for a sale of `product_price`."""
+    commission = product_price * COMMISSION_RATE
+    return commission, product_price - commission
+
+
+def load_purchases(payment):
+    """
+    Every purchase on the payment with the rows fulfilment needs already
+    joined in, so nothing below triggers a lazy FK load.
+    """
+    return list(
+        payment.purchases.select_related(
+            'product__owner', 'selected_ticket_tier', 'payment__user',
+        ).order_by('id')
+    )
+
+
+def _library_rows(payment, purchases):
+    rows = []
+    for purchase in purchases:
+        if purchase.product.product_type == 'event':
+            # One library entry per ticket, so each shows up (and can be
+            # handed over) individually in the buyer's library.
+            rows.extend(
+                UserLibrary(user_id=payment.user_id, product_id=purchase.product_id,
+                            purchase=purchase, quantity=1)
+                for _ in range(purchase.quantity)
+            )
+        else:
+            rows.append(UserLibrary(user_id=payment.user_id, product_id=purchase.product_id,
+                                    purchase=purchase, quantity=purchase.quantity))
+    return rows
+
+
+def _commission_rows(purchases):
+    rows = []
+    for purchase in purchases:
+        commission, seller_payout = split_commission(purchase.total_price)
+        rows.append(SellerCommission(
+            seller_id=purchase.product.owner_id,
+            purchase=purchase,
+            product_price=purchase.total_price,
+            commission_amount=commission,
+            seller_payout=seller_payout,
+            status='pending',
+        ))
+    return rows
+
+
+def _increment_tiers(purchases):
+    """
+    Add each purchase's quantity to its tier's quantity_sold.
+
+    Purchases are summed per tier first, then tiers sharing the same increment
+    are updated together — one UPDATE per distinct increment rather than one
+    per purchase. F() keeps it race-free against concurrent orders.
+    """
+    per_tier = defaultdict(int)
+    for purchase in purchases:
+        if purchase.selected_ticket_tier_id:
+            per_tier[purchase.selected_ticket_tier_id] += purchase.quantity
+
+    by_increment = defaultdict(list)
+    for tier_id, qty in per_tier.items():
+        by_increment[qty].append(tier_id)
+
+    for qty, tier_ids in by_increment.items():
+        TicketTier.objects.filter(id__in=tier_ids).update(
+            quantity_sold=F('quantity_sold') + qty
+        )
+    return per_tier
+
+
+def fulfill_payment(payment, purchases=None):
+    """
+    Grant everything a claimed payment paid for, in one transaction.
+
+    Returns the purchases (with product, owner and tier loaded) so the caller
+    can send emails and issue tickets without querying them again. Raises on
+    failure; nothing is written in that case.
+    """
+    if purchases is None:
+        purchases = load_purchases(payment)
+    if not purchases:
+        return purchases
+
+    with transaction.atomic():
+        UserLibrary.objects.bulk_create(_library_rows(payment, purchases))
+        # ignore_conflicts: a commission may already exist for an old order
+        # (backfill_old_commissions); the unique (seller, purchase) pair makes
+        # the insert a no-op for those instead of an error.
+        commissions = _commission_rows(purchases)
+        SellerCommission.objects.bulk_create(commissions, ignore_conflicts=True)
+        _increment_tiers(purchases)
+        inventory.convert(payment, purchases)
+        posted = {entry.purchase_id for entry in ledger.post_sales(commissions)}
+        # Only sales the ledger took as new, so a re-run can't count them twice.
+        seller_stats.record_sales([c for c in commissions if c.purchase_id in posted], purchases)
+        sellers = {p.product.owner_id for p in purchases}
+
+    logger.info(
+        "Fulfilled payment %s: %d purchase(s), %d seller(s)",
+        payment.reference, len(purchases), len(sellers),
+    )
+    return purchases
@@ -0,0 +1,203 @@
+"""
+Ticket tier inventory: time-boxed holds against sharded capacity counters.
+
+quantity_sold only moves once a payment succeeds, so on its own it can't stop
+five hundred buyers checking out the last fifty seats at the same moment, and
+locking the TicketTier row to check it would serialise every checkout for the
+event. Instead:
+
+    * A tier's free capacity (quantity_available - quantity_sold - live
+      holds) is spread over SHARDS TicketInventoryShard rows, created the
+      first time someone checks out the tier.
+    * Checkout takes a TicketHold by decrementing a shard with a conditional
+      UPDATE ... WHERE available >= n. No reads, no row held beyond the
+      checkout transaction, and concurrent buyers mostly land on different
+      shards. If no single shard can cover the request it is assembled from
+      several; if the whole tier can't, checkout fails with "sold out".
+    * A successful payment converts its holds (the seats stay taken and
+      quantity_sold goes up in fulfilment). A payment the provider reports as
+      failed releases them, and release_expired() — run by the
+      release_expired_ticket_holds command / beat task, and opportunistically
+      when a tier looks sold out — hands back holds whose TTL ran out.
+
+Product.available_ticket_tiers reads the shard sums, so "sold out" reflects
+seats that are held as well as sold.
+"""
+
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from products.models import TicketTier
+from .models import TicketHold, TicketInventoryShard
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 8
+HOLD_TTL = timedelta(seconds=getattr(settings, 'TICKET_HOLD_TTL_SECONDS', 15 * 60))
+
+
+def _split(total, parts):
+    base, extra = divmod(max(total, 0), parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def _free_capacity(tier):
+    held = TicketHold.objects.filter(tier=tier, status=TicketHold.Status.HELD).aggregate(
+        n=Sum('quantity'))['n'] or 0
+    return tier.quantity_available - tier.quantity_sold - held
+
+
+def rebalance(tier_id):
+    """
+    (Re)build a tier's shards from its current capacity. Creates them the
+    first time; call again after quantity_available changes. Locks the tier
+    and its shards, so it waits for in-flight checkouts and they wait for it.
+    """
+    with transaction.atomic():
+        tier = TicketTier.objects.select_for_update().get(pk=tier_id)
+        shards = list(TicketInventoryShard.objects.select_for_update().filter(tier=tier).order_by('shard'))
+        amounts = _split(_free_capacity(tier), SHARDS)
+        if not shards:
+            TicketInventoryShard.objects.bulk_create([
+                TicketInventoryShard(tier=tier, shard=i, available=n) for i, n in enumerate(amounts)
+            ])
+            return
+        for shard, n in zip(shards, amounts):
+            if shard.available != n:
+                shard.available = n
+                shard.save(update_fields=['available'])
+
+
+def _take_from_shards(tier_id, quantity):
+    """
+    Decrement `quantity` from the tier's shards. Returns True on success;
+    on failure nothing is left taken.
+    """
+    order = list(range(SHARDS))
+    random.shuffle(order)
+    shards = TicketInventoryShard.objects.filter(tier_id=tier_id)
+
+    # Common case: one shard covers it.
+    for i in order:
+        if shards.filter(shard=i, available__gte=quantity).update(available=F('available') - quantity):
+            return True
+
+    # Otherwise gather it piecemeal from whatever the shards have left.
+    taken = {}
+    needed = quantity
+    for row in shards.filter(available__gt=0).values('shard', 'available'):
+        n = min(row['available'], needed)
+        if shards.filter(shard=row['shard'], available__gte=n).update(available=F('available') - n):
+            taken[row['shard']] = n
+            needed -= n
+            if not needed:
+                return True
+    for i, n in taken.items():
+        shards.filter(shard=i).update(available=F('available') + n)
+    return False
+
+
+def _give_back(tier_id, quantity):
+    TicketInventoryShard.objects.filter(tier_id=tier_id, shard=random.randrange(SHARDS)).update(
+        available=F('available') + quantity
+    )
+
+
+def hold(payment, items):
+    """
+    Hold seats for a checkout. `items` is [(tier, quantity)]. Call inside the
+    checkout transaction so a failure rolls the payment back with it; raises
+    ValidationError naming the tier if there aren't enough seats.
+    """
+    per_tier = defaultdict(int)
+    tiers = {}
+    for tier, quantity in items:
+        per_tier[tier.pk] += quantity
+        tiers[tier.pk] = tier
+
+    with transaction.atomic():
+        for tier_id, quantity in per_tier.items():
+            if _take_from_shards(tier_id, quantity):
+                continue
+            if not TicketInventoryShard.objects.filter(tier_id=tier_id).exists():
+                rebalance(tier_id)
+            elif not release_expired(tier_id=tier_id):
+                raise ValidationError(f"Not enough {tiers[tier_id].display_name} tickets left")
+            if not _take_from_shards(tier_id, quantity):
+                raise ValidationError(f"Not enough {tiers[tier_id].display_name} tickets left")
+
+        expires_at = timezone.now() + HOLD_TTL
+        TicketHold.objects.bulk_create([
+            TicketHold(payment=payment, tier_id=tier_id, quantity=quantity, expires_at=expires_at)
+            for tier_id, quantity in per_tier.items()
+        ])
+
+
+def convert(payment, purchases):
+    """
+    Turn a paid order's holds into sales. Run in the fulfilment transaction.
+
+    A hold that already expired was handed back to the pool, so those seats
+    are taken again here unconditionally — the buyer has paid and gets the
+    ticket even if that briefly oversells the tier.
+    """
+    converted = TicketHold.objects.filter(payment=payment, status=TicketHold.Status.HELD).update(
+        status=TicketHold.Status.CONVERTED
+    )
+    if converted == len({p.selected_ticket_tier_id for p in purchases if p.selected_ticket_tier_id}):
+        return
+
+    covered = set(
+        TicketHold.objects.filter(payment=payment, status=TicketHold.Status.CONVERTED)
+        .values_list('tier_id', flat=True)
+    )
+    for purchase in purchases:
+        tier_id = purchase.selected_ticket_tier_id
+        if tier_id and tier_id not in covered:
+            TicketInventoryShard.objects.filter(tier_id=tier_id, shard=random.randrange(SHARDS)).update(
+                available=F('available') - purchase.quantity
+            )
+
+
+def _release(holds):
+    """Release the given HELD holds; returns how many this call released."""
+    released = 0
+    for h in holds:
+        # Claim each hold so a concurrent sweeper or payment can't act on it too.
+        if TicketHold.objects.filter(pk=h['id'], status=TicketHold.Status.HELD).update(
+            status=TicketHold.Status.RELEASED
+        ):
+            _give_back(h['tier_id'], h['quantity'])
+            released += 1
+    return released
+
+
+def release_for_payment(payment):
+    """Hand back a payment's seats, e.g. once the provider says it failed."""
+    holds = TicketHold.objects.filter(payment=payment, status=TicketHold.Status.HELD).values(
+        'id', 'tier_id', 'quantity')
+    with transaction.atomic():
+        return _release(holds)
+
+
+def release_expired(tier_id=None, batch_size=500):
+    """Release holds past their expiry. Returns how many were released."""
+    holds = TicketHold.objects.filter(status=TicketHold.Status.HELD, expires_at__lte=timezone.now())
+    if tier_id is not None:
+        holds = holds.filter(tier_id=tier_id)
+    batch = list(holds.order_by('expires_at').values('id', 'tier_id', 'quantity')[:batch_size])
+    if not batch:
+        return 0
+    with transaction.atomic():
+        released = _release(batch)
+    if released:
+        logger.info("Released %d expired ticket hold(s)", released)
+    return released
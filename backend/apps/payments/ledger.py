@@ -0,0 +1,268 @@
+"""
+Seller earnings ledger.
+
+Every movement on a seller's balance is an EarningsLedgerEntry, and
+SellerEarnings is the running total of those entries. Each entry is a posting
+between two accounts, so the books always balance:
+
+    earning             buyer clearing      -> seller sales
+    commission          seller sales        -> platform revenue
+    payout_reservation  seller available    -> payouts in flight
+    payout_release      payouts in flight   -> seller available
+
+Only the seller side is stored per row (the counter-account is implied by the
+type) and amounts are always positive. When an entry is written its delta is
+applied to SellerEarnings with F() in the same transaction, so a balance read
+is one row no matter how many sales the seller has, and a sale costs a couple
+of statements instead of re-summing every commission and payout ever made.
+
+Entries are idempotent per source row: a purchase is posted once, and a payout
+is reserved while it is live and released once it has failed. The reconcile
+helpers at the bottom rebuild SellerEarnings from the ledger (posting anything
+the source rows have that the ledger is missing first); they back the
+reconcile_seller_earnings command and the admin "Recalculate" action. Sales
+and payouts from before the ledger were given their entries by migration
+0015_backfill_earnings_ledger.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import EarningsLedgerEntry, PayoutRequest, SellerCommission, SellerEarnings
+
+logger = logging.getLogger(__name__)
+
+Entry = EarningsLedgerEntry.EntryType
+
+# How one unit of each entry type moves the SellerEarnings columns.
+# available_balance always equals sales - commission - payouts.
+EFFECTS = {
+    Entry.EARNING: {'total_sales': 1, 'available_balance': 1},
+    Entry.COMMISSION: {'total_commission': 1, 'available_balance': -1},
+    Entry.PAYOUT_RESERVATION: {'total_payouts': 1, 'available_balance': -1},
+    Entry.PAYOUT_RELEASE: {'total_payouts': -1, 'available_balance': 1},
+}
+
+# Payout statuses that hold the seller's money. 'failed' releases it.
+RESERVED_PAYOUT_STATUSES = ('pending', 'processing', 'completed')
+
+
+def _deltas(entries):
+    """Sum the SellerEarnings column changes per seller for `entries`."""
+    per_seller = defaultdict(lambda: defaultdict(Decimal))
+    for entry in entries:
+        for column, sign in EFFECTS[entry.entry_type].items():
+            per_seller[entry.seller_id][column] += sign * entry.amount
+    return per_seller
+
+
+def _apply(entries):
+    """Write `entries` and move each seller's running totals by their deltas."""
+    EarningsLedgerEntry.objects.bulk_create(entries)
+    per_seller = _deltas(entries)
+    SellerEarnings.objects.bulk_create(
+        [SellerEarnings(seller_id=seller_id) for seller_id in per_seller],
+        ignore_conflicts=True,
+    )
+    for seller_id, columns in per_seller.items():
+        SellerEarnings.objects.filter(seller_id=seller_id).update(
+            **{column: F(column) + delta for column, delta in columns.items()}
+        )
+
+
+def post_sales(commissions):
+    """
+    Post the earning and commission entries for newly created commissions.
+
+    Takes SellerCommission instances (saved or not — only seller_id,
+    purchase_id, product_price and commission_amount are read). Purchases that
+    are already on the ledger are skipped, so calling this twice is harmless.
+    """
+    commissions = [c for c in commissions if c.purchase_id]
+    if not commissions:
+        return []
+
+    with transaction.atomic():
+        posted = set(
+            EarningsLedgerEntry.objects.filter(
+                entry_type=Entry.EARNING,
+                purchase_id__in=[c.purchase_id for c in commissions],
+            ).values_list('purchase_id', flat=True)
+        )
+        entries = []
+        for c in commissions:
+            if c.purchase_id in posted:
+                continue
+            posted.add(c.purchase_id)
+            entries.append(EarningsLedgerEntry(
+                seller_id=c.seller_id, entry_type=Entry.EARNING,
+                amount=c.product_price, purchase_id=c.purchase_id,
+            ))
+            entries.append(EarningsLedgerEntry(
+                seller_id=c.seller_id, entry_type=Entry.COMMISSION,
+                amount=c.commission_amount, purchase_id=c.purchase_id,
+            ))
+        if entries:
+            _apply(entries)
+    return entries
+
+
+def _payout_entries(payout_id, seller_id, amount, status, net):
+    """Entries that bring a payout with `net` live reservations in line with `status`."""
+    wanted = 0 if status == 'failed' else 1
+    if net == wanted:
+        return []
+    entry_type = Entry.PAYOUT_RESERVATION if wanted > net else Entry.PAYOUT_RELEASE
+    return [
+        EarningsLedgerEntry(seller_id=seller_id, entry_type=entry_type,
+                            amount=amount, payout_id=payout_id)
+        for _ in range(abs(wanted - net))
+    ]
+
+
+def _net_reservations():
+    return Count('ledger_entries', filter=Q(ledger_entries__entry_type=Entry.PAYOUT_RESERVATION)) - \
+        Count('ledger_entries', filter=Q(ledger_entries__entry_type=Entry.PAYOUT_RELEASE))
+
+
+def sync_payout(payout):
+    """
+    Reserve or release a payout's amount to match its current status.
+
+    Call after any status change. A live payout (pending, processing,
+    completed) holds exactly one reservation; a failed one holds none. The
+    payout row is locked while this runs so two concurrent callers cannot both
+    post the same reservation.
+    """
+    return sync_payouts([payout.pk])
+
+
+def sync_payouts(payout_ids):
+    """sync_payout for many payouts at once: one lock, one count, one write batch."""
+    with transaction.atomic():
+        rows = list(
+            PayoutRequest.objects.select_for_update()
+            .filter(pk__in=payout_ids)
+            .order_by('pk')
+            .values('pk', 'seller_id', 'amount', 'status')
+        )
+        if not rows:
+            return []
+        nets = dict(
+            PayoutRequest.objects.filter(pk__in=[row['pk'] for row in rows])
+            .annotate(net=_net_reservations())
+            .values_list('pk', 'net')
+        )
+        entries = [
+            entry
+            for row in rows
+            for entry in _payout_entries(
+                row['pk'], row['seller_id'], row['amount'], row['status'], nets.get(row['pk']) or 0
+            )
+        ]
+        if entries:
+            _apply(entries)
+    return entries
+
+
+# --- reconciliation --------------------------------------------------------
+
+def _backfill(seller_ids):
+    """
+    Post entries the source rows imply but the ledger lacks, without touching
+    SellerEarnings (the caller rebuilds it from the ledger afterwards).
+    """
+    entries = []
+    missing_sales = (
+        SellerCommission.objects.filter(seller_id__in=seller_ids)
+        .exclude(purchase__ledger_entries__entry_type=Entry.EARNING)
+        .values('seller_id', 'purchase_id', 'product_price', 'commission_amount')
+    )
+    for c in missing_sales.iterator(chunk_size=2000):
+        entries.append(EarningsLedgerEntry(
+            seller_id=c['seller_id'], entry_type=Entry.EARNING,
+            amount=c['product_price'], purchase_id=c['purchase_id'],
+        ))
+        entries.append(EarningsLedgerEntry(
+            seller_id=c['seller_id'], entry_type=Entry.COMMISSION,
+            amount=c['commission_amount'], purchase_id=c['purchase_id'],
+        ))
+
+    payouts = (
+        PayoutRequest.objects.filter(seller_id__in=seller_ids)
+        .annotate(net=_net_reservations())
+        .values('id', 'seller_id', 'amount', 'status', 'net')
+    )
+    for p in payouts.iterator(chunk_size=2000):
+        entries.extend(_payout_entries(p['id'], p['seller_id'], p['amount'], p['status'], p['net']))
+
+    EarningsLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def _ledger_totals(seller_ids):
+    """{seller_id: {column: value}} summed from the ledger."""
+    totals = defaultdict(lambda: dict.fromkeys(
+        ('total_sales', 'total_commission', 'total_payouts', 'available_balance'), Decimal('0')
+    ))
+    rows = (
+        EarningsLedgerEntry.objects.filter(seller_id__in=seller_ids)
+        .values('seller_id', 'entry_type')
+        .annotate(total=Sum('amount'))
+    )
+    for row in rows:
+        for column, sign in EFFECTS[row['entry_type']].items():
+            totals[row['seller_id']][column] += sign * row['total']
+    return totals
+
+
+def reconcile_sellers(seller_ids):
+    """
+    Make SellerEarnings for `seller_ids` exactly match the ledger.
+
+    Missing entries are posted first, then each seller's row is compared to
+    the ledger sums and corrected. Returns (entries_posted, drift) where drift
+    maps seller_id to {column: (stored, ledger)} for every column that was
+    wrong. Run inside the caller's transaction; the earnings rows are locked
+    so a concurrent sale cannot slip a delta in between the sum and the write.
+    """
+    seller_ids = list(seller_ids)
+    with transaction.atomic():
+        stored = {
+            e.seller_id: e
+            for e in SellerEarnings.objects.select_for_update().filter(seller_id__in=seller_ids)
+        }
+        posted = _backfill(seller_ids)
+        totals = _ledger_totals(seller_ids)
+
+        drift = {}
+        for seller_id in seller_ids:
+            if seller_id not in totals and seller_id not in stored:
+                continue
+            expected = totals[seller_id]
+            earnings = stored.get(seller_id) or SellerEarnings(seller_id=seller_id)
+            wrong = {
+                column: (getattr(earnings, column), value)
+                for column, value in expected.items()
+                if getattr(earnings, column) != value
+            }
+            if wrong or earnings.pk is None:
+                for column, value in expected.items():
+                    setattr(earnings, column, value)
+                earnings.save()
+            if wrong:
+                drift[seller_id] = wrong
+    return posted, drift
+
+
+def reconcile_seller(seller):
+    """Rebuild one seller's earnings from the ledger and return the row."""
+    posted, drift = reconcile_sellers([seller.pk])
+    if posted or drift:
+        logger.info("Reconciled earnings for seller %s: %d entries posted, drift %s",
+                    seller.pk, posted, drift.get(seller.pk))
+    return SellerEarnings.objects.get_or_create(seller=seller)[0]
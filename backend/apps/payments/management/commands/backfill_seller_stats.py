@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.payments import seller_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the sellers' daily sales rollup (SellerDailyStats) from their "
+        'commissions. Run once after deploying the rollup to bring historical '
+        'sales onto it; afterwards fulfilment keeps it current, and re-running '
+        'is safe whenever the figures look off.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the rows without writing them',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Sellers rebuilt per transaction (default 100)',
+        )
+        parser.add_argument(
+            '--seller',
+            type=int,
+            action='append',
+            help='Only rebuild this seller id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        chunk_size = max(1, options['chunk_size'])
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        sellers = User.objects.filter(commissions__isnull=False).distinct().order_by('id').values_list('id', flat=True)
+        if options['seller']:
+            sellers = sellers.filter(id__in=options['seller'])
+
+        rows = checked = 0
+        # Keyset over seller ids: each chunk is its own short transaction, so
+        # the command can be stopped and re-run without redoing finished work.
+        last_id = 0
+        while True:
+            chunk = list(sellers.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            rows += seller_stats.rebuild(chunk, dry_run=dry_run)
+            checked += len(chunk)
+            self.stdout.write(f"  up to seller {last_id}: {checked} sellers, {rows} days")
+
+        verb = 'Would write' if dry_run else 'Wrote'
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {checked} sellers. {verb} {rows} daily rows."))
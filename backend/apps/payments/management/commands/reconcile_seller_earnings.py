@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from apps.payments import ledger
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconcile seller earnings against the ledger. Posts ledger entries for '
+        'any commission or payout that is missing one, then corrects each '
+        "seller's SellerEarnings totals to match. Run once after deploying the "
+        'ledger to bring historical sales onto it; after that it should find '
+        'nothing to do.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing anything',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Sellers reconciled per transaction (default 200)',
+        )
+        parser.add_argument(
+            '--seller',
+            type=int,
+            action='append',
+            help='Only reconcile this seller id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        chunk_size = max(1, options['chunk_size'])
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        sellers = User.objects.filter(
+            Q(commissions__isnull=False) | Q(payout_requests__isnull=False) | Q(earnings__isnull=False)
+        ).distinct().order_by('id').values_list('id', flat=True)
+        if options['seller']:
+            sellers = sellers.filter(id__in=options['seller'])
+
+        total_posted = total_drift = checked = 0
+        # Keyset over seller ids so each chunk is its own short transaction and
+        # the command can be stopped and re-run without redoing finished work.
+        last_id = 0
+        while True:
+            chunk = list(sellers.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+
+            with transaction.atomic():
+                posted, drift = ledger.reconcile_sellers(chunk)
+                if dry_run:
+                    transaction.set_rollback(True)
+
+            checked += len(chunk)
+            total_posted += posted
+            total_drift += len(drift)
+            for seller_id, columns in drift.items():
+                detail = ', '.join(
+                    f"{column} {stored} -> {expected}" for column, (stored, expected) in columns.items()
+                )
+                self.stdout.write(f"  seller {seller_id}: {detail}")
+
+        verb = 'Would post' if dry_run else 'Posted'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} sellers. {verb} {total_posted} ledger entries; "
+                f"{total_drift} sellers had drifted totals."
+            )
+        )
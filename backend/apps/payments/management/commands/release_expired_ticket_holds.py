@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments import inventory
+
+
+class Command(BaseCommand):
+    help = (
+        'Release ticket holds whose checkout expired without payment, giving '
+        'the seats back to their tier. Schedule it (cron, or the beat entry '
+        'under Celery) or run it with --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep sweeping every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30.0,
+            help='Seconds between sweeps with --loop (default 30)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Holds released per sweep (default 500)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        try:
+            while True:
+                released = inventory.release_expired(batch_size=batch_size)
+                self.stdout.write(f"Released {released} expired hold(s)")
+                if not options['loop']:
+                    break
+                if released < batch_size:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopped'))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.payments import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Poll the payment outbox and run due post-payment steps (emails, '
+        'tickets, notifications). Needed when Celery is not running; with '
+        'Celery the drain-payment-outbox beat task does the same job.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain what is due now and exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep when nothing is due (default 5)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Payments processed per poll (default 100)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+
+        if options['once']:
+            processed = outbox.drain(batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Processed outbox for {processed} payment(s)"))
+            return
+
+        self.stdout.write(f"Polling payment outbox every {options['interval']}s (Ctrl+C to stop)")
+        try:
+            while True:
+                close_old_connections()
+                processed = outbox.drain(batch_size)
+                if processed:
+                    self.stdout.write(f"Processed outbox for {processed} payment(s)")
+                # A full batch means there is probably more waiting.
+                if processed < batch_size:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopped'))
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.payments import webhook_inbox
+from apps.payments.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Process stored payment webhooks: re-verify each with the provider and '
+        'fulfil it. Needed when Celery is not running; with Celery the '
+        'drain-webhook-inbox beat task does the same job. Also re-queues '
+        'events for replay with --replay / --replay-failed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain what is due now and exit',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Worker threads draining the inbox (default 2)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds a worker sleeps when nothing is due (default 2)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Events a worker claims per poll (default 50)',
+        )
+        parser.add_argument(
+            '--replay',
+            type=int,
+            action='append',
+            help='Re-queue this event id before draining (repeatable)',
+        )
+        parser.add_argument(
+            '--replay-failed',
+            action='store_true',
+            help='Re-queue every failed event before draining',
+        )
+
+    def _replay(self, options):
+        events = WebhookEvent.objects.none()
+        if options['replay']:
+            events = WebhookEvent.objects.filter(pk__in=options['replay'])
+        if options['replay_failed']:
+            events = events | WebhookEvent.objects.filter(status=WebhookEvent.Status.FAILED)
+        count = webhook_inbox.replay(events)
+        if count:
+            self.stdout.write(f"Re-queued {count} event(s)")
+
+    def _work(self, stop, batch_size, interval):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                processed = webhook_inbox.drain(batch_size)
+                # A full batch means there is probably more waiting.
+                if processed < batch_size:
+                    stop.wait(interval)
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        self._replay(options)
+
+        if options['once']:
+            total = 0
+            while True:
+                processed = webhook_inbox.drain(batch_size)
+                total += processed
+                if processed < batch_size:
+                    break
+            self.stdout.write(self.style.SUCCESS(f"Processed {total} webhook event(s)"))
+            return
+
+        workers = max(1, options['workers'])
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self._work, args=(stop, batch_size, options['interval']),
+                             name=f'webhook-inbox-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        self.stdout.write(f"Draining webhook inbox with {workers} worker(s) (Ctrl+C to stop)")
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.stdout.write(self.style.WARNING('Stopped'))
@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from apps.payments import payout_sync
+from apps.payments.models import PayoutRequest
+
+DEFAULT_CHECKPOINT = os.path.join(tempfile.gettempdir(), 'payout_sync_checkpoint.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile open payouts against Flutterwave's transfer statuses — the "
+        'bulk fix for missed transfer webhooks. Statuses are fetched '
+        'concurrently under a rate limit, each batch is settled in one '
+        'transaction and seller emails are queued in the background. Progress '
+        'is checkpointed after every batch; pass --resume to carry on after an '
+        'interrupted run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Fetch statuses and report what would change without writing anything',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=payout_sync.DEFAULT_WORKERS,
+            help=f'Concurrent status requests (default {payout_sync.DEFAULT_WORKERS})',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=payout_sync.DEFAULT_RATE,
+            help=f'Maximum status requests per second (default {payout_sync.DEFAULT_RATE})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=payout_sync.BATCH_SIZE,
+            help=f'Payouts settled per transaction (default {payout_sync.BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--payout',
+            type=int,
+            action='append',
+            help='Only reconcile this payout id (repeatable)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help=f'Checkpoint file (default {DEFAULT_CHECKPOINT})',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue from the checkpoint left by an interrupted run',
+        )
+
+    def _load_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            return int(saved['after_id']), saved.get('totals') or {}
+        except FileNotFoundError:
+            return 0, {}
+        except (ValueError, KeyError, TypeError):
+            self.stdout.write(self.style.WARNING(f'Ignoring unreadable checkpoint {path}'))
+            return 0, {}
+
+    def _save_checkpoint(self, path, after_id, totals):
+        # Write then rename, so a crash mid-write never leaves a torn file.
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'after_id': after_id, 'totals': totals}, f)
+        os.replace(tmp, path)
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        path = options['checkpoint']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        after_id, previous = self._load_checkpoint(path) if options['resume'] else (0, {})
+        if after_id:
+            self.stdout.write(f'Resuming after payout {after_id}')
+
+        queryset = PayoutRequest.objects.all()
+        if options['payout']:
+            queryset = queryset.filter(pk__in=options['payout'])
+
+        def on_batch(last_id, totals):
+            if not dry_run:
+                self._save_checkpoint(path, last_id, _merge(previous, totals))
+            self.stdout.write(
+                f"  up to payout {last_id}: {totals['checked']} checked, "
+                f"{totals['completed']} completed, {totals['failed']} failed"
+            )
+
+        totals = payout_sync.reconcile(
+            queryset,
+            workers=options['workers'],
+            rate=options['rate'],
+            batch_size=max(1, options['batch_size']),
+            after_id=after_id,
+            on_batch=on_batch,
+            dry_run=dry_run,
+        )
+        totals = _merge(previous, totals)
+
+        if not dry_run and os.path.exists(path):
+            os.remove(path)
+
+        verb = 'Would settle' if dry_run else 'Settled'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {totals['checked']} payouts. {verb} {totals['completed']} completed and "
+                f"{totals['failed']} failed; {totals['unchanged']} still processing, "
+                f"{totals['errors']} could not be fetched."
+            )
+        )
+
+
+def _merge(previous, totals):
+    return {key: previous.get(key, 0) + value for key, value in totals.items()}
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_purchase_selected_ticket_tier'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarningsLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('earning', 'Earning'), ('commission', 'Commission'), ('payout_reservation', 'Payout reservation'), ('payout_release', 'Payout release')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payout', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='payments.payoutrequest')),
+                ('purchase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='payments.purchase')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'created_at'], name='payments_ea_seller__996d14_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('purchase__isnull', False)), fields=('entry_type', 'purchase'), name='unique_ledger_entry_per_purchase')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_earnings_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentOutboxTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.CharField(choices=[('receipt_email', 'Receipt email'), ('seller_email', 'Seller email'), ('event_tickets', 'Event tickets'), ('ticket_email', 'Ticket email'), ('buyer_notification', 'Buyer notification'), ('seller_notifications', 'Seller notifications')], max_length=30)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_tasks', to='payments.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='payments_pa_status_0b3fa6_idx')],
+                'unique_together': {('payment', 'step')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_payment_outbox'),
+        ('products', '0014_product_is_published_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Held'), ('converted', 'Converted to sale'), ('released', 'Released')], default='held', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_holds', to='payments.payment')),
+                ('tier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='products.tickettier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='payments_ti_status_85cf08_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketInventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('available', models.IntegerField(default=0)),
+                ('tier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_shards', to='products.tickettier')),
+            ],
+            options={
+                'unique_together': {('tier', 'shard')},
+            },
+        ),
+    ]
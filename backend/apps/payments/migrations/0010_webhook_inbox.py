@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_ticket_inventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('paystack', 'Paystack'), ('flutterwave', 'Flutterwave')], max_length=20)),
+                ('kind', models.CharField(choices=[('charge', 'Charge'), ('transfer', 'Transfer')], max_length=20)),
+                ('event_id', models.CharField(blank=True, default='', max_length=100)),
+                ('reference', models.CharField(db_index=True, max_length=100)),
+                ('dedupe_key', models.CharField(max_length=255, unique=True)),
+                ('body', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('outcome', models.CharField(blank=True, default='', max_length=200)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('deliveries', models.PositiveIntegerField(default=1)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='payments_we_status_d66c03_idx'), models.Index(fields=['provider', 'event_id'], name='payments_we_provide_139ee0_idx')],
+            },
+        ),
+    ]
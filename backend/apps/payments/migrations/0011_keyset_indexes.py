@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_webhook_inbox'),
+        ('products', '0014_product_is_published_review'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payments_pa_user_id_2473a7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userlibrary',
+            index=models.Index(fields=['user', '-added_at', '-id'], name='payments_us_user_id_97b5b6_idx'),
+        ),
+    ]
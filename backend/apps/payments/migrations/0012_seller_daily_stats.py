@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('net_payout', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('buyers', models.JSONField(default=list)),
+                ('buyer_ips', models.JSONField(default=list)),
+                ('products', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('seller', 'date')},
+            },
+        ),
+    ]
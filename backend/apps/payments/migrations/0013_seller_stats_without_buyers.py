@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_seller_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='sellerdailystats',
+            name='buyer_ips',
+        ),
+        migrations.RemoveField(
+            model_name='sellerdailystats',
+            name='buyers',
+        ),
+        migrations.AddIndex(
+            model_name='sellercommission',
+            index=models.Index(fields=['seller', 'created_at'], name='payments_se_seller__421668_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:43
+
+from django.db import migrations, models
+
+
+def queue_pending_notifications(apps, schema_editor):
+    # The ticket notification used to go out with the ticket email. Orders
+    # whose email hasn't been sent yet still need it, now as its own step.
+    PaymentOutboxTask = apps.get_model('payments', 'PaymentOutboxTask')
+    waiting = (
+        PaymentOutboxTask.objects.filter(step='ticket_email')
+        .exclude(status='done').values_list('payment_id', flat=True)
+    )
+    PaymentOutboxTask.objects.bulk_create(
+        [PaymentOutboxTask(payment_id=pk, step='ticket_notification') for pk in waiting],
+        ignore_conflicts=True,
+    )
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_seller_stats_without_buyers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentoutboxtask',
+            name='step',
+            field=models.CharField(choices=[('receipt_email', 'Receipt email'), ('seller_email', 'Seller email'), ('event_tickets', 'Event tickets'), ('ticket_email', 'Ticket email'), ('ticket_notification', 'Ticket notification'), ('buyer_notification', 'Buyer notification'), ('seller_notifications', 'Seller notifications')], max_length=30),
+        ),
+        migrations.RunPython(queue_pending_notifications, noop),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Post the ledger entries for sales and payouts made before the ledger.
+
+    Their amounts are already in SellerEarnings (update_seller_earnings summed
+    the commissions and the live payouts), so only the entries are written and
+    the totals are left as they are. Without them a pre-ledger payout that
+    moves on would be reserved a second time, or never released when it fails.
+    Rows that already have their entries are skipped, so this is safe to run
+    on a database where the ledger has been live for a while.
+    """
+    EarningsLedgerEntry = apps.get_model('payments', 'EarningsLedgerEntry')
+    PayoutRequest = apps.get_model('payments', 'PayoutRequest')
+    SellerCommission = apps.get_model('payments', 'SellerCommission')
+
+    entries = []
+    missing_sales = (
+        SellerCommission.objects.filter(purchase__isnull=False)
+        .exclude(purchase__ledger_entries__entry_type='earning')
+        .values('seller_id', 'purchase_id', 'product_price', 'commission_amount')
+    )
+    for c in missing_sales.iterator(chunk_size=2000):
+        entries.append(EarningsLedgerEntry(
+            seller_id=c['seller_id'], entry_type='earning',
+            amount=c['product_price'], purchase_id=c['purchase_id'],
+        ))
+        entries.append(EarningsLedgerEntry(
+            seller_id=c['seller_id'], entry_type='commission',
+            amount=c['commission_amount'], purchase_id=c['purchase_id'],
+        ))
+
+    # A live payout holds one reservation; a failed one holds none, which is
+    # what a payout without entries already has.
+    unreserved = (
+        PayoutRequest.objects.filter(status__in=('pending', 'processing', 'completed'))
+        .annotate(net=Count('ledger_entries', filter=Q(ledger_entries__entry_type='payout_reservation'))
+                  - Count('ledger_entries', filter=Q(ledger_entries__entry_type='payout_release')))
+        .filter(net=0)
+        .values('id', 'seller_id', 'amount')
+    )
+    for p in unreserved.iterator(chunk_size=2000):
+        entries.append(EarningsLedgerEntry(
+            seller_id=p['seller_id'], entry_type='payout_reservation',
+            amount=p['amount'], payout_id=p['id'],
+        ))
+
+    EarningsLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0014_outbox_ticket_notification_step'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger, noop),
+    ]
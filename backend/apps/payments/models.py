@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
 
 class Payment(models.Model):
@@ -30,6 +31,10 @@ class Payment(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.reference} - {self.status}"
 
+    class Meta:
+        # Payment history pages by (created_at, id) per user.
+        indexes = [models.Index(fields=['user', '-created_at', '-id'])]
+
     @property
     def transaction_id(self):
         """Get the appropriate transaction ID based on payment provider"""
@@ -64,11 +69,15 @@ class UserLibrary(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.product.title}"
 
+    class Meta:
+        # The library pages by (added_at, id) per user.
+        indexes = [models.Index(fields=['user', '-added_at', '-id'])]
+
     def get_event_tickets(self):
         """Get the actual FastEventTicket objects for event products"""
         if self.product.product_type == 'event':
-            from apps.events.fast_models import FastEventTicket
-            return FastEventTicket.objects.filter(purchase=self.purchase)
+            # Through the relation, so a prefetch of purchase__fast_tickets is used.
+            return self.purchase.fast_tickets.all()
         return []
 
 class SellerCommission(models.Model):
@@ -91,6 +100,10 @@ class SellerCommission(models.Model):
 
     class Meta:
         unique_together = ['seller', 'purchase']
+        indexes = [
+            # Unique customers over a dashboard's date range (seller_stats.customers).
+            models.Index(fields=['seller', 'created_at']),
+        ]
 
 class PayoutRequest(models.Model):
     """Track seller payout requests"""
@@ -134,4 +147,192 @@ class SellerEarnings(models.Model):
     def calculate_available_balance(self):
         """Calculate available balance for payout"""
         self.available_balance = self.total_sales - self.total_commission - self.total_payouts
-        return self.available_balance 
\ No newline at end of file
+        return self.available_balance
+
+
+class EarningsLedgerEntry(models.Model):
+    """
+    One movement on a seller's balance. Append-only: rows are never edited or
+    deleted, corrections are new entries. SellerEarnings is the running total
+    of these, kept current by applying each entry's delta as it is written
+    (see apps.payments.ledger), so reading a balance never has to walk the
+    seller's history.
+    """
+    class EntryType(models.TextChoices):
+        EARNING = 'earning', 'Earning'
+        COMMISSION = 'commission', 'Commission'
+        PAYOUT_RESERVATION = 'payout_reservation', 'Payout reservation'
+        PAYOUT_RELEASE = 'payout_release', 'Payout release'
+
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ledger_entries')
+    entry_type = models.CharField(max_length=20, choices=EntryType.choices)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # always positive; entry_type gives the direction
+    purchase = models.ForeignKey(Purchase, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    payout = models.ForeignKey(PayoutRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.seller.email} - {self.entry_type} ₦{self.amount}"
+
+    class Meta:
+        indexes = [models.Index(fields=['seller', 'created_at'])]
+        constraints = [
+            # A sale is posted once. Payout entries are not unique: a payout
+            # that failed and was re-opened reserves again.
+            models.UniqueConstraint(
+                fields=['entry_type', 'purchase'],
+                condition=models.Q(purchase__isnull=False),
+                name='unique_ledger_entry_per_purchase',
+            ),
+        ]
+
+
+class PaymentOutboxTask(models.Model):
+    """
+    One piece of post-payment work (an email, the tickets, a notification)
+    owed for a paid order. Rows are written in the same transaction as the
+    payment claim, so the work can't be lost if the process dies after the
+    commit, and are drained afterwards by apps.payments.outbox — by a Celery
+    worker when one is running, otherwise by run_payment_outbox.
+    """
+    class Step(models.TextChoices):
+        RECEIPT_EMAIL = 'receipt_email', 'Receipt email'
+        SELLER_EMAIL = 'seller_email', 'Seller email'
+        EVENT_TICKETS = 'event_tickets', 'Event tickets'
+        TICKET_EMAIL = 'ticket_email', 'Ticket email'
+        TICKET_NOTIFICATION = 'ticket_notification', 'Ticket notification'
+        BUYER_NOTIFICATION = 'buyer_notification', 'Buyer notification'
+        SELLER_NOTIFICATIONS = 'seller_notifications', 'Seller notifications'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='outbox_tasks')
+    step = models.CharField(max_length=30, choices=Step.choices)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    available_at = models.DateTimeField(default=timezone.now)  # not retried before this
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.payment.reference} - {self.step} ({self.status})"
+
+    class Meta:
+        unique_together = ['payment', 'step']
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+
+class WebhookEvent(models.Model):
+    """
+    A signed provider webhook, stored on arrival and acted on afterwards by
+    apps.payments.webhook_inbox. The webhook view only verifies the signature
+    and inserts this row, so the provider gets its 200 at once; dedupe_key
+    (provider, event id and reference) absorbs the provider's retries.
+    """
+    class Kind(models.TextChoices):
+        CHARGE = 'charge', 'Charge'
+        TRANSFER = 'transfer', 'Transfer'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    provider = models.CharField(max_length=20, choices=Payment.PaymentProvider.choices)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    event_id = models.CharField(max_length=100, blank=True, default='')
+    reference = models.CharField(max_length=100, db_index=True)
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    body = models.TextField()  # the raw request body, exactly as signed
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    outcome = models.CharField(max_length=200, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    deliveries = models.PositiveIntegerField(default=1)  # including retries we deduped
+    last_error = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)  # not retried before this
+    started_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.provider} {self.kind} {self.reference} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['provider', 'event_id']),
+        ]
+
+
+class TicketInventoryShard(models.Model):
+    """
+    A slice of a ticket tier's unsold, unheld seats.
+
+    A tier's free capacity is split across a handful of these rows so that
+    concurrent checkouts for one event decrement different rows instead of
+    queueing on a single counter. The tier's free count is the sum of its
+    shards. See apps.payments.inventory.
+    """
+    tier = models.ForeignKey('products.TicketTier', on_delete=models.CASCADE, related_name='inventory_shards')
+    shard = models.PositiveSmallIntegerField()
+    # Can dip below zero on one shard when a payment lands after its hold
+    # expired; the tier-wide sum is what matters.
+    available = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.tier} shard {self.shard}: {self.available}"
+
+    class Meta:
+        unique_together = ['tier', 'shard']
+
+
+class TicketHold(models.Model):
+    """Seats set aside for a checkout until it is paid or the hold expires."""
+    class Status(models.TextChoices):
+        HELD = 'held', 'Held'
+        CONVERTED = 'converted', 'Converted to sale'
+        RELEASED = 'released', 'Released'
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='ticket_holds')
+    tier = models.ForeignKey('products.TicketTier', on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.HELD)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.payment.reference} - {self.quantity} x {self.tier} ({self.status})"
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+
+class SellerDailyStats(models.Model):
+    """
+    One seller's sales for one (local) day, rolled up from their commissions
+    so the analytics dashboards sum a few hundred rows at most instead of
+    aggregating every purchase. Kept current by fulfilment (seller_stats) and
+    rebuilt by `manage.py backfill_seller_stats`.
+    """
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+    commission = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    net_payout = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # {product_id: {"sales": n, "revenue": "123.00"}}
+    products = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.seller.email} - {self.date}: ₦{self.revenue} ({self.orders} orders)"
+
+    class Meta:
+        unique_together = ['seller', 'date']
@@ -0,0 +1,307 @@
+"""
+Post-payment outbox.
+
+Everything a paid order triggers beyond the money itself — receipt and seller
+emails, rendering the event tickets and mailing them, in-app notifications —
+used to run inline in process_successful_payment, so the provider's webhook
+waited on SMTP and PIL before it got its 200. Now the claim transaction only
+inserts one PaymentOutboxTask row per step (see enqueue) and the work runs
+after the commit:
+
+    * with a task queue (Celery, or the database queue: see
+      apps.taskqueue) the commit hands the payment to the
+      apps.payments.tasks.process_payment_outbox task, and a beat entry
+      drains anything left over;
+    * without one, the commit starts a background thread for the payment and
+      `manage.py run_payment_outbox` polls the table for retries and for
+      anything a restart interrupted.
+
+Each step is tracked on its own row: it is claimed with a conditional UPDATE
+(so two workers never run it together), retried with exponential backoff on
+failure, and marked done once it succeeds, so a retry never re-sends an email
+that already went out. Steps must still be safe to re-run after a crash
+between "did the work" and "marked done" — the ticket step only creates the
+tickets that are missing for that reason.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.taskqueue.decorators import queue_available
+
+from .models import Payment, PaymentOutboxTask
+
+logger = logging.getLogger(__name__)
+
+Step = PaymentOutboxTask.Step
+Status = PaymentOutboxTask.Status
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 30          # seconds; doubled per attempt
+RETRY_MAX_DELAY = 60 * 60
+# A task still 'running' after this long belongs to a worker that died.
+STALE_AFTER = timedelta(minutes=15)
+
+# Run order within a payment. A step listed in DEPENDS_ON waits until the
+# step it names has completed.
+STEP_ORDER = [
+    Step.EVENT_TICKETS,
+    Step.TICKET_EMAIL,
+    Step.TICKET_NOTIFICATION,
+    Step.RECEIPT_EMAIL,
+    Step.SELLER_EMAIL,
+    Step.BUYER_NOTIFICATION,
+    Step.SELLER_NOTIFICATIONS,
+]
+DEPENDS_ON = {
+    Step.TICKET_EMAIL: Step.EVENT_TICKETS,
+    Step.TICKET_NOTIFICATION: Step.EVENT_TICKETS,
+}
+
+
+class StepFailed(Exception):
+    """A step ran but did not do its job (e.g. the email backend refused)."""
+
+
+# --- step handlers ---------------------------------------------------------
+# Each takes the payment and its purchases (product, owner and tier loaded)
+# and raises on failure.
+
+def _receipt_email(payment, purchases):
+    from users.utils import send_purchase_receipt_email
+    if not send_purchase_receipt_email(payment, purchases):
+        raise StepFailed('receipt email was not sent')
+
+
+def _seller_email(payment, purchases):
+    from users.utils import send_seller_notification_email
+    if not send_seller_notification_email(payment, purchases):
+        raise StepFailed('seller email was not sent')
+
+
+def _event_tickets(payment, purchases):
+    """Create whichever tickets each event purchase is still missing."""
+    from apps.events.fast_models import FastEventTicket
+    from . import progress
+    for purchase in purchases:
+        if purchase.product.product_type != 'event':
+            continue
+        missing = purchase.quantity - FastEventTicket.objects.filter(purchase=purchase).count()
+        # Created and rendered as one batch.
+        for ticket in FastEventTicket.issue(purchase, payment.user, missing):
+            progress.ticket_rendered(payment, ticket)
+
+
+def _tickets_by_event(payment):
+    from apps.events.fast_models import FastEventTicket
+    grouped = {}
+    tickets = (
+        FastEventTicket.objects.filter(purchase__payment=payment)
+        .select_related('event', 'buyer', 'purchase__selected_ticket_tier__category').order_by('id')
+    )
+    for ticket in tickets:
+        grouped.setdefault(ticket.event_id, (ticket.event, []))[1].append(ticket)
+    return grouped.values()
+
+
+def _ticket_email(payment, purchases):
+    from users.utils import send_event_ticket_email
+    from apps.events import ticket_images
+    for product, tickets in _tickets_by_event(payment):
+        # Tickets created without an image (TICKET_IMAGES = 'lazy') are
+        # rendered here, as one batch, rather than one by one while attaching.
+        ticket_images.materialize(tickets)
+        if not send_event_ticket_email(payment.user, product, tickets):
+            raise StepFailed(f'ticket email for {product.title} was not sent')
+
+
+def _ticket_notification(payment, purchases):
+    # A step of its own: if it failed inside the email step, the retry would
+    # mail the tickets (attachments and all) a second time.
+    from apps.notifications.services import NotificationService
+    for product, tickets in _tickets_by_event(payment):
+        NotificationService.send_event_ticket_notification(payment.user, product, tickets)
+
+
+def _buyer_notification(payment, purchases):
+    from apps.notifications.services import NotificationService
+    if NotificationService.send_payment_notification(payment, payment.user) is None:
+        raise StepFailed('payment notification was not created')
+
+
+def _seller_notifications(payment, purchases):
+    from apps.notifications.services import NotificationService
+    for purchase in purchases:
+        NotificationService.send_order_notification(purchase, purchase.product.owner)
+
+
+HANDLERS = {
+    Step.RECEIPT_EMAIL: _receipt_email,
+    Step.SELLER_EMAIL: _seller_email,
+    Step.EVENT_TICKETS: _event_tickets,
+    Step.TICKET_EMAIL: _ticket_email,
+    Step.TICKET_NOTIFICATION: _ticket_notification,
+    Step.BUYER_NOTIFICATION: _buyer_notification,
+    Step.SELLER_NOTIFICATIONS: _seller_notifications,
+}
+
+
+# --- enqueue / dispatch ----------------------------------------------------
+
+def steps_for(purchases):
+    steps = [Step.RECEIPT_EMAIL, Step.SELLER_EMAIL, Step.BUYER_NOTIFICATION, Step.SELLER_NOTIFICATIONS]
+    if any(p.product.product_type == 'event' for p in purchases):
+        steps += [Step.EVENT_TICKETS, Step.TICKET_EMAIL, Step.TICKET_NOTIFICATION]
+    return steps
+
+
+def enqueue(payment, purchases):
+    """
+    Insert the outbox rows for a freshly claimed payment. Call inside the
+    claim transaction; the work is kicked off once it commits.
+    """
+    PaymentOutboxTask.objects.bulk_create(
+        [PaymentOutboxTask(payment=payment, step=step) for step in steps_for(purchases)],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(lambda: dispatch(payment.pk))
+
+
+def _run_in_thread(payment_id):
+    try:
+        process_payment(payment_id)
+    finally:
+        close_old_connections()
+
+
+def dispatch(payment_id):
+    """Start working through a payment's outbox without blocking the caller."""
+    if queue_available():
+        try:
+            from .tasks import process_payment_outbox
+            process_payment_outbox.delay(payment_id)
+            return
+        except Exception as e:
+            logger.warning("Could not queue outbox for payment %s on the task queue, using a thread: %s",
+                           payment_id, e)
+    # No broker: run it in the background here. If the process dies first the
+    # rows are still pending and run_payment_outbox picks them up.
+    from core.async_fallback import AsyncFallback
+    AsyncFallback.delay(_run_in_thread, payment_id)
+
+
+# --- processing ------------------------------------------------------------
+
+def _claimable(now):
+    return Q(status=Status.PENDING, available_at__lte=now) | Q(
+        status=Status.RUNNING, started_at__lt=now - STALE_AFTER
+    )
+
+
+def _claim(task, now):
+    """Take the task for this worker. False if someone else has it or it isn't due."""
+    return PaymentOutboxTask.objects.filter(_claimable(now), pk=task.pk).update(
+        status=Status.RUNNING, started_at=now, attempts=F('attempts') + 1,
+    ) == 1
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def _finish(task, error=None):
+    now = timezone.now()
+    if error is None:
+        PaymentOutboxTask.objects.filter(pk=task.pk).update(
+            status=Status.DONE, completed_at=now, last_error=None,
+        )
+        return Status.DONE
+
+    attempts = PaymentOutboxTask.objects.filter(pk=task.pk).values_list('attempts', flat=True).first() or 1
+    status = Status.FAILED if attempts >= MAX_ATTEMPTS else Status.PENDING
+    PaymentOutboxTask.objects.filter(pk=task.pk).update(
+        status=status, last_error=str(error)[:2000], available_at=now + retry_delay(attempts),
+    )
+    return status
+
+
+def _wait_for(task, blocker):
+    """Hold `task` back until its prerequisite has run (or give up with it)."""
+    blocker.refresh_from_db(fields=['status', 'available_at'])
+    waiting = PaymentOutboxTask.objects.filter(pk=task.pk, status=Status.PENDING)
+    if blocker.status == Status.FAILED:
+        waiting.update(status=Status.FAILED, last_error=f'{blocker.step} failed')
+    else:
+        waiting.update(available_at=max(blocker.available_at, timezone.now()))
+
+
+def process_payment(payment_id):
+    """
+    Run every due step for one payment, in STEP_ORDER. Returns
+    {step: resulting status} for the steps this call ran.
+    """
+    from .fulfillment import load_purchases
+
+    now = timezone.now()
+    tasks = {
+        t.step: t
+        for t in PaymentOutboxTask.objects.filter(payment_id=payment_id).exclude(status=Status.DONE)
+    }
+    if not tasks:
+        return {}
+
+    payment = Payment.objects.select_related('user').filter(pk=payment_id).first()
+    if payment is None:
+        return {}
+    purchases = load_purchases(payment)
+
+    results = {}
+    for step in STEP_ORDER:
+        task = tasks.get(step)
+        if task is None:
+            continue
+        blocker = tasks.get(DEPENDS_ON.get(step))
+        if blocker is not None and results.get(blocker.step) != Status.DONE:
+            _wait_for(task, blocker)
+            continue
+        if not _claim(task, now):
+            continue
+        try:
+            HANDLERS[step](payment, purchases)
+        except Exception as e:
+            logger.exception("Outbox step %s failed for payment %s", step, payment.reference)
+            results[step] = _finish(task, e)
+        else:
+            results[step] = _finish(task)
+    return results
+
+
+def drain(batch_size=100):
+    """
+    Process up to `batch_size` payments with due outbox work. Used by the
+    polling worker and the periodic Celery task. Returns the number of
+    payments looked at.
+    """
+    due = (
+        PaymentOutboxTask.objects.filter(_claimable(timezone.now()))
+        .order_by('available_at')
+        .values_list('payment_id', flat=True)[:batch_size * len(STEP_ORDER)]
+    )
+    payment_ids = list(dict.fromkeys(due))[:batch_size]  # oldest first, each once
+    for payment_id in payment_ids:
+        try:
+            process_payment(payment_id)
+        except Exception as e:
+            logger.exception("Outbox drain failed for payment %s: %s", payment_id, e)
+    return len(payment_ids)
+
+
+def replay(queryset):
+    """Make failed (or done) steps run again on the next drain."""
+    return queryset.exclude(status=Status.RUNNING).update(
+        status=Status.PENDING, attempts=0, available_at=timezone.now(), last_error=None,
+    )
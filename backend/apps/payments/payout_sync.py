@@ -0,0 +1,221 @@
+"""
+Bulk payout reconciliation against Flutterwave.
+
+sync_payout_status used to settle one payout per call: a blocking status
+request, a full earnings recompute and an email, all inline. The admin action
+looped it over the selection, so clearing a few hundred 'processing' payouts
+after a missed-webhook outage held an admin request open for minutes.
+
+reconcile() works in batches of payouts, keyset-ordered by id:
+
+    * statuses are fetched concurrently on a bounded thread pool, every
+      request first taking a token from a shared RateLimiter so a burst never
+      exceeds what the provider allows. The threads only do HTTP; all
+      database work stays on the calling thread;
+    * the batch's transitions are written together: one locked read, one
+      bulk_update and one ledger.sync_payouts() for the whole batch;
+    * the seller emails are queued once the batch commits (the task queue when
+      there is one, a background thread otherwise) instead of being sent inline;
+    * after each batch `on_batch(last_id, totals)` is called, so a caller —
+      the sync_payout_statuses command — can checkpoint and later resume
+      from `after_id` without re-asking the provider about payouts it has
+      already settled.
+
+A payout that is still NEW/PENDING at Flutterwave, or whose status could not
+be fetched, is left 'processing' for the next run.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.taskqueue.decorators import queue_available
+
+from . import ledger
+from .models import PayoutRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 10              # status requests per second
+BATCH_SIZE = 50
+
+OPEN_STATUSES = ('pending', 'processing')
+
+
+class RateLimiter:
+    """Token bucket shared by the fetch threads: `rate` calls per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def classify(data):
+    """(new status, failure reason) for a transfer's `data`, or None if it isn't final yet."""
+    flw_status = str((data or {}).get('status', '')).upper()
+    if flw_status == 'SUCCESSFUL':
+        return 'completed', None
+    if flw_status == 'FAILED':
+        return 'failed', data.get('complete_message') or 'Transfer failed at Flutterwave'
+    return None
+
+
+def fetch_status(service, payout, limiter=None):
+    """
+    The transfer's `data` from Flutterwave, or None if it couldn't be fetched
+    — including an HTTP error answer (a 4xx for an unknown transfer, bad
+    credentials), which carries no status and must not read as "unchanged".
+    """
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        resp = service.http.get(
+            f"/transfers/{payout.flutterwave_transfer_id}", 'transfer_status',
+            headers=service._get_headers(),
+        )
+        if not resp.ok:
+            logger.error("Sync payout %s failed: HTTP %s", payout.pk, resp.status_code)
+            return None
+        return (resp.json() or {}).get('data') or {}
+    except Exception as e:
+        logger.error("Sync payout %s failed: %s", payout.pk, e)
+        return None
+
+
+def apply(results, dry_run=False):
+    """
+    Settle payouts from fetched transfer data, {payout_id: data}, in one
+    transaction. Payouts that are already final are skipped. Returns
+    {'completed': [ids], 'failed': [ids]} for the ones this call moved.
+    """
+    outcomes = {pk: classify(data) for pk, data in results.items()}
+    outcomes = {pk: outcome for pk, outcome in outcomes.items() if outcome}
+    moved = {'completed': [], 'failed': []}
+    if not outcomes:
+        return moved
+
+    now = timezone.now()
+    with transaction.atomic():
+        payouts = list(
+            PayoutRequest.objects.select_for_update()
+            .filter(pk__in=outcomes, status__in=OPEN_STATUSES)
+            .order_by('pk')
+        )
+        for payout in payouts:
+            payout.status, reason = outcomes[payout.pk]
+            if payout.status == 'completed':
+                payout.processed_at = payout.processed_at or now
+            else:
+                payout.failure_reason = reason
+            moved[payout.status].append(payout.pk)
+        if payouts:
+            PayoutRequest.objects.bulk_update(payouts, ['status', 'processed_at', 'failure_reason'])
+            ledger.sync_payouts([p.pk for p in payouts])  # releases failed reservations
+            ids = [p.pk for p in payouts]
+            transaction.on_commit(lambda: queue_emails(ids))
+        if dry_run:
+            transaction.set_rollback(True)
+    return moved
+
+
+# --- seller emails ---------------------------------------------------------
+
+def send_emails(payout_ids):
+    """Email each seller about their payout's current (final) status."""
+    from users.utils import send_payout_completed_email, send_payout_failed_email
+    senders = {'completed': send_payout_completed_email, 'failed': send_payout_failed_email}
+    sent = 0
+    for payout in PayoutRequest.objects.filter(pk__in=payout_ids).select_related('seller', 'bank_details'):
+        sender = senders.get(payout.status)
+        if sender is None:
+            continue
+        try:
+            sent += bool(sender(payout))
+        except Exception as e:
+            logger.error("Payout %s email failed for %s: %s", payout.status, payout.pk, e)
+    return sent
+
+
+def _send_in_thread(payout_ids):
+    try:
+        send_emails(payout_ids)
+    finally:
+        close_old_connections()
+
+
+def queue_emails(payout_ids):
+    """Send the emails in the background: on the task queue if there is one, else a thread."""
+    if queue_available():
+        try:
+            from .tasks import send_payout_status_emails
+            send_payout_status_emails.delay(list(payout_ids))
+            return
+        except Exception as e:
+            logger.warning("Could not queue payout emails on the task queue, using a thread: %s", e)
+    from core.async_fallback import AsyncFallback
+    AsyncFallback.delay(_send_in_thread, list(payout_ids))
+
+
+# --- the engine ------------------------------------------------------------
+
+def reconcile(queryset=None, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, batch_size=BATCH_SIZE,
+              after_id=0, on_batch=None, dry_run=False):
+    """
+    Reconcile every open payout in `queryset` (default: all) that has a
+    Flutterwave transfer id, in id order starting after `after_id`. Returns
+    totals: checked, completed, failed, unchanged, errors.
+    """
+    from .services import FlutterwaveService
+
+    if queryset is None:
+        queryset = PayoutRequest.objects.all()
+    open_payouts = (
+        queryset.filter(status__in=OPEN_STATUSES, flutterwave_transfer_id__isnull=False)
+        .exclude(flutterwave_transfer_id='')
+        .order_by('pk')
+        .only('pk', 'flutterwave_transfer_id')
+    )
+    service = FlutterwaveService()
+    limiter = RateLimiter(rate)
+    totals = {'checked': 0, 'completed': 0, 'failed': 0, 'unchanged': 0, 'errors': 0}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='payout-sync') as pool:
+        while True:
+            batch = list(open_payouts.filter(pk__gt=after_id)[:batch_size])
+            if not batch:
+                break
+            fetched = pool.map(lambda payout: fetch_status(service, payout, limiter), batch)
+            results = {payout.pk: data for payout, data in zip(batch, fetched)}
+
+            moved = apply({pk: data for pk, data in results.items() if data is not None}, dry_run=dry_run)
+            errors = sum(1 for data in results.values() if data is None)
+            totals['checked'] += len(batch)
+            totals['completed'] += len(moved['completed'])
+            totals['failed'] += len(moved['failed'])
+            totals['errors'] += errors
+            totals['unchanged'] += len(batch) - errors - len(moved['completed']) - len(moved['failed'])
+
+            after_id = batch[-1].pk
+            if on_batch is not None:
+                on_batch(after_id, dict(totals))
+    return totals
@@ -0,0 +1,218 @@
+"""
+Per-payment progress record and event feed, kept in the cache.
+
+After checkout the client waits for three things: the payment to be claimed,
+the order to land in the library, and each event ticket to be rendered. It
+used to find out by polling check_payment_status, which reloaded the payment
+and its purchases and counted tickets on every poll — and counted the legacy
+EventTicket table, which new orders never write to, so ticket orders never
+looked complete.
+
+Now the fulfilment path reports progress as it happens:
+
+    * process_successful_payment -> payment_claimed(), once the claim
+      commits: publishes 'payment.claimed' and 'library.ready';
+    * the outbox ticket step -> ticket_rendered(), per FastEventTicket:
+      publishes 'ticket.rendered'.
+
+Each call updates a small progress record (what check_payment_status
+returns) and appends to a numbered event log: a counter plus one key per
+event. Subscribers — the SSE / long-poll endpoint in streams.py — remember
+the last number they saw and fetch anything newer, so this works the same on
+Redis and on the local-memory cache, across processes wherever the cache is
+shared.
+
+The cache is only a fast path. A missing record is rebuilt from the database
+(rebuild()), a pending one is kept for a few seconds only so status changes
+made elsewhere still show up, and every write here swallows cache errors:
+reporting progress must never fail a payment.
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+RECORD_TTL = 24 * 60 * 60      # a settled payment's record
+PENDING_TTL = 5                # a pending one: re-read from the DB soon
+EVENT_TTL = 60 * 60            # how long a subscriber can catch up on events
+
+SETTLED_STATUSES = {
+    Payment.PaymentStatus.SUCCESS,
+    Payment.PaymentStatus.FAILED,
+    Payment.PaymentStatus.CANCELLED,
+}
+
+
+def _key(reference, *parts):
+    return ':'.join(['payment_progress', reference, *parts])
+
+
+def _ttl(status):
+    return RECORD_TTL if status in SETTLED_STATUSES else PENDING_TTL
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, RECORD_TTL)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add and incr.
+        cache.set(key, delta, RECORD_TTL)
+        return delta
+
+
+def _record(payment, purchases, library_ready):
+    tickets_expected = sum(p.quantity for p in purchases if p.product.product_type == 'event')
+    return {
+        'reference': payment.reference,
+        'user_id': payment.user_id,
+        'status': payment.status,
+        'amount': payment.amount,
+        'created_at': payment.created_at,
+        'has_event_tickets': tickets_expected > 0,
+        'total_tickets_expected': tickets_expected,
+        'library_ready': library_ready,
+    }
+
+
+def _store(record, tickets_created=None, tickets_rendered=None):
+    cache.set(_key(record['reference']), record, _ttl(record['status']))
+    if tickets_created is not None:
+        # The counters outlive a pending record: incr keeps a key's expiry, so
+        # a short one here would drop tickets counted after the claim.
+        cache.set_many({
+            _key(record['reference'], 'tickets_created'): tickets_created,
+            _key(record['reference'], 'tickets_rendered'): tickets_rendered,
+        }, RECORD_TTL)
+
+
+# --- reading ---------------------------------------------------------------
+
+def snapshot(reference):
+    """The cached progress for `reference`, or None if it isn't cached."""
+    keys = [_key(reference), _key(reference, 'tickets_created'), _key(reference, 'tickets_rendered')]
+    found = cache.get_many(keys)
+    record = found.get(keys[0])
+    if record is None:
+        return None
+    return {
+        **record,
+        'tickets_created': found.get(keys[1]) or 0,
+        'tickets_rendered': found.get(keys[2]) or 0,
+    }
+
+
+def rebuild(payment):
+    """Build the record from the database and cache it (the slow path)."""
+    from apps.events import ticket_images
+    from apps.events.fast_models import FastEventTicket
+
+    purchases = list(payment.purchases.select_related('product'))
+    counts = FastEventTicket.objects.filter(purchase__payment=payment).aggregate(
+        created=Count('id'),
+        rendered=Count('id', filter=Q(ticket_png__isnull=False) & ~Q(ticket_png='')),
+    )
+    if ticket_images.is_lazy():
+        counts['rendered'] = counts['created']
+    # Library rows are written in the same transaction that marks the payment
+    # successful, so the status says whether they exist.
+    record = _record(payment, purchases, payment.status == Payment.PaymentStatus.SUCCESS)
+    try:
+        _store(record, counts['created'], counts['rendered'])
+    except Exception as e:
+        logger.warning("Could not cache progress for payment %s: %s", payment.reference, e)
+    return {**record, 'tickets_created': counts['created'], 'tickets_rendered': counts['rendered']}
+
+
+def get(reference):
+    """Progress for `reference` from the cache, else the database. None if no such payment."""
+    try:
+        found = snapshot(reference)
+    except Exception as e:
+        logger.warning("Progress cache unavailable (%s); reading the database", e)
+        found = None
+    if found is not None:
+        return found
+    payment = Payment.objects.filter(reference=reference).first()
+    return rebuild(payment) if payment is not None else None
+
+
+def is_complete(progress):
+    """Every expected ticket has been created and rendered."""
+    if not progress['has_event_tickets']:
+        return True
+    expected = progress['total_tickets_expected']
+    return progress['tickets_created'] >= expected and progress['tickets_rendered'] >= expected
+
+
+def is_finished(progress):
+    """Nothing more will be published for this payment."""
+    if progress['status'] == Payment.PaymentStatus.SUCCESS:
+        return progress['library_ready'] and is_complete(progress)
+    return progress['status'] in SETTLED_STATUSES
+
+
+def events_since(reference, cursor):
+    """([(number, event)], latest number) for events published after `cursor`."""
+    latest = cache.get(_key(reference, 'seq')) or 0
+    if latest <= cursor:
+        return [], latest
+    numbers = range(max(cursor, latest - 1000) + 1, latest + 1)
+    found = cache.get_many([_key(reference, 'event', str(n)) for n in numbers])
+    events = [
+        (n, found[_key(reference, 'event', str(n))])
+        for n in numbers
+        if _key(reference, 'event', str(n)) in found
+    ]
+    return events, latest
+
+
+# --- publishing ------------------------------------------------------------
+
+def publish(reference, event, **data):
+    """Append an event to the payment's feed; returns its number (None on cache failure)."""
+    try:
+        number = _incr(_key(reference, 'seq'))
+        cache.set(_key(reference, 'event', str(number)), {'event': event, **data}, EVENT_TTL)
+        return number
+    except Exception as e:
+        logger.warning("Could not publish %s for payment %s: %s", event, reference, e)
+        return None
+
+
+def payment_claimed(payment, purchases):
+    """The payment was claimed and fulfilled; call once that has committed."""
+    record = _record(payment, purchases, library_ready=True)
+    record['status'] = Payment.PaymentStatus.SUCCESS
+    try:
+        _store(record)
+        cache.add(_key(payment.reference, 'tickets_created'), 0, RECORD_TTL)
+        cache.add(_key(payment.reference, 'tickets_rendered'), 0, RECORD_TTL)
+    except Exception as e:
+        logger.warning("Could not cache progress for payment %s: %s", payment.reference, e)
+    publish(payment.reference, 'payment.claimed', status=record['status'],
+            total_tickets_expected=record['total_tickets_expected'])
+    publish(payment.reference, 'library.ready', items=len(purchases))
+
+
+def ticket_rendered(payment, ticket):
+    """
+    A FastEventTicket for this payment was created (and, if it has a PNG,
+    rendered). With on-demand images a created ticket counts as rendered.
+    """
+    from apps.events import ticket_images
+    rendered = bool(ticket.ticket_png) or ticket_images.is_lazy()
+    try:
+        created = _incr(_key(payment.reference, 'tickets_created'))
+        if rendered:
+            _incr(_key(payment.reference, 'tickets_rendered'))
+    except Exception as e:
+        logger.warning("Could not count ticket for payment %s: %s", payment.reference, e)
+        created = None
+    publish(payment.reference, 'ticket.rendered', ticket_id=str(ticket.ticket_id),
+            rendered=rendered, tickets_created=created)
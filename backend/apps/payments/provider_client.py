@@ -0,0 +1,275 @@
+"""
+Shared HTTP client for payment provider APIs (Flutterwave, Paystack).
+
+The services used to call bare requests.get/post, which opens a fresh TCP+TLS
+connection to the provider on every call — 100-300ms of handshake on the
+checkout and verify paths before the provider even starts working — and two
+of those calls had no timeout at all, so a slow provider could pin a worker
+indefinitely. ProviderClient fixes both and adds the guard rails a payment
+dependency needs:
+
+    * one keep-alive requests.Session per provider per process, so calls
+      reuse pooled connections;
+    * a (connect, read) timeout on every call, tuned per endpoint;
+    * retries with exponential backoff and jitter, for GETs only — a POST
+      may have been acted on even if we never saw the response, and
+      initializing or sending money twice is worse than failing;
+    * a circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive
+      connection errors, timeouts or 5xx answers, calls fail immediately
+      with ProviderUnavailable for CIRCUIT_RESET_AFTER seconds instead of
+      tying up workers on a provider that is down, then one trial call is
+      let through to see if it has recovered;
+    * latency and error histograms per provider endpoint, readable with
+      metrics_snapshot() and logged to the 'performance' logger when a call
+      is slow.
+
+All state is per process. ProviderUnavailable subclasses
+requests.RequestException, so existing `except RequestException` handlers in
+the services treat a tripped breaker like any other network failure.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+perf_logger = logging.getLogger('performance')
+
+# (connect, read) seconds. Connect is short everywhere — a provider that
+# can't accept a connection in 3s is not going to serve the request either.
+DEFAULT_TIMEOUT = (3.05, 15)
+ENDPOINT_TIMEOUTS = {
+    'initialize': (3.05, 15),
+    'verify': (3.05, 10),
+    'transfer_fee': (3.05, 5),
+    'transfer': (3.05, 30),
+    'transfer_status': (3.05, 15),
+    'banks': (3.05, 15),
+}
+
+GET_RETRIES = 2                 # attempts after the first
+RETRY_BACKOFF = 0.25            # seconds, doubled per retry, plus jitter
+RETRY_STATUSES = {502, 503, 504}
+
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_AFTER = 30        # seconds
+
+POOL_SIZE = 10
+SLOW_CALL_SECONDS = 2.0
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is
+# everything slower.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ProviderUnavailable(requests.exceptions.RequestException):
+    """The circuit for this provider is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call."""
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_after=CIRCUIT_RESET_AFTER):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        """The call ended without telling us anything about the provider."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                # A failed trial re-opens for another full period.
+                self.opened_at = time.monotonic()
+
+
+class _Metrics:
+    """Per-endpoint call counts, error counts and a latency histogram."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = defaultdict(lambda: {
+            'calls': 0,
+            'errors': defaultdict(int),
+            'latency': [0] * (len(LATENCY_BUCKETS) + 1),
+            'latency_sum': 0.0,
+        })
+
+    def record(self, key, elapsed, error=None):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if elapsed <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            row = self._data[key]
+            row['calls'] += 1
+            row['latency'][bucket] += 1
+            row['latency_sum'] += elapsed
+            if error:
+                row['errors'][error] += 1
+
+    def snapshot(self):
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS] + ['le_inf']
+        with self._lock:
+            return {
+                key: {
+                    'calls': row['calls'],
+                    'errors': dict(row['errors']),
+                    'latency': dict(zip(labels, row['latency'])),
+                    'latency_avg': row['latency_sum'] / row['calls'] if row['calls'] else 0.0,
+                }
+                for key, row in self._data.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+metrics = _Metrics()
+
+
+def metrics_snapshot():
+    """{'provider.endpoint': {calls, errors, latency histogram, latency_avg}} for this process."""
+    return metrics.snapshot()
+
+
+class ProviderClient:
+    def __init__(self, provider, base_url):
+        self.provider = provider
+        self.base_url = base_url.rstrip('/')
+        self.breaker = CircuitBreaker()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # A session (and its sockets) must not be shared across a fork, e.g.
+        # gunicorn's preload: rebuild it the first time a child uses it.
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session, self._pid = session, pid
+        return self._session
+
+    def _url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, endpoint, **kwargs):
+        """
+        Make one logical call (GETs may retry). Raises ProviderUnavailable if
+        the circuit is open and requests' own exceptions on network failure;
+        HTTP error statuses are returned, not raised.
+        """
+        method = method.upper()
+        key = f"{self.provider}.{endpoint}"
+        kwargs.setdefault('timeout', ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        attempts = 1 + (GET_RETRIES if method == 'GET' else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                metrics.record(key, 0.0, error='circuit_open')
+                raise ProviderUnavailable(f"{self.provider} is unavailable (circuit open)")
+
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, self._url(path), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                elapsed = time.monotonic() - started
+                kind = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection'
+                metrics.record(key, elapsed, error=kind)
+                self.breaker.record_failure()
+                if attempt + 1 < attempts:
+                    self._backoff(attempt)
+                    continue
+                logger.warning("%s %s failed after %d attempt(s): %s", method, key, attempt + 1, e)
+                raise
+            except requests.exceptions.RequestException:
+                # A bad URL or similar: our fault, not the provider's.
+                metrics.record(key, time.monotonic() - started, error='request')
+                self.breaker.release()
+                raise
+
+            elapsed = time.monotonic() - started
+            if response.status_code >= 500:
+                metrics.record(key, elapsed, error=f"http_{response.status_code}")
+                self.breaker.record_failure()
+                if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                    self._backoff(attempt)
+                    continue
+            else:
+                error = f"http_{response.status_code}" if response.status_code >= 400 else None
+                metrics.record(key, elapsed, error=error)
+                self.breaker.record_success()
+
+            if elapsed >= SLOW_CALL_SECONDS:
+                perf_logger.warning("Slow provider call %s %s: %.2fs", method, key, elapsed)
+            return response
+
+    def _backoff(self, attempt):
+        delay = RETRY_BACKOFF * (2 ** attempt)
+        time.sleep(delay + random.uniform(0, delay))
+
+    def get(self, path, endpoint, **kwargs):
+        return self.request('GET', path, endpoint, **kwargs)
+
+    def post(self, path, endpoint, **kwargs):
+        return self.request('POST', path, endpoint, **kwargs)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider, base_url):
+    """The process-wide client for `provider`, created on first use."""
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _clients[provider] = ProviderClient(provider, base_url)
+    return client
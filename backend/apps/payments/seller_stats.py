@@ -0,0 +1,181 @@
+"""
+Per-seller daily sales rollup (SellerDailyStats).
+
+Both analytics dashboards — seller_analytics here and SellerAnalyticsView in
+products — used to aggregate raw commissions and purchase joins on every
+load: revenue, orders, commission and payout as separate aggregates, then the
+previous period again for growth, top products, daily revenue and unique
+customers. Each is a scan of the seller's whole sales history in the range.
+
+Now every sale is also added to its seller's row for the day:
+
+    * record_sales() runs inside fulfilment, in the same transaction as the
+      commissions, for the purchases the ledger has just posted (so a sale is
+      never counted twice). It locks the day's rows, adds the deltas and
+      writes them back with one bulk_update;
+    * rebuild() recomputes whole sellers from their commissions, in one pass
+      each. It backs `manage.py backfill_seller_stats` and puts right any
+      drift;
+    * summary() answers a dashboard: it reads at most `days` rows per range
+      and merges them in Python. Unique customers are the one figure a sum
+      of days can't give, so they are a COUNT(DISTINCT) over the range's
+      commissions (indexed by seller and date). The rows keep no buyer ids or
+      IP addresses: they stay small, and no personal data is copied here.
+
+Days are local dates (settings.TIME_ZONE), taken from when the sale was
+fulfilled.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import SellerCommission, SellerDailyStats
+
+logger = logging.getLogger(__name__)
+
+# The dashboards' timeRange / time_range values, in days.
+RANGES = {'7d': 7, '30d': 30, '90d': 90, '1y': 365}
+DEFAULT_RANGE = '7d'
+
+
+def days_for(time_range):
+    return RANGES.get(time_range, RANGES[DEFAULT_RANGE])
+
+
+def _add(row, price, commission, payout, product_id):
+    """Add one sale to a SellerDailyStats row (not saved)."""
+    row.revenue += price
+    row.orders += 1
+    row.commission += commission
+    row.net_payout += payout
+    entry = row.products.setdefault(str(product_id), {'sales': 0, 'revenue': '0'})
+    entry['sales'] += 1
+    entry['revenue'] = str(Decimal(entry['revenue']) + price)
+
+
+def record_sales(commissions, purchases):
+    """
+    Add newly posted commissions to today's rows. `purchases` are the
+    fulfilled purchases; commissions whose purchase isn't among them are
+    ignored.
+    """
+    by_purchase = {p.pk: p for p in purchases}
+    commissions = [c for c in commissions if c.purchase_id in by_purchase]
+    if not commissions:
+        return
+
+    day = timezone.localdate()
+    seller_ids = {c.seller_id for c in commissions}
+    with transaction.atomic():
+        SellerDailyStats.objects.bulk_create(
+            [SellerDailyStats(seller_id=seller_id, date=day) for seller_id in seller_ids],
+            ignore_conflicts=True,
+        )
+        # Locked, so two orders for the same seller can't lose each other's deltas.
+        rows = {
+            row.seller_id: row
+            for row in SellerDailyStats.objects.select_for_update().filter(date=day, seller_id__in=seller_ids)
+        }
+        for c in commissions:
+            purchase = by_purchase[c.purchase_id]
+            _add(rows[c.seller_id], Decimal(c.product_price), Decimal(c.commission_amount),
+                 Decimal(c.seller_payout), purchase.product_id)
+        SellerDailyStats.objects.bulk_update(
+            rows.values(), ['revenue', 'orders', 'commission', 'net_payout', 'products'],
+        )
+
+
+def rebuild(seller_ids, dry_run=False):
+    """
+    Recompute every day's row for `seller_ids` from their commissions. Returns
+    how many rows were written.
+    """
+    rows = {}
+    sales = (
+        SellerCommission.objects.filter(seller_id__in=seller_ids)
+        .values_list('seller_id', 'created_at', 'product_price', 'commission_amount', 'seller_payout',
+                     'purchase__product_id')
+        .order_by('id')
+    )
+    with transaction.atomic():
+        # Hold the existing rows so fulfilment waits for the rebuild rather
+        # than adding to rows about to be replaced.
+        list(SellerDailyStats.objects.select_for_update().filter(seller_id__in=seller_ids).values_list('pk'))
+        for seller_id, created_at, price, commission, payout, product_id in sales.iterator():
+            day = timezone.localdate(created_at)
+            row = rows.get((seller_id, day))
+            if row is None:
+                row = rows[(seller_id, day)] = SellerDailyStats(
+                    seller_id=seller_id, date=day, revenue=Decimal('0'), commission=Decimal('0'),
+                    net_payout=Decimal('0'), products={},
+                )
+            _add(row, price, commission, payout, product_id)
+
+        SellerDailyStats.objects.filter(seller_id__in=seller_ids).delete()
+        SellerDailyStats.objects.bulk_create(rows.values(), batch_size=500)
+        if dry_run:
+            transaction.set_rollback(True)
+    return len(rows)
+
+
+# --- reading ---------------------------------------------------------------
+
+def _merge(rows):
+    totals = {
+        'revenue': Decimal('0'), 'orders': 0, 'commission': Decimal('0'), 'net_payout': Decimal('0'),
+    }
+    products = defaultdict(lambda: {'sales': 0, 'revenue': Decimal('0')})
+    for row in rows:
+        totals['revenue'] += row.revenue
+        totals['orders'] += row.orders
+        totals['commission'] += row.commission
+        totals['net_payout'] += row.net_payout
+        for product_id, entry in row.products.items():
+            products[int(product_id)]['sales'] += entry['sales']
+            products[int(product_id)]['revenue'] += Decimal(entry['revenue'])
+    totals['products'] = dict(products)
+    return totals
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def customers(seller, first_day, last_day):
+    """Distinct buyers and buyer IP addresses of the seller's sales between two local dates, inclusive."""
+    return SellerCommission.objects.filter(
+        seller=seller,
+        created_at__gte=_day_start(first_day),
+        created_at__lt=_day_start(last_day + timedelta(days=1)),
+    ).aggregate(
+        customers=Count('purchase__payment__user_id', distinct=True),
+        customer_ips=Count('purchase__payment__ip_address', distinct=True),
+    )
+
+
+def summary(seller, days, previous=False):
+    """
+    The seller's totals over the last `days` local days (today included):
+    revenue, orders, commission, net_payout, customers, customer_ips,
+    products ({product_id: {sales, revenue}}) and daily ([(date, revenue)]
+    for days with sales). With previous=True the same figures for the `days`
+    before, except the customer counts, are added under 'previous'.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days)
+    earliest = start - timedelta(days=days) if previous else start
+    rows = list(SellerDailyStats.objects.filter(seller=seller, date__gt=earliest, date__lte=today).order_by('date'))
+
+    current = [row for row in rows if row.date > start]
+    result = _merge(current)
+    result.update(customers(seller, start + timedelta(days=1), today))
+    result['daily'] = [(row.date, row.revenue) for row in current]
+    if previous:
+        result['previous'] = _merge(row for row in rows if row.date <= start)
+    return result
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.conf import settings
+from django.db.models import Prefetch
 from .models import Payment, Purchase, UserLibrary, SellerCommission, PayoutRequest, SellerEarnings
+from products.models import Product
 from products.serializers import ProductSerializer
 from users.serializers import UserProfileSerializer
 
@@ -16,6 +18,29 @@ class PurchaseSerializer(serializers.ModelSerializer):
         model = Purchase
         fields = ['id', 'product', 'quantity', 'unit_price', 'total_price', 'created_at']
 
+class SellerOrderSerializer(PurchaseSerializer):
+    """A purchase as its seller sees it: with the buyer and payment attached."""
+    customer = serializers.SerializerMethodField()
+    payment_reference = serializers.CharField(source='payment.reference', read_only=True)
+    payment_status = serializers.CharField(source='payment.status', read_only=True)
+
+    class Meta(PurchaseSerializer.Meta):
+        fields = PurchaseSerializer.Meta.fields + ['customer', 'payment_reference', 'payment_status']
+
+    @staticmethod
+    def setup_queryset(queryset):
+        return queryset.select_related('payment__user').prefetch_related(
+            Prefetch('product', queryset=ProductSerializer.setup_queryset(Product.objects.all())),
+        )
+
+    def get_customer(self, obj):
+        user = obj.payment.user
+        return {
+            'email': user.email,
+            'name': user.first_name or user.email.split('@')[0],
+            'id': user.id,
+        }
+
 class UserLibrarySerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     event_tickets = serializers.SerializerMethodField()
@@ -24,43 +49,37 @@ class UserLibrarySerializer(serializers.ModelSerializer):
         model = UserLibrary
         fields = ['id', 'product', 'quantity', 'added_at', 'event_tickets']
         read_only_fields = ['id', 'quantity', 'added_at', 'event_tickets']
-    
+
+    @staticmethod
+    def setup_queryset(queryset):
+        """
+        Load everything this serializer reads, so a page costs the same
+        handful of queries however many rows it has: the product as
+        ProductSerializer.setup_queryset loads it (rating annotations instead
+        of a reviews aggregate per row) and the purchase's tickets.
+        """
+        from apps.events.fast_models import FastEventTicket
+
+        return queryset.select_related('purchase').prefetch_related(
+            Prefetch('product', queryset=ProductSerializer.setup_queryset(Product.objects.all())),
+            Prefetch('purchase__fast_tickets', queryset=FastEventTicket.objects.all()),
+        )
+
     def get_event_tickets(self, obj):
-        """Get fast event ticket details including PNG tickets for event products"""
-        print(f"DEBUG: Processing product {obj.product.id} with type: {obj.product.product_type}")
-        
-        if obj.product.product_type == 'event':
-            try:
-                from apps.events.fast_models import FastEventTicket
-                print(f"DEBUG: Importing FastEventTicket model")
-                
-                tickets = FastEventTicket.objects.filter(purchase=obj.purchase)
-                print(f"DEBUG: Found {tickets.count()} fast tickets for purchase {obj.purchase.id}")
-                
-                result = []
-                for ticket in tickets:
-                    ticket_data = {
-                        'id': ticket.id,
-                        'ticket_id': str(ticket.ticket_id),
-                        'ticket_png_url': ticket.ticket_png.url if ticket.ticket_png else None,
-                        'qr_code_url': ticket.qr_code.url if ticket.qr_code else None,
-                        'is_used': ticket.is_used,
-                        'created_at': ticket.created_at
-                    }
-                    print(f"DEBUG: Ticket {ticket.ticket_id} - PNG URL: {ticket_data['ticket_png_url']}")
-                    print(f"DEBUG: Ticket {ticket.ticket_id} - QR URL: {ticket_data['qr_code_url']}")
-                    result.append(ticket_data)
-                
-                print(f"DEBUG: Serialized fast tickets: {result}")
-                return result
-            except Exception as e:
-                print(f"ERROR: Error getting fast event tickets: {e}")
-                import traceback
-                traceback.print_exc()
-                return []
-        else:
-            print(f"DEBUG: Product {obj.product.id} is not an event (type: {obj.product.product_type})")
-        return []
+        """Fast event ticket details, including the PNG ticket, for event products"""
+        if obj.product.product_type != 'event':
+            return []
+        return [
+            {
+                'id': ticket.id,
+                'ticket_id': str(ticket.ticket_id),
+                'ticket_png_url': ticket.get_ticket_url(),
+                'qr_code_url': ticket.qr_code.url if ticket.qr_code else None,
+                'is_used': ticket.is_used,
+                'created_at': ticket.created_at
+            }
+            for ticket in obj.get_event_tickets()
+        ]
 
 class CheckoutItemSerializer(serializers.Serializer):
     """Serializer for individual checkout items"""
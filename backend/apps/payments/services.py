@@ -4,11 +4,14 @@ import uuid
 from decimal import Decimal
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
-from .models import Payment, Purchase, UserLibrary, SellerCommission, SellerEarnings, PayoutRequest
+from . import fee_schedule, inventory, ledger, outbox, payout_sync, progress
+from .fulfillment import fulfill_payment, split_commission
+from .provider_client import get_client
+from .verification import coalesced_verify
+from .models import Payment, Purchase, SellerCommission, SellerEarnings, PayoutRequest
 from products.models import Product
-from users.utils import send_purchase_receipt_email, send_seller_notification_email, send_event_ticket_email
-from apps.notifications.services import NotificationService
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +22,7 @@ class FlutterwaveService:
         self.public_key = settings.FLUTTERWAVE_PUBLIC_KEY
         self.encryption_key = settings.FLUTTERWAVE_ENCRYPTION_KEY
         self.base_url = "https://api.flutterwave.com/v3"
+        self.http = get_client('flutterwave', self.base_url)
         
         # Debug logging for API keys
         print(f"DEBUG: FlutterwaveService initialized")
@@ -68,54 +72,61 @@ class FlutterwaveService:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=self._get_headers())
+            response = self.http.post(url, 'initialize', json=payload, headers=self._get_headers())
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise ValidationError(f"Flutterwave API error: {str(e)}")
     
     def verify_payment(self, reference):
-        """Verify payment with Flutterwave"""
+        """
+        Verify payment with Flutterwave. Concurrent calls for the same reference
+        share one provider request, and final answers are briefly cached.
+        """
+        return coalesced_verify('flutterwave', reference, lambda: self._fetch_verification(reference))
+
+    def _fetch_verification(self, reference):
         url = f"{self.base_url}/transactions/verify_by_reference?tx_ref={reference}"
         
         try:
-            response = requests.get(url, headers=self._get_headers())
+            response = self.http.get(url, 'verify', headers=self._get_headers())
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise ValidationError(f"Flutterwave API error: {str(e)}")
 
     def _transfer_fee_tier(self, amount):
-        """Flutterwave NGN transfer fee tiers — the fallback if the live fee
-        lookup can't be reached. Kept slightly conservative so the platform is
-        never left short."""
-        amount = Decimal(str(amount))
-        if amount <= Decimal('5000'):
-            return Decimal('10')
-        if amount <= Decimal('50000'):
-            return Decimal('25')
-        return Decimal('50')
-
-    def get_transfer_fee(self, amount):
-        """
-        The Flutterwave fee for an NGN transfer of `amount`. The seller bears
-        this fee (per business decision), so we deduct it from what we send.
-        Asks Flutterwave's /transfers/fee for the exact figure, falling back to
-        the known tier table if that call fails.
-        """
+        """Flutterwave NGN transfer fee tiers — the fallback if no live fee has
+        been learned yet. Kept slightly conservative so the platform is never
+        left short."""
+        return fee_schedule.fallback_fee(amount)
+
+    def fetch_transfer_fee(self, amount):
+        """Flutterwave's live /transfers/fee figure for `amount`, or None if it
+        can't be had."""
         try:
-            resp = requests.get(
-                f"{self.base_url}/transfers/fee",
+            resp = self.http.get(
+                '/transfers/fee', 'transfer_fee',
                 params={'amount': float(amount), 'currency': 'NGN'},
-                headers=self._get_headers(), timeout=15,
+                headers=self._get_headers(),
             )
             body = resp.json() if resp.content else {}
             rows = (body or {}).get('data') or []
             if resp.ok and rows and rows[0].get('fee') is not None:
                 return Decimal(str(rows[0]['fee']))
         except Exception as e:
-            logger.warning("Transfer-fee lookup failed (%s); using tier fallback.", e)
-        return self._transfer_fee_tier(amount)
+            logger.warning("Transfer-fee lookup failed: %s", e)
+        return None
+
+    def get_transfer_fee(self, amount):
+        """
+        The Flutterwave fee for an NGN transfer of `amount`. The seller bears
+        this fee (per business decision), so we deduct it from what we send.
+        Served from the cached fee schedule (see fee_schedule.py), which is
+        refreshed from fetch_transfer_fee in the background and falls back to
+        the tier table — so it never waits on Flutterwave.
+        """
+        return fee_schedule.lookup(amount, self.fetch_transfer_fee)
 
     def process_seller_payout(self, payout_request):
         """
@@ -151,7 +162,7 @@ class FlutterwaveService:
                 f"NGN {fee} transfer fee."
             )
             payout_request.save()
-            self.update_seller_earnings(payout_request.seller)  # release reservation
+            ledger.sync_payout(payout_request)  # release reservation
             return False
 
         transfer_data = {
@@ -165,22 +176,24 @@ class FlutterwaveService:
         }
 
         try:
-            response = requests.post(
-                f"{self.base_url}/transfers", json=transfer_data,
-                headers=self._get_headers(), timeout=30,
+            response = self.http.post(
+                '/transfers', 'transfer', json=transfer_data,
+                headers=self._get_headers(),
             )
             body = response.json() if response.content else {}
         except Exception as e:
             payout_request.status = 'failed'
             payout_request.failure_reason = f"Could not reach Flutterwave: {e}"
             payout_request.save()
-            self.update_seller_earnings(payout_request.seller)  # release the reservation
+            ledger.sync_payout(payout_request)  # release the reservation
             logger.error("Payout %s transfer request failed: %s", payout_request.id, e)
             return False
 
         data = (body or {}).get('data') or {}
         # FLW replies status='success' + data.status NEW/PENDING when queued.
         if response.ok and body.get('status') == 'success' and data.get('id'):
+            if data.get('fee') is not None:
+                fee_schedule.learn(net_amount, data['fee'])
             payout_request.flutterwave_transfer_id = str(data['id'])
             payout_request.status = 'processing'
             payout_request.processed_at = timezone.now()
@@ -193,7 +206,7 @@ class FlutterwaveService:
             body.get('message') if isinstance(body, dict) else None
         ) or 'Transfer was rejected by Flutterwave'
         payout_request.save()
-        self.update_seller_earnings(payout_request.seller)  # release the reservation
+        ledger.sync_payout(payout_request)  # release the reservation
         logger.error("Payout %s rejected by Flutterwave: %s",
                      payout_request.id, payout_request.failure_reason)
         return False
@@ -203,53 +216,27 @@ class FlutterwaveService:
         Reconcile a payout against Flutterwave's actual transfer status — for
         when the confirmation webhook was missed (downtime, a config gap, etc.).
         Mirrors the webhook: on SUCCESSFUL/FAILED it updates the record, releases
-        the reserved balance if failed, and emails the seller. Idempotent — a
+        the reserved balance if failed, and queues the seller's email. For many
+        payouts at once use payout_sync.reconcile(). Idempotent — a
         payout that is already final, or was never sent, is left alone. Returns
         the resolved status.
         """
         if payout_request.status in ('completed', 'failed') or not payout_request.flutterwave_transfer_id:
             return payout_request.status
 
-        try:
-            resp = requests.get(
-                f"{self.base_url}/transfers/{payout_request.flutterwave_transfer_id}",
-                headers=self._get_headers(), timeout=30,
-            )
-            data = (resp.json() or {}).get('data') or {}
-        except Exception as e:
-            logger.error("Sync payout %s failed: %s", payout_request.id, e)
+        data = payout_sync.fetch_status(self, payout_request)
+        if data is None:
             return payout_request.status
-
-        flw_status = str(data.get('status', '')).upper()
-        if flw_status == 'SUCCESSFUL':
-            payout_request.status = 'completed'
-            if not payout_request.processed_at:
-                payout_request.processed_at = timezone.now()
-            payout_request.save()
-            self.update_seller_earnings(payout_request.seller)
-            try:
-                from users.utils import send_payout_completed_email
-                send_payout_completed_email(payout_request)
-            except Exception as e:
-                logger.error("Payout completed email failed for %s: %s", payout_request.id, e)
-        elif flw_status == 'FAILED':
-            payout_request.status = 'failed'
-            payout_request.failure_reason = data.get('complete_message') or 'Transfer failed at Flutterwave'
-            payout_request.save()
-            self.update_seller_earnings(payout_request.seller)  # release reservation
-            try:
-                from users.utils import send_payout_failed_email
-                send_payout_failed_email(payout_request)
-            except Exception as e:
-                logger.error("Payout failed email failed for %s: %s", payout_request.id, e)
-        # else: still NEW/PENDING at Flutterwave — leave it processing.
+        # Same path as the bulk reconciler; the seller email goes out after
+        # the commit, in the background.
+        payout_sync.apply({payout_request.pk: data})
+        payout_request.refresh_from_db(fields=['status', 'processed_at', 'failure_reason'])
+        # Still NEW/PENDING at Flutterwave leaves it processing.
         return payout_request.status
 
     def calculate_seller_commission(self, product_price):
         """Calculate 4% commission and seller payout"""
-        commission = product_price * Decimal('0.04')
-        seller_payout = product_price - commission
-        return commission, seller_payout
+        return split_commission(product_price)
 
     def create_seller_commission(self, purchase):
         """Create commission record for seller"""
@@ -268,6 +255,7 @@ class FlutterwaveService:
             )
             
             if created:
+                ledger.post_sales([commission])
                 print(f"DEBUG: Created commission record for {purchase.product.owner.email}: ₦{commission_amount}")
             
             return commission
@@ -276,46 +264,15 @@ class FlutterwaveService:
             return None
 
     def update_seller_earnings(self, seller):
-        """Update seller's total earnings"""
+        """
+        Rebuild seller's earnings from the ledger. This is the full
+        reconcile; sales and payouts keep the totals current on their own
+        through apps.payments.ledger, so only admin tooling needs this.
+        """
         try:
-            # Get all commissions for this seller
-            commissions = SellerCommission.objects.filter(seller=seller)
-            
-            # Calculate totals
-            total_sales = sum(c.product_price for c in commissions)
-            total_commission = sum(c.commission_amount for c in commissions)
-            
-            # Count in-flight payouts (pending/processing) as reserved too, so a
-            # seller cannot request two payouts against the same balance. A
-            # 'failed' payout is excluded here, which releases its funds back.
-            total_payouts = sum(p.amount for p in PayoutRequest.objects.filter(
-                seller=seller,
-                status__in=['pending', 'processing', 'completed'],
-            ))
-            
-            # Get or create earnings record
-            earnings, created = SellerEarnings.objects.get_or_create(
-                seller=seller,
-                defaults={
-                    'total_sales': total_sales,
-                    'total_commission': total_commission,
-                    'total_payouts': total_payouts,
-                    'available_balance': total_sales - total_commission - total_payouts
-                }
-            )
-            
-            if not created:
-                earnings.total_sales = total_sales
-                earnings.total_commission = total_commission
-                earnings.total_payouts = total_payouts
-                earnings.available_balance = total_sales - total_commission - total_payouts
-                earnings.save()
-            
-            print(f"DEBUG: Updated earnings for {seller.email}: Sales: ₦{total_sales}, Commission: ₦{total_commission}, Available: ₦{earnings.available_balance}")
-            
-            return earnings
+            return ledger.reconcile_seller(seller)
         except Exception as e:
-            print(f"DEBUG: Error updating earnings: {str(e)}")
+            logger.error("Error reconciling earnings for %s: %s", seller.pk, e)
             return None
 
 class PaystackService:
@@ -323,6 +280,7 @@ class PaystackService:
         self.secret_key = settings.PAYSTACK_SECRET_KEY
         self.public_key = settings.PAYSTACK_PUBLIC_KEY
         self.base_url = "https://api.paystack.co"
+        self.http = get_client('paystack', self.base_url)
         
     def _get_headers(self):
         return {
@@ -349,18 +307,24 @@ class PaystackService:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=self._get_headers())
+            response = self.http.post(url, 'initialize', json=payload, headers=self._get_headers())
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise ValidationError(f"Paystack API error: {str(e)}")
     
     def verify_payment(self, reference):
-        """Verify payment with Paystack"""
+        """
+        Verify payment with Paystack. Concurrent calls for the same reference
+        share one provider request, and final answers are briefly cached.
+        """
+        return coalesced_verify('paystack', reference, lambda: self._fetch_verification(reference))
+
+    def _fetch_verification(self, reference):
         url = f"{self.base_url}/transaction/verify/{reference}"
         
         try:
-            response = requests.get(url, headers=self._get_headers())
+            response = self.http.get(url, 'verify', headers=self._get_headers())
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -368,9 +332,7 @@ class PaystackService:
 
     def calculate_seller_commission(self, product_price):
         """Calculate 4% commission and seller payout"""
-        commission = product_price * Decimal('0.04')
-        seller_payout = product_price - commission
-        return commission, seller_payout
+        return split_commission(product_price)
 
     def create_seller_commission(self, purchase):
         """Create commission record for seller"""
@@ -389,6 +351,7 @@ class PaystackService:
             )
             
             if created:
+                ledger.post_sales([commission])
                 print(f"DEBUG: Created commission record for {purchase.product.owner.email}: ₦{commission_amount}")
             
             return commission
@@ -397,311 +360,96 @@ class PaystackService:
             return None
 
     def update_seller_earnings(self, seller):
-        """Update seller's total earnings"""
+        """
+        Rebuild seller's earnings from the ledger. This is the full
+        reconcile; sales and payouts keep the totals current on their own
+        through apps.payments.ledger, so only admin tooling needs this.
+        """
         try:
-            # Get all commissions for this seller
-            commissions = SellerCommission.objects.filter(seller=seller)
-            
-            # Calculate totals
-            total_sales = sum(c.product_price for c in commissions)
-            total_commission = sum(c.commission_amount for c in commissions)
-            
-            # Count in-flight payouts (pending/processing) as reserved too, so a
-            # seller cannot request two payouts against the same balance. A
-            # 'failed' payout is excluded here, which releases its funds back.
-            total_payouts = sum(p.amount for p in PayoutRequest.objects.filter(
-                seller=seller,
-                status__in=['pending', 'processing', 'completed'],
-            ))
-            
-            # Update or create earnings record
-            earnings, created = SellerEarnings.objects.get_or_create(
-                seller=seller,
-                defaults={
-                    'total_sales': total_sales,
-                    'total_commission': total_commission,
-                    'total_payouts': total_payouts
-                }
-            )
-            
-            if not created:
-                earnings.total_sales = total_sales
-                earnings.total_commission = total_commission
-                earnings.total_payouts = total_payouts
-            
-            earnings.calculate_available_balance()
-            earnings.save()
-            
-            print(f"DEBUG: Updated earnings for {seller.email}: Sales: ₦{total_sales}, Commission: ₦{total_commission}, Available: ₦{earnings.available_balance}")
-            
-            return earnings
+            return ledger.reconcile_seller(seller)
         except Exception as e:
-            print(f"DEBUG: Error updating earnings: {str(e)}")
+            logger.error("Error reconciling earnings for %s: %s", seller.pk, e)
             return None
 
-    def process_successful_payment(self, payment, paystack_data):
-        """Process successful payment and add products to user library"""
-        print(f"DEBUG: Processing successful payment for user: {payment.user.email}")
-        
-        # Update payment status
-        payment.status = Payment.PaymentStatus.SUCCESS
-        payment.paystack_transaction_id = paystack_data.get('data', {}).get('id')
-        payment.gateway_response = str(paystack_data)
-        payment.save()
-        print(f"DEBUG: Payment status updated to: {payment.status}")
-        
-        # Add products to user library
-        purchases = payment.purchases.all()
-        print(f"DEBUG: Found {purchases.count()} purchases to add to library")
-        
-        for purchase in purchases:
-            try:
-                # Create commission record for seller
-                commission = self.create_seller_commission(purchase)
-                
-                if purchase.product.product_type == 'event':
-                    # For event tickets, create separate library entries for each ticket
-                    for ticket_number in range(purchase.quantity):
-                        UserLibrary.objects.create(
-                            user=payment.user,
-                            product=purchase.product,
-                            purchase=purchase,
-                            quantity=1
-                        )
-                    print(f"DEBUG: Created {purchase.quantity} library entries for event: {purchase.product.title}")
-                else:
-                    # For digital products, create one library entry with the full quantity
-                    UserLibrary.objects.create(
-                        user=payment.user,
-                        product=purchase.product,
-                        purchase=purchase,
-                        quantity=purchase.quantity
-                    )
-                    print(f"DEBUG: Created library entry for digital product: {purchase.product.title} x{purchase.quantity}")
-
-                # Decrement ticket tier quantity_sold
-                if purchase.selected_ticket_tier:
-                    from django.db.models import F
-                    from products.models import TicketTier
-                    TicketTier.objects.filter(id=purchase.selected_ticket_tier.id).update(
-                        quantity_sold=F('quantity_sold') + purchase.quantity
-                    )
-                    print(f"DEBUG: Updated quantity_sold for tier {purchase.selected_ticket_tier.id} by {purchase.quantity}")
-
-                # Update seller earnings
-                if commission:
-                    self.update_seller_earnings(purchase.product.owner)
-                    
-            except Exception as e:
-                print(f"DEBUG: Error adding product to library: {str(e)}")
-                # Continue with other products even if one fails
-                continue
-        
-        print(f"DEBUG: Successfully processed payment and added items to library")
-        
-        # Send emails and notifications after successful payment processing (non-blocking)
-        try:
-            # Import notification service
-            from apps.notifications.services import NotificationService
-                   
-            # Check if any purchases are events
-            has_events = any(p.product.product_type == 'event' for p in purchases)
-            
-            # Send purchase receipt email once with all purchases
-            try:
-                send_purchase_receipt_email(payment, purchases)
-            except Exception as email_error:
-                print(f"DEBUG: Error sending purchase receipt email: {str(email_error)}")
-            
-            # Send seller notification email once with all purchases
-            try:
-                send_seller_notification_email(payment, purchases)
-            except Exception as email_error:
-                print(f"DEBUG: Error sending seller notification email: {str(email_error)}")
-
-            # FIRST FUNCTION - Create event tickets with better error handling
-            if has_events:
-                # Collect all event tickets first
-                all_event_tickets = []
-                event_products = {}
-                
-                for purchase in purchases:
-                    if purchase.product.product_type == 'event':
-                        print(f"DEBUG: Creating {purchase.quantity} tickets for event: {purchase.product.title}")
-                        
-                        # Import here to avoid circular imports
-                        from apps.events.fast_models import FastEventTicket
-                        
-                        # Create fast PNG tickets based on quantity with error handling
-                        tickets = []
-                        for ticket_num in range(purchase.quantity):
-                            try:
-                                ticket = FastEventTicket.objects.create(
-                                    purchase=purchase,
-                                    buyer=payment.user,
-                                    event=purchase.product
-                                )
-                                tickets.append(ticket)
-                                print(f"DEBUG: ✅ Created fast ticket {ticket.ticket_id} for event {purchase.product.title}")
-                            except Exception as ticket_error:
-                                print(f"DEBUG: ❌ Error creating fast ticket {ticket_num + 1}: {str(ticket_error)}")
-                                # Continue with other tickets even if one fails
-                                continue
-                        
-                        # Group tickets by event product
-                        if purchase.product.id not in event_products:
-                            event_products[purchase.product.id] = {
-                                'product': purchase.product,
-                                'tickets': [],
-                                'purchase': purchase
-                            }
-                        event_products[purchase.product.id]['tickets'].extend(tickets)
-                        all_event_tickets.extend(tickets)
-                
-                print(f"DEBUG: Successfully created {len(all_event_tickets)} event tickets")
-                
-                # Send one event ticket email with all tickets grouped by event
-                for product_id, event_data in event_products.items():
-                    try:
-                        send_event_ticket_email(payment.user, event_data['product'], event_data['tickets'])
-                    except Exception as email_error:
-                        print(f"DEBUG: Error sending event ticket email: {str(email_error)}")
-                    
-                    # Send notification
-                    try:
-                        NotificationService.send_event_ticket_notification(payment.user, event_data['product'], event_data['tickets'])
-                    except Exception as notif_error:
-                        print(f"DEBUG: Error sending event ticket notification: {str(notif_error)}")
-                
-                # Send payment notification once for the buyer (for events)
-                try:
-                    NotificationService.send_payment_notification(payment, payment.user)
-                    print(f"DEBUG: ✅ Payment notification sent to buyer for event purchase")
-                except Exception as notif_error:
-                    print(f"DEBUG: ❌ Error sending payment notification: {str(notif_error)}")
-                
-                # Send order notifications for each purchase
-                for purchase in purchases:
-                    try:
-                        NotificationService.send_order_notification(purchase, purchase.product.owner)
-                    except Exception as notif_error:
-                        print(f"DEBUG: Error sending order notification: {str(notif_error)}")
-            else:
-                # Handle digital products - send payment notification once for the buyer
-                try:
-                    NotificationService.send_payment_notification(payment, payment.user)
-                    print(f"DEBUG: ✅ Payment notification sent to buyer for digital product purchase")
-                except Exception as notif_error:
-                    print(f"DEBUG: ❌ Error sending payment notification: {str(notif_error)}")
-                
-                # Send order notifications for each purchase
-                for purchase in purchases:
-                    try:
-                        NotificationService.send_order_notification(purchase, purchase.product.owner)
-                    except Exception as notif_error:
-                        print(f"DEBUG: Error sending order notification: {str(notif_error)}")
-                        
-        except Exception as e:
-            print(f"DEBUG: Error sending emails/notifications: {str(e)}")
-            # Don't fail the payment if emails/notifications fail
-        
-        return payment
-
 class PaymentService:
     @staticmethod
     def create_payment_from_cart(user, cart_items, payment_provider=None):
-        """Create payment from cart items"""
-        print(f"DEBUG: PaymentService.create_payment_from_cart called with cart_items: {cart_items}")
-        print(f"DEBUG: Type of cart_items: {type(cart_items)}")
-        print(f"DEBUG: Length of cart_items: {len(cart_items)}")
-        
-        # Generate unique reference
+        """
+        Create a pending payment and its purchases from cart items.
+
+        Items carry either a `product_id` (plus `quantity` and an optional
+        `ticket_tier_id`) or a `product` object. Products and the chosen tiers
+        are resolved in one query each and the Payment and every Purchase are
+        inserted together, so the cost doesn't grow with the size of the cart.
+        A tier that doesn't belong to its product is rejected rather than
+        silently charged at the product's base price.
+        """
         reference = f"DARRA_{uuid.uuid4().hex[:8].upper()}"
-        
-        # Fetch products and calculate total amount
-        total_amount = 0
-        processed_items = []
-        
-        for i, item in enumerate(cart_items):
-            print(f"DEBUG: Processing item {i}: {item}")
-            print(f"DEBUG: Item type: {type(item)}")
-            print(f"DEBUG: Item keys: {list(item.keys()) if isinstance(item, dict) else 'Not a dict'}")
-            
+
+        for item in cart_items:
+            if 'product_id' not in item and 'product' not in item:
+                raise ValidationError("Each item must have either 'product_id' or 'product' field")
+
+        product_ids = {item['product_id'] for item in cart_items if 'product_id' in item}
+        products = Product.objects.in_bulk(product_ids)
+        missing = product_ids - products.keys()
+        if missing:
+            raise ValidationError(f"Product with ID {min(missing)} not found")
+
+        # (product_id, tier_id) -> tier, for just the pairs in this cart.
+        tier_ids = {item['ticket_tier_id'] for item in cart_items if item.get('ticket_tier_id')}
+        tiers = {}
+        if tier_ids:
+            links = Product.ticket_tiers.through.objects.filter(
+                product_id__in=product_ids, tickettier_id__in=tier_ids,
+            ).select_related('tickettier')
+            tiers = {(link.product_id, link.tickettier_id): link.tickettier for link in links}
+
+        total_amount = Decimal('0')
+        purchases = []
+        for item in cart_items:
+            quantity = item['quantity']
+            tier = None
             if 'product_id' in item:
-                print(f"DEBUG: Found product_id: {item['product_id']}")
-                # Frontend is sending product_id, fetch the product
-                try:
-                    product = Product.objects.get(id=item['product_id'])
-                    quantity = item['quantity']
-                    
-                    # Check if this is a ticket event with specific tier pricing
-                    item_price = product.price
-                    ticket_tier_id = item.get('ticket_tier_id')
-                    
-                    if ticket_tier_id and product.is_ticket_event and product.ticket_tiers:
-                        try:
-                            ticket_tier = product.ticket_tiers.get(id=ticket_tier_id)
-                            item_price = ticket_tier.price
-                            print(f"DEBUG: Using ticket tier price: ₦{item_price} for tier: {ticket_tier.name}")
-                        except Exception as e:
-                            print(f"DEBUG: Error getting ticket tier {ticket_tier_id}: {e}")
-                            # Fall back to product price
-                            item_price = product.price
-                    
-                    total_amount += item_price * quantity
-                    processed_items.append({
-                        'product': product,
-                        'quantity': quantity,
-                        'unit_price': item_price,
-                        'ticket_tier_id': ticket_tier_id
-                    })
-                    print(f"DEBUG: Successfully processed product {product.id} with quantity {quantity} at price ₦{item_price}")
-                except Product.DoesNotExist:
-                    raise ValidationError(f"Product with ID {item['product_id']} not found")
-            elif 'product' in item:
-                print(f"DEBUG: Found product object: {item['product']}")
-                product = item['product']
-                quantity = item['quantity']
-                total_amount += product.price * quantity
-                processed_items.append({
-                    'product': product,
-                    'quantity': quantity
-                })
+                product = products[item['product_id']]
+                ticket_tier_id = item.get('ticket_tier_id')
+                if ticket_tier_id and product.product_type == 'event':
+                    tier = tiers.get((product.id, ticket_tier_id))
+                    if tier is None:
+                        raise ValidationError(
+                            f"Ticket tier {ticket_tier_id} is not available for product {product.id}"
+                        )
             else:
-                print(f"DEBUG: Item missing both product_id and product fields")
-                print(f"DEBUG: Available keys: {list(item.keys()) if isinstance(item, dict) else 'Not a dict'}")
-                raise ValidationError("Each item must have either 'product_id' or 'product' field")
-        
-        # Create payment with requested provider or default
-        payment = Payment.objects.create(
-            user=user,
-            reference=reference,
-            amount=total_amount,
-            currency='NGN',
-            payment_provider=payment_provider if payment_provider else getattr(settings, 'PAYMENT_PROVIDER', 'paystack')
-        )
-        
-        # Create purchases
-        for item in processed_items:
-            purchase = Purchase.objects.create(
-                payment=payment,
-                product=item['product'],
-                quantity=item['quantity'],
-                unit_price=item['unit_price'],
-                total_price=item['unit_price'] * item['quantity']
+                product = item['product']
+
+            unit_price = tier.price if tier else product.price
+            total_amount += unit_price * quantity
+            purchases.append(Purchase(
+                product=product,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_price=unit_price * quantity,
+                selected_ticket_tier=tier,
+            ))
+
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                user=user,
+                reference=reference,
+                amount=total_amount,
+                currency='NGN',
+                payment_provider=payment_provider if payment_provider else getattr(settings, 'PAYMENT_PROVIDER', 'paystack')
             )
-            
-            # Set ticket tier if specified
-            if item.get('ticket_tier_id'):
-                try:
-                    from products.models import TicketTier
-                    ticket_tier = TicketTier.objects.get(id=item['ticket_tier_id'])
-                    purchase.selected_ticket_tier = ticket_tier
-                    purchase.save()
-                    print(f"DEBUG: Set ticket tier {ticket_tier.name} for purchase {purchase.id}")
-                except Exception as e:
-                    print(f"DEBUG: Error setting ticket tier: {e}")
-        
+            for purchase in purchases:
+                purchase.payment = payment
+            Purchase.objects.bulk_create(purchases)
+            # Set the seats aside until the payment lands or the hold expires.
+            # Raises (rolling the payment back) if the tier is sold out.
+            tier_items = [(p.selected_ticket_tier, p.quantity) for p in purchases if p.selected_ticket_tier]
+            if tier_items:
+                inventory.hold(payment, tier_items)
+
+        logger.info("Created payment %s for %d cart item(s), total %s", reference, len(purchases), total_amount)
         return payment
 
     @staticmethod
@@ -714,189 +462,32 @@ class PaymentService:
         # issue duplicate library entries and tickets and double-count
         # quantity_sold. Claim the payment atomically: only the caller that
         # actually flips the row from non-success proceeds.
-        claimed = Payment.objects.filter(
-            pk=payment.pk
-        ).exclude(
-            status=Payment.PaymentStatus.SUCCESS
-        ).update(status=Payment.PaymentStatus.SUCCESS)
-
-        if not claimed:
-            print(f"DEBUG: Payment {payment.reference} already processed; skipping.")
-            return payment
+        #
+        # The claim and the fulfilment writes share one transaction. If
+        # granting the order fails the claim is rolled back with it and the
+        # exception propagates, so the webhook answers 500 and the provider's
+        # retry gets a clean second attempt instead of a "success" payment
+        # with nothing in the buyer's library.
+        with transaction.atomic():
+            claimed = Payment.objects.filter(
+                pk=payment.pk
+            ).exclude(
+                status=Payment.PaymentStatus.SUCCESS
+            ).update(status=Payment.PaymentStatus.SUCCESS)
+
+            if not claimed:
+                print(f"DEBUG: Payment {payment.reference} already processed; skipping.")
+                return payment
+
+            purchases = fulfill_payment(payment)
+            # Tell anyone watching the checkout (streams.py) once it commits.
+            transaction.on_commit(lambda: progress.payment_claimed(payment, purchases))
+            # Emails, tickets and notifications are queued here and run after
+            # the commit, so the provider gets its 200 without waiting on them.
+            outbox.enqueue(payment, purchases)
 
         payment.status = Payment.PaymentStatus.SUCCESS
-        print(f"DEBUG: Payment status updated to: {payment.status}")
-        
-        # Now process everything else - if this fails, payment is still successful
-        try:
-            # Add products to user library
-            purchases = payment.purchases.all()
-            print(f"DEBUG: Found {purchases.count()} purchases to add to library")
-            
-            for purchase in purchases:
-                try:
-                    # Create commission record for seller
-                    commission = None
-                    if payment.payment_provider == 'flutterwave':
-                        from .services import FlutterwaveService
-                        flutterwave_service = FlutterwaveService()
-                        commission = flutterwave_service.create_seller_commission(purchase)
-                    else:
-                        from .services import PaystackService
-                        paystack_service = PaystackService()
-                        commission = paystack_service.create_seller_commission(purchase)
-                    
-                    if purchase.product.product_type == 'event':
-                        # For event tickets, create separate library entries for each ticket
-                        for ticket_number in range(purchase.quantity):
-                            UserLibrary.objects.create(
-                                user=payment.user,
-                                product=purchase.product,
-                                purchase=purchase,
-                                quantity=1
-                            )
-                        print(f"DEBUG: Created {purchase.quantity} library entries for event: {purchase.product.title}")
-                    else:
-                        # For digital products, create one library entry with the full quantity
-                        UserLibrary.objects.create(
-                            user=payment.user,
-                            product=purchase.product,
-                            purchase=purchase,
-                            quantity=purchase.quantity
-                        )
-                        print(f"DEBUG: Created library entry for digital product: {purchase.product.title} x{purchase.quantity}")
-
-                    # Decrement ticket tier quantity_sold
-                    if purchase.selected_ticket_tier:
-                        from django.db.models import F
-                        from products.models import TicketTier
-                        TicketTier.objects.filter(id=purchase.selected_ticket_tier.id).update(
-                            quantity_sold=F('quantity_sold') + purchase.quantity
-                        )
-                        print(f"DEBUG: Updated quantity_sold for tier {purchase.selected_ticket_tier.id} by {purchase.quantity}")
-
-                    # Update seller earnings
-                    if commission:
-                        if payment.payment_provider == 'flutterwave':
-                            flutterwave_service.update_seller_earnings(purchase.product.owner)
-                        else:
-                            paystack_service.update_seller_earnings(purchase.product.owner)
-                        
-                except Exception as e:
-                    print(f"DEBUG: Error adding product to library: {str(e)}")
-                    # Continue with other products even if one fails
-                    continue
-            
-            print(f"DEBUG: Successfully processed payment and added items to library")
-            
-            # Send emails and notifications after successful payment processing (non-blocking)
-            try:
-                # Import notification service
-                from apps.notifications.services import NotificationService
-                
-                # Send purchase receipt email once with all purchases
-                try:
-                    send_purchase_receipt_email(payment, purchases)
-                except Exception as email_error:
-                    print(f"DEBUG: Error sending purchase receipt email: {str(email_error)}")
-                
-                # Send seller notification email once with all purchases
-                try:
-                    send_seller_notification_email(payment, purchases)
-                except Exception as email_error:
-                    print(f"DEBUG: Error sending seller notification email: {str(email_error)}")
-                   
-                # Check if any purchases are events
-                has_events = any(p.product.product_type == 'event' for p in purchases)
-                
-                # SECOND FUNCTION - Create event tickets (this is the main function being called)
-                print(f"DEBUG: Checking for events - has_events: {has_events}")
-                if has_events:
-                    print(f"DEBUG: Found events, starting ticket creation process")
-                    # Collect all event tickets first
-                    all_event_tickets = []
-                    event_products = {}
-                    
-                    for purchase in purchases:
-                        if purchase.product.product_type == 'event':
-                            print(f"DEBUG: Creating {purchase.quantity} tickets for event: {purchase.product.title}")
-                            
-                            # Import here to avoid circular imports
-                            from apps.events.fast_models import FastEventTicket
-                            
-                            # Create fast tickets based on quantity with error handling
-                            tickets = []
-                            for ticket_num in range(purchase.quantity):
-                                try:
-                                    print(f"DEBUG: Creating fast ticket {ticket_num + 1} for event {purchase.product.title}")
-                                    
-                                    # Create fast ticket (PNG generation happens automatically)
-                                    ticket = FastEventTicket(
-                                        purchase=purchase,
-                                        buyer=payment.user,
-                                        event=purchase.product
-                                    )
-                                    ticket.save()  # This will trigger QR code generation
-                                    
-                                    tickets.append(ticket)
-                                    print(f"DEBUG: ✅ Created ticket {ticket.ticket_id} for event {purchase.product.title}")
-                                    
-                                except Exception as ticket_error:
-                                    print(f"DEBUG: ❌ Error creating ticket {ticket_num + 1}: {str(ticket_error)}")
-                                    import traceback
-                                    traceback.print_exc()
-                                    # Continue with other tickets even if one fails
-                                    continue
-                            
-                            # Group tickets by event product
-                            if purchase.product.id not in event_products:
-                                event_products[purchase.product.id] = {
-                                    'product': purchase.product,
-                                    'tickets': [],
-                                    'purchase': purchase
-                                }
-                            event_products[purchase.product.id]['tickets'].extend(tickets)
-                            all_event_tickets.extend(tickets)
-                    
-                    print(f"DEBUG: Successfully created {len(all_event_tickets)} event tickets")
-                    
-                    # Send event ticket emails immediately (QR codes should be generated by now)
-                    for product_id, event_data in event_products.items():
-                        try:
-                            send_event_ticket_email(payment.user, event_data['product'], event_data['tickets'])
-                            print(f"DEBUG: ✅ Event ticket email sent for {event_data['product'].title}")
-                        except Exception as email_error:
-                            print(f"DEBUG: ❌ Error sending event ticket email: {str(email_error)}")
-                        
-                        # Send notification
-                        try:
-                            NotificationService.send_event_ticket_notification(payment.user, event_data['product'], event_data['tickets'])
-                        except Exception as notif_error:
-                            print(f"DEBUG: ❌ Error sending event ticket notification: {str(notif_error)}")
-                
-                # Send payment notification once for the buyer
-                try:
-                    NotificationService.send_payment_notification(payment, payment.user)
-                    print(f"DEBUG: ✅ Payment notification sent to buyer")
-                except Exception as notif_error:
-                    print(f"DEBUG: ❌ Error sending payment notification: {str(notif_error)}")
-                
-                # Send order notifications for all purchases (both events and digital products)
-                for purchase in purchases:
-                    try:
-                        NotificationService.send_order_notification(purchase, purchase.product.owner)
-                    except Exception as notif_error:
-                        print(f"DEBUG: Error sending order notification: {str(notif_error)}")
-                        
-            except Exception as e:
-                print(f"DEBUG: Error sending emails/notifications: {str(e)}")
-                # Don't fail the payment if emails/notifications fail
-        
-        except Exception as processing_error:
-            print(f"DEBUG: Error in post-payment processing: {str(processing_error)}")
-            print(f"DEBUG: Payment is still successful, but some processing failed")
-            # Payment status is already set to SUCCESS, so we're good
-        
+        print(f"DEBUG: Payment {payment.reference} fulfilled ({len(purchases)} purchases)")
         return payment
 
 class PayoutService:
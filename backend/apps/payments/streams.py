@@ -0,0 +1,209 @@
+"""
+Push feed of a payment's progress: Server-Sent Events, or long-poll.
+
+GET /api/payments/events/<reference>/ with `Accept: text/event-stream` opens
+an SSE stream. It starts with a 'progress' event carrying the current record
+(progress.py), then relays 'payment.claimed', 'library.ready' and
+'ticket.rendered' as fulfilment publishes them, and ends with 'complete' once
+nothing more is coming. Every event carries an id, so a reconnecting
+EventSource resumes from Last-Event-ID instead of starting over; reconnecting
+to a finished payment answers 204, which tells EventSource to stop.
+
+Without that header the same URL long-polls: `?since=<id>` (default: now)
+waits up to `?timeout=` seconds (max LONG_POLL_MAX) for events after that id
+and returns them as JSON with the new cursor.
+
+Under ASGI (core/asgi.py) a stream costs a coroutine, so it stays open for
+STREAM_FOR. Under WSGI it holds a worker thread, so it is cut after
+WSGI_STREAM_FOR and the browser's automatic reconnect picks it up again.
+
+EventSource can't send an Authorization header, so the access token may
+also be passed as `?token=`. Only the buyer can watch their payment.
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import progress
+
+POLL_INTERVAL = 0.5            # seconds between looks at the event counter
+RECHECK_EVERY = 10             # re-read the record even without events
+HEARTBEAT_EVERY = 15           # keep proxies from closing an idle stream
+STREAM_FOR = 5 * 60
+WSGI_STREAM_FOR = 25
+LONG_POLL_MAX = 25
+RECONNECT_MS = 1000
+
+
+def _authenticate(request):
+    auth = JWTAuthentication()
+    try:
+        found = auth.authenticate(request)
+        if found is None and request.GET.get('token'):
+            found = auth.get_user(auth.get_validated_token(request.GET['token'])), None
+    except AuthenticationFailed:
+        return None
+    return found[0] if found else None
+
+
+def _public(state):
+    data = {k: v for k, v in state.items() if k != 'user_id'}
+    data['is_complete'] = progress.is_complete(state)
+    return data
+
+
+def _cursor(value, default):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+class _Feed:
+    """One subscriber's position in a payment's event feed."""
+
+    def __init__(self, reference, state, cursor, latest):
+        self.reference = reference
+        self.state = state
+        self.cursor = cursor
+        self.latest = latest
+        self.done = progress.is_finished(state)
+        self._checked = time.monotonic()
+
+    def poll(self):
+        """Events published since the last poll; refreshes state and done."""
+        try:
+            events, latest = progress.events_since(self.reference, self.cursor)
+        except Exception:
+            events, latest = [], self.cursor
+        self.cursor = max(self.cursor, latest)
+        now = time.monotonic()
+        if events or now - self._checked >= RECHECK_EVERY:
+            # Events say what happened; the record says whether it's over
+            # (and covers anything published while the cache was down).
+            self.state = progress.get(self.reference) or self.state
+            self.done = progress.is_finished(self.state)
+            self._checked = now
+        return events
+
+
+def _open(user, reference, since):
+    # Read the counter before the record: anything published in between is
+    # both in the record and sent again as an event, never lost.
+    try:
+        _, latest = progress.events_since(reference, 1 << 62)
+    except Exception:
+        latest = 0
+    state = progress.get(reference)
+    if state is None or state['user_id'] != user.pk:
+        return None
+    return _Feed(reference, state, latest if since is None else since, latest)
+
+
+def _sse(event, data, number=None):
+    head = f"id: {number}\n" if number is not None else ''
+    return f"{head}event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _opening(feed):
+    return f"retry: {RECONNECT_MS}\n\n" + _sse('progress', _public(feed.state), feed.cursor)
+
+
+def _frames(events):
+    return [_sse(event['event'], event, number) for number, event in events]
+
+
+def _closing(feed):
+    return _sse('complete', _public(feed.state), feed.cursor)
+
+
+def _stream(feed, duration):
+    yield _opening(feed)
+    deadline = time.monotonic() + duration
+    quiet_since = time.monotonic()
+    while not feed.done and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        frames = _frames(feed.poll())
+        if frames:
+            quiet_since = time.monotonic()
+            yield ''.join(frames)
+        elif time.monotonic() - quiet_since >= HEARTBEAT_EVERY:
+            quiet_since = time.monotonic()
+            yield ': keep-alive\n\n'
+    if feed.done:
+        yield _closing(feed)
+
+
+async def _astream(feed, duration):
+    poll = sync_to_async(feed.poll)
+    yield _opening(feed)
+    deadline = time.monotonic() + duration
+    quiet_since = time.monotonic()
+    while not feed.done and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        frames = _frames(await poll())
+        if frames:
+            quiet_since = time.monotonic()
+            yield ''.join(frames)
+        elif time.monotonic() - quiet_since >= HEARTBEAT_EVERY:
+            quiet_since = time.monotonic()
+            yield ': keep-alive\n\n'
+    if feed.done:
+        yield _closing(feed)
+
+
+async def _long_poll(feed, timeout):
+    poll = sync_to_async(feed.poll)
+    deadline = time.monotonic() + timeout
+    events = await poll()
+    while not events and not feed.done and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        events = await poll()
+    return events
+
+
+@require_GET
+async def payment_events(request, reference):
+    """SSE / long-poll feed of a payment's fulfilment progress."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    streaming = 'text/event-stream' in request.headers.get('Accept', '')
+    resume = request.headers.get('Last-Event-ID') if streaming else request.GET.get('since')
+    since = _cursor(resume, None) if resume is not None else None
+
+    feed = await sync_to_async(_open)(user, reference, since)
+    if feed is None:
+        return JsonResponse({'error': 'Payment not found'}, status=404)
+
+    if streaming:
+        if feed.done and since is not None and since >= feed.latest:
+            # A reconnect after 'complete': 204 stops EventSource retrying.
+            return HttpResponse(status=204)
+        if isinstance(request, ASGIRequest):
+            body = _astream(feed, STREAM_FOR)
+        else:
+            body = _stream(feed, WSGI_STREAM_FOR)
+        response = StreamingHttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    timeout = min(_cursor(request.GET.get('timeout'), LONG_POLL_MAX), LONG_POLL_MAX)
+    events = await _long_poll(feed, timeout)
+    return JsonResponse({
+        'cursor': feed.cursor,
+        'events': [{'id': number, **event} for number, event in events],
+        'progress': _public(feed.state),
+        'finished': feed.done,
+    }, encoder=DjangoJSONEncoder)
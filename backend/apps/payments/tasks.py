@@ -0,0 +1,59 @@
+"""
+Background tasks for payment processing.
+
+Routed to the 'payment_processing' queue by core/celery.py. These are thin
+wrappers: the work and its retry bookkeeping live in apps.payments.outbox, so
+the same code runs under Celery and under run_payment_outbox.
+"""
+from apps.taskqueue.decorators import shared_task
+import logging
+
+from . import fee_schedule, inventory, outbox, payout_sync, webhook_inbox
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def process_payment_outbox(payment_id):
+    """Run the post-payment steps owed for one payment."""
+    return outbox.process_payment(payment_id)
+
+
+@shared_task(ignore_result=True)
+def drain_payment_outbox(batch_size=100):
+    """Periodic sweep: retries that have come due and work a dead worker left behind."""
+    processed = outbox.drain(batch_size)
+    if processed:
+        logger.info("Drained outbox for %d payment(s)", processed)
+    return processed
+
+
+@shared_task(ignore_result=True)
+def release_expired_ticket_holds(batch_size=500):
+    """Periodic sweep: give seats held by abandoned checkouts back to their tier."""
+    return inventory.release_expired(batch_size=batch_size)
+
+
+@shared_task(ignore_result=True)
+def send_payout_status_emails(payout_ids):
+    """Seller emails for payouts the reconciler just settled."""
+    return payout_sync.send_emails(payout_ids)
+
+
+@shared_task(ignore_result=True)
+def refresh_transfer_fees():
+    """Keep every transfer fee band learned, so payouts never wait on /transfers/fee."""
+    from .services import FlutterwaveService
+    return fee_schedule.refresh_all(FlutterwaveService().fetch_transfer_fee)
+
+
+@shared_task(ignore_result=True)
+def process_webhook_event(event_id):
+    """Re-verify and act on one stored webhook delivery."""
+    return webhook_inbox.process_event(event_id)
+
+
+@shared_task(ignore_result=True)
+def drain_webhook_inbox(batch_size=50):
+    """Periodic sweep: webhook retries, and events a dead worker left behind."""
+    return webhook_inbox.drain(batch_size)
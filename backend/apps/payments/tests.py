@@ -13,15 +13,26 @@ says X" cases are deterministic.
 import hashlib
 import hmac
 import json
+import time
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch, Mock
 
+from django.core import mail
+from django.core.management import call_command
 from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from core.test_factories import make_payment, make_user, make_product, make_seller
+from core.test_factories import make_payment, make_user, make_product, make_seller, make_event
 from users.models import BankDetail
-from .models import Payment, UserLibrary, PayoutRequest
+from .models import (
+    Payment, Purchase, UserLibrary, PayoutRequest, SellerCommission, SellerEarnings,
+    EarningsLedgerEntry, PaymentOutboxTask, SellerDailyStats, WebhookEvent,
+)
 from .services import FlutterwaveService
 
 PAYSTACK_KEY = 'sk_test_webhook_key'
@@ -43,10 +54,13 @@ class PaymentWebhookSecurityTests(TestCase):
         self.payment = make_payment(amount='5000.00', payment_provider='paystack')
 
     def _post(self, body, **headers):
-        return self.client.post(
+        from . import webhook_inbox
+        response = self.client.post(
             self.url, data=json.dumps(body),
             content_type='application/json', **headers,
         )
+        webhook_inbox.drain()  # what the worker does after the 200
+        return response
 
     def assert_not_fulfilled(self):
         self.payment.refresh_from_db()
@@ -90,8 +104,11 @@ class PaymentWebhookSecurityTests(TestCase):
         body = {'data': {'reference': self.payment.reference, 'status': 'success'}}
         raw = json.dumps(body).encode()
         res = self._post(body, HTTP_X_PAYSTACK_SIGNATURE=paystack_sig(raw))
-        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res.status_code, 200)  # acknowledged; the inbox refuses it
         self.assert_not_fulfilled()
+        event = WebhookEvent.objects.get(reference=self.payment.reference)
+        self.assertEqual(event.status, WebhookEvent.Status.FAILED)
+        self.assertIn('amount mismatch', event.last_error)
 
     @patch('apps.payments.views.PaystackService.verify_payment')
     def test_valid_signature_and_provider_confirms_grants_product(self, mock_verify):
@@ -106,6 +123,62 @@ class PaymentWebhookSecurityTests(TestCase):
         self.assertEqual(UserLibrary.objects.filter(user=self.payment.user).count(), 1)
 
 
+@override_settings(PAYSTACK_SECRET_KEY=PAYSTACK_KEY)
+class WebhookInboxTests(TestCase):
+    """The webhook only authenticates and stores a delivery; the inbox
+    dedupes it and does the verify-and-fulfil work afterwards."""
+
+    def setUp(self):
+        cache.clear()
+        self.payment = make_payment(amount='5000.00', payment_provider='paystack')
+        self.body = {'event': 'charge.success',
+                     'data': {'id': 4242, 'reference': self.payment.reference, 'status': 'success'}}
+
+    def _deliver(self):
+        raw = json.dumps(self.body).encode()
+        return self.client.post('/api/payments/webhook/', data=raw, content_type='application/json',
+                                HTTP_X_PAYSTACK_SIGNATURE=paystack_sig(raw))
+
+    @patch('apps.payments.views.PaystackService.verify_payment')
+    def test_acknowledges_without_calling_the_provider(self, mock_verify):
+        mock_verify.return_value = {'data': {'status': 'success', 'amount': 500000}}
+        self.assertEqual(self._deliver().status_code, 200)
+        mock_verify.assert_not_called()
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.provider, event.kind, event.event_id), ('paystack', 'charge', '4242'))
+        self.assertEqual(json.loads(event.body), self.body)
+
+        from . import webhook_inbox
+        self.assertEqual(webhook_inbox.process_event(event.pk), WebhookEvent.Status.DONE)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.PaymentStatus.SUCCESS)
+        self.assertEqual(WebhookEvent.objects.get().outcome, 'fulfilled')
+
+    def test_retried_delivery_is_deduped(self):
+        self._deliver()
+        self._deliver()
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.deliveries, 2)
+
+    @patch('apps.payments.views.PaystackService.verify_payment', side_effect=ConnectionError('down'))
+    def test_unverifiable_event_backs_off_and_replays(self, mock_verify):
+        from . import webhook_inbox
+        self._deliver()
+        webhook_inbox.drain()
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.Status.PENDING, 1))
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(webhook_inbox.drain(), 0)  # not due yet
+
+        mock_verify.side_effect = None
+        mock_verify.return_value = {'data': {'status': 'success', 'amount': 500000}}
+        out = StringIO()
+        call_command('run_webhook_inbox', '--once', '--replay', str(event.pk), stdout=out)
+        self.assertIn('Processed 1 webhook event(s)', out.getvalue())
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.PaymentStatus.SUCCESS)
+
+
 class ProcessPaymentIdempotencyTests(TestCase):
     def test_processing_twice_does_not_duplicate_library_entries(self):
         from .services import PaymentService
@@ -128,6 +201,295 @@ class ProcessPaymentIdempotencyTests(TestCase):
         self.assertEqual(UserLibrary.objects.filter(user=payment.user).count(), 0)
 
 
+class CheckoutConstructionTests(TestCase):
+    """create_payment_from_cart resolves the whole cart in a fixed number of
+    queries and checks tiers belong to their product."""
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        from . import inventory
+        from .services import PaymentService
+        buyer = make_user()
+        event = make_event(tiers=[('VIP', 5000, 800), ('Regular', 1000, 10)])
+        vip = event.ticket_tiers.get(name='VIP')
+        inventory.rebalance(vip.id)
+        small = [{'product_id': event.id, 'quantity': 1, 'ticket_tier_id': vip.id}]
+        large = [{'product_id': make_product().id, 'quantity': 2} for _ in range(8)]
+        large.append({'product_id': event.id, 'quantity': 3, 'ticket_tier_id': vip.id})
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            PaymentService.create_payment_from_cart(buyer, small)
+        with CaptureQueriesContext(connection) as large_ctx:
+            payment = PaymentService.create_payment_from_cart(buyer, large)
+
+        self.assertEqual(len(large_ctx), len(small_ctx))
+        self.assertEqual(payment.purchases.count(), 9)
+        ticket = payment.purchases.get(product=event)
+        self.assertEqual(ticket.selected_ticket_tier, vip)
+        self.assertEqual(ticket.total_price, Decimal('15000.00'))
+        self.assertEqual(payment.amount, Decimal('8') * 2 * Decimal('1000.00') + Decimal('15000.00'))
+
+    def test_tier_from_another_event_is_rejected(self):
+        from django.core.exceptions import ValidationError
+        from .services import PaymentService
+        event = make_event(tiers=[('Regular', 1000, 10)])
+        other_tier = make_event(tiers=[('VIP', 9000, 10)]).ticket_tiers.get()
+
+        with self.assertRaises(ValidationError):
+            PaymentService.create_payment_from_cart(
+                make_user(), [{'product_id': event.id, 'quantity': 1, 'ticket_tier_id': other_tier.id}]
+            )
+        self.assertFalse(Payment.objects.exists())
+
+    def test_unknown_product_is_rejected(self):
+        from django.core.exceptions import ValidationError
+        from .services import PaymentService
+        with self.assertRaises(ValidationError):
+            PaymentService.create_payment_from_cart(make_user(), [{'product_id': 999999, 'quantity': 1}])
+
+
+class TicketInventoryTests(TestCase):
+    """Checkout holds seats so a tier can't be oversold while payments are
+    in flight; holds convert on payment and come back when they lapse."""
+
+    def setUp(self):
+        self.event = make_event(tiers=[('VIP', 5000, 3)])
+        self.tier = self.event.ticket_tiers.get()
+
+    def _checkout(self, quantity):
+        from .services import PaymentService
+        return PaymentService.create_payment_from_cart(
+            make_user(), [{'product_id': self.event.id, 'quantity': quantity, 'ticket_tier_id': self.tier.id}]
+        )
+
+    def _free(self):
+        from .models import TicketInventoryShard
+        return sum(TicketInventoryShard.objects.filter(tier=self.tier).values_list('available', flat=True))
+
+    def test_hold_takes_seats_and_blocks_oversell(self):
+        from django.core.exceptions import ValidationError
+        from .models import TicketHold
+        self._checkout(2)
+        self.assertEqual(self._free(), 1)
+        self.assertEqual(TicketHold.objects.get().quantity, 2)
+
+        with self.assertRaises(ValidationError):
+            self._checkout(2)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(self._free(), 1)
+
+    def test_held_out_tier_is_not_offered(self):
+        self._checkout(3)
+        self.assertFalse(self.event.available_ticket_tiers.exists())
+
+    def test_expired_hold_is_released(self):
+        from .inventory import release_expired
+        from .models import TicketHold
+        payment = self._checkout(3)
+        TicketHold.objects.filter(payment=payment).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual(self._free(), 3)
+        self.assertEqual(TicketHold.objects.get().status, TicketHold.Status.RELEASED)
+        self.assertEqual(release_expired(), 0)
+
+    def test_checkout_reclaims_expired_holds_when_sold_out(self):
+        from .models import TicketHold
+        first = self._checkout(3)
+        TicketHold.objects.filter(payment=first).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        second = self._checkout(3)
+        self.assertEqual(second.ticket_holds.get().status, TicketHold.Status.HELD)
+        self.assertEqual(self._free(), 0)
+
+    def test_failed_payment_releases_its_hold(self):
+        from .inventory import release_for_payment
+        payment = self._checkout(2)
+        self.assertEqual(release_for_payment(payment), 1)
+        self.assertEqual(self._free(), 3)
+        self.assertEqual(release_for_payment(payment), 0)
+
+    def test_paid_hold_converts_and_keeps_seats(self):
+        from .models import TicketHold
+        from .services import PaymentService
+        payment = self._checkout(2)
+        PaymentService.process_successful_payment(payment)
+
+        self.assertEqual(payment.ticket_holds.get().status, TicketHold.Status.CONVERTED)
+        self.assertEqual(self._free(), 1)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.quantity_sold, 2)
+
+    def test_sweeper_command(self):
+        from .models import TicketHold
+        payment = self._checkout(1)
+        TicketHold.objects.filter(payment=payment).update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('release_expired_ticket_holds', stdout=out)
+        self.assertIn('Released 1 expired hold(s)', out.getvalue())
+
+
+class BulkFulfillmentTests(TestCase):
+    """Fulfilment writes a whole order in a fixed number of statements and
+    shares a transaction with the claim."""
+
+    def _payment_with(self, user, products, quantity=1, tier=None):
+        payment = Payment.objects.create(
+            user=user, reference=f'REF-BULK-{Payment.objects.count()}',
+            amount=Decimal('1000.00'),
+        )
+        for product in products:
+            Purchase.objects.create(
+                payment=payment, product=product, quantity=quantity,
+                unit_price=Decimal('1000.00'), selected_ticket_tier=tier,
+            )
+        return payment
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        from .fulfillment import fulfill_payment
+        seller = make_seller()
+        buyer = make_user()
+        # First sale creates the seller's earnings row; measure after that.
+        fulfill_payment(self._payment_with(buyer, [make_product(owner=seller)]))
+        small = self._payment_with(buyer, [make_product(owner=seller)])
+        large = self._payment_with(buyer, [make_product(owner=seller) for _ in range(6)])
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            fulfill_payment(small)
+        with CaptureQueriesContext(connection) as large_ctx:
+            fulfill_payment(large)
+
+        self.assertEqual(len(small_ctx), len(large_ctx))
+        self.assertEqual(UserLibrary.objects.filter(purchase__payment=large).count(), 6)
+        self.assertEqual(SellerCommission.objects.filter(purchase__payment=large).count(), 6)
+        self.assertEqual(seller.earnings.total_sales, Decimal('8000.00'))
+
+    def test_event_order_grants_one_row_per_ticket_and_counts_tier(self):
+        from .fulfillment import fulfill_payment
+        event = make_event(tiers=[('VIP', 1000, 50)])
+        tier = event.ticket_tiers.get()
+        payment = self._payment_with(make_user(), [event], quantity=3, tier=tier)
+
+        fulfill_payment(payment)
+
+        tier.refresh_from_db()
+        self.assertEqual(tier.quantity_sold, 3)
+        self.assertEqual(UserLibrary.objects.filter(purchase__payment=payment).count(), 3)
+        commission = SellerCommission.objects.get(purchase__payment=payment)
+        self.assertEqual(commission.commission_amount, Decimal('120.00'))
+
+    def test_failed_fulfilment_rolls_back_the_claim(self):
+        from .services import PaymentService
+        payment = make_payment()
+        with patch('apps.payments.fulfillment._increment_tiers', side_effect=RuntimeError('db gone')):
+            with self.assertRaises(RuntimeError):
+                PaymentService.process_successful_payment(payment)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PaymentStatus.PENDING)
+        self.assertFalse(UserLibrary.objects.filter(user=payment.user).exists())
+        self.assertFalse(SellerCommission.objects.exists())
+
+
+class PaymentOutboxTests(TestCase):
+    """Post-payment work is queued in the claim transaction and run after it,
+    one tracked, retryable step at a time."""
+
+    def _claim(self, payment):
+        from .services import PaymentService
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            PaymentService.process_successful_payment(payment)
+        return callbacks
+
+    def test_claim_queues_steps_and_sends_nothing_inline(self):
+        payment = make_payment()
+        callbacks = self._claim(payment)
+
+        self.assertEqual(len(callbacks), 2)  # progress + dispatch run after commit
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            set(PaymentOutboxTask.objects.filter(payment=payment).values_list('step', flat=True)),
+            {'receipt_email', 'seller_email', 'buyer_notification', 'seller_notifications'},
+        )
+
+    def test_event_order_also_queues_tickets(self):
+        payment = make_payment(product=make_event(tiers=[('Regular', 1000, 10)]))
+        self._claim(payment)
+        steps = set(PaymentOutboxTask.objects.filter(payment=payment).values_list('step', flat=True))
+        self.assertIn('event_tickets', steps)
+        self.assertIn('ticket_email', steps)
+        self.assertIn('ticket_notification', steps)
+
+    def test_processing_runs_every_step_once(self):
+        from . import outbox
+        payment = make_payment()
+        self._claim(payment)
+
+        outbox.process_payment(payment.pk)
+        outbox.process_payment(payment.pk)  # nothing left to do
+
+        self.assertFalse(PaymentOutboxTask.objects.exclude(status='done').exists())
+        receipts = [m for m in mail.outbox if payment.user.email in m.to]
+        self.assertEqual(len(receipts), 1)
+
+    def test_failed_step_backs_off_and_retries_alone(self):
+        from . import outbox
+        payment = make_payment()
+        self._claim(payment)
+
+        with patch('users.utils.send_purchase_receipt_email', return_value=False):
+            outbox.process_payment(payment.pk)
+        task = PaymentOutboxTask.objects.get(payment=payment, step='receipt_email')
+        self.assertEqual(task.status, 'pending')
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.available_at, timezone.now())
+        sent_before = len(mail.outbox)
+
+        # Not due yet: a drain leaves it alone.
+        self.assertEqual(outbox.drain(), 0)
+
+        PaymentOutboxTask.objects.filter(pk=task.pk).update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'done')
+        self.assertEqual(len(mail.outbox), sent_before + 1)  # only the receipt went out again
+
+    def test_ticket_email_waits_for_tickets(self):
+        from . import outbox
+        payment = make_payment(product=make_event(tiers=[('Regular', 1000, 10)]))
+        self._claim(payment)
+
+        def broken(*args):
+            raise RuntimeError('renderer down')
+
+        with patch.dict(outbox.HANDLERS, {'event_tickets': broken}):
+            outbox.process_payment(payment.pk)
+
+        tasks = dict(PaymentOutboxTask.objects.filter(payment=payment).values_list('step', 'status'))
+        self.assertEqual(tasks['event_tickets'], 'pending')
+        self.assertEqual(tasks['ticket_email'], 'pending')
+        self.assertEqual(tasks['receipt_email'], 'done')
+
+    def test_failed_ticket_notification_does_not_resend_the_tickets(self):
+        from . import outbox
+        payment = make_payment(product=make_event(tiers=[('Regular', 1000, 10)]))
+        self._claim(payment)
+
+        with patch('apps.notifications.services.NotificationService.send_event_ticket_notification',
+                   side_effect=RuntimeError('notifications down')):
+            outbox.process_payment(payment.pk)
+        tasks = dict(PaymentOutboxTask.objects.filter(payment=payment).values_list('step', 'status'))
+        self.assertEqual(tasks['ticket_email'], 'done')
+        self.assertEqual(tasks['ticket_notification'], 'pending')
+        sent_before = len(mail.outbox)
+
+        PaymentOutboxTask.objects.filter(payment=payment).update(available_at=timezone.now())
+        with patch('apps.notifications.services.NotificationService.send_event_ticket_notification') as notify:
+            outbox.drain()
+        notify.assert_called_once()
+        self.assertEqual(len(mail.outbox), sent_before)
+        self.assertFalse(PaymentOutboxTask.objects.filter(payment=payment).exclude(status='done').exists())
+
+
 def _bank_for(seller):
     return BankDetail.objects.create(
         user=seller, bank_code='044', bank_name='Access Bank',
@@ -147,6 +509,599 @@ def _flw_transfer_response(transfer_id=999, accepted=True):
     return resp
 
 
+class TransferFeeScheduleTests(TestCase):
+    """Payout fees come from a cached, self-refreshing schedule, so sending a
+    payout is one provider call."""
+
+    def setUp(self):
+        cache.clear()
+        refresh = patch('apps.payments.fee_schedule.schedule_refresh')
+        self.schedule_refresh = refresh.start()
+        self.addCleanup(refresh.stop)
+
+    def _fee_response(self, fee):
+        m = Mock(ok=True, content=b'{}')
+        m.json.return_value = {'status': 'success', 'data': [{'fee': fee}]}
+        return m
+
+    @patch('apps.payments.provider_client.ProviderClient.get')
+    def test_cold_cache_uses_tier_table_and_refreshes_in_background(self, mock_get):
+        self.assertEqual(FlutterwaveService().get_transfer_fee(Decimal('3000')), Decimal('10'))
+        mock_get.assert_not_called()
+        self.schedule_refresh.assert_called_once()
+
+    @patch('apps.payments.provider_client.ProviderClient.get')
+    def test_learned_band_is_served_from_cache(self, mock_get):
+        from . import fee_schedule
+        svc = FlutterwaveService()
+        mock_get.return_value = self._fee_response(10.75)
+        fee_schedule.refresh(Decimal('2000'), svc.fetch_transfer_fee)
+        mock_get.reset_mock()
+
+        self.assertEqual(svc.get_transfer_fee(Decimal('4500')), Decimal('10.75'))  # same band
+        self.assertEqual(svc.get_transfer_fee(Decimal('20000')), Decimal('25'))    # not learned yet
+        mock_get.assert_not_called()
+        self.assertEqual(self.schedule_refresh.call_count, 1)
+
+    def test_stale_fee_is_served_while_refreshing(self):
+        from . import fee_schedule
+        fee_schedule.learn(Decimal('1000'), '12')
+        with patch('apps.payments.fee_schedule.time.time', return_value=time.time() + fee_schedule.FRESH_FOR):
+            fee = fee_schedule.lookup(Decimal('1000'), fetch=Mock())
+        self.assertEqual(fee, Decimal('12'))
+        self.schedule_refresh.assert_called_once()
+
+    @patch('apps.payments.provider_client.ProviderClient.get')
+    @patch('apps.payments.provider_client.ProviderClient.post')
+    def test_payout_makes_one_provider_call_and_learns_the_fee(self, mock_post, mock_get):
+        seller = make_seller()
+        payout = PayoutRequest.objects.create(
+            seller=seller, amount=Decimal('1000.00'), bank_details=_bank_for(seller), status='pending',
+        )
+        response = _flw_transfer_response(transfer_id=77)
+        response.json.return_value['data']['fee'] = 10.75
+        mock_post.return_value = response
+
+        self.assertTrue(FlutterwaveService().process_seller_payout(payout))
+        mock_get.assert_not_called()
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(mock_post.call_args.kwargs['json']['amount'], 990.0)  # fallback fee
+        self.assertEqual(FlutterwaveService().get_transfer_fee(Decimal('1000')), Decimal('10.75'))
+
+
+class PaymentProgressTests(TestCase):
+    """check_payment_status and the events feed answer from a cached progress
+    record that fulfilment keeps up to date."""
+
+    def setUp(self):
+        cache.clear()
+        self.event = make_event(tiers=[('Regular', 1000, 10)])
+        self.payment = make_payment(product=self.event, reference='REF-PROGRESS')
+        self.payment.purchases.update(quantity=2)
+        self.headers = self._auth(self.payment.user)
+
+    def _auth(self, user):
+        from rest_framework_simplejwt.tokens import AccessToken
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    def _claim(self):
+        from .services import PaymentService
+        with patch('apps.payments.outbox.dispatch'), self.captureOnCommitCallbacks(execute=True):
+            PaymentService.process_successful_payment(self.payment)
+
+    def _ticket(self, rendered=True):
+        return Mock(ticket_id='t-1', ticket_png='tickets/png/t.png' if rendered else None)
+
+    def test_status_poll_is_served_from_cache_after_claim(self):
+        from rest_framework.test import APIClient
+        self._claim()
+        client = APIClient()
+        client.force_authenticate(self.payment.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            body = client.get('/api/payments/check-status/REF-PROGRESS/').json()
+        self.assertEqual(len(ctx), 0)
+        self.assertEqual(body['payment']['status'], 'success')
+        self.assertEqual(body['tickets']['total_tickets_expected'], 2)
+        self.assertFalse(body['is_complete'])
+
+        from . import progress
+        progress.ticket_rendered(self.payment, self._ticket())
+        progress.ticket_rendered(self.payment, self._ticket())
+        body = client.get('/api/payments/check-status/REF-PROGRESS/').json()
+        self.assertEqual(body['tickets']['tickets_with_qr_codes'], 2)
+        self.assertTrue(body['is_complete'])
+
+    def test_cache_miss_counts_fast_tickets(self):
+        from apps.events.fast_models import FastEventTicket
+        from . import progress
+        self._claim()
+        purchase = self.payment.purchases.get()
+        FastEventTicket.objects.bulk_create([
+            FastEventTicket(purchase=purchase, buyer=self.payment.user, event=self.event,
+                            ticket_png='tickets/png/a.png'),
+            FastEventTicket(purchase=purchase, buyer=self.payment.user, event=self.event),
+        ])
+        cache.clear()
+
+        state = progress.get('REF-PROGRESS')
+        self.assertEqual((state['tickets_created'], state['tickets_rendered']), (2, 1))
+        self.assertFalse(progress.is_complete(state))
+
+    def test_long_poll_returns_published_events(self):
+        from . import progress
+        self._claim()
+        progress.ticket_rendered(self.payment, self._ticket())
+
+        body = self.client.get('/api/payments/events/REF-PROGRESS/?since=0&timeout=0', **self.headers).json()
+        self.assertEqual(
+            [e['event'] for e in body['events']],
+            ['payment.claimed', 'library.ready', 'ticket.rendered'],
+        )
+        self.assertEqual(body['cursor'], 3)
+        self.assertFalse(body['finished'])
+
+    def test_stream_ends_once_everything_is_ready(self):
+        from . import progress
+        self._claim()
+        progress.ticket_rendered(self.payment, self._ticket())
+        progress.ticket_rendered(self.payment, self._ticket())
+
+        response = self.client.get('/api/payments/events/REF-PROGRESS/',
+                                   HTTP_ACCEPT='text/event-stream', **self.headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = b''.join(response.streaming_content).decode()
+        self.assertIn('event: progress', stream)
+        self.assertIn('event: complete', stream)
+
+        again = self.client.get('/api/payments/events/REF-PROGRESS/', HTTP_ACCEPT='text/event-stream',
+                                HTTP_LAST_EVENT_ID='4', **self.headers)
+        self.assertEqual(again.status_code, 204)
+
+    def test_only_the_buyer_can_watch(self):
+        response = self.client.get('/api/payments/events/REF-PROGRESS/?timeout=0', **self._auth(make_user()))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/api/payments/events/REF-PROGRESS/').status_code, 401)
+
+
+class KeysetPaginationTests(TestCase):
+    """The library and payment history page by cursor when asked, and by
+    page number as before otherwise."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        cache.clear()
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        same_instant = timezone.now()
+        for _ in range(5):
+            payment = make_payment(user=self.user, status=Payment.PaymentStatus.SUCCESS)
+            purchase = payment.purchases.get()
+            UserLibrary.objects.create(user=self.user, product=purchase.product, purchase=purchase)
+        # Identical timestamps: only the id tie-breaker keeps the order stable.
+        UserLibrary.objects.filter(user=self.user).update(added_at=same_instant)
+
+    def _walk(self, url):
+        seen, cursor = [], ''
+        while True:
+            body = self.client.get(url, {'cursor': cursor, 'page_size': 2}).json()
+            seen += [item['id'] for item in body['results']]
+            cursor = body['pagination']['next_cursor']
+            if not cursor:
+                self.assertFalse(body['pagination']['has_next'])
+                return seen
+
+    def test_library_cursor_walk_visits_every_item_once(self):
+        seen = self._walk('/api/payments/library/')
+        expected = list(
+            UserLibrary.objects.filter(user=self.user).order_by('-added_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_pages_skip_the_count_unless_asked(self):
+        page = self.client.get('/api/payments/library/', {'cursor': '', 'page_size': 2}).json()['pagination']
+        self.assertNotIn('total_items', page)
+        self.assertNotIn('page', page)
+
+        page = self.client.get('/api/payments/library/', {'cursor': '', 'total': 'estimate'}).json()['pagination']
+        self.assertEqual(page['total_items'], 5)
+        self.assertTrue(page['total_is_estimate'])
+
+    def test_deep_cursor_page_does_not_offset(self):
+        first = self.client.get('/api/payments/library/', {'cursor': '', 'page_size': 2}).json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/payments/library/', {'cursor': first['pagination']['next_cursor'], 'page_size': 2})
+        page_query = next(q['sql'] for q in ctx.captured_queries if 'payments_userlibrary' in q['sql'])
+        self.assertNotIn('OFFSET', page_query.upper())
+        self.assertNotIn('COUNT(', page_query.upper())
+
+    def test_garbled_cursor_starts_from_the_top(self):
+        body = self.client.get('/api/payments/library/', {'cursor': 'not-a-cursor!', 'page_size': 2}).json()
+        self.assertEqual(len(body['results']), 2)
+        self.assertFalse(body['pagination']['has_previous'])
+
+    def test_offset_pages_still_work_for_old_clients(self):
+        body = self.client.get('/api/payments/library/', {'page': 2, 'page_size': 2}).json()
+        expected = list(
+            UserLibrary.objects.filter(user=self.user).order_by('-added_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([item['id'] for item in body['results']], expected[2:4])
+        self.assertEqual(body['pagination']['total_items'], 5)
+        self.assertEqual(body['pagination']['next_page'], 3)
+        self.assertEqual(body['pagination']['previous_page'], 1)
+
+    def test_payment_history_pages_by_cursor(self):
+        Payment.objects.filter(user=self.user).update(created_at=timezone.now())
+        seen = self._walk('/api/payments/history/')
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+        body = self.client.get('/api/payments/history/', {'page': 3, 'page_size': 2}).json()
+        self.assertEqual(len(body['results']), 1)
+        self.assertEqual(body['pagination']['total_pages'], 3)
+        self.assertFalse(body['pagination']['has_next'])
+
+
+class LibraryQueryBudgetTests(TestCase):
+    """A library page is serialized from prefetched state: its query count
+    does not grow with the number of rows."""
+
+    # count, library rows + purchases, products, tiers, tickets.
+    BUDGET = 5
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _add(self, count):
+        from apps.events.fast_models import FastEventTicket
+        from products.models import Review
+        for i in range(count):
+            product = make_event(tiers=[('Regular', 1000, 10), ('VIP', 5000, 5)]) if i % 2 else make_product()
+            purchase = make_payment(user=self.user, product=product).purchases.get()
+            UserLibrary.objects.create(user=self.user, product=product, purchase=purchase)
+            Review.objects.create(product=product, user=make_user(), rating=4)
+            if i % 2:
+                FastEventTicket.objects.bulk_create([
+                    FastEventTicket(purchase=purchase, buyer=self.user, event=product,
+                                    ticket_png='tickets/png/a.png'),
+                    FastEventTicket(purchase=purchase, buyer=self.user, event=product),
+                ])
+
+    def _queries(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/payments/library/', params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()
+
+    def test_query_count_is_constant_in_page_size(self):
+        self._add(2)
+        small, _ = self._queries({'page_size': 20})
+        self._add(10)
+        large, body = self._queries({'page_size': 20})
+
+        self.assertEqual(len(body['results']), 12)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.BUDGET)
+
+        cursor, _ = self._queries({'cursor': '', 'page_size': 20})
+        self.assertLessEqual(cursor, large)
+
+    def test_serialized_from_prefetch_matches_the_data(self):
+        self._add(2)
+        _, body = self._queries({})
+        event = next(item for item in body['results'] if item['product']['product_type'] == 'event')
+        self.assertEqual(len(event['event_tickets']), 2)
+        self.assertEqual(len(event['product']['ticket_tiers']), 2)
+        self.assertTrue(event['product']['is_ticket_event'])
+        self.assertEqual(event['product']['average_rating'], 4)
+        self.assertEqual(event['product']['review_count'], 1)
+        other = next(item for item in body['results'] if item['product']['product_type'] != 'event')
+        self.assertEqual(other['event_tickets'], [])
+
+
+class SellerDailyStatsTests(TestCase):
+    """Fulfilment keeps the daily sales rollup current, the backfill rebuilds
+    it, and both analytics dashboards answer from it."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.seller = make_seller()
+        self.ebook = make_product(owner=self.seller, price=Decimal('1000.00'))
+        self.course = make_product(owner=self.seller, price=Decimal('3000.00'))
+        self.buyer = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def _sell(self, product, buyer=None, amount='1000.00'):
+        from .fulfillment import fulfill_payment
+        payment = make_payment(user=buyer or self.buyer, product=product, amount=amount)
+        Payment.objects.filter(pk=payment.pk).update(ip_address='203.0.113.9')
+        payment.refresh_from_db()
+        fulfill_payment(payment)
+        return payment
+
+    def _today(self):
+        return SellerDailyStats.objects.get(seller=self.seller, date=timezone.localdate())
+
+    def test_fulfilment_adds_each_sale_to_the_day(self):
+        from . import seller_stats
+        from .fulfillment import fulfill_payment
+        first = self._sell(self.ebook)
+        self._sell(self.course, amount='3000.00')
+        self._sell(self.ebook, buyer=make_user())
+
+        row = self._today()
+        self.assertEqual(row.orders, 3)
+        self.assertEqual(row.revenue, Decimal('5000.00'))
+        self.assertEqual(row.commission, Decimal('200.00'))
+        self.assertEqual(row.net_payout, Decimal('4800.00'))
+        self.assertEqual(seller_stats.summary(self.seller, 7)['customers'], 2)
+        self.assertEqual(row.products[str(self.ebook.pk)], {'sales': 2, 'revenue': '2000.00'})
+
+        # Fulfilling the same order again posts nothing new, so counts nothing.
+        fulfill_payment(first)
+        self.assertEqual(self._today().orders, 3)
+
+    def test_backfill_rebuilds_the_same_rows(self):
+        self._sell(self.ebook)
+        self._sell(self.course, amount='3000.00')
+        live = self._today()
+        SellerCommission.objects.filter(seller=self.seller).update(created_at=timezone.now() - timedelta(days=3))
+        SellerDailyStats.objects.all().delete()
+
+        call_command('backfill_seller_stats', stdout=StringIO())
+
+        rebuilt = SellerDailyStats.objects.get(seller=self.seller)
+        self.assertEqual(rebuilt.date, timezone.localdate() - timedelta(days=3))
+        for field in ('revenue', 'orders', 'commission', 'net_payout', 'products'):
+            self.assertEqual(getattr(rebuilt, field), getattr(live, field), field)
+
+    def test_product_dashboard_reads_the_rollup(self):
+        self._sell(self.course, amount='3000.00')
+        self._sell(self.ebook, buyer=make_user())
+        # Last week's sales, for growth.
+        SellerDailyStats.objects.create(
+            seller=self.seller, date=timezone.localdate() - timedelta(days=10),
+            revenue=Decimal('2000.00'), orders=1,
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.client.get('/api/products/analytics/?time_range=7d').json()
+        # Sums come from the rollup; only the unique-customer count joins purchases.
+        self.assertEqual(sum('payments_purchase' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual(body['total_revenue'], 4000.0)
+        self.assertEqual(body['total_orders'], 2)
+        self.assertEqual(body['total_customers'], 2)
+        self.assertEqual(body['revenue_growth'], 100.0)
+        self.assertEqual(body['top_products'][0]['name'], self.course.title)
+        self.assertEqual(body['daily_revenue'], [
+            {'date': timezone.localdate().strftime('%Y-%m-%d'), 'revenue': 4000.0},
+        ])
+
+    def test_unique_customers_are_counted_over_the_range_without_storing_buyers(self):
+        from . import seller_stats
+        other = make_user()
+        self._sell(self.ebook)
+        self._sell(self.course, amount='3000.00')
+        self._sell(self.ebook, buyer=other)
+        # A sale by the same buyer two weeks ago: in the 30-day range only.
+        SellerCommission.objects.filter(purchase__payment__user=other).update(
+            created_at=timezone.now() - timedelta(days=14),
+        )
+        self.assertEqual(seller_stats.summary(self.seller, 7)['customers'], 1)
+        self.assertEqual(seller_stats.summary(self.seller, 30)['customers'], 2)
+        self.assertEqual(seller_stats.summary(self.seller, 30)['customer_ips'], 1)
+        self.assertFalse(hasattr(self._today(), 'buyer_ips'))
+
+    def test_payments_dashboard_reads_the_rollup(self):
+        self._sell(self.course, amount='3000.00')
+        SellerDailyStats.objects.create(
+            seller=self.seller, date=timezone.localdate() - timedelta(days=10),
+            revenue=Decimal('2000.00'), orders=1,
+        )
+        week = self.client.get('/api/payments/seller/analytics/?timeRange=7d').json()
+        month = self.client.get('/api/payments/seller/analytics/?timeRange=30d').json()
+        self.assertEqual(Decimal(str(week['total_revenue'])), Decimal('3000'))
+        self.assertEqual(Decimal(str(week['total_commission'])), Decimal('120'))
+        self.assertEqual(month['total_orders'], 2)
+
+
+class SellerExportTests(TestCase):
+    """Seller orders and commissions page by keyset when asked, and orders,
+    commissions and attendees stream as CSV / NDJSON."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .fulfillment import fulfill_payment
+        self.seller = make_seller()
+        self.event = make_event(owner=self.seller, tiers=[('VIP', 5000, 10)])
+        self.tier = self.event.ticket_tiers.get()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+        for i in range(3):
+            buyer = make_user(full_name='=HYPERLINK("x")' if i == 0 else f'Buyer {i}')
+            payment = make_payment(user=buyer, product=make_product(owner=self.seller), status=Payment.PaymentStatus.SUCCESS)
+            fulfill_payment(payment)
+
+    def _body(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_orders_list_is_paged_without_a_query_per_row(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/products/orders/', {'cursor': '', 'page_size': 1})
+        with CaptureQueriesContext(connection) as large:
+            body = self.client.get('/api/products/orders/', {'cursor': '', 'page_size': 3}).json()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(body['results']), 3)
+        self.assertIn('customer', body['results'][0])
+        self.assertIsNone(body['pagination']['next_cursor'])
+
+        # Clients that don't page still get the plain list.
+        legacy = self.client.get('/api/products/orders/').json()
+        self.assertIsInstance(legacy, list)
+        self.assertEqual(len(legacy), 3)
+
+    def test_commissions_page_by_cursor(self):
+        first = self.client.get('/api/payments/seller/commissions/', {'cursor': '', 'page_size': 2}).json()
+        rest = self.client.get('/api/payments/seller/commissions/',
+                               {'cursor': first['pagination']['next_cursor'], 'page_size': 2}).json()
+        ids = [c['id'] for c in first['results'] + rest['results']]
+        self.assertEqual(ids, list(
+            SellerCommission.objects.filter(seller=self.seller).order_by('-created_at', '-id').values_list('id', flat=True)
+        ))
+        self.assertIsInstance(self.client.get('/api/payments/seller/commissions/').json(), list)
+
+    def test_orders_csv_streams_and_defuses_formulas(self):
+        import csv
+        response = self.client.get('/api/products/orders/export.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self._body(response))))
+        self.assertEqual(len(rows), 3)
+        self.assertIn('\'=HYPERLINK("x")', [row['customer_name'] for row in rows])
+
+    def test_commissions_ndjson(self):
+        body = self._body(self.client.get('/api/payments/seller/commissions/export.ndjson', HTTP_ACCEPT='application/x-ndjson'))
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(Decimal(lines[0]['commission_amount']), Decimal('40.00'))
+
+    def test_attendees_export_is_the_owners_only(self):
+        from apps.events.fast_models import FastEventTicket
+        purchase = make_payment(product=self.event, status=Payment.PaymentStatus.SUCCESS).purchases.get()
+        Purchase.objects.filter(pk=purchase.pk).update(selected_ticket_tier=self.tier)
+        FastEventTicket.objects.create(purchase=purchase, buyer=purchase.payment.user, event=self.event)
+
+        body = self._body(self.client.get(f'/api/events/{self.event.pk}/attendees.csv'))
+        self.assertEqual(len(body.strip().splitlines()), 2)
+        self.assertIn('VIP', body)
+
+        self.client.force_authenticate(make_seller())
+        self.assertEqual(self.client.get(f'/api/events/{self.event.pk}/attendees.csv').status_code, 404)
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.get(f'/api/events/{self.event.pk}/attendees.xlsx').status_code, 404)
+
+
+class ProductDownloadTests(TestCase):
+    """Library downloads: presigned redirect for R2, web-server offload or a
+    Range-aware response for local files, and only for the owner."""
+
+    DATA = b'0123456789abcdef'
+
+    def setUp(self):
+        import os
+        import tempfile
+        from rest_framework.test import APIClient
+        from products.models import Product
+        self.private_root = tempfile.mkdtemp()
+        self.path = os.path.join(self.private_root, 'song.mp3')
+        with open(self.path, 'wb') as f:
+            f.write(self.DATA)
+        self.addCleanup(lambda: __import__('shutil').rmtree(self.private_root, ignore_errors=True))
+
+        self.product = make_product()
+        Product.objects.filter(pk=self.product.pk).update(file='products/files/1/song.mp3')
+        payment = make_payment(product=self.product, status=Payment.PaymentStatus.SUCCESS)
+        self.item = UserLibrary.objects.create(user=payment.user, product=self.product,
+                                               purchase=payment.purchases.get())
+        self.url = f'/api/payments/library/{self.item.pk}/download/'
+        self.client = APIClient()
+        self.client.force_authenticate(payment.user)
+        resolver = patch('products.models.Product.resolve_file_path', return_value=self.path)
+        resolver.start()
+        self.addCleanup(resolver.stop)
+
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_download_advertises_ranges(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._content(response), self.DATA)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertIn('filename="song.mp3"', response['Content-Disposition'])
+        self.assertTrue(response['ETag'])
+
+    def test_resumes_from_a_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self._content(response), b'abcdef')
+        self.assertEqual(response['Content-Range'], 'bytes 10-15/16')
+
+        suffix = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(self._content(suffix), b'cdef')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"old-version"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._content(response), self.DATA)
+
+    def test_unsatisfiable_range_and_not_modified(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=99-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */16')
+
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_nginx_offload_hands_over_private_files_only(self):
+        with self.settings(PRODUCT_FILE_OFFLOAD='nginx', PRIVATE_MEDIA_ROOT=self.private_root,
+                           PRODUCT_FILE_ACCEL_PREFIX='/protected-files/'):
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Accel-Redirect'], '/protected-files/song.mp3')
+            self.assertEqual(response.content, b'')
+
+        with self.settings(PRODUCT_FILE_OFFLOAD='nginx', PRIVATE_MEDIA_ROOT='/somewhere/else'):
+            response = self.client.get(self.url)
+            self.assertFalse(response.has_header('X-Accel-Redirect'))
+            self.assertEqual(self._content(response), self.DATA)
+
+    def test_r2_files_redirect_to_a_presigned_url(self):
+        from products.models import Product
+        storage = Mock()
+        storage.exists.return_value = True
+        storage.url.return_value = 'https://r2.example/signed?X-Amz-Signature=abc'
+        with patch.object(Product._meta.get_field('file'), 'storage', storage):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'https://r2.example/signed?X-Amz-Signature=abc')
+        self.assertIn('no-store', response['Cache-Control'])
+        params = storage.url.call_args.kwargs['parameters']
+        self.assertEqual(params['ResponseContentDisposition'], 'attachment; filename="song.mp3"')
+
+    def _missing_from_r2(self):
+        from products.models import Product
+        storage = Mock()
+        storage.exists.return_value = False
+        return storage, patch.object(Product._meta.get_field('file'), 'storage', storage)
+
+    def test_r2_file_not_migrated_yet_is_served_from_the_legacy_location(self):
+        storage, missing = self._missing_from_r2()
+        with missing:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._content(response), self.DATA)
+        storage.exists.assert_called_with('products/files/1/song.mp3')
+        storage.url.assert_not_called()
+
+    def test_file_in_neither_place_is_not_found(self):
+        storage, missing = self._missing_from_r2()
+        with missing, patch('products.models.Product.resolve_file_path', return_value=None):
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+        storage.url.assert_not_called()
+
+    def test_someone_elses_library_item_is_not_found(self):
+        self.client.force_authenticate(make_user())
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
 class PayoutInitiationTests(TestCase):
     """Approving a payout initiates a Flutterwave transfer — it must move to
     'processing' (never 'completed' here), be idempotent, and fail cleanly."""
@@ -163,7 +1118,7 @@ class PayoutInitiationTests(TestCase):
             bank_details=_bank_for(self.seller), status='pending',
         )
 
-    @patch('apps.payments.services.requests.post')
+    @patch('apps.payments.provider_client.ProviderClient.post')
     def test_initiates_and_moves_to_processing(self, mock_post):
         mock_post.return_value = _flw_transfer_response(transfer_id=555)
         ok = FlutterwaveService().process_seller_payout(self.payout)
@@ -175,7 +1130,7 @@ class PayoutInitiationTests(TestCase):
         # Seller pays the fee: we send amount - fee = 1000 - 10 = 990.
         self.assertEqual(mock_post.call_args.kwargs['json']['amount'], 990.0)
 
-    @patch('apps.payments.services.requests.post')
+    @patch('apps.payments.provider_client.ProviderClient.post')
     def test_second_send_is_a_noop(self, mock_post):
         mock_post.return_value = _flw_transfer_response()
         FlutterwaveService().process_seller_payout(self.payout)  # -> processing
@@ -184,7 +1139,7 @@ class PayoutInitiationTests(TestCase):
         self.assertFalse(again)
         mock_post.assert_not_called()                           # never sent twice
 
-    @patch('apps.payments.services.requests.post')
+    @patch('apps.payments.provider_client.ProviderClient.post')
     def test_rejected_transfer_marks_failed(self, mock_post):
         mock_post.return_value = _flw_transfer_response(accepted=False)
         ok = FlutterwaveService().process_seller_payout(self.payout)
@@ -207,6 +1162,118 @@ class PayoutBalanceReservationTests(TestCase):
         self.assertEqual(seller.earnings.total_payouts, Decimal('800'))  # 500+300; failed excluded
 
 
+class EarningsLedgerTests(TestCase):
+    """Earnings move by ledger deltas as sales and payouts happen; the
+    reconcile command rebuilds them from source rows."""
+
+    def _sale(self, seller, price='1000.00'):
+        from .fulfillment import fulfill_payment
+        payment = make_payment(product=make_product(owner=seller, price=Decimal(price)), amount=price)
+        fulfill_payment(payment)
+        return payment
+
+    def test_sale_posts_earning_and_commission(self):
+        seller = make_seller()
+        payment = self._sale(seller)
+        self._sale(seller)
+
+        earnings = SellerEarnings.objects.get(seller=seller)
+        self.assertEqual(earnings.total_sales, Decimal('2000.00'))
+        self.assertEqual(earnings.total_commission, Decimal('80.00'))
+        self.assertEqual(earnings.available_balance, Decimal('1920.00'))
+        self.assertEqual(
+            EarningsLedgerEntry.objects.filter(purchase__payment=payment).count(), 2
+        )
+
+    def test_posting_the_same_sale_twice_is_a_noop(self):
+        from . import ledger
+        seller = make_seller()
+        payment = self._sale(seller)
+        commission = SellerCommission.objects.get(purchase__payment=payment)
+
+        self.assertEqual(ledger.post_sales([commission]), [])
+        self.assertEqual(SellerEarnings.objects.get(seller=seller).total_sales, Decimal('1000.00'))
+
+    def test_payout_reserves_releases_and_re_reserves(self):
+        from . import ledger
+        seller = make_seller()
+        self._sale(seller)
+        payout = PayoutRequest.objects.create(
+            seller=seller, amount=Decimal('500'), bank_details=_bank_for(seller), status='pending',
+        )
+
+        ledger.sync_payout(payout)
+        ledger.sync_payout(payout)  # no change in status, nothing posted
+        self.assertEqual(SellerEarnings.objects.get(seller=seller).available_balance, Decimal('460.00'))
+
+        PayoutRequest.objects.filter(pk=payout.pk).update(status='failed')
+        ledger.sync_payout(payout)
+        self.assertEqual(SellerEarnings.objects.get(seller=seller).available_balance, Decimal('960.00'))
+
+        PayoutRequest.objects.filter(pk=payout.pk).update(status='pending')
+        ledger.sync_payout(payout)
+        earnings = SellerEarnings.objects.get(seller=seller)
+        self.assertEqual(earnings.total_payouts, Decimal('500.00'))
+        self.assertEqual(earnings.available_balance, Decimal('460.00'))
+
+    def test_reconcile_command_backfills_history_and_fixes_drift(self):
+        from django.core.management import call_command
+        seller = make_seller()
+        payment = make_payment(product=make_product(owner=seller))
+        # A pre-ledger commission and a stale totals row.
+        SellerCommission.objects.create(
+            seller=seller, purchase=payment.purchases.get(), product_price=Decimal('1000'),
+            commission_amount=Decimal('40'), seller_payout=Decimal('960'),
+        )
+        SellerEarnings.objects.create(seller=seller, total_sales=Decimal('5'))
+
+        call_command('reconcile_seller_earnings', '--dry-run', stdout=StringIO())
+        self.assertEqual(SellerEarnings.objects.get(seller=seller).total_sales, Decimal('5.00'))
+
+        call_command('reconcile_seller_earnings', '--chunk-size', '1', stdout=StringIO())
+        earnings = SellerEarnings.objects.get(seller=seller)
+        self.assertEqual(earnings.total_sales, Decimal('1000.00'))
+        self.assertEqual(earnings.available_balance, Decimal('960.00'))
+
+        out = StringIO()
+        call_command('reconcile_seller_earnings', stdout=out)
+        self.assertIn('Posted 0 ledger entries; 0 sellers', out.getvalue())
+
+    def test_migration_backfills_pre_ledger_payouts_without_moving_balances(self):
+        from importlib import import_module
+        from django.apps import apps
+        from . import ledger
+        backfill = import_module('apps.payments.migrations.0015_backfill_earnings_ledger').backfill_ledger
+        seller = make_seller()
+        bank = _bank_for(seller)
+        # Rows from before the ledger, already counted in the stored totals.
+        SellerCommission.objects.create(
+            seller=seller, purchase=make_payment(product=make_product(owner=seller)).purchases.get(),
+            product_price=Decimal('1000'), commission_amount=Decimal('40'), seller_payout=Decimal('960'),
+        )
+        live, failing = [
+            PayoutRequest.objects.create(seller=seller, amount=Decimal('300'), bank_details=bank, status='pending')
+            for _ in range(2)
+        ]
+        SellerEarnings.objects.create(
+            seller=seller, total_sales=Decimal('1000'), total_commission=Decimal('40'),
+            total_payouts=Decimal('600'), available_balance=Decimal('360'),
+        )
+
+        backfill(apps, None)
+        backfill(apps, None)  # nothing left to post
+        self.assertEqual(EarningsLedgerEntry.objects.filter(seller=seller).count(), 4)
+        self.assertEqual(SellerEarnings.objects.get(seller=seller).available_balance, Decimal('360.00'))
+
+        PayoutRequest.objects.filter(pk=live.pk).update(status='completed')
+        PayoutRequest.objects.filter(pk=failing.pk).update(status='failed')
+        ledger.sync_payouts([live.pk, failing.pk])
+        earnings = SellerEarnings.objects.get(seller=seller)
+        self.assertEqual(earnings.total_payouts, Decimal('300.00'))
+        self.assertEqual(earnings.available_balance, Decimal('660.00'))
+        self.assertEqual(ledger.reconcile_sellers([seller.pk]), (0, {}))
+
+
 @override_settings(FLUTTERWAVE_SECRET_HASH=FLW_HASH)
 class PayoutTransferWebhookTests(TestCase):
     """The transfer webhook is what actually completes/fails a payout — signed,
@@ -222,8 +1289,11 @@ class PayoutTransferWebhookTests(TestCase):
         )
 
     def _post(self, body, **headers):
-        return self.client.post('/api/payments/webhook/', data=json.dumps(body),
-                                content_type='application/json', **headers)
+        from . import webhook_inbox
+        response = self.client.post('/api/payments/webhook/', data=json.dumps(body),
+                                    content_type='application/json', **headers)
+        webhook_inbox.drain()
+        return response
 
     def _body(self, status='SUCCESSFUL', ref='DARRA-PO-1-abc123'):
         return {'event': 'transfer.completed',
@@ -277,21 +1347,226 @@ class PayoutSyncStatusTests(TestCase):
         m.json.return_value = {'data': {'status': status, 'complete_message': 'x'}}
         return m
 
-    @patch('apps.payments.services.requests.get')
+    @patch('apps.payments.provider_client.ProviderClient.get')
     def test_successful_marks_completed(self, mock_get):
         mock_get.return_value = self._resp('SUCCESSFUL')
         self.assertEqual(FlutterwaveService().sync_payout_status(self.payout), 'completed')
         self.payout.refresh_from_db()
         self.assertEqual(self.payout.status, 'completed')
 
-    @patch('apps.payments.services.requests.get')
+    @patch('apps.payments.provider_client.ProviderClient.get')
     def test_failed_marks_failed(self, mock_get):
         mock_get.return_value = self._resp('FAILED')
         self.assertEqual(FlutterwaveService().sync_payout_status(self.payout), 'failed')
 
-    @patch('apps.payments.services.requests.get')
+    @patch('apps.payments.provider_client.ProviderClient.get')
     def test_already_final_is_a_noop(self, mock_get):
         self.payout.status = 'completed'
         self.payout.save()
         FlutterwaveService().sync_payout_status(self.payout)
         mock_get.assert_not_called()   # never re-queries a final payout
+
+
+class PayoutReconciliationTests(TestCase):
+    """payout_sync settles many open payouts per run: concurrent fetches,
+    batched writes, background emails and a resumable checkpoint."""
+
+    def setUp(self):
+        self.seller = make_seller()
+        bank = _bank_for(self.seller)
+        self.payouts = [
+            PayoutRequest.objects.create(
+                seller=self.seller, amount=Decimal('100'), bank_details=bank,
+                status='processing', flutterwave_transfer_id=str(900 + i),
+            )
+            for i in range(6)
+        ]
+        from . import ledger
+        for payout in self.payouts:
+            ledger.sync_payout(payout)
+        # 900-901 succeeded, 902 failed, the rest are still pending.
+        self.statuses = {'900': 'SUCCESSFUL', '901': 'SUCCESSFUL', '902': 'FAILED'}
+
+    def _get(self, path, endpoint, **kwargs):
+        m = Mock()
+        m.json.return_value = {'data': {'status': self.statuses.get(path.rsplit('/', 1)[-1], 'PENDING')}}
+        return m
+
+    def _statuses(self):
+        return list(PayoutRequest.objects.order_by('pk').values_list('status', flat=True))
+
+    def test_reconcile_settles_in_batches_and_queues_emails(self):
+        from . import payout_sync
+        with patch('apps.payments.provider_client.ProviderClient.get', side_effect=self._get), \
+                patch('apps.payments.payout_sync.queue_emails') as queue, \
+                self.captureOnCommitCallbacks(execute=True):
+            totals = payout_sync.reconcile(batch_size=4, rate=1000)
+
+        self.assertEqual(self._statuses(), ['completed', 'completed', 'failed'] + ['processing'] * 3)
+        self.assertEqual(
+            {k: totals[k] for k in ('checked', 'completed', 'failed', 'unchanged', 'errors')},
+            {'checked': 6, 'completed': 2, 'failed': 1, 'unchanged': 3, 'errors': 0},
+        )
+        queue.assert_called_once_with([p.pk for p in self.payouts[:3]])
+        self.assertEqual(len(mail.outbox), 0)
+        # The failed payout's reservation went back to the seller.
+        self.assertEqual(SellerEarnings.objects.get(seller=self.seller).total_payouts, Decimal('500'))
+
+    def test_fetch_errors_leave_payouts_open(self):
+        from requests.exceptions import ConnectionError
+        from . import payout_sync
+        with patch('apps.payments.provider_client.ProviderClient.get', side_effect=ConnectionError('down')):
+            totals = payout_sync.reconcile(rate=1000)
+        self.assertEqual(totals['errors'], 6)
+        self.assertEqual(self._statuses(), ['processing'] * 6)
+
+    def test_provider_error_answers_count_as_errors(self):
+        from . import payout_sync
+
+        def get(path, endpoint, **kwargs):
+            if path.endswith('/903'):
+                return Mock(ok=False, status_code=404, content=b'{}', **{
+                    'json.return_value': {'status': 'error', 'message': 'Transfer not found', 'data': None},
+                })
+            return self._get(path, endpoint, **kwargs)
+
+        with patch('apps.payments.provider_client.ProviderClient.get', side_effect=get), \
+                patch('apps.payments.payout_sync.queue_emails'):
+            totals = payout_sync.reconcile(rate=1000)
+
+        self.assertEqual(totals['errors'], 1)
+        self.assertEqual(totals['unchanged'], 2)
+        self.assertEqual(self._statuses()[3], 'processing')
+
+    def test_command_resumes_from_checkpoint(self):
+        import os
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        with open(path, 'w') as f:
+            json.dump({'after_id': self.payouts[0].pk, 'totals': {'checked': 1}}, f)
+
+        out = StringIO()
+        with patch('apps.payments.provider_client.ProviderClient.get', side_effect=self._get), \
+                patch('apps.payments.payout_sync.queue_emails'):
+            call_command('sync_payout_statuses', '--resume', '--checkpoint', path, '--rate', '1000', stdout=out)
+
+        self.assertEqual(self._statuses()[0], 'processing')  # before the checkpoint
+        self.assertEqual(self._statuses()[1:3], ['completed', 'failed'])
+        self.assertIn('Checked 6 payouts', out.getvalue())
+        self.assertFalse(os.path.exists(path))
+
+
+class ProviderClientTests(TestCase):
+    """The shared provider client: timeouts, GET-only retries, the circuit
+    breaker and per-endpoint metrics."""
+
+    def setUp(self):
+        from . import provider_client
+        self.pc = provider_client
+        self.client_ = provider_client.ProviderClient('testpay', 'https://api.test')
+        provider_client.metrics.reset()
+        sleep = patch('apps.payments.provider_client.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def _resp(self, code):
+        r = Mock()
+        r.status_code = code
+        return r
+
+    @patch('requests.Session.request')
+    def test_every_call_gets_the_endpoint_timeout(self, mock_request):
+        mock_request.return_value = self._resp(200)
+        self.client_.get('/transactions/1', 'verify')
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], self.pc.ENDPOINT_TIMEOUTS['verify'])
+        self.assertEqual(mock_request.call_args.args[1], 'https://api.test/transactions/1')
+
+    @patch('requests.Session.request')
+    def test_get_is_retried_on_gateway_errors(self, mock_request):
+        mock_request.side_effect = [self._resp(503), self._resp(200)]
+        response = self.client_.get('/x', 'verify')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_request.call_count, 2)
+        stats = self.pc.metrics_snapshot()['testpay.verify']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['errors'], {'http_503': 1})
+
+    @patch('requests.Session.request')
+    def test_post_is_never_retried(self, mock_request):
+        import requests
+        mock_request.side_effect = requests.exceptions.ConnectionError('reset')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client_.post('/transfers', 'transfer', json={})
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch('requests.Session.request')
+    def test_breaker_opens_then_lets_one_trial_through(self, mock_request):
+        import requests
+        mock_request.side_effect = requests.exceptions.Timeout('slow')
+        for _ in range(self.pc.CIRCUIT_FAILURE_THRESHOLD):
+            with self.assertRaises(requests.exceptions.Timeout):
+                self.client_.post('/x', 'initialize')
+
+        mock_request.reset_mock()
+        with self.assertRaises(self.pc.ProviderUnavailable):
+            self.client_.post('/x', 'initialize')
+        mock_request.assert_not_called()  # failed fast
+
+        # After the reset window one trial goes out; success closes it.
+        self.client_.breaker.opened_at -= self.pc.CIRCUIT_RESET_AFTER
+        mock_request.side_effect = None
+        mock_request.return_value = self._resp(200)
+        self.client_.post('/x', 'initialize')
+        self.assertEqual(self.client_.breaker.state, 'closed')
+
+
+class VerifyCoalescingTests(TestCase):
+    """Concurrent verifies of one reference share a single provider call, and
+    final answers are reused briefly."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_call(self):
+        import threading
+        from .verification import coalesced_verify
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            release.wait(5)
+            return {'data': {'status': 'success'}}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(coalesced_verify('paystack', 'REF-1', slow_fetch)))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join(10)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'data': {'status': 'success'}}] * 4)
+
+    def test_final_result_is_cached_pending_is_not(self):
+        from .verification import coalesced_verify
+        fetch = Mock(return_value={'data': {'status': 'ongoing'}})
+        coalesced_verify('paystack', 'REF-2', fetch)
+        cache.delete('payment_verify:paystack:REF-2:result')  # share window over
+        fetch.return_value = {'data': {'status': 'success'}}
+        coalesced_verify('paystack', 'REF-2', fetch)
+        coalesced_verify('paystack', 'REF-2', fetch)
+        self.assertEqual(fetch.call_count, 2)
+        self.assertIsNone(cache.get('payment_verify:paystack:REF-2:lock'))
+
+    def test_leader_error_is_not_shared(self):
+        from .verification import coalesced_verify
+        with self.assertRaises(RuntimeError):
+            coalesced_verify('flutterwave', 'REF-3', Mock(side_effect=RuntimeError('down')))
+        fetch = Mock(return_value={'data': {'status': 'successful'}})
+        self.assertEqual(coalesced_verify('flutterwave', 'REF-3', fetch)['data']['status'], 'successful')
+        fetch.assert_called_once()
@@ -10,6 +10,7 @@ from .views import (
     test_flutterwave_connection,
     seller_earnings,
     seller_commissions,
+    SellerCommissionsExportView,
     seller_payouts,
     request_payout,
     seller_analytics,
@@ -18,6 +19,7 @@ from .views import (
     download_product_file,
     download_ticket_qr,
 )
+from .streams import payment_events
 
 urlpatterns = [
     path('checkout/', CheckoutView.as_view(), name='checkout'),
@@ -25,6 +27,7 @@ urlpatterns = [
     path('test-flutterwave/', test_flutterwave_connection, name='test_flutterwave_connection'),
     path('verify/<str:reference>/', verify_payment, name='verify_payment'),
     path('check-status/<str:reference>/', check_payment_status, name='check_payment_status'),
+    path('events/<str:reference>/', payment_events, name='payment_events'),
     path('library/', get_user_library, name='user_library'),
     path('library/<int:library_item_id>/send-email/', send_digital_product_to_email, name='send_digital_product_email'),
     path('library/<int:library_item_id>/download/', download_product_file, name='download_product_file'),
@@ -36,6 +39,7 @@ urlpatterns = [
     # Seller earnings and payouts
     path('seller/earnings/', seller_earnings, name='seller_earnings'),
     path('seller/commissions/', seller_commissions, name='seller_commissions'),
+    path('seller/commissions/export.<str:fmt>', SellerCommissionsExportView.as_view(), name='seller_commissions_export'),
     path('seller/payouts/', seller_payouts, name='seller_payouts'),
     path('seller/request-payout/', request_payout, name='request_payout'),
     path('seller/analytics/', seller_analytics, name='seller_analytics'),
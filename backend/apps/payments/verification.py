@@ -0,0 +1,108 @@
+"""
+Single-flight provider verification per payment reference.
+
+One checkout routinely verifies the same reference several times at once: the
+browser redirect hits verify_payment, the mobile app polls, and the provider
+fires (and retries) the webhook. Each used to make its own verify call to the
+provider and then race the others on the claim in process_successful_payment.
+
+coalesced_verify() lets only one of them call out. The first caller takes a
+short lock in the cache and makes the request; anyone arriving while it is in
+flight waits for its answer instead of issuing their own. Results the provider
+will never change (paid, failed, abandoned) are then kept for a few minutes,
+so repeats are answered from the cache; a still-pending result is only kept
+long enough to hand to the callers that were already waiting for it.
+
+Everything degrades to a plain call: if the cache is down, the leader dies or
+a waiter times out, the caller verifies for itself. Worst case is the old
+behaviour, never a wrong answer — the claim stays the real guard against
+double fulfilment.
+"""
+
+import logging
+import time
+import uuid
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_RESULT_TTL = 300      # seconds a final verify answer is reused
+SHARED_RESULT_TTL = 3          # seconds a non-final answer is handed to waiters
+LOCK_TTL = 20                  # longer than the verify read timeout
+WAIT_TIMEOUT = 12              # how long a follower waits for the leader
+POLL_START, POLL_MAX = 0.05, 0.25
+
+# data.status values that will not change on a later verify.
+TERMINAL_STATUSES = {
+    'paystack': {'success', 'failed', 'abandoned', 'reversed'},
+    'flutterwave': {'successful', 'failed', 'cancelled'},
+}
+
+
+def _keys(provider, reference):
+    base = f"payment_verify:{provider}:{reference}"
+    return f"{base}:result", f"{base}:lock"
+
+
+def is_terminal(provider, result):
+    data = (result or {}).get('data') if isinstance(result, dict) else None
+    status = str((data or {}).get('status', '')).lower()
+    return status in TERMINAL_STATUSES.get(provider, set())
+
+
+def _cache_call(fn, *args, default=None):
+    try:
+        return fn(*args)
+    except Exception as e:
+        logger.warning("Verify cache unavailable (%s); verifying directly", e)
+        return default
+
+
+def coalesced_verify(provider, reference, fetch):
+    """
+    Return the provider's verify response for `reference`, calling `fetch()`
+    at most once across concurrent callers. Exceptions from `fetch` reach only
+    the caller that ran it.
+    """
+    result_key, lock_key = _keys(provider, reference)
+
+    cached = _cache_call(cache.get, result_key)
+    if cached is not None:
+        return cached
+
+    token = uuid.uuid4().hex
+    if _cache_call(cache.add, lock_key, token, LOCK_TTL, default=True):
+        try:
+            # A leader may have finished between our first look and taking
+            # the lock.
+            cached = _cache_call(cache.get, result_key)
+            if cached is not None:
+                return cached
+            result = fetch()
+            ttl = TERMINAL_RESULT_TTL if is_terminal(provider, result) else SHARED_RESULT_TTL
+            _cache_call(cache.set, result_key, result, ttl)
+            return result
+        finally:
+            if _cache_call(cache.get, lock_key) == token:
+                _cache_call(cache.delete, lock_key)
+
+    # Someone else is verifying this reference right now: wait for them.
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    delay = POLL_START
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        cached = _cache_call(cache.get, result_key)
+        if cached is not None:
+            return cached
+        if _cache_call(cache.get, lock_key) is None:
+            # The leader is done: it either stored a result just after our
+            # last look, or failed without one.
+            cached = _cache_call(cache.get, result_key)
+            if cached is not None:
+                return cached
+            break
+        delay = min(delay * 2, POLL_MAX)
+
+    return fetch()
+
@@ -10,7 +10,6 @@ from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
 from django.conf import settings
-from decimal import Decimal, InvalidOperation
 import hashlib
 import hmac
 import logging
@@ -31,6 +30,10 @@ from .serializers import (
 )
 from .services import PaystackService, FlutterwaveService, PaymentService, PayoutService
 from .services import PaymentProviderFactory  # Import the factory
+from . import delivery, inventory, ledger, progress, seller_stats, webhook_inbox
+from .verification import is_terminal
+from core.exports import ExportView
+from core.pagination import KeysetPagination, is_paged, paginate_list
 from core.throttling import PaymentRateThrottle, WebhookRateThrottle  # Import rate limiting
 from users.utils import send_digital_product_email
 
@@ -191,6 +194,9 @@ def verify_payment(request, reference):
                 error_status = payment_response.get('status')
             else:  # Paystack
                 error_status = payment_response.get('data', {}).get('status')
+
+            if is_terminal(payment.payment_provider, payment_response):
+                inventory.release_for_payment(payment)
             
             return Response({
                 'message': 'Payment not successful',
@@ -206,103 +212,35 @@ def verify_payment(request, reference):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_library(request):
-    """Get user's purchased products with pagination"""
+    """Get user's purchased products, by page or by cursor (see core.pagination)"""
     try:
-        print(f"DEBUG: Getting library for user: {request.user.email}")
-        
-        # Get pagination parameters
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        offset = (page - 1) * page_size
-        
-        # Get total count
-        total_items = UserLibrary.objects.filter(user=request.user).count()
-        print(f"DEBUG: Total library items: {total_items}")
-        
-        # Get paginated items
-        library_items = UserLibrary.objects.filter(user=request.user).select_related('product', 'purchase').order_by('-added_at')[offset:offset + page_size]
-        print(f"DEBUG: Returning {library_items.count()} items for page {page}")
-        
-        # Debug: Print first few items
-        for i, item in enumerate(library_items[:3]):
-            print(f"DEBUG: Item {i}: Product ID {item.product.id}, Type: {item.product.product_type}")
-        
-        serializer = UserLibrarySerializer(library_items, many=True)
-        print(f"DEBUG: Serialization completed successfully")
-        
-        # Calculate pagination info
-        total_pages = (total_items + page_size - 1) // page_size
-        has_next = page < total_pages
-        has_previous = page > 1
-        
-        return Response({
-            'results': serializer.data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_items': total_items,
-                'total_pages': total_pages,
-                'has_next': has_next,
-                'has_previous': has_previous,
-                'next_page': page + 1 if has_next else None,
-                'previous_page': page - 1 if has_previous else None
-            }
-        })
+        library_items = UserLibrarySerializer.setup_queryset(UserLibrary.objects.filter(user=request.user))
+        return Response(paginate_list(
+            request,
+            library_items,
+            serialize=lambda item: UserLibrarySerializer(item).data,
+            default_page_size=20,
+            ordering=('-added_at', '-id'),
+        ))
     except Exception as e:
-        print(f"ERROR: Library fetch error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Library fetch failed for user %s", request.user.pk)
         return Response({
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
+
+class PaymentHistoryPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+
+
 class PaymentHistoryView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentSerializer
-    
+    pagination_class = PaymentHistoryPagination
+
     def get_queryset(self):
-        return Payment.objects.filter(user=self.request.user).prefetch_related('purchases__product').order_by('-created_at')
-    
-    def list(self, request, *args, **kwargs):
-        """Custom list method with pagination and debugging"""
-        # Get pagination parameters
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        offset = (page - 1) * page_size
-        
-        # Get total count
-        queryset = self.filter_queryset(self.get_queryset())
-        total_items = queryset.count()
-        print(f"DEBUG: PaymentHistoryView - Total transactions: {total_items}")
-        
-        # Get paginated items
-        paginated_queryset = queryset[offset:offset + page_size]
-        serializer = self.get_serializer(paginated_queryset, many=True)
-        data = serializer.data
-        
-        # Debug: Log the first few payment amounts
-        if data and len(data) > 0:
-            print(f"DEBUG: PaymentHistoryView - First payment amount: {data[0].get('amount')}, Type: {type(data[0].get('amount'))}")
-            print(f"DEBUG: PaymentHistoryView - First payment currency: {data[0].get('currency')}")
-        
-        # Calculate pagination info
-        total_pages = (total_items + page_size - 1) // page_size
-        has_next = page < total_pages
-        has_previous = page > 1
-        
-        return Response({
-            'results': data,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_items': total_items,
-                'total_pages': total_pages,
-                'has_next': has_next,
-                'has_previous': has_previous,
-                'next_page': page + 1 if has_next else None,
-                'previous_page': page - 1 if has_previous else None
-            }
-        })
+        return Payment.objects.filter(user=self.request.user).prefetch_related('purchases__product')
 
 @api_view(['GET'])
 def payment_status(request, reference):
@@ -347,70 +285,6 @@ def _paystack_signature_ok(request, raw_body):
     return hmac.compare_digest(received, computed)
 
 
-def _amounts_match(expected, actual):
-    """Compare money values tolerantly (providers vary in type and precision)."""
-    try:
-        return abs(Decimal(str(expected)) - Decimal(str(actual))) < Decimal('0.01')
-    except (InvalidOperation, TypeError, ValueError):
-        return False
-
-
-def _handle_transfer_webhook(request, webhook_data):
-    """
-    Flutterwave transfer (payout) webhook. Transfers are async: the payout was
-    initiated as 'processing', and this confirms the real outcome — SUCCESSFUL
-    or FAILED. Authenticated by the same verif-hash secret as charge webhooks,
-    and idempotent (a final state never changes; providers re-send).
-    """
-    if not _flutterwave_signature_ok(request):
-        logger.error("Rejected transfer webhook: signature verification failed.")
-        return HttpResponse(status=401)
-
-    data = (webhook_data.get('data') or {}) if isinstance(webhook_data, dict) else {}
-    reference = data.get('reference')
-    transfer_id = data.get('id')
-
-    payout = None
-    if reference:
-        payout = PayoutRequest.objects.filter(transfer_reference=reference).first()
-    if not payout and transfer_id:
-        payout = PayoutRequest.objects.filter(flutterwave_transfer_id=str(transfer_id)).first()
-
-    if not payout:
-        logger.warning("Transfer webhook for unknown payout (ref=%s id=%s)", reference, transfer_id)
-        return HttpResponse(status=200)  # stop FLW retrying something we don't know
-
-    if payout.status in ('completed', 'failed'):
-        return HttpResponse(status=200)  # already final — idempotent
-
-    flw_status = str(data.get('status', '')).upper()
-    if flw_status == 'SUCCESSFUL':
-        payout.status = 'completed'
-        if not payout.processed_at:
-            payout.processed_at = timezone.now()
-        payout.save(update_fields=['status', 'processed_at'])
-        FlutterwaveService().update_seller_earnings(payout.seller)
-        try:
-            from users.utils import send_payout_completed_email
-            send_payout_completed_email(payout)
-        except Exception as e:
-            logger.error("Payout completed email failed for %s: %s", payout.id, e)
-    else:
-        payout.status = 'failed'
-        payout.failure_reason = data.get('complete_message') or 'Transfer failed at Flutterwave'
-        payout.save(update_fields=['status', 'failure_reason'])
-        # Recompute earnings: a 'failed' payout is no longer reserved, so the
-        # seller's balance is released and they can retry.
-        FlutterwaveService().update_seller_earnings(payout.seller)
-        try:
-            from users.utils import send_payout_failed_email
-            send_payout_failed_email(payout)
-        except Exception as e:
-            logger.error("Payout failed email failed for %s: %s", payout.id, e)
-
-    return HttpResponse(status=200)
-
-
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @throttle_classes([WebhookRateThrottle])
@@ -420,14 +294,18 @@ def payment_webhook(request):
 
     This endpoint is unauthenticated by necessity, so it is defended twice:
 
-      1. The provider's signature over the request is verified, proving the
-         call really came from them.
+      1. The provider's signature over the request is verified here, proving
+         the call really came from them.
       2. The payment is then re-verified by calling the provider's own API.
          The status and amount in the request body are NEVER trusted — only
          what the provider tells us directly.
 
     Either check alone would stop a forged "payment successful" callback; both
     together mean a leaked secret hash still is not enough to grant a product.
+
+    Only the first happens in the request: a signed delivery is stored in the
+    webhook inbox and acknowledged at once, and the re-verify and fulfilment
+    run from there (see webhook_inbox.py). Retried deliveries are deduped.
     """
     try:
         # Must be read before request.data — once DRF parses the stream the
@@ -435,94 +313,30 @@ def payment_webhook(request):
         raw_body = request.body
         webhook_data = request.data
 
-        # Payout (transfer) webhooks are a different event type — route them to
-        # the transfer handler before the charge/payment logic below.
-        if isinstance(webhook_data, dict) and webhook_data.get('event') == 'transfer.completed':
-            return _handle_transfer_webhook(request, webhook_data)
-
-        # Determine payment provider from webhook data
-        reference = None
-        provider = None
-
-        # Paystack webhook format (reference lives under data.reference)
-        if isinstance(webhook_data, dict) and webhook_data.get('data', {}).get('reference'):
-            reference = webhook_data['data']['reference']
-            provider = 'paystack'
-
-        # Flutterwave webhook formats:
-        # - Some deliveries put tx_ref at the root
-        # - Others nest tx_ref under data.tx_ref (common)
-        if not provider and isinstance(webhook_data, dict):
-            if webhook_data.get('tx_ref'):
-                reference = webhook_data.get('tx_ref')
-                provider = 'flutterwave'
-            elif webhook_data.get('data', {}).get('tx_ref'):
-                reference = webhook_data['data']['tx_ref']
-                provider = 'flutterwave'
-
-        if not provider or not reference:
+        found = webhook_inbox.identify(webhook_data)
+        if found is None:
             logger.warning("Webhook with unknown format or missing reference")
             return HttpResponse(status=400)
+        provider, kind, reference, event_id, claimed_status = found
 
         # --- 1. Authenticate the caller ---------------------------------
         if provider == 'paystack':
             signature_ok = _paystack_signature_ok(request, raw_body)
         else:
+            # Charge and transfer webhooks share the verif-hash secret.
             signature_ok = _flutterwave_signature_ok(request)
 
         if not signature_ok:
             logger.error(
-                "Rejected %s webhook for reference %s: signature verification failed.",
-                provider, reference,
+                "Rejected %s %s webhook for reference %s: signature verification failed.",
+                provider, kind, reference,
             )
             return HttpResponse(status=401)
 
-        payment = get_object_or_404(Payment, reference=reference)
-
-        # Nothing to do if we already processed this one (providers retry).
-        if payment.status == Payment.PaymentStatus.SUCCESS:
-            logger.info("Webhook for already-processed payment %s; ignoring.", reference)
-            return HttpResponse(status=200)
-
-        # --- 2. Ask the provider directly, never trust the body ----------
-        try:
-            if provider == 'paystack':
-                service = PaystackService()
-                result = service.verify_payment(reference)
-                data = (result or {}).get('data', {}) or {}
-                is_successful = data.get('status') == 'success'
-                # Paystack reports amounts in kobo.
-                provider_amount = Decimal(str(data.get('amount', 0))) / Decimal('100')
-            else:
-                service = FlutterwaveService()
-                result = service.verify_payment(reference)
-                data = (result or {}).get('data', {}) or {}
-                is_successful = data.get('status') in ('success', 'successful')
-                provider_amount = data.get('amount', 0)
-        except Exception as e:
-            # Could not confirm with the provider — do not grant anything.
-            # Returning 5xx makes the provider retry later.
-            logger.error("Could not verify %s payment %s: %s", provider, reference, e)
-            return HttpResponse(status=502)
-
-        if not is_successful:
-            logger.info("Provider reports payment %s is not successful; ignoring.", reference)
-            return HttpResponse(status=200)
-
-        if not _amounts_match(payment.amount, provider_amount):
-            logger.error(
-                "Amount mismatch for payment %s: expected %s, provider reported %s. "
-                "Refusing to process.",
-                reference, payment.amount, provider_amount,
-            )
-            return HttpResponse(status=409)
-
-        try:
-            PaymentService.process_successful_payment(payment)
-        except Exception as e:
-            logger.exception("Error processing verified payment %s: %s", reference, e)
-            return HttpResponse(status=500)
-
+        # --- 2. Store it; the inbox re-verifies and fulfils -------------
+        _, created = webhook_inbox.accept(provider, kind, reference, event_id, claimed_status, raw_body)
+        if not created:
+            logger.info("Duplicate %s webhook for %s; already queued.", provider, reference)
         return HttpResponse(status=200)
     except Exception as e:
         logger.exception("Unhandled error in payment webhook: %s", e)
@@ -542,15 +356,10 @@ def seller_earnings(request):
         return Response({'error': 'Only sellers can access this'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        # Get or create earnings record
+        # The ledger keeps this row current as sales and payouts happen, so
+        # this is a single-row read however long the seller's history is.
         earnings, created = SellerEarnings.objects.get_or_create(seller=request.user)
         
-        # Update earnings if not created
-        if not created:
-            paystack_service = PaystackService()
-            paystack_service.update_seller_earnings(request.user)
-            earnings.refresh_from_db()
-        
         serializer = SellerEarningsSerializer(earnings)
         return Response(serializer.data)
         
@@ -569,8 +378,17 @@ def seller_commissions(request):
     try:
         commissions = SellerCommission.objects.filter(
             seller=request.user
-        ).select_related('purchase__product', 'purchase__payment__user').order_by('-created_at')
-        
+        ).select_related('purchase__product', 'purchase__payment__user').order_by('-created_at', '-id')
+
+        # Paged (by page or cursor) when asked; older clients still get the
+        # bare list. commissions/export.csv streams the full history.
+        if is_paged(request):
+            return Response(paginate_list(
+                request,
+                commissions,
+                serialize=lambda c: SellerCommissionSerializer(c).data,
+                ordering=('-created_at', '-id'),
+            ))
         serializer = SellerCommissionSerializer(commissions, many=True)
         return Response(serializer.data)
         
@@ -579,6 +397,39 @@ def seller_commissions(request):
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
+class SellerCommissionsExportView(ExportView):
+    """The seller's whole commission history, streamed as CSV or NDJSON."""
+    filename = 'commissions'
+    columns = (
+        'id', 'created_at', 'payment_reference', 'product', 'customer_email', 'product_price',
+        'commission_amount', 'seller_payout', 'status', 'paid_at',
+    )
+
+    def get(self, request, fmt):
+        if request.user.user_type != 'seller':
+            return Response({'error': 'Only sellers can access this'}, status=status.HTTP_403_FORBIDDEN)
+        return super().get(request, fmt)
+
+    def get_rows(self, request):
+        commissions = (
+            SellerCommission.objects.filter(seller=request.user)
+            .select_related('purchase__product', 'purchase__payment__user')
+            .order_by('-created_at', '-id')
+        )
+        for c in commissions.iterator(chunk_size=self.chunk_size):
+            yield {
+                'id': c.id,
+                'created_at': c.created_at,
+                'payment_reference': c.purchase.payment.reference,
+                'product': c.purchase.product.title,
+                'customer_email': c.purchase.payment.user.email,
+                'product_price': c.product_price,
+                'commission_amount': c.commission_amount,
+                'seller_payout': c.seller_payout,
+                'status': c.status,
+                'paid_at': c.paid_at,
+            }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def seller_payouts(request):
@@ -619,8 +470,7 @@ def request_payout(request):
         # Reserve the amount immediately so a second request can't be made
         # against the same balance while this one is pending/processing.
         try:
-            from apps.payments.services import FlutterwaveService
-            FlutterwaveService().update_seller_earnings(request.user)
+            ledger.sync_payout(payout_request)
         except Exception as e:
             print(f"Payout balance reservation error: {e}")
 
@@ -657,33 +507,14 @@ def seller_analytics(request):
         return Response({'error': 'Only sellers can access this'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        # Get time range from query params
-        time_range = request.query_params.get('timeRange', '7d')
-        
-        # Calculate date range
-        end_date = timezone.now()
-        if time_range == '7d':
-            start_date = end_date - timedelta(days=7)
-        elif time_range == '30d':
-            start_date = end_date - timedelta(days=30)
-        elif time_range == '90d':
-            start_date = end_date - timedelta(days=90)
-        elif time_range == '1y':
-            start_date = end_date - timedelta(days=365)
-        else:
-            start_date = end_date - timedelta(days=7)
-        
-        # Get commissions in date range
-        commissions = SellerCommission.objects.filter(
-            seller=request.user,
-            created_at__range=(start_date, end_date)
-        )
-        
-        # Calculate analytics
-        total_revenue = commissions.aggregate(total=Sum('product_price'))['total'] or 0
-        total_orders = commissions.count()
-        total_commission = commissions.aggregate(total=Sum('commission_amount'))['total'] or 0
-        net_payout = commissions.aggregate(total=Sum('seller_payout'))['total'] or 0
+        # Totals come from the daily rollup (seller_stats): at most one small
+        # row per day in the range rather than aggregates over every sale.
+        days = seller_stats.days_for(request.query_params.get('timeRange', '7d'))
+        totals = seller_stats.summary(request.user, days)
+        total_revenue = totals['revenue']
+        total_orders = totals['orders']
+        total_commission = totals['commission']
+        net_payout = totals['net_payout']
         
         # Get pending payouts
         pending_payouts = PayoutRequest.objects.filter(
@@ -692,7 +523,10 @@ def seller_analytics(request):
         ).aggregate(total=Sum('amount'))['total'] or 0
         
         # Get recent commissions
-        recent_commissions = commissions.order_by('-created_at')[:5]
+        recent_commissions = SellerCommission.objects.filter(
+            seller=request.user,
+            created_at__gte=timezone.now() - timedelta(days=days)
+        ).order_by('-created_at')[:5]
         commission_data = SellerCommissionSerializer(recent_commissions, many=True).data
         
         # Get recent payouts
@@ -711,7 +545,7 @@ def seller_analytics(request):
             'customer_countries': 1,  # Default value
             'top_products': [],  # You can implement top products
             'daily_revenue': [],  # You can implement daily revenue
-            'total_customers': total_orders,  # For now, assume 1 customer per order
+            'total_customers': totals['customers'],
             
             # Commission and earnings data
             'total_earnings': net_payout,
@@ -780,53 +614,36 @@ def test_flutterwave_connection(request):
 
 @api_view(['GET'])
 def check_payment_status(request, reference):
-    """Check payment status and ticket creation progress"""
+    """
+    Check payment status and ticket creation progress.
+
+    Answered from the cached progress record the fulfilment path keeps up to
+    date (see progress.py), so polling no longer queries the payment tables.
+    Clients that can should subscribe to payment_events instead.
+    """
     try:
-        payment = Payment.objects.get(reference=reference)
-        
-        # Get payment status
+        state = progress.get(reference)
+        if state is None:
+            raise Payment.DoesNotExist
+
         payment_status = {
-            'reference': payment.reference,
-            'status': payment.status,
-            'amount': payment.amount,
-            'created_at': payment.created_at,
+            'reference': state['reference'],
+            'status': state['status'],
+            'amount': state['amount'],
+            'created_at': state['created_at'],
         }
-        
-        # Check if payment has event tickets
-        purchases = payment.purchases.all()
-        has_event_tickets = any(purchase.product.product_type == 'event' for purchase in purchases)
-        
         ticket_status = {
-            'has_event_tickets': has_event_tickets,
-            'tickets_created': 0,
-            'tickets_with_qr_codes': 0,
-            'total_tickets_expected': 0,
+            'has_event_tickets': state['has_event_tickets'],
+            'tickets_created': state['tickets_created'],
+            'tickets_with_qr_codes': state['tickets_rendered'],
+            'total_tickets_expected': state['total_tickets_expected'],
         }
-        
-        if has_event_tickets:
-            # Count tickets for this payment
-            from apps.events.models import EventTicket
-            tickets = EventTicket.objects.filter(purchase__payment=payment)
-            
-            ticket_status['tickets_created'] = tickets.count()
-            ticket_status['tickets_with_qr_codes'] = tickets.filter(qr_code__isnull=False).count()
-            
-            # Calculate expected tickets
-            for purchase in purchases:
-                if purchase.product.product_type == 'event':
-                    ticket_status['total_tickets_expected'] += purchase.quantity
-        
-        # Determine overall status
-        is_complete = True
-        if has_event_tickets:
-            is_complete = (
-                ticket_status['tickets_created'] == ticket_status['total_tickets_expected'] and
-                ticket_status['tickets_with_qr_codes'] == ticket_status['total_tickets_expected']
-            )
-        
+        is_complete = progress.is_complete(state)
+
         return Response({
             'payment': payment_status,
             'tickets': ticket_status,
+            'library_ready': state['library_ready'],
             'is_complete': is_complete,
             'message': 'Complete' if is_complete else 'Processing tickets...'
         })
@@ -892,10 +709,7 @@ def send_digital_product_to_email(request, library_item_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_product_file(request, library_item_id):
-    """Securely serve a purchased digital product file"""
-    import os
-    from django.http import FileResponse
-
+    """Securely serve a purchased digital product file (see delivery.py)"""
     library_item = get_object_or_404(UserLibrary, id=library_item_id, user=request.user)
     product = library_item.product
 
@@ -905,29 +719,12 @@ def download_product_file(request, library_item_id):
     if not product.file:
         return Response({'message': 'No file attached to this product.'}, status=404)
 
-    # Opens from the configured (private) storage, falling back to the
-    # pre-migration public location so downloads keep working while files are
-    # still being moved. Works for remote backends too.
-    file_handle = product.open_file()
-    if file_handle is None:
+    # A presigned redirect for R2, a web-server offload or a Range-aware
+    # response for local disk, which falls back to the pre-migration public
+    # location while files are still being moved.
+    response = delivery.deliver(request, product)
+    if response is None:
         return Response({'message': 'File not found on server.'}, status=404)
-
-    # Derive the name from the stored field, not the resolved path, so it is
-    # identical regardless of which location the file came from.
-    filename = os.path.basename(product.file.name)
-    ext = os.path.splitext(filename)[1].lower()
-    content_types = {
-        '.pdf': 'application/pdf',
-        '.mp3': 'audio/mpeg',
-        '.mp4': 'video/mp4',
-        '.zip': 'application/zip',
-        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        '.png': 'image/png',
-    }
-    content_type = content_types.get(ext, 'application/octet-stream')
-
-    response = FileResponse(file_handle, content_type=content_type)
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
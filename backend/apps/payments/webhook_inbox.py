@@ -0,0 +1,275 @@
+"""
+Webhook inbox: acknowledge provider webhooks at once, act on them afterwards.
+
+payment_webhook used to verify the signature, re-verify the payment with the
+provider, claim and fulfil it, all before answering. Under a Paystack or
+Flutterwave retry storm those calls filled every worker, the deliveries timed
+out, the provider retried them, and WebhookRateThrottle began refusing real
+ones. Now the view only checks the signature and calls accept(), which stores
+the raw body as a WebhookEvent and answers; everything else happens here:
+
+    * dedupe: each delivery gets a key built from the provider, the kind of
+      event, the provider's event id, the reference and the status the body
+      claims. A retried delivery hits the unique key and only bumps
+      `deliveries`; a later delivery with a different status (pending, then
+      successful) is a new event;
+    * processing: after the insert commits the event is handed to the
+      task queue (process_webhook_event) or a background thread, and drain() — run by
+      the drain-webhook-inbox beat task or `manage.py run_webhook_inbox` —
+      sweeps up retries and anything a restart interrupted. Events are
+      claimed with a conditional UPDATE, so workers never share one;
+    * charges are re-verified with the provider exactly as the view used to
+      (the body is never trusted) and then fulfilled. Transfers settle the
+      payout through payout_sync;
+    * failures that may clear up (provider unreachable, fulfilment error)
+      retry with exponential backoff; ones that won't (amount mismatch) fail
+      at once. replay() re-queues events, from the admin or the command.
+"""
+
+import json
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.taskqueue.decorators import queue_available
+
+from .models import Payment, PayoutRequest, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+Kind = WebhookEvent.Kind
+Status = WebhookEvent.Status
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = 30          # seconds; doubled per attempt
+RETRY_MAX_DELAY = 60 * 60
+# An event still 'running' after this long belongs to a worker that died.
+STALE_AFTER = timedelta(minutes=10)
+
+
+class Retry(Exception):
+    """Processing failed in a way that may succeed later."""
+
+
+class Reject(Exception):
+    """The event can never be processed (e.g. the amounts don't match)."""
+
+
+def _amounts_match(expected, actual):
+    """Compare money values tolerantly (providers vary in type and precision)."""
+    try:
+        return abs(Decimal(str(expected)) - Decimal(str(actual))) < Decimal('0.01')
+    except (InvalidOperation, TypeError, ValueError):
+        return False
+
+
+# --- receiving -------------------------------------------------------------
+
+def identify(webhook_data):
+    """
+    (provider, kind, reference, event_id, claimed status) for a webhook body,
+    or None if it isn't a format we know.
+    """
+    if not isinstance(webhook_data, dict):
+        return None
+    data = webhook_data.get('data') or {}
+    if not isinstance(data, dict):
+        data = {}
+
+    # Payout (transfer) webhooks are a different event type.
+    if webhook_data.get('event') == 'transfer.completed':
+        reference = data.get('reference') or str(data.get('id') or '')
+        if not reference:
+            return None
+        return 'flutterwave', Kind.TRANSFER, reference, str(data.get('id') or ''), str(data.get('status', ''))
+
+    # Paystack puts the reference under data.reference.
+    if data.get('reference'):
+        return 'paystack', Kind.CHARGE, data['reference'], str(data.get('id') or ''), str(data.get('status', ''))
+
+    # Flutterwave: tx_ref at the root on some deliveries, under data on most.
+    if webhook_data.get('tx_ref'):
+        return ('flutterwave', Kind.CHARGE, webhook_data['tx_ref'],
+                str(webhook_data.get('id') or ''), str(webhook_data.get('status', '')))
+    if data.get('tx_ref'):
+        return 'flutterwave', Kind.CHARGE, data['tx_ref'], str(data.get('id') or ''), str(data.get('status', ''))
+    return None
+
+
+def accept(provider, kind, reference, event_id, claimed_status, raw_body):
+    """
+    Store a signed delivery. Returns (event, created); a duplicate only counts
+    the delivery. Processing starts once the insert commits.
+    """
+    key = ':'.join([provider, kind, event_id, reference, claimed_status.lower()])[:255]
+    try:
+        with transaction.atomic():
+            event = WebhookEvent.objects.create(
+                provider=provider, kind=kind, event_id=event_id, reference=reference,
+                dedupe_key=key, body=raw_body.decode('utf-8', 'replace'),
+            )
+    except IntegrityError:
+        WebhookEvent.objects.filter(dedupe_key=key).update(deliveries=F('deliveries') + 1)
+        return WebhookEvent.objects.filter(dedupe_key=key).first(), False
+    transaction.on_commit(lambda: dispatch(event.pk))
+    return event, True
+
+
+def _run_in_thread(event_id):
+    try:
+        process_event(event_id)
+    finally:
+        close_old_connections()
+
+
+def dispatch(event_id):
+    """Start processing an event without blocking the caller."""
+    if queue_available():
+        try:
+            from .tasks import process_webhook_event
+            process_webhook_event.delay(event_id)
+            return
+        except Exception as e:
+            logger.warning("Could not queue webhook event %s on the task queue, using a thread: %s", event_id, e)
+    from core.async_fallback import AsyncFallback
+    AsyncFallback.delay(_run_in_thread, event_id)
+
+
+# --- handlers --------------------------------------------------------------
+# Each takes the event and its parsed body, returns a short outcome, and
+# raises Retry or Reject.
+
+def _charge(event, body):
+    from .services import FlutterwaveService, PaymentService, PaystackService
+    from .verification import is_terminal
+    from . import inventory
+
+    payment = Payment.objects.filter(reference=event.reference).first()
+    if payment is None:
+        return 'unknown payment'
+    if payment.status == Payment.PaymentStatus.SUCCESS:
+        return 'already processed'
+
+    # Ask the provider directly; never trust the body.
+    try:
+        if event.provider == 'paystack':
+            result = PaystackService().verify_payment(event.reference)
+            data = (result or {}).get('data', {}) or {}
+            is_successful = data.get('status') == 'success'
+            # Paystack reports amounts in kobo.
+            provider_amount = Decimal(str(data.get('amount', 0))) / Decimal('100')
+        else:
+            result = FlutterwaveService().verify_payment(event.reference)
+            data = (result or {}).get('data', {}) or {}
+            is_successful = data.get('status') in ('success', 'successful')
+            provider_amount = data.get('amount', 0)
+    except Exception as e:
+        raise Retry(f'could not verify with {event.provider}: {e}')
+
+    if not is_successful:
+        if is_terminal(event.provider, result):
+            # Definitely not going to be paid: free its held seats now
+            # rather than waiting for the hold to expire.
+            inventory.release_for_payment(payment)
+            return 'not paid'
+        raise Retry('provider does not report the payment as final yet')
+
+    if not _amounts_match(payment.amount, provider_amount):
+        raise Reject(f'amount mismatch: expected {payment.amount}, provider reported {provider_amount}')
+
+    try:
+        PaymentService.process_successful_payment(payment)
+    except Exception as e:
+        raise Retry(f'fulfilment failed: {e}')
+    return 'fulfilled'
+
+
+def _transfer(event, body):
+    """Flutterwave's transfer.completed: the payout's real outcome."""
+    from . import payout_sync
+
+    data = body.get('data') or {}
+    payout = PayoutRequest.objects.filter(transfer_reference=event.reference).first()
+    if payout is None and event.event_id:
+        payout = PayoutRequest.objects.filter(flutterwave_transfer_id=event.event_id).first()
+    if payout is None:
+        return 'unknown payout'
+    moved = payout_sync.apply({payout.pk: data})
+    if moved['completed'] or moved['failed']:
+        return 'completed' if moved['completed'] else 'failed'
+    return 'no change'
+
+
+HANDLERS = {Kind.CHARGE: _charge, Kind.TRANSFER: _transfer}
+
+
+# --- processing ------------------------------------------------------------
+
+def _claimable(now):
+    return Q(status=Status.PENDING, available_at__lte=now) | Q(
+        status=Status.RUNNING, started_at__lt=now - STALE_AFTER
+    )
+
+
+def _claim(event_id, now):
+    return WebhookEvent.objects.filter(_claimable(now), pk=event_id).update(
+        status=Status.RUNNING, started_at=now, attempts=F('attempts') + 1,
+    ) == 1
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def process_event(event_id):
+    """Process one event if it is due and unclaimed. Returns its new status, or None."""
+    now = timezone.now()
+    if not _claim(event_id, now):
+        return None
+    event = WebhookEvent.objects.get(pk=event_id)
+    updates = {'processed_at': timezone.now()}
+    try:
+        body = json.loads(event.body or '{}')
+        updates['outcome'] = HANDLERS[event.kind](event, body if isinstance(body, dict) else {})
+        updates.update(status=Status.DONE, last_error=None)
+    except Reject as e:
+        logger.error("Webhook %s for %s rejected: %s", event.pk, event.reference, e)
+        updates.update(status=Status.FAILED, outcome='rejected', last_error=str(e)[:2000])
+    except Exception as e:
+        if not isinstance(e, Retry):
+            logger.exception("Webhook %s for %s failed", event.pk, event.reference)
+        gave_up = event.attempts >= MAX_ATTEMPTS
+        updates.update(
+            status=Status.FAILED if gave_up else Status.PENDING,
+            outcome='gave up' if gave_up else 'retrying',
+            last_error=str(e)[:2000],
+            available_at=timezone.now() + retry_delay(event.attempts),
+        )
+    WebhookEvent.objects.filter(pk=event_id).update(**updates)
+    return updates['status']
+
+
+def drain(batch_size=50):
+    """Process up to `batch_size` due events, oldest first. Returns how many were looked at."""
+    due = list(
+        WebhookEvent.objects.filter(_claimable(timezone.now()))
+        .order_by('available_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    for event_id in due:
+        try:
+            process_event(event_id)
+        except Exception as e:
+            logger.exception("Webhook inbox drain failed for event %s: %s", event_id, e)
+    return len(due)
+
+
+def replay(queryset):
+    """Make events (failed, or done ones to re-run) process again on the next drain."""
+    return queryset.exclude(status=Status.RUNNING).update(
+        status=Status.PENDING, attempts=0, available_at=timezone.now(), last_error=None, outcome='',
+    )
@@ -0,0 +1,41 @@
+from django.contrib import admin
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import QueuedTask, TaskGroup
+
+
+@admin.register(QueuedTask)
+class QueuedTaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'queue', 'status', 'attempts', 'available_at', 'completed_at', 'worker']
+    list_filter = ['status', 'queue', 'name']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['worker', 'started_at', 'completed_at', 'created_at', 'result', 'last_error']
+    ordering = ['-created_at']
+
+    actions = ['run_again']
+
+    def run_again(self, request, queryset):
+        """Queue the selected tasks to run again now, with a fresh retry budget"""
+        count = queryset.exclude(status=QueuedTask.Status.RUNNING).update(
+            status=QueuedTask.Status.PENDING, available_at=timezone.now(), attempts=0,
+        )
+        self.message_user(request, f"Queued {count} task(s) to run again.")
+    run_again.short_description = "Run again now"
+
+
+@admin.register(TaskGroup)
+class TaskGroupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'body', 'total', 'finished', 'body_sent_at', 'created_at']
+    search_fields = ['body']
+    readonly_fields = ['total', 'body', 'body_args', 'body_kwargs', 'body_immutable', 'body_queue',
+                       'body_sent_at', 'created_at']
+    ordering = ['-created_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(finished_count=Count('results'))
+
+    def finished(self, obj):
+        return obj.finished_count
+    finished.short_description = "Finished"
+    finished.admin_order_field = 'finished_count'
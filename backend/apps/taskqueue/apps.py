@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class TaskQueueConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.taskqueue'
+    label = 'taskqueue'
+    verbose_name = 'Background tasks'
@@ -0,0 +1,227 @@
+"""
+Signatures, group and chord for shared_task tasks, on every TASK_BACKEND.
+
+Fanning out used to mean .delay() per item and then .get() on each result
+from inside the fanning-out task. That task holds a worker slot while it
+waits, every level of nesting holds another, and with one worker on the
+queue (worker_prefetch_multiplier = 1) the children never start: deadlock.
+A task here never waits on another; it says what runs next:
+
+    * task.s(*args, **kwargs) is a Signature: a call to send later.
+      task.si(...) is the same, but it ignores the results a chord gives it;
+    * group(signatures).apply_async() sends them all and returns;
+    * chord(header, body).apply_async(), or chord(header)(body), sends the
+      header as a group and the body once every header task has finished,
+      with their results (in header order) as its first argument.
+
+On 'celery' these are Celery's own group and chord. Elsewhere ('database',
+'thread') the chord is a TaskGroup row. Each header task runs inside
+chord_member, which stores what it returned as a TaskGroupResult and then
+counts them; the member that finds them all there sends the body, claimed
+with a conditional UPDATE on body_sent_at, so it is sent once even when the
+last two finish together. A header task that raises is retried as usual
+(queue backend); once it gives up, its result is {'status': 'error', ...}
+and the chord still completes.
+"""
+
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .decorators import backend, registry, shared_task
+from .models import TaskGroup, TaskGroupResult
+
+logger = logging.getLogger(__name__)
+
+try:
+    from celery import chord as _celery_chord, group as _celery_group
+except ImportError:  # only needed when TASK_BACKEND is 'celery'
+    _celery_chord = _celery_group = None
+
+
+def _use_celery():
+    return backend() == 'celery' and _celery_chord is not None
+
+
+class Signature:
+    """A task call to send later: task.s(...) / task.si(...)."""
+
+    def __init__(self, task, args=(), kwargs=None, immutable=False, **options):
+        self.task = task
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.immutable = immutable
+        self.options = options
+
+    def __repr__(self):
+        return f"{self.task.name}{'.si' if self.immutable else '.s'}{self.args}"
+
+    def apply_async(self, args=(), kwargs=None, **options):
+        """Send it. `args` go before the signature's own, as in Celery, unless immutable."""
+        call_args = self.args if self.immutable else tuple(args) + self.args
+        call_kwargs = self.kwargs if self.immutable else dict(self.kwargs, **(kwargs or {}))
+        return self.task.apply_async(call_args, call_kwargs, **dict(self.options, **options))
+
+    def delay(self, *args, **kwargs):
+        return self.apply_async(args, kwargs)
+
+    def celery(self):
+        """The same call as a Celery signature."""
+        if self.task._celery is None:
+            raise RuntimeError(f"{self.task.name} is not a Celery task")
+        return self.task._celery.signature(self.args, self.kwargs, immutable=self.immutable, **self.options)
+
+
+class GroupResult:
+    """The results of a group sent without Celery."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __len__(self):
+        return len(self.results)
+
+    def completed_count(self):
+        return sum(1 for result in self.results if result.ready())
+
+
+class ChordResult:
+    """A chord sent without Celery: its TaskGroup id and how far along it is."""
+
+    def __init__(self, group_id):
+        self.id = group_id
+
+    def completed_count(self):
+        return TaskGroupResult.objects.filter(group_id=self.id).count()
+
+    def ready(self):
+        """Whether the body has been sent."""
+        return TaskGroup.objects.filter(pk=self.id, body_sent_at__isnull=False).exists()
+
+
+class group:
+    """Send several signatures at once, like celery.group."""
+
+    def __init__(self, *tasks):
+        if len(tasks) == 1 and not isinstance(tasks[0], Signature):
+            tasks = tasks[0]
+        self.tasks = list(tasks)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def apply_async(self):
+        if _use_celery():
+            return _celery_group([sig.celery() for sig in self.tasks]).apply_async()
+        return GroupResult([sig.apply_async() for sig in self.tasks])
+
+    def __call__(self):
+        return self.apply_async()
+
+
+class chord:
+    """Send a group, then `body` with its results once all of it has finished."""
+
+    def __init__(self, header, body=None):
+        self.header = header if isinstance(header, group) else group(header)
+        self.body = body
+
+    def __call__(self, body=None):
+        return self.apply_async(body)
+
+    def apply_async(self, body=None):
+        body = body or self.body
+        if body is None:
+            raise ValueError("A chord needs a body")
+        if _use_celery():
+            return _celery_chord([sig.celery() for sig in self.header.tasks])(body.celery())
+
+        header = self.header.tasks
+        row = TaskGroup.objects.create(
+            total=len(header),
+            body=body.task.name,
+            body_args=list(body.args),
+            body_kwargs=body.kwargs,
+            body_immutable=body.immutable,
+            body_queue=body.options.get('queue') or '',
+        )
+        if not header:
+            _send_body(row.pk)
+            return ChordResult(row.pk)
+
+        def send_header():
+            for index, sig in enumerate(header):
+                chord_member.apply_async(
+                    (row.pk, index, sig.task.name, list(sig.args), sig.kwargs),
+                    queue=sig.options.get('queue') or sig.task.queue,
+                    max_retries=sig.task.max_retries,
+                )
+
+        if backend() == 'database':
+            # Queued rows commit (or roll back) with the TaskGroup.
+            send_header()
+        else:
+            # A thread could start before the TaskGroup is committed.
+            transaction.on_commit(send_header)
+        return ChordResult(row.pk)
+
+
+def _send_body(group_id):
+    """Send the chord's body if every result is in and nobody has sent it yet."""
+    row = TaskGroup.objects.filter(pk=group_id).first()
+    if row is None or row.body_sent_at is not None:
+        return False
+    if TaskGroupResult.objects.filter(group_id=group_id).count() < row.total:
+        return False
+    with transaction.atomic():
+        if not TaskGroup.objects.filter(pk=group_id, body_sent_at__isnull=True).update(body_sent_at=timezone.now()):
+            return False
+        task = registry.get(row.body)
+        if task is None:
+            logger.error("Chord #%s: no task registered as %r", group_id, row.body)
+            return False
+        args = list(row.body_args)
+        if not row.body_immutable:
+            results = list(TaskGroupResult.objects.filter(group_id=group_id)
+                           .order_by('index').values_list('result', flat=True))
+            args = [results, *args]
+
+        def send_body():
+            task.apply_async(args, row.body_kwargs, queue=row.body_queue or None)
+
+        if backend() == 'database':
+            send_body()
+        else:
+            transaction.on_commit(send_body)
+    return True
+
+
+def _store_result(group_id, index, result):
+    try:
+        TaskGroupResult.objects.bulk_create(
+            [TaskGroupResult(group_id=group_id, index=index, result=result)], ignore_conflicts=True,
+        )
+    except (TypeError, ValueError):
+        # The return value isn't JSON; the task still finished.
+        TaskGroupResult.objects.bulk_create(
+            [TaskGroupResult(group_id=group_id, index=index, result=None)], ignore_conflicts=True,
+        )
+
+
+@shared_task(bind=True, name='taskqueue.chord_member')
+def chord_member(self, group_id, index, name, args, kwargs):
+    """Run header task `index` of chord `group_id`, then send the body if it was the last."""
+    task = registry.get(name)
+    if task is None:
+        result = {'status': 'error', 'error': f"No task registered as {name!r}"}
+    else:
+        try:
+            result = task(*args, **kwargs)
+        except Exception as e:
+            if not self.request.called_directly and self.request.retries < task.max_retries:
+                raise self.retry(e, countdown=task.retry_delay(self.request.retries + 1))
+            logger.exception("Chord #%s task %s (%s) failed", group_id, index, name)
+            result = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    _store_result(group_id, index, result)
+    _send_body(group_id)
@@ -0,0 +1,185 @@
+"""
+shared_task: Celery's decorator, with the broker chosen by TASK_BACKEND.
+
+Task modules import shared_task from here instead of from celery. The
+decorated function is registered under its Celery name (`name`, or
+module.function) and .delay() / .apply_async() send it to:
+
+    * 'celery': Celery, exactly as before (the function is also a real
+      Celery task, so `celery worker` finds it by autodiscovery);
+    * 'database': a QueuedTask row, written in the caller's transaction and
+      run by `manage.py run_task_worker` (see apps.taskqueue.queue);
+    * 'thread': the in-process executor (core.executor), as the fallback
+      without Redis always did.
+
+Calling the task directly still runs it synchronously. Options Celery knows
+(bind, name, ignore_result, max_retries, queue, ...) are accepted and passed
+on to Celery; the database queue reads bind, name, ignore_result, queue,
+max_retries, retry_backoff (base delay in seconds, doubled per attempt) and
+retry_backoff_max.
+"""
+
+import itertools
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.executor import executor
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('celery', 'database', 'thread')
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 30          # seconds; doubled per attempt
+DEFAULT_RETRY_BACKOFF_MAX = 60 * 60
+
+registry = {}
+
+try:
+    from celery import shared_task as _celery_shared_task
+except ImportError:  # Celery isn't needed unless TASK_BACKEND is 'celery'
+    _celery_shared_task = None
+
+
+def backend():
+    name = getattr(settings, 'TASK_BACKEND', 'thread')
+    return name if name in BACKENDS else 'thread'
+
+
+def queue_available():
+    """Whether .delay() goes to a queue that outlives this process."""
+    return backend() in ('celery', 'database')
+
+
+class Retry(Exception):
+    """Raised by Task.retry(): run the task again after `countdown` seconds."""
+
+    def __init__(self, exc=None, countdown=None):
+        super().__init__(str(exc) if exc else 'retry requested')
+        self.exc = exc
+        self.countdown = countdown
+
+
+class _Request(threading.local):
+    id = None
+    retries = 0
+    called_directly = True
+
+
+class _DelayedThreadTask:
+    """A thread-backend task held back by a countdown; get() waits for it."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, task, args, kwargs, delay):
+        self.id = f"delayed_{next(self._ids)}"
+        self._inner = None
+        self._submitted = threading.Event()
+        timer = threading.Timer(delay, self._submit, (task, args, kwargs))
+        timer.daemon = True
+        timer.start()
+
+    def _submit(self, task, args, kwargs):
+        self._inner = executor.submit(task, *args, **kwargs)
+        self._submitted.set()
+
+    def get(self, timeout=None):
+        if not self._submitted.wait(timeout):
+            raise TimeoutError(f"Task {self.id} has not started")
+        return self._inner.get(timeout)
+
+
+class Task:
+    def __init__(self, func, name=None, bind=False, ignore_result=False, queue=None,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+                 retry_backoff_max=DEFAULT_RETRY_BACKOFF_MAX, **celery_options):
+        self.func = func
+        self.name = name or f"{func.__module__}.{func.__name__}"
+        self.bind = bind
+        self.ignore_result = ignore_result
+        self.queue = queue or 'default'
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.request = _Request()
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+        self.__module__ = func.__module__
+        self.__qualname__ = getattr(func, '__qualname__', func.__name__)
+        self._celery = None
+        if _celery_shared_task is not None:
+            options = dict(celery_options, name=self.name, bind=bind, ignore_result=ignore_result)
+            if queue:
+                options['queue'] = queue
+            if max_retries is not None:
+                options['max_retries'] = max_retries
+            self._celery = _celery_shared_task(**options)(func)
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+    def __call__(self, *args, **kwargs):
+        if self.bind:
+            return self.func(self, *args, **kwargs)
+        return self.func(*args, **kwargs)
+
+    def retry_delay(self, attempts):
+        """Seconds to wait before run number `attempts` + 1."""
+        return min(self.retry_backoff * 2 ** max(0, attempts - 1), self.retry_backoff_max)
+
+    def retry(self, exc=None, countdown=None, max_retries=None):
+        """Ask for another run, like Celery's task.retry(). Always raises."""
+        raise Retry(exc, countdown)
+
+    def s(self, *args, **kwargs):
+        """A signature for this call, for group / chord (see apps.taskqueue.canvas)."""
+        from .canvas import Signature
+        return Signature(self, args, kwargs)
+
+    def si(self, *args, **kwargs):
+        """Like s(), but a chord doesn't pass it the header's results."""
+        from .canvas import Signature
+        return Signature(self, args, kwargs, immutable=True)
+
+    def delay(self, *args, **kwargs):
+        return self.apply_async(args, kwargs)
+
+    def apply_async(self, args=None, kwargs=None, countdown=None, eta=None, queue=None, **options):
+        """Send one call. The database queue also reads `max_retries`, overriding the task's."""
+        args, kwargs = list(args or ()), dict(kwargs or {})
+        chosen = backend()
+        if chosen == 'celery' and self._celery is not None:
+            return self._celery.apply_async(args, kwargs, countdown=countdown, eta=eta,
+                                            queue=queue, **options)
+
+        if countdown is not None and eta is None:
+            eta = timezone.now() + timedelta(seconds=countdown)
+        if chosen == 'database':
+            from . import queue as task_queue
+            return task_queue.enqueue(self, args, kwargs, eta=eta, queue=queue,
+                                      max_retries=options.get('max_retries'))
+
+        if chosen == 'celery':
+            logger.warning("TASK_BACKEND is 'celery' but Celery isn't installed; running %s in a thread",
+                           self.name)
+        delay = (eta - timezone.now()).total_seconds() if eta else 0
+        if delay > 0:
+            return _DelayedThreadTask(self, args, kwargs, delay)
+        return executor.submit(self, *args, **kwargs)
+
+
+def shared_task(*args, **options):
+    """@shared_task and @shared_task(...), as in Celery."""
+    def decorate(func):
+        task = Task(func, **options)
+        if task.name in registry and registry[task.name].func is not func:
+            logger.warning("Task name %s registered twice; the later one wins", task.name)
+        registry[task.name] = task
+        return task
+
+    if len(args) == 1 and callable(args[0]) and not options:
+        return decorate(args[0])
+    return decorate
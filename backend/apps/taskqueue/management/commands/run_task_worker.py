@@ -0,0 +1,72 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from apps.taskqueue import queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background tasks queued in the database (TASK_BACKEND = "
+        "'database'). Several workers, on one host or many, can run at once: "
+        'each task is claimed by exactly one of them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=2,
+            help='Tasks run at the same time, one thread each (default 2)',
+        )
+        parser.add_argument(
+            '--queue',
+            action='append',
+            help='Only run tasks from this queue (repeatable; default all)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1,
+            help='Tasks each thread claims at a time (default 1)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds a thread sleeps when nothing is due (default 1)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run what is due now and exit (for a cron or scheduled task)',
+        )
+
+    def handle(self, *args, **options):
+        queue.autodiscover()
+        pruned = queue.prune()
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} finished task(s)")
+
+        worker = queue.Worker(
+            concurrency=options['concurrency'],
+            queues=options['queue'],
+            batch_size=options['batch_size'],
+            poll_interval=options['interval'],
+            once=options['once'],
+        )
+        if not options['once']:
+            self.stdout.write(
+                f"Running queued tasks with {worker.concurrency} thread(s) "
+                f"from {', '.join(options['queue'] or ['all queues'])} (Ctrl+C to stop)"
+            )
+            if threading.current_thread() is threading.main_thread():
+                # Finish the tasks in hand, then exit, when the host stops us.
+                signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        try:
+            processed = worker.run()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(f"Stopped after {worker.processed} task(s)"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Ran {processed} task(s)"))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskqueue', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField()),
+                ('body', models.CharField(max_length=200)),
+                ('body_args', models.JSONField(blank=True, default=list)),
+                ('body_kwargs', models.JSONField(blank=True, default=dict)),
+                ('body_immutable', models.BooleanField(default=False)),
+                ('body_queue', models.CharField(blank=True, default='', max_length=50)),
+                ('body_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskGroupResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='taskqueue.taskgroup')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'index'), name='taskqueue_group_result_once')],
+            },
+        ),
+    ]
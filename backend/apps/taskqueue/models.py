@@ -0,0 +1,72 @@
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedTask(models.Model):
+    """
+    One call of a background task, waiting for or run by `manage.py
+    run_task_worker` (see apps.taskqueue.queue). Written by .delay() /
+    .apply_async() when TASK_BACKEND is 'database', in the caller's
+    transaction, so a task queued by work that rolls back never runs.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    name = models.CharField(max_length=200)  # the registered task name
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_retries = models.PositiveIntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)  # not run before this
+    worker = models.CharField(max_length=100, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['queue', 'status', 'available_at']),
+        ]
+
+
+class TaskGroup(models.Model):
+    """
+    A chord sent without Celery (see apps.taskqueue.canvas): `total` header
+    tasks, each leaving a TaskGroupResult, and the body task sent with their
+    results once the last one is in. body_sent_at is set exactly once.
+    """
+    total = models.PositiveIntegerField()
+    body = models.CharField(max_length=200)  # the registered task name
+    body_args = models.JSONField(default=list, blank=True)
+    body_kwargs = models.JSONField(default=dict, blank=True)
+    body_immutable = models.BooleanField(default=False)  # .si(): results not passed
+    body_queue = models.CharField(max_length=50, blank=True, default='')
+    body_sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Chord #{self.pk} -> {self.body} ({self.total} task(s))"
+
+
+class TaskGroupResult(models.Model):
+    """What header task number `index` of a TaskGroup returned."""
+    group = models.ForeignKey(TaskGroup, on_delete=models.CASCADE, related_name='results')
+    index = models.PositiveIntegerField()
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'index'], name='taskqueue_group_result_once'),
+        ]
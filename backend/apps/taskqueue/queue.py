@@ -0,0 +1,297 @@
+"""
+The database task queue.
+
+Without Redis, settings used to point Celery at CELERY_BROKER_URL =
+'django-db', which isn't a broker Celery has: on a Redis-less host every
+.delay() on a Celery task raised or hung, and the apps avoided that by
+starting a thread instead (see core.executor). A thread's work dies with
+the process, and a small host can't keep a Celery worker and Redis running.
+
+With TASK_BACKEND = 'database', .delay() writes a QueuedTask row instead,
+in the caller's transaction like the payment outbox, and `manage.py
+run_task_worker` runs them:
+
+    * claim() takes due rows for one worker. Where the database has it
+      (PostgreSQL, MySQL 8) the rows are picked with SELECT ... FOR UPDATE
+      SKIP LOCKED, so concurrent workers take different rows without waiting
+      on each other. Elsewhere (SQLite) each candidate is taken with a
+      conditional UPDATE, and a row someone else took is skipped;
+    * run() calls the registered task. A success marks the row done, keeping
+      the return value unless the task ignores results. An exception, or
+      task.retry(), puts it back for later with exponential backoff until it
+      has been retried max_retries times; then it is marked failed;
+    * a row left 'running' for STALE_AFTER belongs to a worker that died,
+      and is claimed again (counting as an attempt) unless it has had all
+      its attempts: then it is marked failed, so a task that kills its
+      worker every time (out of memory, say) doesn't run forever;
+    * eta / countdown tasks simply become due later (available_at).
+
+Tasks must be safe to run twice: a worker can die between doing the work
+and marking the row done.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .decorators import Retry, registry
+from .models import QueuedTask, TaskGroup
+
+logger = logging.getLogger(__name__)
+
+Status = QueuedTask.Status
+
+# A task still 'running' after this long belongs to a worker that died. Well
+# above CELERY_TASK_TIME_LIMIT, the longest a task is expected to take.
+STALE_AFTER = timedelta(minutes=15)
+KEEP_DONE_FOR = timedelta(days=7)
+
+
+def worker_name(suffix=''):
+    return f"{socket.gethostname()}:{os.getpid()}{suffix}"[:100]
+
+
+# --- results ---------------------------------------------------------------
+
+class TaskFailed(Exception):
+    """The queued task failed for good; the message is its last error."""
+
+
+class QueuedResult:
+    """What .delay() returns for a queued task: its id, status and result."""
+
+    def __init__(self, task_id):
+        self.id = task_id
+
+    def _row(self):
+        return QueuedTask.objects.only('status', 'result', 'last_error').get(pk=self.id)
+
+    @property
+    def status(self):
+        return self._row().status
+
+    def ready(self):
+        return self.status in (Status.DONE, Status.FAILED)
+
+    def get(self, timeout=None, interval=0.5):
+        """Wait for the task (polling the row) and return its result."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            row = self._row()
+            if row.status == Status.DONE:
+                return row.result
+            if row.status == Status.FAILED:
+                raise TaskFailed(row.last_error)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Queued task {self.id} still {row.status}")
+            time.sleep(interval)
+
+
+# --- producing -------------------------------------------------------------
+
+def enqueue(task, args, kwargs, eta=None, queue=None, max_retries=None):
+    """Queue one call of `task`. Returns a QueuedResult."""
+    row = QueuedTask.objects.create(
+        name=task.name,
+        queue=queue or task.queue,
+        args=list(args),
+        kwargs=dict(kwargs),
+        max_retries=task.max_retries if max_retries is None else max_retries,
+        available_at=eta or timezone.now(),
+    )
+    return QueuedResult(row.pk)
+
+
+# --- claiming --------------------------------------------------------------
+
+def _abandoned(now):
+    return Q(status=Status.RUNNING, started_at__lt=now - STALE_AFTER)
+
+
+def _claimable(now):
+    return Q(status=Status.PENDING, available_at__lte=now) | (
+        _abandoned(now) & Q(attempts__lte=F('max_retries'))
+    )
+
+
+def fail_abandoned(now=None):
+    """Mark failed the abandoned tasks that have used up their attempts. Returns how many."""
+    now = now or timezone.now()
+    failed = QueuedTask.objects.filter(_abandoned(now), attempts__gt=F('max_retries')).update(
+        status=Status.FAILED, completed_at=now,
+        last_error='Worker stopped while running the task, on its last attempt',
+    )
+    if failed:
+        logger.error("Marked %s abandoned task(s) failed after their last attempt", failed)
+    return failed
+
+
+def _take(now, worker):
+    return dict(status=Status.RUNNING, started_at=now, worker=worker, attempts=F('attempts') + 1)
+
+
+def claim(worker, limit=1, queues=None):
+    """Take up to `limit` due tasks for `worker`. Returns the claimed rows."""
+    now = timezone.now()
+    fail_abandoned(now)
+    candidates = QueuedTask.objects.filter(_claimable(now)).order_by('available_at', 'id')
+    if queues:
+        candidates = candidates.filter(queue__in=queues)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            QueuedTask.objects.filter(id__in=ids).update(**_take(now, worker))
+    else:
+        ids = []
+        # A few spares, in case other workers take some of them first.
+        for pk in candidates.values_list('id', flat=True)[:limit * 2]:
+            if QueuedTask.objects.filter(_claimable(now), pk=pk).update(**_take(now, worker)) == 1:
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(QueuedTask.objects.filter(id__in=ids).order_by('available_at', 'id'))
+
+
+# --- running ---------------------------------------------------------------
+
+def _settle(row, **fields):
+    """Record the outcome, unless the row was claimed again meanwhile."""
+    return QueuedTask.objects.filter(pk=row.pk, attempts=row.attempts, status=Status.RUNNING).update(**fields)
+
+
+def _retry_or_fail(row, task, error, countdown=None):
+    now = timezone.now()
+    if row.attempts > row.max_retries:
+        logger.error("Task %s #%s failed after %s attempt(s): %s", row.name, row.pk, row.attempts, error)
+        _settle(row, status=Status.FAILED, completed_at=now, last_error=error)
+        return Status.FAILED
+    delay = countdown if countdown is not None else (task.retry_delay(row.attempts) if task else 0)
+    logger.warning("Task %s #%s attempt %s failed, retrying in %ss: %s",
+                   row.name, row.pk, row.attempts, delay, error)
+    _settle(row, status=Status.PENDING, available_at=now + timedelta(seconds=delay), last_error=error)
+    return Status.PENDING
+
+
+def run(row):
+    """Run one claimed task. Returns the status it ended in."""
+    task = registry.get(row.name)
+    if task is None:
+        error = f"No task registered as {row.name!r}"
+        logger.error("%s (task #%s)", error, row.pk)
+        _settle(row, status=Status.FAILED, completed_at=timezone.now(), last_error=error)
+        return Status.FAILED
+
+    task.request.id, task.request.retries, task.request.called_directly = row.pk, row.attempts - 1, False
+    try:
+        result = task(*row.args, **row.kwargs)
+    except Retry as r:
+        return _retry_or_fail(row, task, str(r.exc or r), countdown=r.countdown)
+    except Exception as e:
+        logger.exception("Task %s #%s raised", row.name, row.pk)
+        return _retry_or_fail(row, task, f"{type(e).__name__}: {e}")
+    finally:
+        task.request.id, task.request.retries, task.request.called_directly = None, 0, True
+
+    fields = dict(status=Status.DONE, completed_at=timezone.now(), last_error=None)
+    if not task.ignore_result:
+        fields['result'] = result
+    try:
+        _settle(row, **fields)
+    except (TypeError, ValueError):
+        # The return value isn't JSON; the task still succeeded.
+        fields.pop('result')
+        _settle(row, **fields)
+    return Status.DONE
+
+
+def work_once(worker, limit=1, queues=None):
+    """Claim and run up to `limit` due tasks. Returns how many ran."""
+    rows = claim(worker, limit, queues)
+    for row in rows:
+        try:
+            run(row)
+        finally:
+            close_old_connections()
+    return len(rows)
+
+
+def prune(older_than=KEEP_DONE_FOR):
+    """
+    Delete finished (done) tasks, and chords whose body was sent, older than
+    `older_than`. Failed tasks are kept.
+    """
+    cutoff = timezone.now() - older_than
+    deleted, _ = QueuedTask.objects.filter(status=Status.DONE, completed_at__lt=cutoff).delete()
+    TaskGroup.objects.filter(body_sent_at__lt=cutoff).delete()
+    return deleted
+
+
+def autodiscover():
+    """Import every installed app's tasks module, so their tasks are registered."""
+    from django.utils.module_loading import autodiscover_modules
+    from . import canvas  # noqa: F401 - registers chord_member
+    autodiscover_modules('tasks')
+
+
+class Worker:
+    """
+    `concurrency` threads, each claiming and running tasks until stop() is
+    called (or, with once=True, until nothing is due).
+    """
+
+    def __init__(self, concurrency=1, queues=None, batch_size=1, poll_interval=1.0, once=False):
+        self.concurrency = max(1, concurrency)
+        self.queues = queues or None
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.once = once
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, index):
+        name = worker_name(f"/{index}")
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                ran = work_once(name, self.batch_size, self.queues)
+            except Exception:
+                logger.exception("Task worker %s: claim failed", name)
+                ran = 0
+            with self._lock:
+                self.processed += ran
+            if ran < self.batch_size:
+                if self.once:
+                    break
+                self._stop.wait(self.poll_interval)
+        close_old_connections()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, args=(i,), name=f"task-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            # Join with a timeout so the main thread still sees Ctrl+C.
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            raise
+        return self.processed
@@ -0,0 +1,246 @@
+"""
+Tests for the database task queue: queueing through the Celery-style
+decorator, claiming, retries with backoff, delayed tasks, chords and the
+worker.
+
+SQLite has no SKIP LOCKED, so these run the conditional-UPDATE claim; the
+SKIP LOCKED path is the same query with select_for_update on top.
+"""
+
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .canvas import chord
+from .decorators import shared_task
+from .models import QueuedTask, TaskGroup
+
+calls = []
+collected = []
+collected_event = threading.Event()
+
+
+@shared_task(name='taskqueue.tests.add')
+def add(a, b=0):
+    calls.append((a, b))
+    return a + b
+
+
+@shared_task(name='taskqueue.tests.flaky', max_retries=2, retry_backoff=10)
+def flaky():
+    raise ConnectionError('provider down')
+
+
+@shared_task(name='taskqueue.tests.broken', max_retries=1)
+def broken():
+    raise ValueError('bad input')
+
+
+@shared_task(name='taskqueue.tests.collect')
+def collect(results, label=''):
+    collected.append((label, results))
+    collected_event.set()
+    return len(results)
+
+
+@shared_task(bind=True, name='taskqueue.tests.patient', ignore_result=True)
+def patient(self):
+    if self.request.retries == 0:
+        raise self.retry(countdown=120)
+    return 'done'
+
+
+@override_settings(TASK_BACKEND='database')
+class DatabaseQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def _run_due(self):
+        return queue.work_once('test-worker', limit=10)
+
+    def test_delay_queues_a_row_that_the_worker_runs(self):
+        result = add.delay(2, b=3)
+        row = QueuedTask.objects.get(pk=result.id)
+        self.assertEqual((row.name, row.args, row.kwargs, row.status), ('taskqueue.tests.add', [2], {'b': 3}, 'pending'))
+        self.assertEqual(calls, [])
+
+        self.assertEqual(self._run_due(), 1)
+        self.assertEqual(calls, [(2, 3)])
+        self.assertEqual(result.get(timeout=0), 5)
+        self.assertEqual(self._run_due(), 0)
+
+    def test_calling_the_task_still_runs_it_inline(self):
+        self.assertEqual(add(1, 1), 2)
+        self.assertFalse(QueuedTask.objects.exists())
+
+    def test_countdown_holds_the_task_back(self):
+        add.apply_async((1,), countdown=60)
+        self.assertEqual(self._run_due(), 0)
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=61)):
+            self.assertEqual(self._run_due(), 1)
+
+    def test_failures_back_off_then_give_up(self):
+        row_id = flaky.delay().id
+        delays = []
+        for _ in range(3):
+            QueuedTask.objects.filter(pk=row_id).update(available_at=timezone.now())
+            before = timezone.now()
+            self._run_due()
+            row = QueuedTask.objects.get(pk=row_id)
+            delays.append(round((row.available_at - before).total_seconds()))
+        self.assertEqual(row.status, 'failed')
+        self.assertEqual(row.attempts, 3)
+        self.assertIn('provider down', row.last_error)
+        self.assertEqual(delays[:2], [10, 20])
+
+    def test_task_retry_uses_its_countdown(self):
+        row_id = patient.delay().id
+        self._run_due()
+        row = QueuedTask.objects.get(pk=row_id)
+        self.assertEqual(row.status, 'pending')
+        self.assertGreater(row.available_at, timezone.now() + timedelta(seconds=100))
+        QueuedTask.objects.filter(pk=row_id).update(available_at=timezone.now())
+        self._run_due()
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.result), ('done', None))
+
+    def test_a_task_is_claimed_once_and_stale_claims_are_retaken(self):
+        add.delay(1)
+        first = queue.claim('worker-a', limit=5)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(queue.claim('worker-b', limit=5), [])
+        # worker-a died mid-task.
+        QueuedTask.objects.filter(pk=first[0].pk).update(started_at=timezone.now() - queue.STALE_AFTER * 2)
+        retaken, = queue.claim('worker-b', limit=5)
+        self.assertEqual((retaken.worker, retaken.attempts), ('worker-b', 2))
+        # worker-a's late result doesn't overwrite worker-b's claim.
+        queue.run(first[0])
+        retaken.refresh_from_db()
+        self.assertEqual(retaken.status, 'running')
+
+    def test_a_task_that_keeps_killing_its_worker_is_not_retaken_forever(self):
+        row_id = add.delay(1).id
+        stale = timezone.now() - queue.STALE_AFTER * 2
+        for attempt in range(1, 5):
+            claimed = queue.claim('worker', limit=5)
+            self.assertEqual([(r.pk, r.attempts) for r in claimed], [(row_id, attempt)])
+            # The worker dies mid-task.
+            QueuedTask.objects.filter(pk=row_id).update(started_at=stale)
+        self.assertEqual(queue.claim('worker', limit=5), [])
+        row = QueuedTask.objects.get(pk=row_id)
+        self.assertEqual((row.status, row.attempts), ('failed', 4))
+        self.assertIn('last attempt', row.last_error)
+
+    def test_unknown_tasks_fail(self):
+        row = QueuedTask.objects.create(name='nowhere.task')
+        self._run_due()
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'failed')
+
+    def test_queue_filter(self):
+        add.apply_async((1,), queue='emails')
+        self.assertEqual(queue.work_once('w', limit=5, queues=['tickets']), 0)
+        self.assertEqual(queue.work_once('w', limit=5, queues=['emails']), 1)
+
+    def test_outbox_dispatch_uses_the_queue(self):
+        from apps.payments import outbox
+        outbox.dispatch(12345)
+        row = QueuedTask.objects.get()
+        self.assertEqual((row.name, row.args), ('apps.payments.tasks.process_payment_outbox', [12345]))
+
+
+@override_settings(TASK_BACKEND='database')
+class ChordTests(TestCase):
+    """chord on the database queue: the body is queued once, after the last
+    header task, with the results in header order; nothing waits."""
+
+    def setUp(self):
+        calls.clear()
+        collected.clear()
+
+    def _drain(self):
+        ran = 0
+        while n := queue.work_once('test-worker', limit=10):
+            ran += n
+        return ran
+
+    def test_body_gets_the_results_in_order_once_all_are_in(self):
+        result = chord(add.s(n, b=10) for n in range(3))(collect.s(label='sums'))
+        self.assertEqual(QueuedTask.objects.filter(name='taskqueue.chord_member').count(), 3)
+
+        # Run the header last-first: the body must still wait for all three.
+        first, *rest = queue.claim('w', limit=3)
+        for row in reversed(rest):
+            queue.run(row)
+        self.assertEqual((result.completed_count(), result.ready()), (2, False))
+        self.assertFalse(QueuedTask.objects.filter(name='taskqueue.tests.collect').exists())
+
+        queue.run(first)
+        self._drain()
+        self.assertTrue(result.ready())
+        self.assertEqual(collected, [('sums', [10, 11, 12])])
+        self.assertEqual(QueuedTask.objects.filter(name='taskqueue.tests.collect').count(), 1)
+
+    def test_a_task_that_gives_up_still_completes_the_chord(self):
+        chord([add.s(1), broken.s()], collect.s()).apply_async()
+        for _ in range(3):
+            QueuedTask.objects.filter(status='pending').update(available_at=timezone.now())
+            self._drain()
+        (label, results), = collected
+        self.assertEqual(results[0], 1)
+        self.assertEqual(results[1]['status'], 'error')
+        self.assertIn('bad input', results[1]['error'])
+        # broken has max_retries=1: two runs, then the error result.
+        member = QueuedTask.objects.get(name='taskqueue.chord_member', args__2='taskqueue.tests.broken')
+        self.assertEqual((member.status, member.attempts), ('done', 2))
+
+    def test_immutable_body_and_empty_header(self):
+        chord([add.s(1)])(collect.si([], label='fixed'))
+        self._drain()
+        chord([])(collect.s(label='empty'))
+        self._drain()
+        self.assertEqual(collected, [('fixed', []), ('empty', [])])
+        self.assertFalse(TaskGroup.objects.filter(body_sent_at__isnull=True).exists())
+
+
+@override_settings(TASK_BACKEND='database')
+class TaskWorkerCommandTests(TransactionTestCase):
+    """The worker threads use their own connections, so the queued rows must
+    be committed (and SQLite's in-memory test database allows one writer at
+    a time, hence a single thread here)."""
+
+    def test_runs_what_is_due_and_exits(self):
+        calls.clear()
+        for n in range(5):
+            add.delay(n)
+        out = StringIO()
+        call_command('run_task_worker', '--once', '--concurrency', '1', '--batch-size', '2', stdout=out)
+        self.assertIn('Ran 5 task(s)', out.getvalue())
+        self.assertEqual(sorted(calls), [(n, 0) for n in range(5)])
+        self.assertEqual(QueuedTask.objects.filter(status='done').count(), 5)
+
+
+@override_settings(TASK_BACKEND='thread')
+class ThreadBackendTests(TestCase):
+    def test_delay_runs_on_the_executor(self):
+        self.assertEqual(add.delay(4, b=1).get(timeout=5), 5)
+        self.assertFalse(QueuedTask.objects.exists())
+
+
+@override_settings(TASK_BACKEND='thread')
+class ThreadChordTests(TransactionTestCase):
+    """Without a queue the chord runs on the executor, sent once the caller's
+    transaction commits."""
+
+    def test_chord_on_the_executor(self):
+        collected.clear()
+        collected_event.clear()
+        chord([add.s(5)])(collect.s(label='threads'))
+        self.assertTrue(collected_event.wait(10))
+        self.assertEqual(collected, [('threads', [5])])
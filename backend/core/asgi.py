@@ -3,6 +3,11 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve this (e.g. ``uvicorn core.asgi:application``) to get long-lived payment
+progress streams (apps/payments/streams.py) at the cost of a coroutine each.
+The same endpoint works under WSGI, where each stream holds a worker thread
+and is cut short so the client reconnects.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -50,6 +50,22 @@ app.conf.update(
             'task': 'core.tasks.cleanup_old_tasks',
             'schedule': 3600.0,  # Run every hour
         },
+        'drain-payment-outbox': {
+            'task': 'apps.payments.tasks.drain_payment_outbox',
+            'schedule': 60.0,  # Retries and anything a dead worker left behind
+        },
+        'release-expired-ticket-holds': {
+            'task': 'apps.payments.tasks.release_expired_ticket_holds',
+            'schedule': 60.0,  # Seats held by abandoned checkouts
+        },
+        'drain-webhook-inbox': {
+            'task': 'apps.payments.tasks.drain_webhook_inbox',
+            'schedule': 30.0,  # Webhook retries and interrupted events
+        },
+        'refresh-transfer-fees': {
+            'task': 'apps.payments.tasks.refresh_transfer_fees',
+            'schedule': 6 * 60 * 60.0,  # Matches fee_schedule.FRESH_FOR
+        },
     },
 )
 
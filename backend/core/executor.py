@@ -0,0 +1,287 @@
+"""
+The process-wide background executor.
+
+Without Celery, AsyncFallback.delay and LightweightAsync.delay used to start
+a new daemon thread for every task: no cap, no queue, no way to see what was
+running. A 200-ticket purchase could start 200 threads, each opening its own
+database connection and keeping it until the thread died, and a process
+exiting mid-task simply dropped the work. LightweightAsync also slept before
+every task on purpose.
+
+Every .delay() now goes through one executor per process:
+
+    * BACKGROUND_WORKERS threads, started on first use (and again in a
+      forked child, which inherits none of its parent's threads);
+    * a queue of at most BACKGROUND_QUEUE_SIZE waiting tasks. When it is
+      full, submit() waits up to BACKGROUND_QUEUE_TIMEOUT seconds for room
+      and then runs the task in the caller's thread. The caller slows down
+      instead of the process growing without bound, and nothing is dropped;
+    * each task runs like a request: close_old_connections() before and
+      after it, so a worker never keeps a broken or expired connection and
+      with CONN_MAX_AGE = 0 holds none between tasks. A task run in the
+      caller's thread is left the caller's connection as it is, since the
+      caller may be inside atomic() and closing it would end its transaction;
+    * per-task timing — time waiting in the queue and time running — kept
+      per task name as counts, failures and a latency histogram, readable
+      with metrics_snapshot() and logged to the 'performance' logger when a
+      task is slow;
+    * on interpreter exit the queue stops taking work and the workers finish
+      what is queued, for up to BACKGROUND_SHUTDOWN_TIMEOUT seconds.
+      Anything left is abandoned, as before. The payment outbox and webhook
+      inbox recover their own work (run_payment_outbox, run_webhook_inbox).
+
+submit() returns a BackgroundTask whose get() waits for the result, which
+is the shape the old MockTask had.
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+perf_logger = logging.getLogger('performance')
+
+# Upper bounds (seconds) of the run-time histogram buckets; the last bucket
+# is everything slower.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+SLOW_TASK_SECONDS = 5.0
+
+_STOP = object()
+_ids = itertools.count(1)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class BackgroundTask:
+    """A submitted task: its id, and get() to wait for its result."""
+
+    def __init__(self, name):
+        self.id = f"bg_{os.getpid()}_{next(_ids)}"
+        self.name = name
+        self._done = threading.Event()
+        self._result = None
+        self.status = 'queued'
+
+    def _finish(self, status, result):
+        self.status = status
+        self._result = result
+        self._done.set()
+
+    def ready(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        """
+        The task's return value, or {'status': 'error', 'error': ...} if it
+        raised. Raises TimeoutError if it hasn't finished within `timeout`.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Background task {self.id} ({self.name}) still {self.status}")
+        return self._result
+
+
+class _Metrics:
+    """Per-task-name counts, failures, queue wait and a run-time histogram."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = defaultdict(lambda: {
+            'runs': 0,
+            'failures': 0,
+            'ran_inline': 0,
+            'latency': [0] * (len(LATENCY_BUCKETS) + 1),
+            'latency_sum': 0.0,
+            'latency_max': 0.0,
+            'wait_sum': 0.0,
+        })
+
+    def record(self, name, waited, elapsed, failed, inline):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if elapsed <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            row = self._data[name]
+            row['runs'] += 1
+            row['failures'] += int(failed)
+            row['ran_inline'] += int(inline)
+            row['latency'][bucket] += 1
+            row['latency_sum'] += elapsed
+            row['latency_max'] = max(row['latency_max'], elapsed)
+            row['wait_sum'] += waited
+
+    def snapshot(self):
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS] + ['le_inf']
+        with self._lock:
+            return {
+                name: {
+                    'runs': row['runs'],
+                    'failures': row['failures'],
+                    'ran_inline': row['ran_inline'],
+                    'latency': dict(zip(labels, row['latency'])),
+                    'latency_avg': row['latency_sum'] / row['runs'],
+                    'latency_max': row['latency_max'],
+                    'wait_avg': row['wait_sum'] / row['runs'],
+                }
+                for name, row in self._data.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+metrics = _Metrics()
+
+
+def _task_name(func):
+    return f"{getattr(func, '__module__', '?')}.{getattr(func, '__qualname__', repr(func))}"
+
+
+class BoundedExecutor:
+    def __init__(self, workers=None, queue_size=None):
+        self._workers = workers
+        self._queue_size = queue_size
+        self._lock = threading.Lock()
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._closed = False
+
+    # --- lifecycle ---------------------------------------------------------
+
+    def _start(self):
+        """Start the workers on first use, and again after a fork."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            workers = max(1, self._workers or _setting('BACKGROUND_WORKERS', 4))
+            self._queue = queue.Queue(maxsize=max(1, self._queue_size or _setting('BACKGROUND_QUEUE_SIZE', 100)))
+            self._threads = [
+                threading.Thread(target=self._work, name=f"background-{i}", daemon=True)
+                for i in range(workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._closed = False
+            self._pid = os.getpid()
+
+    def shutdown(self, timeout=None):
+        """
+        Stop taking work and let the workers finish what is queued, waiting
+        up to `timeout` seconds (BACKGROUND_SHUTDOWN_TIMEOUT by default).
+        """
+        if self._pid != os.getpid():
+            return
+        if timeout is None:
+            timeout = _setting('BACKGROUND_SHUTDOWN_TIMEOUT', 10)
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads, work = self._threads, self._queue
+        deadline = time.monotonic() + timeout
+        for _ in threads:
+            try:
+                work.put(_STOP, timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        left = work.qsize()
+        if left or any(thread.is_alive() for thread in threads):
+            logger.warning("Background executor stopped with %s task(s) unfinished", left)
+
+    # --- running -----------------------------------------------------------
+
+    def _run(self, task, func, args, kwargs, queued_at, inline=False):
+        waited = time.monotonic() - queued_at
+        task.status = 'running'
+        if not inline:
+            close_old_connections()
+        started = time.monotonic()
+        failed = False
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            failed = True
+            logger.exception("Background task %s failed", task.name)
+            result = {'status': 'error', 'error': str(e)}
+        finally:
+            # Inline, the connection is the caller's, possibly mid-transaction.
+            if not inline:
+                close_old_connections()
+        elapsed = time.monotonic() - started
+        metrics.record(task.name, waited, elapsed, failed, inline)
+        if elapsed >= SLOW_TASK_SECONDS:
+            perf_logger.warning("Slow background task %s: %.2fs (queued %.2fs)", task.name, elapsed, waited)
+        else:
+            perf_logger.debug("Background task %s done in %.3fs (queued %.3fs)", task.name, elapsed, waited)
+        task._finish('failed' if failed else 'succeeded', result)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._run(*item)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on a worker. Returns a BackgroundTask."""
+        task = BackgroundTask(_task_name(func))
+        queued_at = time.monotonic()
+        self._start()
+        if not self._closed:
+            try:
+                self._queue.put((task, func, args, kwargs, queued_at),
+                                timeout=_setting('BACKGROUND_QUEUE_TIMEOUT', 5))
+                return task
+            except queue.Full:
+                logger.warning("Background queue full (%s waiting), running %s in the caller",
+                               self._queue.qsize(), task.name)
+        # Backpressure, or the process is shutting down: do it here.
+        self._run(task, func, args, kwargs, queued_at, inline=True)
+        return task
+
+    def stats(self):
+        """Workers, queue depth and capacity right now, for this process."""
+        work = self._queue if self._pid == os.getpid() else None
+        return {
+            'workers': sum(1 for thread in self._threads if thread.is_alive()) if work else 0,
+            'queued': work.qsize() if work else 0,
+            'capacity': work.maxsize if work else 0,
+        }
+
+
+executor = BoundedExecutor()
+atexit.register(executor.shutdown)
+
+
+def submit(func, *args, **kwargs):
+    return executor.submit(func, *args, **kwargs)
+
+
+def metrics_snapshot():
+    """{task name: {runs, failures, ran_inline, latency histogram, latency/wait averages}} for this process."""
+    return metrics.snapshot()
+
+
+def background_task(func):
+    """
+    Give a plain function Celery's .delay(), running on the executor. The
+    function itself still runs synchronously when called directly.
+    """
+    func.delay = lambda *args, **kwargs: executor.submit(func, *args, **kwargs)
+    return func
@@ -0,0 +1,104 @@
+"""
+Streaming CSV / NDJSON exports for seller data.
+
+A seller with a long sales history used to get their orders, commissions or
+attendee list by loading the whole table into one JSON response. An export
+instead streams rows as they are read:
+
+    * the queryset is read with .iterator(chunk_size=...), which is a
+      server-side cursor on PostgreSQL, so only one chunk of rows is in memory
+      at a time, however long the history;
+    * each row is written as soon as it is read (StreamingHttpResponse), so
+      the first bytes reach the client at once and a large export doesn't
+      hold a worker's memory;
+    * the format is part of the URL (`orders.csv`, `orders.ndjson`), not a
+      `?format=` parameter, which DRF reserves for its own renderers.
+
+Subclass ExportView, set `columns` and `filename`, and implement
+get_rows() to yield one dict per row (keys matching `columns`).
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+# Spreadsheet apps run a cell starting with one of these as a formula. Buyer
+# names and product titles are user input, so they are defused with a quote.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back what it's given."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return str(value)
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # BOM, so Excel reads the file as UTF-8
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(row.get(column)) for column in columns])
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps({column: row.get(column) for column in columns}, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream(rows, columns, fmt, filename):
+    """A streaming download of `rows` (an iterable of dicts) as `fmt`."""
+    if fmt not in CONTENT_TYPES:
+        raise Http404(f"Unknown export format: {fmt}")
+    lines = csv_lines(columns, rows) if fmt == 'csv' else ndjson_lines(columns, rows)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+    stamp = timezone.localdate().isoformat()
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.{fmt}"'
+    response['Cache-Control'] = 'no-store'
+    # Tell nginx not to buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class ExportView(APIView):
+    """Base view for a streamed export at `.../<name>.<fmt>`."""
+    permission_classes = [IsAuthenticated]
+    columns = ()
+    filename = 'export'
+    chunk_size = CHUNK_SIZE
+
+    def get_rows(self, request, **kwargs):
+        raise NotImplementedError
+
+    def perform_content_negotiation(self, request, force=False):
+        # The response is CSV or NDJSON whatever the Accept header says; don't
+        # let DRF answer 406 to a client asking for text/csv.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, fmt, **kwargs):
+        if fmt not in CONTENT_TYPES:
+            raise Http404(f"Unknown export format: {fmt}")
+        return stream(self.get_rows(request, **kwargs), self.columns, fmt, self.filename)
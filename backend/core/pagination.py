@@ -11,13 +11,47 @@ return, so every paginated list in the API looks the same:
         "total_pages": 6, "has_next": true, "has_previous": false
       }
     }
+
+That is offset ("page") pagination: every request counts the whole list and
+then skips `(page - 1) * page_size` rows, so a deep page costs as much as
+reading everything before it. Lists that grow without bound (a buyer's
+library, their payment history, a popular product's reviews) can also be paged
+by cursor instead. A client opts in by sending `cursor` — empty for the first
+page, then whatever `next_cursor` the previous page returned:
+
+    {
+      "results": [...],
+      "pagination": {
+        "page_size": 20, "next_cursor": "WyIyMDI2LTA...", "has_next": true,
+        "has_previous": false
+      }
+    }
+
+A cursor page is a keyset query: `WHERE (added_at, id) < (last seen)` on the
+list's ordering, which an index answers without touching earlier rows. The
+cursor is opaque to clients (base64 of the last row's ordering values) and a
+garbled one is simply treated as the first page. Cursor pages skip the total
+by default; `total=estimate` adds a cheap estimate (the planner's row
+estimate on PostgreSQL, a briefly cached count elsewhere) and `total=exact`
+the real count. Clients that send `page` keep getting offset pages.
 """
 
+import base64
+import hashlib
+import json
+import logging
 from collections import OrderedDict
 
-from rest_framework.pagination import PageNumberPagination
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
 
+logger = logging.getLogger(__name__)
+
+ESTIMATE_CACHE_TTL = 5 * 60
+
 
 class StandardResultsPagination(PageNumberPagination):
     page_size = 24
@@ -40,38 +74,208 @@ class StandardResultsPagination(PageNumberPagination):
         ]))
 
 
-def paginate_list(request, items, serialize=None, default_page_size=24, max_page_size=100):
-    """
-    Same shape, for plain APIViews that build their own data.
+# --- cursors ---------------------------------------------------------------
 
-    `items` may be a queryset or a list. `serialize` maps one item to its
-    output dict; omit it if the items are already serialisable.
+def _plain(value):
+    # Full isoformat rather than DjangoJSONEncoder, which drops microseconds:
+    # a truncated timestamp would no longer equal the row it came from.
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_plain, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """The values encode_cursor() was given, or None if `token` isn't one."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _split(ordering):
+    """[(field, descending)] for ('-added_at', '-id')-style ordering."""
+    return [(o.lstrip('-'), o.startswith('-')) for o in ordering]
+
+
+def _after(queryset, ordering, values):
+    """Filter `queryset` to the rows that sort after `values`."""
+    fields = _split(ordering)
+    if len(values) != len(fields):
+        return None
+    meta = queryset.model._meta
+    try:
+        values = [
+            (meta.pk if name == 'pk' else meta.get_field(name)).to_python(value)
+            for (name, _), value in zip(fields, values)
+        ]
+    except Exception:
+        return None
+    # (a, b) < (x, y)  ==  a < x  OR  (a = x AND b < y), and so on.
+    condition = Q()
+    for i, (name, descending) in enumerate(fields):
+        step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+        for j in range(i):
+            step &= Q(**{fields[j][0]: values[j]})
+        condition |= step
+    return queryset.filter(condition)
+
+
+# --- totals ----------------------------------------------------------------
+
+def estimate_count(queryset):
+    """
+    A cheap row count for `queryset`: the planner's estimate on PostgreSQL,
+    otherwise the exact count cached for a few minutes.
     """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        try:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning("Row estimate failed, counting instead: %s", e)
+            return queryset.count()
+
     try:
-        page = max(1, int(request.GET.get('page', 1)))
-    except (TypeError, ValueError):
-        page = 1
+        key = 'count_estimate:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+        total = cache.get(key)
+    except Exception:
+        key, total = None, None
+    if total is None:
+        total = queryset.count()
+        if key:
+            try:
+                cache.set(key, total, ESTIMATE_CACHE_TTL)
+            except Exception:
+                pass
+    return total
+
+
+# --- pages -----------------------------------------------------------------
+
+def page_size_for(request, default_page_size, max_page_size):
     try:
         page_size = int(request.GET.get('page_size', default_page_size))
     except (TypeError, ValueError):
         page_size = default_page_size
-    page_size = max(1, min(page_size, max_page_size))
+    return max(1, min(page_size, max_page_size))
+
+
+def wants_cursor(request):
+    return 'cursor' in request.GET
+
+
+def is_paged(request):
+    """
+    Whether the client asked for a page at all. Endpoints that predate
+    pagination use this to keep answering a bare list to clients that don't.
+    """
+    return any(param in request.GET for param in ('page', 'page_size', 'cursor'))
+
+
+def _offset_page(request, items, page_size):
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except (TypeError, ValueError):
+        page = 1
 
     total_items = items.count() if hasattr(items, 'count') else len(items)
     total_pages = max(1, (total_items + page_size - 1) // page_size)
     offset = (page - 1) * page_size
 
-    window = items[offset:offset + page_size]
-    results = [serialize(i) for i in window] if serialize else list(window)
+    return items[offset:offset + page_size], {
+        'page': page,
+        'page_size': page_size,
+        'total_items': total_items,
+        'total_pages': total_pages,
+        'has_next': page < total_pages,
+        'has_previous': page > 1,
+        'next_page': page + 1 if page < total_pages else None,
+        'previous_page': page - 1 if page > 1 else None,
+    }
 
-    return {
-        'results': results,
-        'pagination': {
-            'page': page,
-            'page_size': page_size,
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'has_next': page < total_pages,
-            'has_previous': page > 1,
-        },
+
+def _cursor_page(request, queryset, ordering, page_size):
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(request.GET.get('cursor'))
+    remaining = _after(queryset, ordering, values) if values is not None else None
+    if remaining is None:
+        values, remaining = None, queryset
+
+    # One row past the page tells us whether there is another.
+    rows = list(remaining[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    meta = {
+        'page_size': page_size,
+        'next_cursor': None,
+        'has_next': has_next,
+        'has_previous': values is not None,
     }
+    if has_next:
+        last = rows[-1]
+        meta['next_cursor'] = encode_cursor(getattr(last, name) for name, _ in _split(ordering))
+
+    total = request.GET.get('total')
+    if total == 'exact':
+        meta['total_items'] = queryset.count()
+    elif total == 'estimate':
+        meta['total_items'] = estimate_count(queryset)
+        meta['total_is_estimate'] = True
+    return rows, meta
+
+
+def paginate_list(request, items, serialize=None, default_page_size=24, max_page_size=100,
+                  ordering=None):
+    """
+    Same shape, for plain APIViews that build their own data.
+
+    `items` may be a queryset or a list. `serialize` maps one item to its
+    output dict; omit it if the items are already serialisable. Pass the
+    queryset's `ordering` (ending in a unique field, e.g. ('-added_at', '-id'))
+    to let clients page it by cursor.
+    """
+    page_size = page_size_for(request, default_page_size, max_page_size)
+    if ordering and wants_cursor(request):
+        window, meta = _cursor_page(request, items, ordering, page_size)
+    else:
+        if ordering:
+            items = items.order_by(*ordering)
+        window, meta = _offset_page(request, items, page_size)
+    results = [serialize(i) for i in window] if serialize else list(window)
+    return {'results': results, 'pagination': meta}
+
+
+class KeysetPagination(BasePagination):
+    """
+    paginate_list() for generic views: cursor pages when the client sends
+    `cursor`, offset pages otherwise. Subclass and set `ordering`.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 24
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = page_size_for(request, self.page_size, self.max_page_size)
+        if wants_cursor(request):
+            window, self.meta = _cursor_page(request, queryset, self.ordering, page_size)
+        else:
+            window, self.meta = _offset_page(request, queryset.order_by(*self.ordering), page_size)
+        return list(window)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([('results', data), ('pagination', self.meta)]))
@@ -91,6 +91,7 @@ INSTALLED_APPS = [
     'apps.notifications',
     'apps.events',
     'apps.support',
+    'apps.taskqueue',
     
     # Celery apps
     'django_celery_beat',
@@ -240,6 +241,43 @@ R2_BUCKET_NAME = os.getenv('R2_BUCKET_NAME', '')
 # e.g. https://<account-id>.r2.cloudflarestorage.com
 R2_ENDPOINT_URL = os.getenv('R2_ENDPOINT_URL', '')
 
+# How paid product files reach the buyer once the download endpoint has
+# checked they own it (apps.payments.delivery). R2 files are always a
+# presigned redirect, valid for PRODUCT_DOWNLOAD_URL_EXPIRY seconds. Local
+# files are streamed by Django with Range support unless PRODUCT_FILE_OFFLOAD
+# hands them to the web server: 'nginx' sends X-Accel-Redirect under
+# PRODUCT_FILE_ACCEL_PREFIX, which must be an `internal` location aliased to
+# PRIVATE_MEDIA_ROOT; 'sendfile' sends X-Sendfile (Apache mod_xsendfile).
+PRODUCT_DOWNLOAD_URL_EXPIRY = int(os.getenv('PRODUCT_DOWNLOAD_URL_EXPIRY', '300'))
+PRODUCT_FILE_OFFLOAD = os.getenv('PRODUCT_FILE_OFFLOAD', '')
+PRODUCT_FILE_ACCEL_PREFIX = os.getenv('PRODUCT_FILE_ACCEL_PREFIX', '/protected-files/')
+
+# Worker processes that render a purchase's ticket PNGs in parallel
+# (apps.events.ticket_renderer). 0 renders in the calling process. The
+# default leaves one core to the web/worker process and caps at 4.
+TICKET_RENDER_PROCESSES = int(os.getenv('TICKET_RENDER_PROCESSES', str(min(4, (os.cpu_count() or 1) - 1))))
+
+# 'eager' renders each ticket's PNG when the ticket is created; 'lazy' creates
+# tickets without one and renders it on first view or when the ticket email
+# goes out (apps.events.ticket_images). TICKET_IMAGE_CACHE_SIZE PNGs are kept
+# in memory per process.
+TICKET_IMAGES = os.getenv('TICKET_IMAGES', 'eager')
+TICKET_IMAGE_CACHE_SIZE = int(os.getenv('TICKET_IMAGE_CACHE_SIZE', '128'))
+
+# Signs ticket QR tokens (apps.events.qr_tokens); defaults to SECRET_KEY.
+# Changing it invalidates the QR code of every ticket already issued.
+TICKET_QR_SECRET = os.getenv('TICKET_QR_SECRET', '')
+
+# The in-process background executor (core.executor) that runs .delay()
+# tasks when Celery isn't available: BACKGROUND_WORKERS threads per process
+# and at most BACKGROUND_QUEUE_SIZE queued tasks. When the queue stays full
+# for BACKGROUND_QUEUE_TIMEOUT seconds the caller runs the task itself. On
+# exit, queued tasks get BACKGROUND_SHUTDOWN_TIMEOUT seconds to finish.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '4'))
+BACKGROUND_QUEUE_SIZE = int(os.getenv('BACKGROUND_QUEUE_SIZE', '100'))
+BACKGROUND_QUEUE_TIMEOUT = float(os.getenv('BACKGROUND_QUEUE_TIMEOUT', '5'))
+BACKGROUND_SHUTDOWN_TIMEOUT = float(os.getenv('BACKGROUND_SHUTDOWN_TIMEOUT', '10'))
+
 # Local file storage configuration
 # No additional configuration needed - Django will use local storage by default
 
@@ -472,16 +510,22 @@ try:
     REDIS_AVAILABLE_FOR_CELERY = True
     print("Redis available for Celery")
 except:
-    print("Redis not available for Celery - using database broker")
+    print("Redis not available for Celery - tasks go to TASK_BACKEND")
 
 if REDIS_AVAILABLE_FOR_CELERY:
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
     CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/0'
 else:
-    # Use database as broker when Redis is not available
-    CELERY_BROKER_URL = 'django-db'
+    # There is no Celery broker without Redis ('django-db' was never one);
+    # TASK_BACKEND below decides where .delay() goes instead.
     CELERY_RESULT_BACKEND = 'django-db'
 
+# Where .delay() sends a task (apps.taskqueue): 'celery' (needs Redis),
+# 'database' (the QueuedTask table, run by `manage.py run_task_worker`) or
+# 'thread' (in this process, see core.executor). Redis-less hosts that can
+# run a worker process should use 'database'.
+TASK_BACKEND = os.getenv('TASK_BACKEND', 'celery' if REDIS_AVAILABLE_FOR_CELERY else 'thread')
+
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
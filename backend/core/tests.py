@@ -117,3 +117,88 @@ class RealClientIPMiddlewareTests(TestCase):
         from rest_framework.request import Request
         ident = _T().get_ident(Request(request))
         self.assertEqual(ident, '198.51.100.7')
+
+
+class BoundedExecutorTests(TestCase):
+    """The background executor: a fixed pool, a bounded queue that pushes
+    back on the caller, per-task metrics and a draining shutdown."""
+
+    def _executor(self, workers=1, queue_size=1):
+        from core.executor import BoundedExecutor
+        executor = BoundedExecutor(workers=workers, queue_size=queue_size)
+        self.addCleanup(executor.shutdown, 5)
+        return executor
+
+    def test_runs_on_a_fixed_pool_and_returns_results(self):
+        import threading
+        executor = self._executor(workers=2, queue_size=50)
+        names = set()
+
+        def work(n):
+            names.add(threading.current_thread().name)
+            return n * 2
+
+        tasks = [executor.submit(work, n) for n in range(20)]
+        self.assertEqual([t.get(timeout=5) for t in tasks], [n * 2 for n in range(20)])
+        self.assertLessEqual(len(names), 2)
+        self.assertEqual(executor.stats()['workers'], 2)
+
+    def test_full_queue_runs_the_task_in_the_caller(self):
+        import threading
+        executor = self._executor(workers=1, queue_size=1)
+        release = threading.Event()
+        blocker = executor.submit(release.wait, 5)
+        queued = executor.submit(lambda: 'queued')
+        # Wait until the worker holds the blocker, so the queued task fills the queue.
+        for _ in range(100):
+            if blocker.status == 'running':
+                break
+            release.wait(0.01)
+        with self.settings(BACKGROUND_QUEUE_TIMEOUT=0.01):
+            inline = executor.submit(threading.current_thread)
+        self.assertIs(inline.get(timeout=0), threading.current_thread())
+        release.set()
+        self.assertEqual(queued.get(timeout=5), 'queued')
+
+    def test_failures_are_results_and_metrics(self):
+        from core import executor as background
+
+        def explode():
+            raise ValueError('boom')
+
+        background.metrics.reset()
+        executor = self._executor()
+        self.assertEqual(executor.submit(explode).get(timeout=5), {'status': 'error', 'error': 'boom'})
+        row = background.metrics_snapshot()[background._task_name(explode)]
+        self.assertEqual((row['runs'], row['failures']), (1, 1))
+
+    def test_shutdown_finishes_queued_work(self):
+        import time
+        executor = self._executor(workers=1, queue_size=10)
+        tasks = [executor.submit(time.sleep, 0.01) for _ in range(5)]
+        executor.shutdown(timeout=5)
+        self.assertTrue(all(t.ready() for t in tasks))
+        # After shutdown the caller runs it.
+        self.assertEqual(executor.submit(lambda: 'late').get(timeout=0), 'late')
+
+    def test_running_inline_leaves_the_callers_connection_alone(self):
+        from unittest.mock import patch
+        from django.db import transaction
+        executor = self._executor()
+        executor.submit(lambda: None).get(timeout=5)
+        executor.shutdown(timeout=5)  # from here on every task runs in the caller
+        with transaction.atomic(), patch('core.executor.close_old_connections') as close:
+            self.assertEqual(executor.submit(lambda: 'inline').get(timeout=0), 'inline')
+        close.assert_not_called()
+
+    def test_delay_keeps_its_shape(self):
+        from core.async_fallback import AsyncFallback
+        from core.executor import background_task
+
+        @background_task
+        def add(a, b=0):
+            return a + b
+
+        self.assertEqual(add(1, b=2), 3)
+        self.assertEqual(add.delay(1, b=2).get(timeout=5), 3)
+        self.assertEqual(AsyncFallback.delay(add, 2, b=2).get(timeout=5), 4)
@@ -2,6 +2,7 @@ import logging
 import os
 
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.core.exceptions import SuspiciousFileOperation
 from django.core.files.storage import FileSystemStorage
@@ -119,6 +120,14 @@ class TicketTier(models.Model):
     def __str__(self):
         return self.display_name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Once checkouts have started, free seats live in sharded counters
+        # derived from capacity; rebuild them if the seller changes it.
+        if self.inventory_shards.exists():
+            from apps.payments.inventory import rebalance
+            rebalance(self.pk)
+
     @property
     def display_name(self):
         """
@@ -340,7 +349,16 @@ class Product(models.Model):
     @property
     def available_ticket_tiers(self):
         """Get only active ticket tiers with remaining quantity"""
-        return self.ticket_tiers.filter(is_active=True).exclude(quantity_sold__gte=models.F('quantity_available'))
+        # Tiers that have been checked out against keep their free seats in
+        # sharded counters (apps.payments.inventory) that also account for
+        # held seats; the others fall back to the sold count.
+        return self.ticket_tiers.filter(is_active=True).annotate(
+            free_seats=Coalesce(
+                models.Sum('inventory_shards__available'),
+                models.F('quantity_available') - models.F('quantity_sold'),
+                output_field=models.IntegerField(),
+            )
+        ).filter(free_seats__gt=0)
 
 
 class Review(models.Model):
@@ -1,6 +1,6 @@
 import json
 
-from django.db.models import Avg
+from django.db.models import Avg, Count, Prefetch
 from rest_framework import serializers
 
 from .models import Product, Review, TicketCategory, TicketTier, media_url_for
@@ -168,6 +168,21 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['owner', 'created_at', 'slug']
 
+    @staticmethod
+    def setup_queryset(queryset):
+        """
+        Load everything this serializer reads, for pages that nest products:
+        owner and category joined, tiers prefetched (which also answers
+        is_ticket_event's exists()), and the rating annotations the two
+        getters below look for.
+        """
+        return (
+            queryset
+            .select_related('owner', 'ticket_category')
+            .prefetch_related(Prefetch('ticket_tiers', queryset=TicketTier.objects.select_related('category')))
+            .annotate(avg_rating=Avg('reviews__rating'), num_reviews=Count('reviews', distinct=True))
+        )
+
     def get_average_rating(self, obj):
         """
         Mean rating, or None when nobody has reviewed yet.
@@ -2,7 +2,7 @@ from django.urls import path
 from .views import (
     SellerProductListCreateView, ProductDetailView,
     SellerAnalyticsView, ProductListView, PublicProductDetailView,
-    SellerOrdersView, TicketCategoryListView, TicketTierListView,
+    SellerOrdersView, SellerOrdersExportView, TicketCategoryListView, TicketTierListView,
     TicketTierCreateView, PresignProductFileUploadView,
     GenerateProductDescriptionView, ProductReviewListCreateView,
     ProductReviewDeleteView, ProductPublishToggleView,
@@ -25,6 +25,7 @@ urlpatterns = [
     path('upload/presign/', PresignProductFileUploadView.as_view(), name='presign-upload'),
     path('analytics/', SellerAnalyticsView.as_view(), name='seller-analytics'),
     path('orders/', SellerOrdersView.as_view(), name='seller-orders'),
+    path('orders/export.<str:fmt>', SellerOrdersExportView.as_view(), name='seller-orders-export'),
 
     # Ticket system endpoints
     path('ticket-categories/', TicketCategoryListView.as_view(), name='ticket-categories'),
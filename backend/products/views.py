@@ -7,13 +7,13 @@ from .serializers import (
 )
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Avg, Sum, Count, Q
+from django.db.models import Avg, Count, Q
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from datetime import timedelta
+from apps.payments import seller_stats
 from apps.payments.models import Payment, Purchase
-from django.db.models.functions import TruncDate
-from apps.payments.serializers import PurchaseSerializer
+from apps.payments.serializers import SellerOrderSerializer
 from .file_validation import (
     validate_uploaded_file, validate_cover_image, ALLOWED_FILE_TYPES,
     get_allowed_extensions_for_type,
@@ -22,7 +22,8 @@ from .models import _r2_configured
 from .r2_uploads import build_file_key, generate_presigned_put, attach_r2_file
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
-from core.pagination import StandardResultsPagination, paginate_list
+from core.exports import ExportView
+from core.pagination import KeysetPagination, StandardResultsPagination, is_paged, paginate_list
 from core.cache_utils import (
     cache_product_list, cache_product_data, cache_user_data, 
     performance_monitor, CacheManager
@@ -325,93 +326,85 @@ class PublicProductDetailView(generics.RetrieveAPIView):
         self.check_object_permissions(self.request, obj)
         return obj
 
+class SellerOrdersPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
 class SellerOrdersView(generics.ListAPIView):
+    """
+    A seller's paid orders, newest first. Paged (by `page` or `cursor`, see
+    core.pagination) when the client asks; clients that don't still get the
+    whole list as a bare array. orders.csv / orders.ndjson stream everything.
+    """
     permission_classes = [IsAuthenticated]
-    serializer_class = PurchaseSerializer
+    serializer_class = SellerOrderSerializer
+    pagination_class = SellerOrdersPagination
 
     def get_queryset(self):
         # Get purchases of products owned by the current user
-        return Purchase.objects.filter(
+        return SellerOrderSerializer.setup_queryset(Purchase.objects.filter(
             product__owner=self.request.user,
             payment__status='success'
-        ).select_related(
-            'product', 'payment__user'
-        ).order_by('-created_at')
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        
-        # Add customer information to each purchase
-        for item in data:
-            purchase = queryset.filter(id=item['id']).first()
-            if purchase:
-                item['customer'] = {
-                    'email': purchase.payment.user.email,
-                    'name': purchase.payment.user.first_name or purchase.payment.user.email.split('@')[0],
-                    'id': purchase.payment.user.id
-                }
-                item['payment_reference'] = purchase.payment.reference
-                item['payment_status'] = purchase.payment.status
-        
-        return Response(data)
+        )).order_by('-created_at', '-id')
+
+    @property
+    def paginator(self):
+        if not is_paged(self.request):
+            return None
+        return super().paginator
+
+
+class SellerOrdersExportView(ExportView):
+    """Every paid order for the seller's products, streamed as CSV or NDJSON."""
+    filename = 'orders'
+    columns = (
+        'order_id', 'created_at', 'payment_reference', 'product', 'ticket_tier', 'quantity',
+        'unit_price', 'total_price', 'customer_name', 'customer_email',
+    )
+
+    def get_rows(self, request):
+        purchases = (
+            Purchase.objects
+            .filter(product__owner=request.user, payment__status='success')
+            .select_related('product', 'payment__user', 'selected_ticket_tier')
+            .order_by('-created_at', '-id')
+        )
+        for purchase in purchases.iterator(chunk_size=self.chunk_size):
+            buyer = purchase.payment.user
+            tier = purchase.selected_ticket_tier
+            yield {
+                'order_id': purchase.id,
+                'created_at': purchase.created_at,
+                'payment_reference': purchase.payment.reference,
+                'product': purchase.product.title,
+                'ticket_tier': tier.display_name if tier else None,
+                'quantity': purchase.quantity,
+                'unit_price': purchase.unit_price,
+                'total_price': purchase.total_price,
+                'customer_name': buyer.full_name,
+                'customer_email': buyer.email,
+            }
+
 
 class SellerAnalyticsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        time_range = request.query_params.get('time_range', '7d')
-        
-        # Calculate date range
-        end_date = timezone.now()
-        if time_range == '7d':
-            start_date = end_date - timedelta(days=7)
-        elif time_range == '30d':
-            start_date = end_date - timedelta(days=30)
-        elif time_range == '90d':
-            start_date = end_date - timedelta(days=90)
-        elif time_range == '1y':
-            start_date = end_date - timedelta(days=365)
-        else:
-            start_date = end_date - timedelta(days=7)
+        days = seller_stats.days_for(request.query_params.get('time_range', '7d'))
 
         # Get user's products
         user_products = Product.objects.filter(owner=user)
         total_products = user_products.count()
 
-        # Get successful purchases of user's products
-        successful_purchases = Purchase.objects.filter(
-            product__owner=user,
-            payment__status='success',
-            created_at__range=[start_date, end_date]
-        )
-
-        # Calculate metrics
-        total_orders = successful_purchases.count()
-        total_revenue = successful_purchases.aggregate(
-            total=Sum('total_price')
-        )['total'] or 0
-
-        # Get unique customers
-        unique_customers = successful_purchases.values('payment__user').distinct().count()
-
-        # Calculate previous period for growth comparison
-        period_days = (end_date - start_date).days
-        prev_start_date = start_date - timedelta(days=period_days)
-        prev_end_date = start_date
-
-        prev_purchases = Purchase.objects.filter(
-            product__owner=user,
-            payment__status='success',
-            created_at__range=[prev_start_date, prev_end_date]
-        )
-
-        prev_orders = prev_purchases.count()
-        prev_revenue = prev_purchases.aggregate(
-            total=Sum('total_price')
-        )['total'] or 0
+        # Sales figures for this period and the one before it, from the daily
+        # rollup: at most 2 x 365 small rows instead of purchase aggregates.
+        stats = seller_stats.summary(user, days, previous=True)
+        total_orders = stats['orders']
+        total_revenue = stats['revenue']
+        unique_customers = stats['customers']
+        prev_orders = stats['previous']['orders']
+        prev_revenue = stats['previous']['revenue']
 
         # Calculate growth percentages
         orders_growth = 0
@@ -440,36 +433,25 @@ class SellerAnalyticsView(APIView):
         review_count = rating_summary['total']
 
         # Get top performing products
-        top_products = successful_purchases.values(
-            'product__title'
-        ).annotate(
-            sales=Count('id'),
-            revenue=Sum('total_price')
-        ).order_by('-revenue')[:5]
+        top_products = sorted(stats['products'].items(), key=lambda item: item[1]['revenue'], reverse=True)[:5]
+        titles = dict(Product.objects.filter(id__in=[pid for pid, _ in top_products]).values_list('id', 'title'))
 
         # Format top products data
         top_products_data = []
-        for product in top_products:
+        for product_id, product in top_products:
             top_products_data.append({
-                'name': product['product__title'],
+                'name': titles.get(product_id, ''),
                 'sales': product['sales'],
                 'revenue': float(product['revenue']),
                 'growth': 0  # Could be calculated with more complex logic
             })
 
-        # Get daily revenue data for charts (last 7 days)
-        daily_revenue = successful_purchases.filter(
-            created_at__gte=end_date - timedelta(days=7)
-        ).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            daily_revenue=Sum('total_price')
-        ).order_by('date')
+        # Daily revenue for charts (last 7 days)
+        week_ago = timezone.localdate() - timedelta(days=7)
+        daily_revenue = [(day, revenue) for day, revenue in stats['daily'] if day > week_ago]
 
         # Get customer demographics (basic)
-        customer_countries = successful_purchases.values(
-            'payment__ip_address'
-        ).distinct().count()
+        customer_countries = stats['customer_ips']
 
         return Response({
             "total_products": total_products,
@@ -492,9 +474,9 @@ class SellerAnalyticsView(APIView):
             "top_products": top_products_data,
             "daily_revenue": [
                 {
-                    'date': item['date'].strftime('%Y-%m-%d'),
-                    'revenue': float(item['daily_revenue'])
-                } for item in daily_revenue
+                    'date': day.strftime('%Y-%m-%d'),
+                    'revenue': float(revenue)
+                } for day, revenue in daily_revenue
             ],
             "customer_countries": customer_countries,
             # Additional metrics
@@ -537,6 +519,7 @@ class ProductReviewListCreateView(APIView):
             reviews,
             serialize=lambda r: ReviewSerializer(r, context={'request': request}).data,
             default_page_size=10,
+            ordering=('-created_at', '-id'),
         )
         page['average_rating'] = round(summary['avg'], 2) if summary['avg'] is not None else None
         page['review_count'] = summary['total']
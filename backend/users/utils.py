@@ -186,9 +186,10 @@ def send_event_ticket_email(user, product, tickets):
         for i, ticket in enumerate(tickets):
             try:
                 # Check if this is a fast ticket or old ticket
-                if hasattr(ticket, 'ticket_png') and ticket.ticket_png:
-                    # Fast ticket - use PNG file
-                    qr_content = ticket.ticket_png.read()
+                if hasattr(ticket, 'ticket_png'):
+                    # Fast ticket - its PNG, rendered now if it hasn't been yet
+                    from apps.events import ticket_images
+                    qr_content, _ = ticket_images.png_for(ticket)
                     qr_filename = f"ticket_{ticket.ticket_id}.png"
                     email.attach(qr_filename, qr_content, 'image/png')
                     print(f"✅ Attached fast ticket PNG: {qr_filename}")
@@ -3,6 +3,19 @@ import { getValidAccessToken } from "@/lib/auth/get-access-token";
 
 const BACKEND = process.env.NEXT_PUBLIC_API_BASE_URL?.replace("/api", "") || "http://localhost:8000";
 
+// Passed through both ways so downloads can resume.
+const REQUEST_HEADERS = ["range", "if-range", "if-none-match"];
+const RESPONSE_HEADERS = [
+  "content-type",
+  "content-disposition",
+  "content-length",
+  "content-range",
+  "accept-ranges",
+  "etag",
+  "last-modified",
+  "cache-control",
+];
+
 export async function GET(
   request: NextRequest,
   { params }: { params: Promise<{ id: string }> }
@@ -12,24 +25,38 @@ export async function GET(
     if (!accessToken) return NextResponse.json({ message: "Not authenticated" }, { status: 401 });
 
     const { id } = await params;
+    const headers: Record<string, string> = { Authorization: `Bearer ${accessToken}` };
+    for (const name of REQUEST_HEADERS) {
+      const value = request.headers.get(name);
+      if (value) headers[name] = value;
+    }
+
     const res = await fetch(`${BACKEND}/api/payments/library/${id}/download/`, {
-      headers: { Authorization: `Bearer ${accessToken}` },
+      headers,
+      redirect: "manual",
     });
 
-    if (!res.ok) {
+    // Files on R2 come back as a short-lived presigned URL; send the browser there.
+    const location = res.headers.get("location");
+    if (res.status >= 300 && res.status < 400 && location) {
+      return NextResponse.redirect(location, { status: 302, headers: { "Cache-Control": "private, no-store" } });
+    }
+
+    if (!res.ok && res.status !== 304 && res.status !== 416) {
       const data = await res.json().catch(() => ({}));
       return NextResponse.json({ message: data.message || "Download failed" }, { status: res.status });
     }
 
-    const contentType = res.headers.get("content-type") || "application/octet-stream";
-    const contentDisposition = res.headers.get("content-disposition") || "attachment";
-    const buffer = await res.arrayBuffer();
+    const responseHeaders = new Headers();
+    for (const name of RESPONSE_HEADERS) {
+      const value = res.headers.get(name);
+      if (value) responseHeaders.set(name, value);
+    }
 
-    return new NextResponse(buffer, {
-      headers: {
-        "Content-Type": contentType,
-        "Content-Disposition": contentDisposition,
-      },
+    // Stream the body instead of buffering the whole file in memory.
+    return new NextResponse(res.status === 304 ? null : res.body, {
+      status: res.status,
+      headers: responseHeaders,
     });
   } catch (error: any) {
     return NextResponse.json({ message: "Download failed" }, { status: 500 });
@@ -0,0 +1,39 @@
+import { NextResponse } from "next/server";
+import { apiClient } from "@/lib/api/client";
+import { getValidAccessToken } from "@/lib/auth/get-access-token";
+
+export async function GET(
+  request: Request,
+  { params }: { params: Promise<{ id: string }> }
+) {
+  try {
+    const accessToken = await getValidAccessToken();
+
+    if (!accessToken) {
+      return NextResponse.json(
+        { message: "Not authenticated" },
+        { status: 401 }
+      );
+    }
+
+    const { id } = await params;
+    const response = await apiClient.get(`/events/${id}/scan-key/`, {
+      headers: {
+        Authorization: `Bearer ${accessToken}`,
+      },
+    });
+
+    return NextResponse.json(response.data, {
+      headers: { "Cache-Control": "private, no-store" },
+    });
+  } catch (error: any) {
+    const status = error.response?.status || 500;
+    const message =
+      error.response?.data?.message ||
+      error.response?.data?.detail ||
+      error.message ||
+      "Failed to fetch scan key";
+
+    return NextResponse.json({ message }, { status });
+  }
+}
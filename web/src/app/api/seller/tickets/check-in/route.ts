@@ -0,0 +1,34 @@
+import { NextResponse } from "next/server";
+import { apiClient } from "@/lib/api/client";
+import { getValidAccessToken } from "@/lib/auth/get-access-token";
+
+export async function POST(request: Request) {
+  try {
+    const accessToken = await getValidAccessToken();
+
+    if (!accessToken) {
+      return NextResponse.json(
+        { message: "Not authenticated" },
+        { status: 401 }
+      );
+    }
+
+    const body = await request.json();
+    const response = await apiClient.post("/events/check-in/", body, {
+      headers: {
+        Authorization: `Bearer ${accessToken}`,
+      },
+    });
+
+    return NextResponse.json(response.data);
+  } catch (error: any) {
+    const status = error.response?.status || 500;
+    const message =
+      error.response?.data?.message ||
+      error.response?.data?.error ||
+      error.message ||
+      "Failed to check in tickets";
+
+    return NextResponse.json({ message }, { status });
+  }
+}
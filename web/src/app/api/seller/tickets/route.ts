@@ -1,8 +1,8 @@
-import { NextResponse } from "next/server";
+import { NextRequest, NextResponse } from "next/server";
 import { apiClient } from "@/lib/api/client";
 import { getValidAccessToken } from "@/lib/auth/get-access-token";
 
-export async function GET() {
+export async function GET(request: NextRequest) {
   try {
     const accessToken = await getValidAccessToken();
 
@@ -13,7 +13,10 @@ export async function GET() {
       );
     }
 
+    // Paging (cursor, page_size) and filters (event, tier, checked_in)
+    // pass straight through.
     const response = await apiClient.get("/events/seller-tickets/", {
+      params: Object.fromEntries(request.nextUrl.searchParams),
       headers: {
         Authorization: `Bearer ${accessToken}`,
       },
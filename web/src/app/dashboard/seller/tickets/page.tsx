@@ -10,6 +10,7 @@ import { toast } from "sonner";
 
 interface EventTicket {
   ticket_id: string;
+  kind: "fast" | "legacy";
   buyer: { full_name: string; email: string };
   event: { title: string; event_date: string };
   quantity: number;
@@ -25,6 +26,20 @@ interface EventTicket {
 
 interface Stats { total: number; valid: number; used: number }
 
+interface TicketPage { results: EventTicket[]; pagination: { next_cursor: string | null; has_next: boolean } }
+
+type Filter = "all" | "valid" | "used";
+
+const PAGE_SIZE = 30;
+
+// The feed is paged and filtered on the server; "valid" and "used" map to
+// its checked_in filter.
+const ticketsUrl = (filter: Filter, cursor: string) => {
+  const params = new URLSearchParams({ page_size: String(PAGE_SIZE), cursor });
+  if (filter !== "all") params.set("checked_in", filter === "used" ? "true" : "false");
+  return `/api/seller/tickets?${params}`;
+};
+
 const fmt = (v: string | number) => {
   const n = typeof v === "string" ? parseFloat(v) : v;
   if (isNaN(n)) return "₦0";
@@ -41,7 +56,9 @@ export default function SellerPurchasesPage() {
   const [stats, setStats] = useState<Stats>({ total: 0, valid: 0, used: 0 });
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
-  const [filter, setFilter] = useState<"all" | "valid" | "used">("all");
+  const [filter, setFilter] = useState<Filter>("all");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (initialized && !isAuthenticated) router.push("/login");
@@ -51,18 +68,19 @@ export default function SellerPurchasesPage() {
     if (isAuthenticated) {
       fetchAll();
     }
-  }, [isAuthenticated]);
+  }, [isAuthenticated, filter]);
 
   const fetchAll = async () => {
     setLoading(true);
     try {
       const [ticketsRes, statsRes] = await Promise.allSettled([
-        fetch("/api/seller/tickets"),
+        fetch(ticketsUrl(filter, "")),
         fetch("/api/seller/tickets/stats"),
       ]);
       if (ticketsRes.status === "fulfilled" && ticketsRes.value.ok) {
-        const d = await ticketsRes.value.json();
-        setTickets(Array.isArray(d) ? d : []);
+        const d: TicketPage = await ticketsRes.value.json();
+        setTickets(d.results || []);
+        setNextCursor(d.pagination?.has_next ? d.pagination.next_cursor : null);
       }
       if (statsRes.status === "fulfilled" && statsRes.value.ok) {
         const d = await statsRes.value.json();
@@ -78,6 +96,22 @@ export default function SellerPurchasesPage() {
 
   const onRefresh = async () => { setRefreshing(true); await fetchAll(); };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(ticketsUrl(filter, nextCursor));
+      if (!res.ok) throw new Error();
+      const d: TicketPage = await res.json();
+      setTickets((prev) => [...prev, ...(d.results || [])]);
+      setNextCursor(d.pagination?.has_next ? d.pagination.next_cursor : null);
+    } catch {
+      toast.error("Failed to load more purchases");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (!initialized || !isAuthenticated) {
     return (
       <DashboardLayout>
@@ -93,12 +127,6 @@ export default function SellerPurchasesPage() {
     return null;
   }
 
-  const filtered = filter === "valid"
-    ? tickets.filter((t) => !t.is_used)
-    : filter === "used"
-    ? tickets.filter((t) => t.is_used)
-    : tickets;
-
   return (
     <DashboardLayout>
       <div className="mx-auto max-w-4xl space-y-8 p-6 sm:p-8">
@@ -154,10 +182,10 @@ export default function SellerPurchasesPage() {
           <div className="space-y-3">
             {[1, 2, 3, 4].map((i) => <Skeleton key={i} className="h-24 w-full rounded-3xl" />)}
           </div>
-        ) : filtered.length > 0 ? (
+        ) : tickets.length > 0 ? (
           <div className="space-y-3">
-            {filtered.map((ticket) => (
-              <div key={ticket.ticket_id} className="flex items-start gap-4 rounded-3xl border border-line bg-surface p-5">
+            {tickets.map((ticket) => (
+              <div key={`${ticket.kind}-${ticket.ticket_id}`} className="flex items-start gap-4 rounded-3xl border border-line bg-surface p-5">
                 {/* Status icon */}
                 <div className={`mt-0.5 flex h-9 w-9 shrink-0 items-center justify-center rounded-full ${ticket.is_used ? "bg-inset" : "bg-ok-soft"}`}>
                   {ticket.is_used ? (
@@ -212,6 +240,13 @@ export default function SellerPurchasesPage() {
                 </div>
               </div>
             ))}
+            {nextCursor && (
+              <div className="flex justify-center pt-2">
+                <Button size="sm" variant="outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? "Loading…" : "Load more"}
+                </Button>
+              </div>
+            )}
           </div>
         ) : (
           <div className="flex flex-col items-center justify-center rounded-3xl border border-dashed border-brand-200 bg-surface py-16 text-center">
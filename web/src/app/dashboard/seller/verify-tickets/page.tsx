@@ -32,6 +32,8 @@ import {
   Loader2,
 } from "lucide-react";
 import { toast } from "sonner";
+import { getScanKey, loadScanKey, parseScan, verifyToken } from "@/lib/tickets/qr-token";
+import { flushCheckins, queueCheckin, queuedCheckins } from "@/lib/tickets/offline-checkins";
 
 interface TicketBuyer {
   full_name: string;
@@ -87,6 +89,7 @@ export default function VerifyTicketsPage() {
   const [manualTicketId, setManualTicketId] = useState("");
   const [verifying, setVerifying] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [pendingCheckins, setPendingCheckins] = useState(0);
 
   useEffect(() => {
     if (initialized && !isAuthenticated) {
@@ -98,6 +101,29 @@ export default function VerifyTicketsPage() {
     }
   }, [isAuthenticated, initialized, user, router]);
 
+  useEffect(() => {
+    // Send check-ins made while offline as soon as the connection is back.
+    const sync = async () => {
+      if (!navigator.onLine || queuedCheckins().length === 0) return;
+      try {
+        const results = await flushCheckins();
+        const refused = results.filter((result) => result.status !== "admitted");
+        toast.success(`Synced ${results.length - refused.length} offline check-in(s)`);
+        refused.forEach((result) =>
+          toast.error(`Ticket ${result.ticket_id || result.code}: ${result.status.replace("_", " ")}`)
+        );
+      } catch (error) {
+        console.error("Error syncing offline check-ins:", error);
+      } finally {
+        setPendingCheckins(queuedCheckins().length);
+      }
+    };
+    setPendingCheckins(queuedCheckins().length);
+    sync();
+    window.addEventListener("online", sync);
+    return () => window.removeEventListener("online", sync);
+  }, []);
+
   useEffect(() => {
     // Cleanup scanner on unmount
     return () => {
@@ -214,20 +240,22 @@ export default function VerifyTicketsPage() {
     await stopScanning();
 
     try {
-      // Parse the scanned QR code data to extract ticket_id
-      let ticketId: string;
-      try {
-        const parsedData = JSON.parse(data);
-        ticketId = parsedData.ticket_id;
-        if (!ticketId) {
-          throw new Error("No ticket_id found in QR code data");
+      const scan = parseScan(data);
+      if (!scan) {
+        throw new Error("Not a ticket QR code");
+      }
+
+      if (scan.kind === "token") {
+        if (!navigator.onLine) {
+          await checkInOffline(scan.token, scan.ticketId, scan.eventId);
+          return;
         }
-      } catch (parseError) {
-        // If parsing fails, assume the data is directly the ticket_id
-        ticketId = data;
+        // Keep the event's key on the device so the door keeps working
+        // if the connection drops.
+        loadScanKey(scan.eventId).catch(() => null);
       }
 
-      await fetchTicketDetails(ticketId);
+      await fetchTicketDetails(scan.ticketId);
     } catch (error: any) {
       console.error("Error processing QR code:", error);
       toast.error("Failed to process QR code. Please try again.");
@@ -235,6 +263,21 @@ export default function VerifyTicketsPage() {
     }
   };
 
+  const checkInOffline = async (token: string, ticketId: string, eventId: number) => {
+    const scanKey = getScanKey(eventId);
+    if (!scanKey) {
+      toast.error("You're offline and this event's tickets can't be checked yet. Scan one while online first.");
+    } else if (!(await verifyToken(token, scanKey))) {
+      toast.error("Invalid ticket: this QR code was not issued by Darra.");
+    } else if (queueCheckin(ticketId, eventId, token)) {
+      setPendingCheckins(queuedCheckins().length);
+      toast.success("Valid ticket. Check-in saved and will sync when you're back online.");
+    } else {
+      toast.error("This ticket was already scanned at this device.");
+    }
+    setScanned(false);
+  };
+
   const fetchTicketDetails = async (ticketId: string) => {
     try {
       setLoading(true);
@@ -368,6 +411,11 @@ export default function VerifyTicketsPage() {
               <p className="mb-8 text-center text-brand-200">
                 Point camera at a ticket QR code
               </p>
+              {pendingCheckins > 0 && (
+                <p className="-mt-6 mb-8 text-center text-sm text-amber-300">
+                  {pendingCheckins} offline check-in(s) waiting to sync
+                </p>
+              )}
 
               <div className="flex w-full max-w-md flex-col gap-3">
                 <button
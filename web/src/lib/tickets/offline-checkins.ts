@@ -0,0 +1,68 @@
+/**
+ * Check-ins made while the scanner was offline, kept in localStorage and
+ * sent in one batch (/api/seller/tickets/check-in) once it reconnects. Each
+ * ticket is queued once; the server decides the outcome (a ticket admitted
+ * at another gate meanwhile comes back as already used).
+ */
+
+export interface QueuedCheckin {
+  ticketId: string;
+  eventId: number;
+  code: string; // what was scanned, sent as-is so the server re-checks it
+  scannedAt: string;
+}
+
+export interface CheckinResult {
+  code: string;
+  status: "admitted" | "already_used" | "not_found" | "invalid" | "forbidden" | "wrong_event";
+  ticket_id?: string;
+  buyer_name?: string;
+  ticket_tier?: string | null;
+  used_at?: string;
+  verified_by?: string | null;
+}
+
+const QUEUE_STORAGE = "darra.offlineCheckins";
+
+export function queuedCheckins(): QueuedCheckin[] {
+  try {
+    return JSON.parse(localStorage.getItem(QUEUE_STORAGE) || "[]");
+  } catch {
+    return [];
+  }
+}
+
+function save(queue: QueuedCheckin[]) {
+  localStorage.setItem(QUEUE_STORAGE, JSON.stringify(queue));
+}
+
+/** Queue a check-in. False if this ticket is already queued. */
+export function queueCheckin(ticketId: string, eventId: number, code: string): boolean {
+  const queue = queuedCheckins();
+  if (queue.some((entry) => entry.ticketId === ticketId)) return false;
+  save([...queue, { ticketId, eventId, code, scannedAt: new Date().toISOString() }]);
+  return true;
+}
+
+/**
+ * Send every queued check-in in one request. If it goes through, the queue
+ * is cleared and the server's answer for each ticket is returned; if not,
+ * the queue is kept for next time and this throws.
+ */
+export async function flushCheckins(): Promise<CheckinResult[]> {
+  const queue = queuedCheckins();
+  if (queue.length === 0) return [];
+  const response = await fetch("/api/seller/tickets/check-in", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ codes: queue.map((entry) => entry.code) }),
+  });
+  if (!response.ok) {
+    throw new Error(`Check-in sync failed (${response.status})`);
+  }
+  const data: { results: CheckinResult[] } = await response.json();
+  // Anything queued while the request was in flight stays.
+  const sent = new Set(queue.map((entry) => entry.ticketId));
+  save(queuedCheckins().filter((entry) => !sent.has(entry.ticketId)));
+  return data.results;
+}
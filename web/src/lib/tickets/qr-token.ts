@@ -0,0 +1,137 @@
+/**
+ * Ticket QR codes, read and checked in the browser.
+ *
+ * New tickets carry a compact signed token (see the backend's
+ * apps/events/qr_tokens.py):
+ *
+ *   "DT1" + base32(ticket uuid (16 bytes) | event id (4 bytes, big-endian)
+ *                  | first 8 bytes of HMAC-SHA256(event key, those 20 bytes))
+ *
+ * With the event's key (fetched once from /api/seller/events/<id>/scan-key
+ * and kept on the device) a scanner can tell a genuine ticket from a forged
+ * one with no network, and queue the check-in (offline-checkins.ts) until it
+ * reconnects. Older tickets carry JSON ({"ticket_id": ...}) or a bare id;
+ * those are read but can only be checked online.
+ */
+
+export const TOKEN_PREFIX = "DT1";
+const MAC_BYTES = 8;
+const BODY_BYTES = 20;
+const BASE32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567";
+
+export type ScannedTicket =
+  | { kind: "token"; ticketId: string; eventId: number; token: string }
+  | { kind: "legacy"; ticketId: string; eventId: number | null };
+
+export interface ScanKey {
+  event_id: number;
+  format: string;
+  mac_bytes: number;
+  key: string; // base64url, no padding
+}
+
+function base32Decode(text: string) {
+  let bits = 0;
+  let value = 0;
+  const out: number[] = [];
+  for (const char of text.toUpperCase()) {
+    const index = BASE32.indexOf(char);
+    if (index === -1) return null;
+    value = (value << 5) | index;
+    bits += 5;
+    if (bits >= 8) {
+      out.push((value >>> (bits - 8)) & 0xff);
+      bits -= 8;
+    }
+  }
+  // Leftover padding bits must be zero, as the server requires: otherwise
+  // several strings would read as the same ticket.
+  if (value & ((1 << bits) - 1)) return null;
+  return new Uint8Array(out);
+}
+
+function base64UrlDecode(text: string) {
+  const base64 = text.replace(/-/g, "+").replace(/_/g, "/");
+  const binary = atob(base64 + "=".repeat((4 - (base64.length % 4)) % 4));
+  return Uint8Array.from(binary, (c) => c.charCodeAt(0));
+}
+
+function uuidFromBytes(bytes: Uint8Array): string {
+  const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+function splitToken(token: string) {
+  const raw = base32Decode(token.slice(TOKEN_PREFIX.length));
+  if (!raw || raw.length !== BODY_BYTES + MAC_BYTES) return null;
+  const body = raw.slice(0, BODY_BYTES);
+  const eventId = new DataView(body.buffer, body.byteOffset).getUint32(16);
+  return { body, mac: raw.slice(BODY_BYTES), ticketId: uuidFromBytes(body.slice(0, 16)), eventId };
+}
+
+/**
+ * What a scanned QR code says, without checking its signature. Returns null
+ * if it isn't a ticket code at all.
+ */
+export function parseScan(text: string): ScannedTicket | null {
+  const value = text.trim();
+  if (value.toUpperCase().startsWith(TOKEN_PREFIX)) {
+    const token = value.toUpperCase();
+    const parts = splitToken(token);
+    return parts ? { kind: "token", ticketId: parts.ticketId, eventId: parts.eventId, token } : null;
+  }
+  if (value.startsWith("{")) {
+    try {
+      const data = JSON.parse(value);
+      if (!data.ticket_id) return null;
+      return { kind: "legacy", ticketId: String(data.ticket_id), eventId: data.event_id ? Number(data.event_id) : null };
+    } catch {
+      return null;
+    }
+  }
+  return value ? { kind: "legacy", ticketId: value, eventId: null } : null;
+}
+
+/** Whether `token` was signed with this event's key. Works offline. */
+export async function verifyToken(token: string, scanKey: ScanKey): Promise<boolean> {
+  const parts = splitToken(token.toUpperCase());
+  if (!parts || parts.eventId !== scanKey.event_id) return false;
+  const key = await crypto.subtle.importKey(
+    "raw",
+    base64UrlDecode(scanKey.key),
+    { name: "HMAC", hash: "SHA-256" },
+    false,
+    ["sign"]
+  );
+  const expected = new Uint8Array(await crypto.subtle.sign("HMAC", key, parts.body)).slice(0, MAC_BYTES);
+  let diff = 0;
+  for (let i = 0; i < MAC_BYTES; i++) diff |= expected[i] ^ parts.mac[i];
+  return diff === 0;
+}
+
+// --- scan keys, kept on the device -----------------------------------------
+
+const KEY_STORAGE = "darra.scanKeys";
+
+function storedKeys(): Record<string, ScanKey> {
+  try {
+    return JSON.parse(localStorage.getItem(KEY_STORAGE) || "{}");
+  } catch {
+    return {};
+  }
+}
+
+export function getScanKey(eventId: number): ScanKey | null {
+  return storedKeys()[String(eventId)] || null;
+}
+
+/** Fetch and keep an event's scan key (while online). Null if not allowed. */
+export async function loadScanKey(eventId: number): Promise<ScanKey | null> {
+  const cached = getScanKey(eventId);
+  if (cached) return cached;
+  const response = await fetch(`/api/seller/events/${eventId}/scan-key`);
+  if (!response.ok) return null;
+  const scanKey: ScanKey = await response.json();
+  localStorage.setItem(KEY_STORAGE, JSON.stringify({ ...storedKeys(), [String(eventId)]: scanKey }));
+  return scanKey;
+}